@@ -1747,6 +1747,86 @@ class ContentStoreTest(ModuleStoreTestCase):
 
         self.assertEqual(timedelta(1), new_module.graceperiod)
 
+    def test_metadata_inheritance_incremental_update(self):
+        module_store = modulestore('direct')
+        _, course_items = import_from_xml(module_store, 'common/test/data/', ['toy'])
+        course = course_items[0]
+        vertical = module_store.get_items(course.id, category='vertical')[0]
+        leaf = module_store.get_item(vertical.children[0])
+
+        with mock.patch.object(
+            module_store, '_compute_metadata_inheritance_tree',
+            wraps=module_store._compute_metadata_inheritance_tree
+        ) as mock_compute:
+            # warm the cache
+            module_store.get_item(vertical.location)
+            mock_compute.reset_mock()
+
+            # neither editing a leaf nor a container's non-inheritable fields recomputes the tree
+            leaf.display_name = 'new display name'
+            module_store.update_item(leaf, self.user.id)
+            vertical.display_name = 'new vertical name'
+            module_store.update_item(vertical, self.user.id)
+
+            # an inheritable change to a container is visible to its descendants
+            vertical.graceperiod = timedelta(2)
+            module_store.update_item(vertical, self.user.id)
+            self.assertEqual(module_store.get_item(leaf.location).graceperiod, timedelta(2))
+
+            self.assertEqual(mock_compute.call_count, 0)
+
+    def test_metadata_inheritance_update_after_concurrent_change(self):
+        module_store = modulestore('direct')
+        _, course_items = import_from_xml(module_store, 'common/test/data/', ['toy'])
+        course = course_items[0]
+        vertical = module_store.get_items(course.id, category='vertical')[0]
+        leaf_location = vertical.children[0]
+        vertical.graceperiod = timedelta(2)
+        module_store.update_item(vertical, self.user.id)
+
+        # another process counts a change to the course, but the tree it changed isn't cached
+        cache = module_store.metadata_inheritance_cache_subsystem
+        version_key = module_store._inheritance_version_key(course.id)  # pylint: disable=protected-access
+        cache.incr(version_key)
+
+        with mock.patch.object(
+            module_store, '_compute_metadata_inheritance_tree',
+            wraps=module_store._compute_metadata_inheritance_tree
+        ) as mock_compute:
+            # so, the cached tree can't be patched, and is rebuilt instead
+            vertical.graceperiod = timedelta(3)
+            module_store.update_item(vertical, self.user.id)
+            self.assertEqual(mock_compute.call_count, 1)
+            self.assertEqual(cache.get(course.id).version, cache.get(version_key))
+
+            # which other processes then use as it is
+            self.assertEqual(module_store.get_item(leaf_location).graceperiod, timedelta(3))
+            self.assertEqual(mock_compute.call_count, 1)
+
+    def test_metadata_inheritance_incremental_update_with_draft(self):
+        draft_store = modulestore('draft')
+        _, course_items = import_from_xml(modulestore('direct'), 'common/test/data/', ['toy'])
+        course_id = course_items[0].id
+        vertical = draft_store.get_items(course_id, category='vertical')[0]
+        removed_child = vertical.children[-1]
+
+        # the draft drops a child and overrides an inheritable field; the published
+        # version still lists the child, so the tree must keep it, as a full build does
+        draft_store.convert_to_draft(vertical.location)
+        draft = draft_store.get_item(vertical.location)
+        draft.children.remove(removed_child)
+        draft.graceperiod = timedelta(3)
+        draft_store.update_item(draft, self.user.id)
+
+        tree = draft_store._get_cached_metadata_inheritance_tree(course_id)
+        self.assertEqual(
+            tree.get_parents(removed_child.to_deprecated_string()), [vertical.location.to_deprecated_string()]
+        )
+        computed = draft_store._compute_metadata_inheritance_tree(course_id)
+        self.assertEqual(tree.parents, computed.parents)
+        self.assertEqual(tree.other_parents, computed.other_parents)
+        self.assertEqual(tree.overrides, computed.overrides)
+
     def test_default_metadata_inheritance(self):
         course = CourseFactory.create()
         vertical = ItemFactory.create(parent_location=course.location)
@@ -161,6 +161,39 @@ def compute_publish_state(xblock):
         return PublishState.public
 
 
+def compute_publish_states(xblock, depth=None):
+    """
+    Returns a dict mapping the location of `xblock`, and of each of its descendents
+    down to `depth` levels (None for all of them), to its publish state, as
+    compute_publish_state returns it.
+
+    Which of the drafts have a published version is looked up in one query, rather
+    than one for each draft, so use this to find the states of a whole subtree,
+    such as the units of a subsection or of a course.
+    """
+    xblocks = []
+    to_visit = [(xblock, depth)]
+    while to_visit:
+        block, block_depth = to_visit.pop()
+        xblocks.append(block)
+        if block.has_children and (block_depth is None or block_depth > 0):
+            child_depth = None if block_depth is None else block_depth - 1
+            to_visit.extend((child, child_depth) for child in block.get_children())
+
+    drafts = [block.location for block in xblocks if getattr(block, 'is_draft', False)]
+    published = modulestore('direct').get_existing_locations(drafts) if drafts else set()
+
+    states = {}
+    for block in xblocks:
+        if not getattr(block, 'is_draft', False):
+            states[block.location] = PublishState.public
+        elif block.location in published:
+            states[block.location] = PublishState.draft
+        else:
+            states[block.location] = PublishState.private
+    return states
+
+
 def add_extra_panel_tab(tab_type, course):
     """
     Used to add the panel tab to a course if it does not exist.
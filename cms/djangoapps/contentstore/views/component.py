@@ -22,7 +22,9 @@ from xblock.fields import Scope
 from xblock.plugin import PluginMissingError
 from xblock.runtime import Mixologist
 
-from contentstore.utils import get_lms_link_for_item, compute_publish_state, PublishState, get_modulestore
+from contentstore.utils import (
+    get_lms_link_for_item, compute_publish_state, compute_publish_states, PublishState, get_modulestore
+)
 from contentstore.views.helpers import get_parent_xblock
 
 from models.settings.course_grading import CourseGradingModel
@@ -104,13 +106,12 @@ def subsection_handler(request, usage_key_string):
             if field.name not in ['display_name', 'start', 'due', 'format'] and field.scope == Scope.settings
         )
 
-        can_view_live = False
         subsection_units = item.get_children()
-        for unit in subsection_units:
-            state = compute_publish_state(unit)
-            if state in (PublishState.public, PublishState.draft):
-                can_view_live = True
-                break
+        publish_states = compute_publish_states(item, depth=1)
+        can_view_live = any(
+            publish_states[unit.location] in (PublishState.public, PublishState.draft)
+            for unit in subsection_units
+        )
 
         return render_to_response(
             'edit_subsection.html',
@@ -125,6 +126,7 @@ def subsection_handler(request, usage_key_string):
                 'locator': usage_key,
                 'policy_metadata': policy_metadata,
                 'subsection_units': subsection_units,
+                'publish_states': publish_states,
                 'can_view_live': can_view_live
             }
         )
@@ -28,6 +28,7 @@ from xmodule.modulestore.locations import Location, SlashSeparatedCourseKey
 from contentstore.course_info_model import get_course_updates, update_course_updates, delete_course_update
 from contentstore.utils import (
     get_lms_link_for_item,
+    compute_publish_states,
     add_extra_panel_tab,
     remove_extra_panel_tab,
     get_modulestore,
@@ -255,6 +256,8 @@ def course_index(request, course_key):
         'context_course': course_module,
         'lms_link': lms_link,
         'sections': sections,
+        # the course's units are three levels down
+        'publish_states': compute_publish_states(course_module, depth=3),
         'course_graders': json.dumps(
             CourseGradingModel.fetch(course_key).graders
         ),
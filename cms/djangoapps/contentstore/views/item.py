@@ -535,11 +535,8 @@ def orphan_handler(request, course_key_string):
             raise PermissionDenied()
     if request.method == 'DELETE':
         if request.user.is_staff:
-            items = modulestore().get_orphans(course_usage_key)
-            for itemloc in items:
-                # get_orphans returns the deprecated string format
-                usage_key = course_usage_key.make_usage_key_from_deprecated_string(itemloc)
-                modulestore('draft').delete_item(usage_key, delete_all_versions=True)
+            # deletes the draft and published versions of every orphan at once
+            items = modulestore('draft').delete_orphans(course_usage_key, request.user.id)
             return JsonResponse({'deleted': items})
         else:
             raise PermissionDenied()
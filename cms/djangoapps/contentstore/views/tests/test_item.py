@@ -17,7 +17,7 @@ from contentstore.utils import reverse_usage_url
 from contentstore.views.component import component_handler
 
 from contentstore.tests.utils import CourseTestCase
-from contentstore.utils import compute_publish_state, PublishState
+from contentstore.utils import compute_publish_state, compute_publish_states, PublishState
 from student.tests.factories import UserFactory
 from xmodule.capa_module import CapaDescriptor
 from xmodule.modulestore.django import modulestore
@@ -727,6 +727,15 @@ class TestEditItem(ItemTest):
         draft = self.get_item_from_modulestore(self.problem_usage_key, True)
         self.assertNotEqual(draft.data, published.data)
 
+    def assert_publish_states(self, xblock, usage_keys, state):
+        """
+        Asserts that the publish states of the subtree of `xblock` are all `state`, for `usage_keys`
+        """
+        publish_states = compute_publish_states(xblock)
+        self.assertEqual(set(publish_states), set(usage_keys))
+        for usage_key in usage_keys:
+            self.assertEqual(publish_states[usage_key], state)
+
     def test_publish_states_of_nested_xblocks(self):
         """ Test publishing of a unit page containing a nested xblock  """
 
@@ -743,6 +752,7 @@ class TestEditItem(ItemTest):
         html = self.get_item_from_modulestore(html_usage_key, True)
         self.assertEqual(compute_publish_state(unit), PublishState.private)
         self.assertEqual(compute_publish_state(html), PublishState.private)
+        self.assert_publish_states(unit, [unit.location, wrapper_usage_key, html_usage_key], PublishState.private)
 
         # Make the unit public and verify that the problem is also made public
         resp = self.client.ajax_post(
@@ -754,6 +764,7 @@ class TestEditItem(ItemTest):
         html = self.get_item_from_modulestore(html_usage_key, True)
         self.assertEqual(compute_publish_state(unit), PublishState.public)
         self.assertEqual(compute_publish_state(html), PublishState.public)
+        self.assert_publish_states(unit, [unit.location, wrapper_usage_key, html_usage_key], PublishState.public)
 
         # Make a draft for the unit and verify that the problem also has a draft
         resp = self.client.ajax_post(
@@ -769,6 +780,7 @@ class TestEditItem(ItemTest):
         html = self.get_item_from_modulestore(html_usage_key, True)
         self.assertEqual(compute_publish_state(unit), PublishState.draft)
         self.assertEqual(compute_publish_state(html), PublishState.draft)
+        self.assert_publish_states(unit, [unit.location, wrapper_usage_key, html_usage_key], PublishState.draft)
 
 
 @ddt.ddt
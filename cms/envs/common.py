@@ -276,6 +276,18 @@ STATIC_URL = '/static/' + git.revision + "/"
 ADMIN_MEDIA_PREFIX = '/static/admin/'
 STATIC_ROOT = ENV_ROOT / "staticfiles" / git.revision
 
+# How many seconds browsers and proxies may cache unlocked course assets (the /c4x/ urls)
+STATIC_CONTENT_CACHE_MAX_AGE = 60 * 60 * 24
+
+# Local disk cache for course assets too big for memcache. None disables it; otherwise e.g.,
+# {
+#     'ROOT': '/var/tmp/asset_cache',
+#     'MAX_SIZE': 10 * 1024 ** 3,  # bytes of disk to use
+#     'MAX_FILE_SIZE': 512 * 1024 ** 2,  # optional: larger assets aren't cached
+#     'ACCEL_REDIRECT_PREFIX': '/asset_cache/',  # optional: an nginx internal location serving ROOT
+# }
+STATIC_CONTENT_DISK_CACHE = None
+
 STATICFILES_DIRS = [
     COMMON_ROOT / "static",
     PROJECT_ROOT / "static",
@@ -560,6 +572,11 @@ TRACKING_BACKENDS = {
 # names/passwords.  Heartbeat events are likely not interesting.
 TRACKING_IGNORE_URL_PATTERNS = [r'^/event', r'^/login', r'^/heartbeat']
 
+# If set, a dict of BATCH_SIZE, FLUSH_INTERVAL (seconds), and MAX_QUEUE_SIZE with
+# which to send events to the TRACKING_BACKENDS in batches from a background thread
+# rather than during the request. See track.dispatcher.
+TRACKING_BUFFER = None
+
 EVENT_TRACKING_ENABLED = True
 EVENT_TRACKING_BACKENDS = {
     'logger': {
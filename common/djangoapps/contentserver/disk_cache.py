@@ -0,0 +1,339 @@
+"""
+A bounded, on-disk LRU cache of course assets which are too big for memcache.
+
+Entries are keyed by the asset's content id plus its upload timestamp, so a re-uploaded asset never
+serves the old bytes even if this process missed the invalidation (e.g., Studio runs on a different
+machine). Entries are removed when the asset is saved or deleted through the contentstore in this
+process and otherwise age out in least recently used order once the cache exceeds its size cap.
+
+Several processes share the cache directory; so, files are only ever added by renaming a complete
+temporary file into place and removed by name, and cached content is served from a file opened
+before it's returned, which outlives the file being removed.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.dispatch import receiver
+from dogapi import dog_stats_api
+
+from xmodule.contentstore.content import StaticContent, STREAM_DATA_CHUNK_SIZE
+from xmodule.contentstore.django import asset_changed, contentstore
+
+log = logging.getLogger(__name__)
+
+# The prefix of the temporary files that cache files are written to, which aren't entries yet
+TEMP_FILE_PREFIX = 'tmp'
+
+
+class DiskCachedContent(StaticContent):
+    """
+    StaticContent whose data is a file in the disk cache. Reads are memory mapped so that serving
+    a range doesn't read the rest of the file.
+
+    The file is opened here, so the content can still be read if the cache file is removed.
+    Raises IOError if it can't be opened.
+    """
+    def __init__(self, content, path):
+        super(DiskCachedContent, self).__init__(
+            content.location, content.name, content.content_type, None,
+            last_modified_at=content.last_modified_at, thumbnail_location=content.thumbnail_location,
+            import_path=content.import_path, length=content.length, locked=getattr(content, 'locked', False),
+            content_digest=getattr(content, 'content_digest', None),
+        )
+        self.path = path
+        self._file = open(path, 'rb')
+
+    @property
+    def data(self):
+        self._file.seek(0)
+        return self._file.read()
+
+    def stream_data(self):
+        return self.stream_data_in_range(0, self.length - 1)
+
+    def stream_data_in_range(self, first_byte, last_byte):
+        if last_byte < first_byte:
+            return
+        mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for offset in xrange(first_byte, last_byte + 1, STREAM_DATA_CHUNK_SIZE):
+                yield mapped[offset:min(offset + STREAM_DATA_CHUNK_SIZE, last_byte + 1)]
+        finally:
+            mapped.close()
+
+    def close(self):
+        self._file.close()
+
+
+class AssetDiskCache(object):
+    """
+    Stores each asset in `root`/<hash of content id>/<upload timestamp>; a file's mtime records
+    when it was last used.
+    """
+    def __init__(self, root, max_size, max_file_size=None, accel_redirect_prefix=None):
+        """
+        :param root: the directory to keep the cache in
+        :param max_size: the maximum number of bytes to keep on disk
+        :param max_file_size: assets larger than this aren't cached. Defaults to max_size.
+        :param accel_redirect_prefix: if set, the url prefix under which the web server (e.g.,
+            an nginx internal location) serves `root`, so that it can send the files itself.
+        """
+        self.root = root
+        self.max_size = max_size
+        self.max_file_size = max_file_size if max_file_size is not None else max_size
+        self.accel_redirect_prefix = accel_redirect_prefix
+        self._size = None
+        self._lock = threading.Lock()
+        # the paths being filled by background threads of this process
+        self._filling = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Return a dict of the cache's counters, for monitoring
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': self._size,
+        }
+
+    @staticmethod
+    def _entry_dir_name(content_id):
+        """
+        The name of the directory holding the versions of the asset with the given content id
+        """
+        key = u'/'.join(unicode(value) for value in content_id.values())
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, content):
+        """
+        The path of the cache file for this version of the content
+        """
+        return os.path.join(
+            self.root,
+            self._entry_dir_name(content.get_id()),
+            content.last_modified_at.strftime('%Y%m%d%H%M%S%f'),
+        )
+
+    def get(self, content, fill=True):
+        """
+        Return the content backed by its cache file, filling the cache from the content's stream
+        on a miss. Returns the content itself if it can't be cached.
+
+        If `fill` is False, as when only a range of the content will be served, a miss returns
+        the content itself, whose stream is left for serving, and the cache is filled in the
+        background from a stream of its own.
+        """
+        if content.length is None or content.length > self.max_file_size:
+            return content
+
+        path = self._entry_path(content)
+        try:
+            # mark it as recently used
+            os.utime(path, None)
+            cached = DiskCachedContent(content, path)
+        except (IOError, OSError):
+            self.misses += 1
+            dog_stats_api.increment('contentserver.disk_cache.miss')
+        else:
+            self.hits += 1
+            dog_stats_api.increment('contentserver.disk_cache.hit')
+            return cached
+
+        if not fill:
+            self._fill_in_background(content.location, path)
+            return content
+        try:
+            self._store(content, path)
+            return DiskCachedContent(content, path)
+        except (IOError, OSError):
+            log.warning('Unable to cache %s on disk', content.location, exc_info=True)
+            # stream_data starts again from the beginning of the content
+            return content
+
+    def accel_redirect_url(self, content):
+        """
+        The url for the web server to serve the cached content from, or None if not configured
+        """
+        if self.accel_redirect_prefix is None or not isinstance(content, DiskCachedContent):
+            return None
+        return self.accel_redirect_prefix.rstrip('/') + '/' + os.path.relpath(content.path, self.root)
+
+    def _fill_in_background(self, location, path):
+        """
+        Store the asset at `location` in a thread of its own, unless this process is already
+        storing it at `path`
+        """
+        with self._lock:
+            if path in self._filling:
+                return
+            self._filling.add(path)
+
+        def fill():
+            """
+            Store a fresh stream of the content
+            """
+            try:
+                content = contentstore().find(location, as_stream=True)
+                if content.length is not None and content.length <= self.max_file_size:
+                    self._store(content, self._entry_path(content))
+            except Exception:  # pylint: disable=broad-except
+                log.warning('Unable to cache %s on disk', location, exc_info=True)
+            finally:
+                with self._lock:
+                    self._filling.discard(path)
+
+        thread = threading.Thread(target=fill)
+        thread.daemon = True
+        thread.start()
+
+    def _store(self, content, path):
+        """
+        Write the content's stream to path, then remove any older versions of the asset
+        """
+        entry_dir = os.path.dirname(path)
+        try:
+            os.makedirs(entry_dir)
+        except OSError:
+            # another process got there first
+            if not os.path.isdir(entry_dir):
+                raise
+
+        # write to a temp file and rename it into place so that readers never see a partial file
+        file_descriptor, temp_path = tempfile.mkstemp(prefix=TEMP_FILE_PREFIX, dir=entry_dir)
+        try:
+            with os.fdopen(file_descriptor, 'wb') as temp_file:
+                for chunk in content.stream_data():
+                    temp_file.write(chunk)
+            os.rename(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+        # versions are named by their upload timestamps; so, older versions sort first. Other
+        # processes' temporary files and any newer version are left alone.
+        version = os.path.basename(path)
+        for file_name in os.listdir(entry_dir):
+            if not file_name.startswith(TEMP_FILE_PREFIX) and file_name < version:
+                self._remove(os.path.join(entry_dir, file_name))
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += content.length
+            if self._size > self.max_size:
+                self._evict()
+
+    @staticmethod
+    def _remove(path):
+        """
+        Remove the file at path, returning whether it was there to remove
+        """
+        try:
+            os.remove(path)
+        except OSError:
+            # removed by another process
+            return False
+        return True
+
+    def _entries(self):
+        """
+        Return a list of (mtime, size, path) for every file in the cache, not counting files
+        which are still being written
+        """
+        entries = []
+        for dir_path, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                if file_name.startswith(TEMP_FILE_PREFIX):
+                    continue
+                path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # removed by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _disk_usage(self):
+        """
+        The number of bytes used by the cache's files
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """
+        Remove the least recently used files until the cache fits in max_size. Rescans the disk
+        since other processes share the cache.
+        """
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_size:
+                break
+            if not self._remove(path):
+                continue
+            self._size -= size
+            self.evictions += 1
+            dog_stats_api.increment('contentserver.disk_cache.eviction')
+
+    def delete(self, content_id):
+        """
+        Remove every cached version of the asset with the given content id
+        """
+        entry_dir = os.path.join(self.root, self._entry_dir_name(content_id))
+        try:
+            file_names = os.listdir(entry_dir)
+        except OSError:
+            # never cached
+            file_names = []
+        for file_name in file_names:
+            if not file_name.startswith(TEMP_FILE_PREFIX):
+                self._remove(os.path.join(entry_dir, file_name))
+        with self._lock:
+            # recomputed on the next store
+            self._size = None
+
+
+_DISK_CACHE = None
+_DISK_CACHE_LOCK = threading.Lock()
+
+
+def get_disk_cache():
+    """
+    Return the process-wide AssetDiskCache configured by settings.STATIC_CONTENT_DISK_CACHE, or
+    None if it isn't configured.
+    """
+    global _DISK_CACHE  # pylint: disable=global-statement
+    config = getattr(settings, 'STATIC_CONTENT_DISK_CACHE', None)
+    if not config:
+        return None
+    with _DISK_CACHE_LOCK:
+        if _DISK_CACHE is None or _DISK_CACHE.root != config['ROOT']:
+            _DISK_CACHE = AssetDiskCache(
+                config['ROOT'],
+                config['MAX_SIZE'],
+                max_file_size=config.get('MAX_FILE_SIZE'),
+                accel_redirect_prefix=config.get('ACCEL_REDIRECT_PREFIX'),
+            )
+        return _DISK_CACHE
+
+
+@receiver(asset_changed)
+def invalidate_disk_cache(sender, content_id, **kwargs):  # pylint: disable=unused-argument
+    """
+    Drop the cached copies of an asset which was saved or deleted
+    """
+    disk_cache = get_disk_cache()
+    if disk_cache is not None:
+        disk_cache.delete(content_id)
@@ -1,16 +1,20 @@
+from django.conf import settings
 from django.http import (HttpResponse, HttpResponseNotModified,
     HttpResponseForbidden)
 from student.models import CourseEnrollment
 
 from xmodule.contentstore.django import contentstore
-from xmodule.contentstore.content import StaticContent, XASSET_LOCATION_TAG
+from xmodule.contentstore.content import StaticContent, StaticContentStream, XASSET_LOCATION_TAG
 from xmodule.modulestore import InvalidLocationError, InvalidKeyError
 from cache_toolbox.core import get_cached_content, set_cached_content
 from xmodule.exceptions import NotFoundError
 
+from .disk_cache import get_disk_cache
+
 # TODO: Soon as we have a reasonable way to serialize/deserialize AssetKeys, we need
 # to change this file so instead of using course_id_partial, we're just using asset keys
 
+
 class StaticContentServer(object):
     def process_request(self, request):
         # look to see if the request is prefixed with 'c4x' tag
@@ -58,14 +62,120 @@ class StaticContentServer(object):
             # timestamp, so we can simply compare the strings
             last_modified_at_str = content.last_modified_at.strftime("%a, %d-%b-%Y %H:%M:%S GMT")
 
+            # content cached by older code may not have a digest
+            content_digest = getattr(content, 'content_digest', None)
+            etag = u'"{}"'.format(content_digest) if content_digest else None
+
             # see if the client has cached this content, if so then compare the
-            # timestamps, if they are the same then just return a 304 (Not Modified)
-            if 'HTTP_IF_MODIFIED_SINCE' in request.META:
+            # etags or timestamps, if they are the same then just return a 304 (Not Modified)
+            if etag is not None and 'HTTP_IF_NONE_MATCH' in request.META:
+                if etag_matches(request.META['HTTP_IF_NONE_MATCH'], etag):
+                    return self._add_cache_headers(HttpResponseNotModified(), content, last_modified_at_str, etag)
+            elif 'HTTP_IF_MODIFIED_SINCE' in request.META:
                 if_modified_since = request.META['HTTP_IF_MODIFIED_SINCE']
                 if if_modified_since == last_modified_at_str:
-                    return HttpResponseNotModified()
+                    return self._add_cache_headers(HttpResponseNotModified(), content, last_modified_at_str, etag)
+
+            disk_cache = get_disk_cache()
+            if disk_cache is not None and isinstance(content, StaticContentStream):
+                # too big for memcache; so, serve it from (and if need be, save it to) local disk.
+                # A range is served straight from the stream rather than waiting for all of
+                # the content to be saved.
+                content = disk_cache.get(content, fill='HTTP_RANGE' not in request.META)
+
+            accel_redirect_url = disk_cache.accel_redirect_url(content) if disk_cache is not None else None
+            if accel_redirect_url is not None:
+                # let the web server send the file, including handling any range
+                response = HttpResponse(content_type=content.content_type)
+                response['X-Accel-Redirect'] = accel_redirect_url
+                return self._add_cache_headers(response, content, last_modified_at_str, etag)
+
+            byte_range = None
+            if 'HTTP_RANGE' in request.META and content.length is not None:
+                # a range only applies to the version of the content named by If-Range, if given
+                if_range = request.META.get('HTTP_IF_RANGE')
+                if if_range is None or if_range in (etag, last_modified_at_str):
+                    try:
+                        byte_range = parse_range_header(request.META['HTTP_RANGE'], content.length)
+                    except ValueError:
+                        response = HttpResponse(status=416)
+                        response['Content-Range'] = 'bytes */{}'.format(content.length)
+                        return response
+
+            if byte_range is None:
+                response = HttpResponse(content.stream_data(), content_type=content.content_type)
+                if content.length is not None:
+                    response['Content-Length'] = str(content.length)
+            else:
+                first_byte, last_byte = byte_range
+                response = HttpResponse(
+                    content.stream_data_in_range(first_byte, last_byte), content_type=content.content_type
+                )
+                response.status_code = 206
+                response['Content-Range'] = 'bytes {}-{}/{}'.format(first_byte, last_byte, content.length)
+                response['Content-Length'] = str(last_byte - first_byte + 1)
+            response['Accept-Ranges'] = 'bytes'
+
+            return self._add_cache_headers(response, content, last_modified_at_str, etag)
+
+    @staticmethod
+    def _add_cache_headers(response, content, last_modified_at_str, etag):
+        """
+        Set the headers which let browsers and proxies cache the content
+        """
+        response['Last-Modified'] = last_modified_at_str
+        if etag is not None:
+            response['ETag'] = etag
+        if getattr(content, "locked", False):
+            # only the requesting user may see locked content; so, shared caches must not keep it
+            response['Cache-Control'] = 'private'
+        else:
+            response['Cache-Control'] = 'public, max-age={}'.format(settings.STATIC_CONTENT_CACHE_MAX_AGE)
+        return response
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Whether the value of an If-None-Match header matches the etag
+    """
+    if if_none_match.strip() == '*':
+        return True
+    # weak comparison, which is what If-None-Match calls for
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return etag in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+
+
+def parse_range_header(header_value, content_length):
+    """
+    Return the (first_byte, last_byte) inclusive byte range requested by the value of a Range
+    header, or None if the header should be ignored (it isn't a byte range or asks for more than
+    one range).
+
+    Raises ValueError if the range can't be satisfied for content of the given length.
+    """
+    unit, _, byte_ranges = header_value.partition('=')
+    if unit.strip() != 'bytes' or ',' in byte_ranges:
+        return None
 
-            response = HttpResponse(content.stream_data(), content_type=content.content_type)
-            response['Last-Modified'] = last_modified_at_str
+    first, _, last = byte_ranges.strip().partition('-')
+    try:
+        first = int(first) if first else None
+        last = int(last) if last else None
+    except ValueError:
+        # syntactically invalid; so, ignore it
+        return None
 
-            return response
+    if first is None:
+        # a suffix range: the final `last` bytes
+        if last is None:
+            return None
+        if last == 0:
+            raise ValueError(header_value)
+        return max(content_length - last, 0), content_length - 1
+    if last is not None and last < first:
+        return None
+    if first >= content_length:
+        raise ValueError(header_value)
+    if last is None or last >= content_length:
+        last = content_length - 1
+    return first, last
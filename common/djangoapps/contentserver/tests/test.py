@@ -2,26 +2,37 @@
 Tests for StaticContentServer
 """
 import copy
+import hashlib
 import logging
+import os
+import shutil
+from datetime import datetime
+from StringIO import StringIO
+from tempfile import mkdtemp
 from uuid import uuid4
+from mock import patch
 from path import path
 from pymongo import MongoClient
+from pytz import UTC
 
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.test import TestCase
 from django.test.client import Client
 from django.test.utils import override_settings
 
 from student.models import CourseEnrollment
 
-from xmodule.contentstore.django import contentstore, _CONTENTSTORE
-from xmodule.contentstore.content import StaticContent
+from xmodule.contentstore.django import contentstore, _CONTENTSTORE, asset_changed
+from xmodule.contentstore.content import StaticContent, StaticContentStream
 from xmodule.modulestore.django import modulestore
 from xmodule.modulestore.locations import SlashSeparatedCourseKey
 from xmodule.modulestore.tests.django_utils import (studio_store_config,
     ModuleStoreTestCase)
 from xmodule.modulestore.xml_importer import import_from_xml
 
+from contentserver.disk_cache import AssetDiskCache, DiskCachedContent, TEMP_FILE_PREFIX, get_disk_cache
+
 log = logging.getLogger(__name__)
 
 TEST_DATA_CONTENTSTORE = copy.deepcopy(settings.CONTENTSTORE)
@@ -59,6 +70,8 @@ class ContentStoreToyCourseTest(ModuleStoreTestCase):
         # An unlocked asset
         self.unlocked_asset = self.course_key.make_asset_key('asset', 'another_static.txt')
         self.url_unlocked = self.unlocked_asset.to_deprecated_string()
+        self.contents_unlocked = self.contentstore.find(self.unlocked_asset).data
+        self.length_unlocked = len(self.contents_unlocked)
 
         self.contentstore.set_attr(self.locked_asset, 'locked', True)
 
@@ -131,3 +144,177 @@ class ContentStoreToyCourseTest(ModuleStoreTestCase):
         resp = self.client.get(self.url_locked)
         self.assertEqual(resp.status_code, 200) # pylint: disable=E1103
 
+
+    def test_range_request_full_file(self):
+        """
+        Test that a range request for the whole file returns partial content
+        """
+        first_byte = 0
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes={first}-'.format(first=first_byte))
+        self.assertEqual(resp.status_code, 206)  # pylint: disable=E1103
+        self.assertEqual(
+            resp['Content-Range'],
+            'bytes {first}-{last}/{length}'.format(
+                first=first_byte, last=self.length_unlocked - 1, length=self.length_unlocked
+            )
+        )
+        self.assertEqual(resp['Content-Length'], str(self.length_unlocked))
+
+    def test_range_request_partial_file(self):
+        """
+        Test that a range request for part of the file returns just those bytes
+        """
+        first_byte, last_byte = self.length_unlocked / 4, self.length_unlocked / 2
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes={}-{}'.format(first_byte, last_byte))
+        self.assertEqual(resp.status_code, 206)  # pylint: disable=E1103
+        self.assertEqual(
+            resp['Content-Range'], 'bytes {}-{}/{}'.format(first_byte, last_byte, self.length_unlocked)
+        )
+        self.assertEqual(resp.content, self.contents_unlocked[first_byte:last_byte + 1])
+
+    def test_range_request_suffix(self):
+        """
+        Test that a suffix range returns the end of the file
+        """
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=-5')
+        self.assertEqual(resp.status_code, 206)  # pylint: disable=E1103
+        self.assertEqual(resp.content, self.contents_unlocked[-5:])
+
+    def test_range_request_unsatisfiable(self):
+        """
+        Test that a range starting past the end of the file is refused
+        """
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes={}-'.format(self.length_unlocked))
+        self.assertEqual(resp.status_code, 416)  # pylint: disable=E1103
+        self.assertEqual(resp['Content-Range'], 'bytes */{}'.format(self.length_unlocked))
+
+    def test_range_request_malformed(self):
+        """
+        Test that a range which can't be parsed is ignored
+        """
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=abc-')
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+        self.assertEqual(resp.content, self.contents_unlocked)
+
+    def test_etag(self):
+        """
+        Test that assets have a strong etag which clients can revalidate with
+        """
+        resp = self.client.get(self.url_unlocked)
+        etag = resp['ETag']
+        self.assertEqual(etag, '"{}"'.format(hashlib.md5(self.contents_unlocked).hexdigest()))
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)  # pylint: disable=E1103
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH='"not-the-etag"')
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+
+    def test_cache_control(self):
+        """
+        Test that only unlocked assets may be kept by shared caches
+        """
+        resp = self.client.get(self.url_unlocked)
+        self.assertEqual(
+            resp['Cache-Control'], 'public, max-age={}'.format(settings.STATIC_CONTENT_CACHE_MAX_AGE)
+        )
+        self.client.login(username=self.staff_usr, password=self.staff_pwd)
+        resp = self.client.get(self.url_locked)
+        self.assertEqual(resp['Cache-Control'], 'private')
+
+
+class AssetDiskCacheTest(TestCase):
+    """
+    Tests for the on-disk asset cache
+    """
+    def setUp(self):
+        self.root = mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.course_key = SlashSeparatedCourseKey('edX', 'toy', '2012_Fall')
+
+    def _content(self, name, data, last_modified_at=None):
+        """
+        Return a streamed StaticContent for the given data
+        """
+        return StaticContentStream(
+            self.course_key.make_asset_key('asset', name), name, 'application/octet-stream', StringIO(data),
+            last_modified_at=last_modified_at or datetime(2014, 5, 1, tzinfo=UTC), length=len(data),
+        )
+
+    def test_miss_then_hit(self):
+        disk_cache = AssetDiskCache(self.root, 1024)
+        cached = disk_cache.get(self._content('a.pdf', 'a' * 100))
+        self.assertIsInstance(cached, DiskCachedContent)
+        self.assertEqual(''.join(cached.stream_data()), 'a' * 100)
+
+        cached = disk_cache.get(self._content('a.pdf', 'x' * 100))
+        self.assertEqual(''.join(cached.stream_data()), 'a' * 100)
+        self.assertEqual(''.join(cached.stream_data_in_range(10, 19)), 'a' * 10)
+        self.assertEqual(disk_cache.stats()['hits'], 1)
+        self.assertEqual(disk_cache.stats()['misses'], 1)
+
+    def test_new_upload_is_not_served_stale(self):
+        disk_cache = AssetDiskCache(self.root, 1024)
+        disk_cache.get(self._content('a.pdf', 'old'))
+        cached = disk_cache.get(self._content('a.pdf', 'new', last_modified_at=datetime(2014, 6, 1, tzinfo=UTC)))
+        self.assertEqual(''.join(cached.stream_data()), 'new')
+
+    def test_too_large_to_cache(self):
+        disk_cache = AssetDiskCache(self.root, 1024, max_file_size=10)
+        content = self._content('a.pdf', 'a' * 100)
+        self.assertIs(disk_cache.get(content), content)
+
+    def test_evicts_least_recently_used(self):
+        disk_cache = AssetDiskCache(self.root, 250)
+        first = disk_cache.get(self._content('a.pdf', 'a' * 100))
+        second = disk_cache.get(self._content('b.pdf', 'b' * 100))
+        # make the first the least recently used
+        os.utime(first.path, (0, 0))
+        disk_cache.get(self._content('c.pdf', 'c' * 100))
+        self.assertFalse(os.path.exists(first.path))
+        self.assertTrue(os.path.exists(second.path))
+        self.assertEqual(disk_cache.stats()['evictions'], 1)
+
+    def test_invalidated_by_contentstore_changes(self):
+        content = self._content('a.pdf', 'a' * 100)
+        with override_settings(STATIC_CONTENT_DISK_CACHE={'ROOT': self.root, 'MAX_SIZE': 1024}):
+            cached = get_disk_cache().get(content)
+            self.assertTrue(os.path.exists(cached.path))
+            asset_changed.send(sender=None, content_id=content.get_id())
+            self.assertFalse(os.path.exists(cached.path))
+
+    def test_failed_store_serves_whole_content(self):
+        disk_cache = AssetDiskCache(self.root, 1024)
+        content = self._content('a.pdf', 'a' * 100)
+        with patch('contentserver.disk_cache.os.rename', side_effect=OSError):
+            self.assertIs(disk_cache.get(content), content)
+        self.assertEqual(''.join(content.stream_data()), 'a' * 100)
+
+    def test_store_removes_only_older_versions(self):
+        disk_cache = AssetDiskCache(self.root, 1024)
+        old = disk_cache.get(self._content('a.pdf', 'old'))
+        # another process's file which is still being written
+        temp_path = os.path.join(os.path.dirname(old.path), TEMP_FILE_PREFIX + 'other')
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write('partial')
+
+        new = disk_cache.get(self._content('a.pdf', 'new', last_modified_at=datetime(2014, 6, 1, tzinfo=UTC)))
+        self.assertFalse(os.path.exists(old.path))
+        self.assertTrue(os.path.exists(new.path))
+        self.assertTrue(os.path.exists(temp_path))
+        # content already being served is still readable
+        self.assertEqual(''.join(old.stream_data()), 'old')
+
+    def test_range_miss_fills_in_background(self):
+        disk_cache = AssetDiskCache(self.root, 1024)
+        content = self._content('a.pdf', 'a' * 100)
+        with patch('contentserver.disk_cache.contentstore') as mock_contentstore:
+            mock_contentstore.return_value.find.return_value = self._content('a.pdf', 'a' * 100)
+            with patch('contentserver.disk_cache.threading.Thread') as mock_thread:
+                self.assertIs(disk_cache.get(content, fill=False), content)
+                self.assertEqual(''.join(content.stream_data_in_range(10, 19)), 'a' * 10)
+                # run the fill as its thread would
+                mock_thread.call_args[1]['target']()
+
+        mock_contentstore.return_value.find.assert_called_once_with(content.location, as_stream=True)
+        cached = disk_cache.get(self._content('a.pdf', 'x' * 100))
+        self.assertIsInstance(cached, DiskCachedContent)
+        self.assertEqual(''.join(cached.stream_data()), 'a' * 100)
@@ -0,0 +1,153 @@
+"""
+The embargo rules, compiled into a form which answers each request without
+touching the database or the disk.
+
+An ``EmbargoDecision`` holds the set of embargoed course ids, the embargoed
+countries, and the whitelisted and blacklisted networks as sorted intervals.
+It is built from the ``EmbargoedCourse``, ``EmbargoedState`` and ``IPFilter``
+rows, and rebuilt by each process only when one of those rows is saved or
+deleted (see ``embargo.models.config_version``). Each decision remembers its
+verdicts for the most recently seen IP addresses.
+"""
+import bisect
+import threading
+from collections import OrderedDict
+
+import ipaddr
+import pygeoip
+from django.conf import settings
+
+from embargo.models import EmbargoedCourse, EmbargoedState, IPFilter, config_version
+
+# The number of IP address verdicts each decision remembers
+VERDICT_CACHE_SIZE = 10000
+
+_geoip = {}  # pylint: disable=invalid-name
+_decision = None  # pylint: disable=invalid-name
+
+
+def geoip():
+    """
+    Return this process's GeoIP database, memory mapped from settings.GEOIP_PATH
+    """
+    path = str(settings.GEOIP_PATH)
+    if path not in _geoip:
+        _geoip[path] = pygeoip.GeoIP(path, pygeoip.MMAP_CACHE)
+    return _geoip[path]
+
+
+def current_decision():
+    """
+    Return the EmbargoDecision for the current embargo configuration,
+    compiling it first if the configuration changed since the last call.
+    """
+    global _decision  # pylint: disable=global-statement
+    version = config_version()
+    decision = _decision
+    if decision is None or decision.version != version:
+        decision = _decision = EmbargoDecision(version)
+    return decision
+
+
+class IPIntervals(object):
+    """
+    A set of IP networks, stored as sorted, merged ranges of addresses, so
+    that an address is found with one binary search however many networks
+    there are.
+    """
+    def __init__(self, networks):
+        ranges = {4: [], 6: []}
+        for network in networks:
+            ranges[network.version].append((int(network.network), int(network.broadcast)))
+
+        self._starts = {}
+        self._ends = {}
+        for version, version_ranges in ranges.items():
+            merged = []
+            for first, last in sorted(version_ranges):
+                if merged and first <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], last)
+                else:
+                    merged.append([first, last])
+            self._starts[version] = [first for first, _last in merged]
+            self._ends[version] = [last for _first, last in merged]
+
+    def __contains__(self, ip):
+        try:
+            ip = ipaddr.IPAddress(ip)
+        except ValueError:
+            return False
+
+        address = int(ip)
+        index = bisect.bisect_right(self._starts[ip.version], address) - 1
+        return index >= 0 and address <= self._ends[ip.version][index]
+
+
+class EmbargoDecision(object):
+    """
+    The embargo configuration as of `version`, compiled for quick lookups
+    """
+    def __init__(self, version):
+        self.version = version
+        self.embargoed_courses = frozenset(
+            record.course_id for record in EmbargoedCourse.objects.filter(embargoed=True)
+        )
+        # Read the configuration from the database rather than from the
+        # ConfigurationModel cache, which is only cleared after the new row is saved
+        self.embargoed_countries = frozenset(_latest(EmbargoedState).embargoed_countries_list)
+        ip_filter = _latest(IPFilter)
+        self.whitelist = IPIntervals(ip_filter.whitelist_ips)
+        self.blacklist = IPIntervals(ip_filter.blacklist_ips)
+
+        self._verdicts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_course_embargoed(self, course_id):
+        """
+        Returns whether or not the given course id is embargoed.
+        """
+        return course_id in self.embargoed_courses
+
+    def restriction(self, ip_addr):
+        """
+        Return why `ip_addr` must be kept from embargoed content, as the end
+        of a sentence (e.g. "IP is blacklisted"), or None if it needn't be.
+        """
+        with self._lock:
+            if ip_addr in self._verdicts:
+                verdict = self._verdicts.pop(ip_addr)
+                self._verdicts[ip_addr] = verdict
+                return verdict
+
+        verdict = self._compute_restriction(ip_addr)
+
+        with self._lock:
+            self._verdicts[ip_addr] = verdict
+            if len(self._verdicts) > VERDICT_CACHE_SIZE:
+                self._verdicts.popitem(last=False)
+        return verdict
+
+    def _compute_restriction(self, ip_addr):
+        """
+        Work out the verdict for `ip_addr` from the rules
+        """
+        # if blacklisted, immediately fail
+        if ip_addr in self.blacklist:
+            return "IP is blacklisted"
+
+        country_code_from_ip = geoip().country_code_by_addr(ip_addr)
+        # Fail if country is embargoed and the ip address isn't explicitly whitelisted
+        if country_code_from_ip in self.embargoed_countries and ip_addr not in self.whitelist:
+            return "IP is from country {}".format(country_code_from_ip)
+
+        return None
+
+
+def _latest(config_model):
+    """
+    Return the newest entry of `config_model`, or a new empty one if there are none.
+    """
+    try:
+        return config_model.objects.order_by('-change_date')[0]
+    except IndexError:
+        return config_model()
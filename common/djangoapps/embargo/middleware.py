@@ -31,7 +31,6 @@ EMBARGO_SITE_REDIRECT_URL = 'https://www.edx.org/'
 
 """
 import logging
-import pygeoip
 
 from django.core.exceptions import MiddlewareNotUsed
 from django.conf import settings
@@ -40,7 +39,7 @@ from django.http import HttpResponseRedirect, HttpResponseForbidden
 from ipware.ip import get_ip
 from util.request import course_id_from_url
 
-from embargo.models import EmbargoedCourse, EmbargoedState, IPFilter
+from embargo.decision import current_decision
 
 log = logging.getLogger(__name__)
 
@@ -51,6 +50,8 @@ class EmbargoMiddleware(object):
 
     This is configured by creating ``EmbargoedCourse``, ``EmbargoedState``, and
     optionally ``IPFilter`` rows in the database, using the django admin site.
+    Each process compiles those rows into an ``EmbargoDecision``, which it
+    rebuilds only when they change.
     """
     def __init__(self):
         self.site_enabled = settings.FEATURES.get('SITE_EMBARGOED', False)
@@ -65,41 +66,25 @@ class EmbargoMiddleware(object):
         """
         url = request.path
         course_id = course_id_from_url(url)
-        course_is_embargoed = EmbargoedCourse.is_embargoed(course_id)
+        decision = current_decision()
+        course_is_embargoed = decision.is_course_embargoed(course_id)
 
         # If they're trying to access a course that cares about embargoes
         if self.site_enabled or course_is_embargoed:
-            response = redirect('embargo')
+            ip_addr = get_ip(request)
+            restriction = decision.restriction(ip_addr)
+            if restriction is None:
+                return
+
+            if course_is_embargoed:
+                msg = "Embargo: Restricting IP address %s to course %s because %s." % (ip_addr, course_id, restriction)
+            else:
+                msg = "Embargo: Restricting IP address %s because %s." % (ip_addr, restriction)
+            log.info(msg)
+
             # Set the proper response if site is enabled
             if self.site_enabled:
                 redirect_url = getattr(settings, 'EMBARGO_SITE_REDIRECT_URL', None)
-                response = HttpResponseRedirect(redirect_url) if redirect_url \
-                           else HttpResponseForbidden('Access Denied')
-
-            # If we're having performance issues, add caching here
-            ip_addr = get_ip(request)
-
-            # if blacklisted, immediately fail
-            if ip_addr in IPFilter.current().blacklist_ips:
-                if course_is_embargoed:
-                    msg = "Embargo: Restricting IP address %s to course %s because IP is blacklisted." % \
-                          (ip_addr, course_id)
-                else:
-                    msg = "Embargo: Restricting IP address %s because IP is blacklisted." % ip_addr
-
-                log.info(msg)
-                return response
-
-            country_code_from_ip = pygeoip.GeoIP(settings.GEOIP_PATH).country_code_by_addr(ip_addr)
-            is_embargoed = country_code_from_ip in EmbargoedState.current().embargoed_countries_list
-            # Fail if country is embargoed and the ip address isn't explicitly whitelisted
-            if is_embargoed and ip_addr not in IPFilter.current().whitelist_ips:
-                if course_is_embargoed:
-                    msg = "Embargo: Restricting IP address %s to course %s because IP is from country %s." % \
-                          (ip_addr, course_id, country_code_from_ip)
-                else:
-                    msg = "Embargo: Restricting IP address %s because IP is from country %s." % \
-                          (ip_addr, country_code_from_ip)
-
-                log.info(msg)
-                return response
+                return HttpResponseRedirect(redirect_url) if redirect_url \
+                    else HttpResponseForbidden('Access Denied')
+            return redirect('embargo')
@@ -12,10 +12,13 @@ file and check it in at the same time as your model changes. To do that,
 """
 
 import ipaddr
+from uuid import uuid4
 
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
-from config_models.models import ConfigurationModel
+from config_models.models import ConfigurationModel, cache
 from xmodule_django.models import CourseKeyField, NoneToEmptyManager
 
 
@@ -127,3 +130,37 @@ class IPFilter(ConfigurationModel):
         if self.blacklist == '':
             return []
         return self.IPFilterList([addr.strip() for addr in self.blacklist.split(',')])  # pylint: disable=no-member
+
+
+CONFIG_VERSION_KEY = 'embargo/config_version'
+# The version is invalidated when a row is saved, before the transaction commits,
+# so a process may read the old rows and set a new version before they change.
+# As for the cached ConfigurationModels, a short timeout bounds how long that lasts.
+CONFIG_VERSION_TIMEOUT = ConfigurationModel.cache_timeout
+
+
+def config_version():
+    """
+    Return a token which changes whenever an EmbargoedCourse, EmbargoedState
+    or IPFilter row is saved or deleted.
+    """
+    version = cache.get(CONFIG_VERSION_KEY)
+    if version is None:
+        version = uuid4().hex
+        # another process may have just set a new version; if so, agree with it
+        if not cache.add(CONFIG_VERSION_KEY, version, CONFIG_VERSION_TIMEOUT):
+            version = cache.get(CONFIG_VERSION_KEY) or version
+    return version
+
+
+@receiver(post_save, sender=EmbargoedCourse)
+@receiver(post_save, sender=EmbargoedState)
+@receiver(post_save, sender=IPFilter)
+@receiver(post_delete, sender=EmbargoedCourse)
+@receiver(post_delete, sender=EmbargoedState)
+@receiver(post_delete, sender=IPFilter)
+def invalidate_config_version(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Make every process recompile its embargo decision
+    """
+    cache.delete(CONFIG_VERSION_KEY)
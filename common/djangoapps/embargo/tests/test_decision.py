@@ -0,0 +1,134 @@
+"""Tests of the compiled embargo decision"""
+import ipaddr
+import mock
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from xmodule.modulestore.locations import SlashSeparatedCourseKey
+
+# Explicitly import the cache from ConfigurationModel so we can reset it after each test
+from config_models.models import cache
+from embargo import decision as embargo_decision
+from embargo.decision import IPIntervals, current_decision
+from embargo.models import EmbargoedCourse, EmbargoedState, IPFilter
+
+
+class IPIntervalsTest(TestCase):
+    """Test looking up addresses in IPIntervals"""
+    def intervals(self, *networks):
+        """Return IPIntervals of the given networks"""
+        return IPIntervals([ipaddr.IPNetwork(network) for network in networks])
+
+    def test_contains(self):
+        intervals = self.intervals('1.0.0.1/24', '5.0.0.0/16', '1.1.0.0/24', '8.8.8.8')
+        for ip_addr in ('1.0.0.0', '1.0.0.255', '5.0.255.255', '1.1.0.1', '8.8.8.8'):
+            self.assertIn(ip_addr, intervals)
+        for ip_addr in ('0.255.255.255', '1.0.1.0', '1.1.1.0', '8.8.8.7', '8.8.8.9', '9.0.0.0'):
+            self.assertNotIn(ip_addr, intervals)
+
+    def test_overlapping_networks(self):
+        intervals = self.intervals('10.0.0.0/8', '10.1.0.0/16', '11.0.0.0/24')
+        self.assertIn('10.1.2.3', intervals)
+        self.assertIn('10.255.255.255', intervals)
+        self.assertIn('11.0.0.255', intervals)
+        self.assertNotIn('11.0.1.0', intervals)
+
+    def test_ip_versions_kept_apart(self):
+        intervals = self.intervals('::/96')
+        self.assertIn('::1', intervals)
+        self.assertNotIn('0.0.0.1', intervals)
+
+    def test_empty_and_invalid(self):
+        self.assertNotIn('1.0.0.0', self.intervals())
+        self.assertNotIn('not an ip', self.intervals('1.0.0.0/8'))
+
+
+class EmbargoDecisionTest(TestCase):
+    """Test compiling and recompiling the embargo rules"""
+    def setUp(self):
+        self.course_id = SlashSeparatedCourseKey('abc', '123', 'doremi')
+        EmbargoedCourse(course_id=self.course_id, embargoed=True).save()
+        EmbargoedCourse(course_id=SlashSeparatedCourseKey('abc', '123', 'fasola'), embargoed=False).save()
+        EmbargoedState(embargoed_countries="cu, ir", enabled=True).save()
+        IPFilter(whitelist='1.0.0.0/24', blacklist='5.0.0.0/16', enabled=True).save()
+
+        patcher = mock.patch('embargo.decision.geoip')
+        self.geoip = patcher.start()
+        self.addCleanup(patcher.stop)
+        # addresses in 1.0.0.0/8 are in Cuba, the rest in the US
+        self.geoip.return_value.country_code_by_addr.side_effect = lambda ip_addr: (
+            'CU' if ip_addr.startswith('1.') else 'US'
+        )
+
+    def tearDown(self):
+        # Explicitly clear ConfigurationModel's cache so tests have a clear cache
+        # and don't interfere with each other
+        cache.clear()
+
+    def test_compiled_rules(self):
+        decision = current_decision()
+        self.assertTrue(decision.is_course_embargoed(self.course_id))
+        self.assertFalse(decision.is_course_embargoed(SlashSeparatedCourseKey('abc', '123', 'fasola')))
+        self.assertFalse(decision.is_course_embargoed(None))
+        self.assertEqual(decision.embargoed_countries, frozenset(['CU', 'IR']))
+
+        self.assertEqual(decision.restriction('5.0.1.2'), "IP is blacklisted")
+        self.assertEqual(decision.restriction('1.0.1.0'), "IP is from country CU")
+        self.assertIsNone(decision.restriction('1.0.0.5'))
+        self.assertIsNone(decision.restriction('2.0.0.0'))
+
+    def test_compiled_once(self):
+        decision = current_decision()
+        with self.assertNumQueries(0):
+            self.assertIs(current_decision(), decision)
+            self.assertTrue(current_decision().is_course_embargoed(self.course_id))
+
+    def test_recompiled_on_change(self):
+        decision = current_decision()
+        EmbargoedCourse.objects.get(course_id=self.course_id).delete()
+        self.assertIsNot(current_decision(), decision)
+        self.assertFalse(current_decision().is_course_embargoed(self.course_id))
+
+        decision = current_decision()
+        IPFilter(whitelist='', blacklist='2.0.0.0', enabled=True).save()
+        self.assertIsNot(current_decision(), decision)
+        self.assertEqual(current_decision().restriction('2.0.0.0'), "IP is blacklisted")
+        self.assertEqual(current_decision().restriction('1.0.0.5'), "IP is from country CU")
+
+        decision = current_decision()
+        EmbargoedState(embargoed_countries="ir", enabled=True).save()
+        self.assertIsNot(current_decision(), decision)
+        self.assertIsNone(current_decision().restriction('1.0.0.5'))
+
+    def test_verdicts_remembered(self):
+        decision = current_decision()
+        decision.restriction('1.0.1.0')
+        decision.restriction('1.0.1.0')
+        self.assertEqual(self.geoip.return_value.country_code_by_addr.call_count, 1)
+
+    @mock.patch.object(embargo_decision, 'VERDICT_CACHE_SIZE', 2)
+    def test_least_recently_used_verdict_forgotten(self):
+        decision = current_decision()
+        decision.restriction('2.0.0.1')
+        decision.restriction('2.0.0.2')
+        decision.restriction('2.0.0.1')
+        decision.restriction('2.0.0.3')
+        lookup = self.geoip.return_value.country_code_by_addr
+        lookup.reset_mock()
+
+        decision.restriction('2.0.0.1')
+        decision.restriction('2.0.0.3')
+        self.assertEqual(lookup.call_count, 0)
+        decision.restriction('2.0.0.2')
+        self.assertEqual(lookup.call_count, 1)
+
+
+class GeoIPTest(TestCase):
+    """Test that the GeoIP database is opened once per process"""
+    @override_settings(GEOIP_PATH='/some/GeoIP.dat')
+    @mock.patch('embargo.decision.pygeoip.GeoIP')
+    def test_opened_once(self, mock_geoip):
+        self.addCleanup(embargo_decision._geoip.pop, '/some/GeoIP.dat', None)  # pylint: disable=protected-access
+        self.assertIs(embargo_decision.geoip(), embargo_decision.geoip())
+        mock_geoip.assert_called_once_with('/some/GeoIP.dat', embargo_decision.pygeoip.MMAP_CACHE)
@@ -1,5 +1,7 @@
 import logging
 import re
+import threading
+from collections import OrderedDict
 
 from staticfiles.storage import staticfiles_storage
 from staticfiles import finders
@@ -11,6 +13,9 @@ from xmodule.contentstore.content import StaticContent
 
 log = logging.getLogger(__name__)
 
+# How many replacements for /static/ urls to remember; see StaticUrlCache
+STATIC_URL_CACHE_SIZE = 10000
+
 
 def _url_replace_regex(prefix):
     """
@@ -92,6 +97,64 @@ def replace_course_urls(text, course_key):
     return re.sub(_url_replace_regex('/course/'), replace_course_url, text)
 
 
+def _static_url(prefix, rest, data_directory, course_id, static_asset_path):
+    """
+    Return the url to replace the /static/ url `prefix` + `rest` with, or None
+    to leave it as it is. See replace_static_urls.
+    """
+    # Don't mess with things that end in '?raw'
+    if rest.endswith('?raw'):
+        return None
+
+    # In debug mode, if we can find the url as is,
+    if settings.DEBUG and finders.find(rest, True):
+        return None
+    # if we're running with a MongoBacked store course_namespace is not None, then use studio style urls
+    elif (not static_asset_path) and course_id and modulestore().get_modulestore_type(course_id) != XML_MODULESTORE_TYPE:
+        # first look in the static file pipeline and see if we are trying to reference
+        # a piece of static content which is in the edx-platform repo (e.g. JS associated with an xmodule)
+
+        exists_in_staticfiles_storage = False
+        try:
+            exists_in_staticfiles_storage = staticfiles_storage.exists(rest)
+        except Exception as err:
+            log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
+                rest, str(err)))
+
+        if exists_in_staticfiles_storage:
+            url = staticfiles_storage.url(rest)
+        else:
+            # if not, then assume it's courseware specific content and then look in the
+            # Mongo-backed database
+            url = StaticContent.convert_legacy_static_url_with_course_id(rest, course_id)
+    # Otherwise, look the file up in staticfiles_storage, and append the data directory if needed
+    else:
+        course_path = "/".join((static_asset_path or data_directory, rest))
+
+        try:
+            if staticfiles_storage.exists(rest):
+                url = staticfiles_storage.url(rest)
+            else:
+                url = staticfiles_storage.url(course_path)
+        # And if that fails, assume that it's course content, and add manually data directory
+        except Exception as err:
+            log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
+                rest, str(err)))
+            url = "".join([prefix, course_path])
+
+    return url
+
+
+def _static_url_prefix(data_directory, static_asset_path):
+    """
+    The regex matching the start of a /static/ url which replace_static_urls replaces
+    """
+    return u'(?:{static_url}|/static/)(?!{data_dir})'.format(
+        static_url=settings.STATIC_URL,
+        data_dir=static_asset_path or data_directory
+    )
+
+
 def replace_static_urls(text, data_directory, course_id=None, static_asset_path=''):
     """
     Replace /static/$stuff urls either with their correct url as generated by collectstatic,
@@ -106,58 +169,149 @@ def replace_static_urls(text, data_directory, course_id=None, static_asset_path=
     """
 
     def replace_static_url(match):
-        original = match.group(0)
-        prefix = match.group('prefix')
+        url = _static_url(match.group('prefix'), match.group('rest'), data_directory, course_id, static_asset_path)
+        if url is None:
+            return match.group(0)
         quote = match.group('quote')
-        rest = match.group('rest')
+        return "".join([quote, url, quote])
+
+    return re.sub(
+        _url_replace_regex(_static_url_prefix(data_directory, static_asset_path)),
+        replace_static_url,
+        text
+    )
 
-        # Don't mess with things that end in '?raw'
-        if rest.endswith('?raw'):
-            return original
 
-        # In debug mode, if we can find the url as is,
-        if settings.DEBUG and finders.find(rest, True):
-            return original
-        # if we're running with a MongoBacked store course_namespace is not None, then use studio style urls
-        elif (not static_asset_path) and course_id and modulestore().get_modulestore_type(course_id) != XML_MODULESTORE_TYPE:
-            # first look in the static file pipeline and see if we are trying to reference
-            # a piece of static content which is in the edx-platform repo (e.g. JS associated with an xmodule)
+class StaticUrlCache(object):
+    """
+    A least recently used cache of what /static/ urls are replaced with, by course.
 
-            exists_in_staticfiles_storage = False
+    Finding a replacement can mean asking the modulestore for the type of the
+    course and staticfiles storage whether the file exists, and a course's
+    pages use the same few static files over and over.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._urls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Return the url cached for `key`, or `default`
+        """
+        with self._lock:
             try:
-                exists_in_staticfiles_storage = staticfiles_storage.exists(rest)
-            except Exception as err:
-                log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
-                    rest, str(err)))
+                url = self._urls.pop(key)
+            except KeyError:
+                return default
+            self._urls[key] = url
+            return url
+
+    def set(self, key, url):
+        """
+        Cache `url` for `key`, dropping the least recently used url if the cache is full
+        """
+        with self._lock:
+            self._urls.pop(key, None)
+            self._urls[key] = url
+            if len(self._urls) > self.size:
+                self._urls.popitem(last=False)
+
+    def clear(self):
+        """
+        Empty the cache
+        """
+        with self._lock:
+            self._urls.clear()
+
+
+static_urls = StaticUrlCache(STATIC_URL_CACHE_SIZE)  # pylint: disable=invalid-name
+
+
+class UrlRewriter(object):
+    """
+    Does the replacements of replace_static_urls, replace_course_urls and
+    replace_jump_to_id_urls for one course in a single pass over the text.
 
-            if exists_in_staticfiles_storage:
-                url = staticfiles_storage.url(rest)
-            else:
-                # if not, then assume it's courseware specific content and then look in the
-                # Mongo-backed database
-                url = StaticContent.convert_legacy_static_url_with_course_id(rest, course_id)
-        # Otherwise, look the file up in staticfiles_storage, and append the data directory if needed
+    Replacements for /static/ urls are remembered in `static_urls`. Like the
+    separate replacements, urls in HTML escaped text are left alone, so text
+    must be rewritten before it's escaped, and is never rewritten twice.
+    """
+    _regexes = {}
+    _regexes_lock = threading.Lock()
+
+    def __init__(self, course_id, data_directory, static_asset_path='', jump_to_id_base_url=None):
+        """
+        course_id: The course whose urls are being rewritten
+        data_directory, static_asset_path: See replace_static_urls
+        jump_to_id_base_url: See replace_jump_to_id_urls. If None, /jump_to_id/ urls are left alone
+        """
+        self.course_id = course_id
+        self.data_directory = data_directory
+        self.static_asset_path = static_asset_path
+        self.jump_to_id_base_url = jump_to_id_base_url
+        # looked up when it's first needed, as part of the key of the course's static urls
+        self._modulestore_type = None
+        self.courses_prefix = '/courses/' + course_id.to_deprecated_string() + '/'
+        self.regex = self._regex(_static_url_prefix(data_directory, static_asset_path))
+
+    @classmethod
+    def _regex(cls, static_prefix):
+        """
+        Return the compiled regex matching quoted /static/, /course/ and /jump_to_id/ urls
+        """
+        with cls._regexes_lock:
+            if static_prefix not in cls._regexes:
+                cls._regexes[static_prefix] = re.compile(ur"""
+                    (?x)                                  # flags=re.VERBOSE
+                    (?P<quote>\\?['"])                    # the opening quotes
+                    (?:
+                        (?P<static>{static_prefix})       # the prefix of a /static/ url
+                        | (?P<course>/course/)            # or of a /course/ url
+                        | (?P<jump_to_id>/jump_to_id/)    # or of a /jump_to_id/ url
+                    )
+                    (?P<rest>.*?)                         # everything else in the url
+                    (?P=quote)                            # the first matching closing quote
+                    """.format(static_prefix=static_prefix))
+            return cls._regexes[static_prefix]
+
+    def rewrite(self, text):
+        """
+        Return `text` with its /static/, /course/ and /jump_to_id/ urls replaced
+        """
+        return self.regex.sub(self._replace_url, text)
+
+    def _replace_url(self, match):
+        """
+        Return the replacement for one quoted url
+        """
+        quote = match.group('quote')
+        rest = match.group('rest')
+        if match.group('static'):
+            url = self._static_url(match.group('static'), rest)
+        elif match.group('course'):
+            url = self.courses_prefix + rest
+        elif self.jump_to_id_base_url is not None:
+            url = self.jump_to_id_base_url + rest
         else:
-            course_path = "/".join((static_asset_path or data_directory, rest))
-
-            try:
-                if staticfiles_storage.exists(rest):
-                    url = staticfiles_storage.url(rest)
-                else:
-                    url = staticfiles_storage.url(course_path)
-            # And if that fails, assume that it's course content, and add manually data directory
-            except Exception as err:
-                log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
-                    rest, str(err)))
-                url = "".join([prefix, course_path])
+            url = None
 
+        if url is None:
+            return match.group(0)
         return "".join([quote, url, quote])
 
-    return re.sub(
-        _url_replace_regex(u'(?:{static_url}|/static/)(?!{data_dir})'.format(
-            static_url=settings.STATIC_URL,
-            data_dir=static_asset_path or data_directory
-        )),
-        replace_static_url,
-        text
-    )
+    def _static_url(self, prefix, rest):
+        """
+        Return the replacement for a /static/ url, using `static_urls`
+        """
+        if self._modulestore_type is None and self.course_id and not self.static_asset_path:
+            self._modulestore_type = modulestore().get_modulestore_type(self.course_id)
+        key = (
+            self.course_id, self._modulestore_type, self.data_directory, self.static_asset_path,
+            settings.DEBUG, prefix, rest,
+        )
+        url = static_urls.get(key, default=self)
+        if url is self:
+            url = _static_url(prefix, rest, self.data_directory, self.course_id, self.static_asset_path)
+            static_urls.set(key, url)
+        return url
@@ -1,8 +1,8 @@
 import re
 
 from nose.tools import assert_equals, assert_true, assert_false  # pylint: disable=E0611
-from static_replace import (replace_static_urls, replace_course_urls,
-                            _url_replace_regex)
+from static_replace import (replace_static_urls, replace_course_urls, replace_jump_to_id_urls,
+                            _url_replace_regex, static_urls, UrlRewriter)
 from mock import patch, Mock
 
 from xmodule.modulestore.locations import SlashSeparatedCourseKey
@@ -123,3 +123,69 @@ def test_regex():
     for s in no:
         print 'Should not match: {0!r}'.format(s)
         assert_false(re.match(regex, s))
+
+
+JUMP_TO_ID_BASE_URL = '/courses/org/course/run/jump_to_id/'
+REWRITE_SOURCE = (
+    '<img src="/static/file.png"/><a href=\'/course/info\'>info</a>'
+    '<a href="/jump_to_id/vertical_test">jump</a><img src="/static/file.png?raw"/>'
+)
+
+
+@patch('static_replace.modulestore')
+@patch('static_replace.staticfiles_storage')
+def test_rewriter_matches_replacements(mock_storage, mock_modulestore):
+    """
+    Make sure UrlRewriter makes the same replacements as the separate functions
+    """
+    static_urls.clear()
+    mock_modulestore.return_value = Mock(XMLModuleStore)
+    mock_storage.exists.return_value = False
+    mock_storage.url.return_value = '/static/data_dir/file.png'
+
+    expected = replace_jump_to_id_urls(
+        replace_course_urls(replace_static_urls(REWRITE_SOURCE, DATA_DIRECTORY), COURSE_KEY),
+        COURSE_KEY,
+        JUMP_TO_ID_BASE_URL,
+    )
+    rewriter = UrlRewriter(COURSE_KEY, DATA_DIRECTORY, jump_to_id_base_url=JUMP_TO_ID_BASE_URL)
+    assert_equals(expected, rewriter.rewrite(REWRITE_SOURCE))
+
+
+@patch('static_replace.modulestore')
+@patch('static_replace.staticfiles_storage')
+def test_rewriter_escaped_quotes(mock_storage, mock_modulestore):
+    """
+    Make sure UrlRewriter leaves urls in HTML escaped text alone, as they've been rewritten already
+    """
+    static_urls.clear()
+    mock_modulestore.return_value = Mock(XMLModuleStore)
+    mock_storage.exists.return_value = False
+    mock_storage.url.return_value = '/static/data_dir/file.png'
+
+    rewriter = UrlRewriter(COURSE_KEY, DATA_DIRECTORY, jump_to_id_base_url=JUMP_TO_ID_BASE_URL)
+    escaped = '&lt;img src=&#34;/static/data_dir/file.png&#34;/&gt;&lt;a href=&quot;/course/info&quot;&gt;'
+    assert_equals(escaped, rewriter.rewrite(escaped))
+    assert_false(mock_storage.exists.called)
+
+
+@patch('static_replace.modulestore')
+@patch('static_replace.staticfiles_storage')
+def test_rewriter_remembers_static_urls(mock_storage, mock_modulestore):
+    """
+    Make sure UrlRewriter only looks up each /static/ url of a course once
+    """
+    static_urls.clear()
+    mock_modulestore.return_value = Mock(MongoModuleStore)
+    mock_storage.exists.return_value = True
+    mock_storage.url.return_value = '/static/file.png'
+
+    for _ in xrange(3):
+        rewriter = UrlRewriter(COURSE_KEY, DATA_DIRECTORY)
+        assert_equals(STATIC_SOURCE + STATIC_SOURCE, rewriter.rewrite(STATIC_SOURCE + STATIC_SOURCE))
+    mock_storage.exists.assert_called_once_with('file.png')
+
+    rewriter = UrlRewriter(SlashSeparatedCourseKey('org', 'other_course', 'run'), DATA_DIRECTORY)
+    rewriter.rewrite(STATIC_SOURCE)
+    assert_equals(mock_storage.exists.call_count, 2)
+
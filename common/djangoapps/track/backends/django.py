@@ -75,9 +75,23 @@ class DjangoBackend(BaseBackend):
         self.name = name
 
     def send(self, event):
-        field_values = {x: event.get(x, '') for x in LOGFIELDS}
-        tldat = TrackingLog(**field_values)
+        tldat = self._tracking_log(event)
         try:
             tldat.save(using=self.name)
         except Exception as e:  # pylint: disable=broad-except
             log.exception(e)
+
+    def send_many(self, events):
+        """Save the events with one INSERT"""
+        try:
+            TrackingLog.objects.using(self.name).bulk_create(
+                [self._tracking_log(event) for event in events]
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            log.exception(e)
+
+    @staticmethod
+    def _tracking_log(event):
+        """Return an unsaved TrackingLog for the event"""
+        field_values = {x: event.get(x, '') for x in LOGFIELDS}
+        return TrackingLog(**field_values)
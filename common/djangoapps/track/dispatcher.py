@@ -0,0 +1,216 @@
+"""
+Deliver tracking events to the backends from a background thread, in batches,
+so that the latency of the backends isn't added to every request.
+
+Enable it with the TRACKING_BUFFER setting::
+
+  TRACKING_BUFFER = {
+      'BATCH_SIZE': 100,       # the most events to hand to a backend at once
+      'FLUSH_INTERVAL': 1.0,   # the longest, in seconds, an event waits to be sent
+      'MAX_QUEUE_SIZE': 10000, # events beyond this many waiting are dropped
+  }
+
+"""
+
+import atexit
+import logging
+import os
+import Queue
+import threading
+import time
+
+from dogapi import dog_stats_api
+
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_QUEUE_SIZE = 10000
+
+# How often, in seconds, an idle worker checks whether it should stop
+STOP_POLL_INTERVAL = 0.1
+
+
+class BufferedDispatcher(object):
+    """
+    Queues events in memory and sends them to the backends with `send_many`
+    once `batch_size` events are waiting or the oldest has waited
+    `flush_interval` seconds.
+
+    The queue holds at most `max_queue_size` events; once it's full, new events
+    are dropped (and counted) rather than blocking the request.
+    """
+    def __init__(self, backends, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_queue_size=DEFAULT_MAX_QUEUE_SIZE):
+        """
+        :param backends: a dict of backend name to backend
+        """
+        self.backends = backends
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = Queue.Queue(max_queue_size)
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self.queued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def stats(self):
+        """
+        Return a dict of the dispatcher's counters, for monitoring
+        """
+        return {
+            'queued': self.queued,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'waiting': self._queue.qsize(),
+        }
+
+    def send(self, event):
+        """
+        Queue the event for the backends
+        """
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(event)
+        except Queue.Full:
+            self.dropped += 1
+            dog_stats_api.increment('track.buffer.dropped')
+            return
+        self.queued += 1
+
+    def _ensure_worker(self):
+        """
+        Start the worker thread if it isn't running in this process. Threads don't
+        survive a fork; so, a forked web worker starts its own.
+        """
+        if self._worker_pid == os.getpid() or self._stopping.is_set():
+            return
+        with self._lock:
+            if self._worker_pid != os.getpid():
+                self._worker = threading.Thread(target=self._run, name='track-dispatcher')
+                self._worker.daemon = True
+                self._worker.start()
+                self._worker_pid = os.getpid()
+
+    def _run(self):
+        """
+        Send batches until stopped and the queue is empty
+        """
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._dispatch(batch)
+            elif self._stopping.is_set():
+                return
+
+    def _next_batch(self):
+        """
+        Wait for up to `batch_size` events, for no more than `flush_interval` after the first
+        """
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if self._stopping.is_set():
+                # shutting down; so, send what's waiting without waiting for more
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Queue.Empty:
+                    break
+                continue
+
+            # wake up periodically to notice a shutdown
+            timeout = STOP_POLL_INTERVAL
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.time())
+                if timeout <= 0:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except Queue.Empty:
+                if deadline is None:
+                    # nothing waiting; let _run check for shutdown
+                    break
+                continue
+            if deadline is None:
+                deadline = time.time() + self.flush_interval
+        return batch
+
+    def _drain(self):
+        """
+        Send everything still queued from the calling thread
+        """
+        while True:
+            batch = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except Queue.Empty:
+                pass
+            if not batch:
+                return
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        """
+        Hand the batch to every backend
+        """
+        dog_stats_api.histogram('track.buffer.batch_size', len(batch))
+        for name, backend in self.backends.iteritems():
+            with dog_stats_api.timer('track.send.backend.{0}'.format(name)):
+                try:
+                    backend.send_many(batch)
+                except Exception:  # pylint: disable=broad-except
+                    self.failed += len(batch)
+                    dog_stats_api.increment('track.buffer.failed', len(batch))
+                    log.exception('Error sending %d events to tracking backend %s', len(batch), name)
+        self.sent += len(batch)
+
+    def stop(self, timeout=5):
+        """
+        Send the events still queued and stop the worker. Waits up to `timeout`
+        seconds for the worker to finish.
+        """
+        self._stopping.set()
+        if self in _DISPATCHERS:
+            _DISPATCHERS.remove(self)
+        worker = self._worker
+        if worker is not None and self._worker_pid == os.getpid() and worker.is_alive():
+            worker.join(timeout)
+            if worker.is_alive():
+                log.warning('Tracking dispatcher did not stop; %d events lost', self._queue.qsize())
+                return
+        self._drain()
+
+
+_DISPATCHERS = []
+
+
+def create_dispatcher(backends, config):
+    """
+    Return a BufferedDispatcher for the backends configured by a TRACKING_BUFFER dict.
+    Its queue is flushed when the process exits.
+    """
+    dispatcher = BufferedDispatcher(
+        backends,
+        batch_size=config.get('BATCH_SIZE', DEFAULT_BATCH_SIZE),
+        flush_interval=config.get('FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL),
+        max_queue_size=config.get('MAX_QUEUE_SIZE', DEFAULT_MAX_QUEUE_SIZE),
+    )
+    _DISPATCHERS.append(dispatcher)
+    return dispatcher
+
+
+@atexit.register
+def _stop_dispatchers():
+    """
+    Send any queued events before the process exits
+    """
+    while _DISPATCHERS:
+        _DISPATCHERS.pop().stop()
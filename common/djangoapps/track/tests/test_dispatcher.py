@@ -0,0 +1,97 @@
+"""Tests for the buffered tracking event dispatcher"""
+import threading
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+import track.tracker as tracker
+from track.backends import BaseBackend
+from track.dispatcher import BufferedDispatcher
+
+
+class BatchRecordingBackend(BaseBackend):
+    """Records each batch of events it's sent"""
+    def __init__(self, **options):
+        super(BatchRecordingBackend, self).__init__(**options)
+        self.batches = []
+        self.received = threading.Event()
+
+    def send(self, event):
+        self.send_many([event])
+
+    def send_many(self, events):
+        self.batches.append(list(events))
+        self.received.set()
+
+
+class FailingBackend(BaseBackend):
+    """Raises on every send"""
+    def send(self, event):
+        raise Exception('unavailable')
+
+
+class TestBufferedDispatcher(TestCase):
+    """Test the batching, overflow, and shutdown of BufferedDispatcher"""
+
+    def setUp(self):
+        self.backend = BatchRecordingBackend()
+
+    def test_sends_in_batches(self):
+        dispatcher = BufferedDispatcher({'recorder': self.backend}, batch_size=3, flush_interval=60)
+        for index in xrange(7):
+            dispatcher.send({'index': index})
+        dispatcher.stop()
+
+        self.assertEqual(
+            [[event['index'] for event in batch] for batch in self.backend.batches],
+            [[0, 1, 2], [3, 4, 5], [6]]
+        )
+        self.assertEqual(dispatcher.stats()['sent'], 7)
+
+    def test_flushes_after_interval(self):
+        dispatcher = BufferedDispatcher({'recorder': self.backend}, batch_size=100, flush_interval=0.01)
+        self.addCleanup(dispatcher.stop)
+        dispatcher.send({'index': 0})
+        self.assertTrue(self.backend.received.wait(5))
+        self.assertEqual(self.backend.batches, [[{'index': 0}]])
+
+    def test_drops_events_when_full(self):
+        dispatcher = BufferedDispatcher({'recorder': self.backend}, max_queue_size=2, flush_interval=60)
+        # no worker; so, nothing leaves the queue
+        dispatcher._ensure_worker = lambda: None  # pylint: disable=protected-access
+        for index in xrange(5):
+            dispatcher.send({'index': index})
+
+        self.assertEqual(dispatcher.stats()['queued'], 2)
+        self.assertEqual(dispatcher.stats()['dropped'], 3)
+
+        dispatcher.stop()
+        self.assertEqual(self.backend.batches, [[{'index': 0}, {'index': 1}]])
+
+    def test_backend_failure_does_not_stop_others(self):
+        dispatcher = BufferedDispatcher({'broken': FailingBackend(), 'recorder': self.backend}, flush_interval=60)
+        dispatcher.send({'index': 0})
+        dispatcher.stop()
+
+        self.assertEqual(self.backend.batches, [[{'index': 0}]])
+        self.assertEqual(dispatcher.stats()['failed'], 1)
+
+
+class TestTrackerBuffering(TestCase):
+    """Test that tracker.send uses the dispatcher when TRACKING_BUFFER is set"""
+
+    @override_settings(
+        TRACKING_BACKENDS={'recorder': {'ENGINE': 'track.tests.test_dispatcher.BatchRecordingBackend'}},
+        TRACKING_BUFFER={'BATCH_SIZE': 10, 'FLUSH_INTERVAL': 60},
+    )
+    def test_buffered_send(self):
+        tracker._initialize_backends_from_django_settings()  # pylint: disable=protected-access
+        self.addCleanup(tracker._initialize_backends_from_django_settings)  # pylint: disable=protected-access
+        backend = tracker.backends['recorder']
+
+        for index in xrange(3):
+            tracker.send({'index': index})
+        self.assertEqual(backend.batches, [])
+
+        tracker.dispatcher.stop()
+        self.assertEqual(backend.batches, [[{'index': 0}, {'index': 1}, {'index': 2}]])
@@ -16,6 +16,9 @@ below::
       }
   }
 
+Events are sent synchronously unless TRACKING_BUFFER is set, in which case
+they are sent in batches from a background thread (see track.dispatcher).
+
 """
 
 import inspect
@@ -26,12 +29,14 @@ from dogapi import dog_stats_api
 from django.conf import settings
 
 from track.backends import BaseBackend
+from track.dispatcher import create_dispatcher
 
 
 __all__ = ['send']
 
 
 backends = {}
+dispatcher = None
 
 
 def _initialize_backends_from_django_settings():
@@ -40,6 +45,11 @@ def _initialize_backends_from_django_settings():
     configuration in django settings
 
     """
+    global dispatcher  # pylint: disable=global-statement
+    if dispatcher is not None:
+        dispatcher.stop()
+        dispatcher = None
+
     backends.clear()
 
     config = getattr(settings, 'TRACKING_BACKENDS', {})
@@ -51,6 +61,10 @@ def _initialize_backends_from_django_settings():
             options = values.get('OPTIONS', {})
             backends[name] = _instantiate_backend_from_name(engine, options)
 
+    buffer_config = getattr(settings, 'TRACKING_BUFFER', None)
+    if buffer_config:
+        dispatcher = create_dispatcher(backends, buffer_config)
+
 
 def _instantiate_backend_from_name(name, options):
     """
@@ -91,6 +105,10 @@ def send(event):
     """
     dog_stats_api.increment('track.send.count')
 
+    if dispatcher is not None:
+        dispatcher.send(event)
+        return
+
     for name, backend in backends.iteritems():
         with dog_stats_api.timer('track.send.backend.{0}'.format(name)):
             backend.send(event)
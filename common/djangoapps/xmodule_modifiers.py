@@ -131,6 +131,15 @@ def replace_static_urls(data_dir, block, view, frag, context, course_id=None, st
     ))
 
 
+def rewrite_urls(url_rewriter, block, view, frag, context):  # pylint: disable=unused-argument
+    """
+    Replaces urls of the forms /static/..., /course/... and /jump_to_id/... as
+    replace_static_urls, replace_course_urls and replace_jump_to_id_urls do,
+    in one pass over the content, using `url_rewriter` (a static_replace.UrlRewriter)
+    """
+    return wrap_fragment(frag, url_rewriter.rewrite(frag.content))
+
+
 def grade_histogram(module_id):
     '''
     Print out a histogram of grades on a given problem in staff member debug info.
@@ -7,6 +7,9 @@ Uses pyparsing to parse. Main function as of now is evaluator().
 import math
 import operator
 import numbers
+import threading
+from collections import OrderedDict, namedtuple
+
 import numpy
 import scipy.constants
 import functions
@@ -72,6 +75,10 @@ SUFFIXES = {
     'c': 1e-2, 'm': 1e-3, 'u': 1e-6, 'n': 1e-9, 'p': 1e-12
 }
 
+# How many parsed expressions to keep. FormulaResponse evaluates the same student and
+# instructor expressions at every sample point, and problems tend to be graded in bursts.
+PARSE_CACHE_SIZE = 1024
+
 
 class UndefinedVariable(Exception):
     """
@@ -93,7 +100,17 @@ def lower_dict(input_dict):
 
 # The following few functions define evaluation actions, which are run on lists
 # of results from each parse component. They convert the strings and (previously
-# calculated) numbers into the number that component represents.
+# calculated) numbers into the number that component represents. Besides plain
+# numbers, they accept numpy arrays of values so that `evaluate_many` can compute
+# every sample point in one pass.
+
+def is_number(value):
+    """
+    Whether `value` is a (previously calculated) number or array of numbers,
+    rather than an operator or parenthesis.
+    """
+    return isinstance(value, (numbers.Number, numpy.ndarray))
+
 
 def super_float(text):
     """
@@ -122,7 +139,7 @@ def eval_atom(parse_result):
     In the case of parenthesis, ignore them.
     """
     # Find first number in the list
-    result = next(k for k in parse_result if isinstance(k, numbers.Number))
+    result = next(k for k in parse_result if is_number(k))
     return result
 
 
@@ -136,7 +153,7 @@ def eval_power(parse_result):
     # `reduce` will go from left to right; reverse the list.
     parse_result = reversed(
         [k for k in parse_result
-         if isinstance(k, numbers.Number)]  # Ignore the '^' marks.
+         if is_number(k)]  # Ignore the '^' marks.
     )
     # Having reversed it, raise `b` to the power of `a`.
     power = reduce(lambda a, b: b ** a, parse_result)
@@ -155,10 +172,17 @@ def eval_parallel(parse_result):
     """
     if len(parse_result) == 1:
         return parse_result[0]
-    if 0 in parse_result:
+    values = [e for e in parse_result if is_number(e)]
+    if any(isinstance(e, numpy.ndarray) for e in values):
+        # NaN wherever any of the inputs is zero
+        has_zero = reduce(numpy.logical_or, [numpy.equal(e, 0) for e in values])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            result = 1. / sum(1. / numpy.asarray(e, dtype=complex if numpy.iscomplexobj(e) else float)
+                              for e in values)
+        return numpy.where(has_zero, float('nan'), result)
+    if 0 in values:
         return float('nan')
-    reciprocals = [1. / e for e in parse_result
-                   if isinstance(e, numbers.Number)]
+    reciprocals = [1. / e for e in values]
     return 1. / sum(reciprocals)
 
 
@@ -228,34 +252,242 @@ def evaluator(variables, functions, math_expr, case_sensitive=False):
     if math_expr.strip() == "":
         return float('nan')
 
-    # Parse the tree.
-    math_interpreter = ParseAugmenter(math_expr, case_sensitive)
-    math_interpreter.parse_algebra()
+    parsed = parse_expression(math_expr)
+    evaluate = _compiled_evaluator(parsed, functions, case_sensitive)
+    return evaluate(variables)
 
-    # Get our variables together.
-    all_variables, all_functions = add_defaults(variables, functions, case_sensitive)
 
-    # ...and check them
-    math_interpreter.check_variables(all_variables, all_functions)
+def evaluate_many(variables, functions, math_expr, case_sensitive=False):
+    """
+    Evaluate an expression at many points, parsing and checking it only once.
+
+    `variables` is either
+    -a list of variable dictionaries like `evaluator` takes. Return the list of
+     results, one per dictionary; each is exactly what `evaluator` would give.
+    -a dictionary mapping variable names to numpy arrays of sample values (and/or
+     numbers common to all the samples). Return an array of the results, computed
+     in one vectorized pass. Note numpy's semantics apply: e.g. dividing by zero
+     gives inf or nan rather than raising, and functions which only accept scalars
+     (such as factorial) raise a TypeError.
+    """
+    if isinstance(variables, dict):
+        if math_expr.strip() == "":
+            shape = numpy.broadcast_arrays(*variables.values())[0].shape if variables else ()
+            return numpy.nan * numpy.ones(shape)
+        parsed = parse_expression(math_expr)
+        return numpy.asarray(_compiled_evaluator(parsed, functions, case_sensitive)(variables))
+
+    if math_expr.strip() == "":
+        return [float('nan')] * len(variables)
+    parsed = parse_expression(math_expr)
+    evaluate = _compiled_evaluator(parsed, functions, case_sensitive)
+    return [evaluate(var_dict) for var_dict in variables]
 
+
+def _compiled_evaluator(parsed, functions, case_sensitive):
+    """
+    Return a function which evaluates the parsed expression given a dictionary of
+    variables. Raise UndefinedVariable if the expression uses an unknown function.
+    """
     # Create a recursion to evaluate the tree.
     if case_sensitive:
         casify = lambda x: x
     else:
         casify = lambda x: x.lower()  # Lowercase for case insens.
 
-    evaluate_actions = {
-        'number': eval_number,
-        'variable': lambda x: all_variables[casify(x[0])],
-        'function': lambda x: all_functions[casify(x[0])](x[1]),
-        'atom': eval_atom,
-        'power': eval_power,
-        'parallel': eval_parallel,
-        'product': eval_product,
-        'sum': eval_sum
-    }
+    _, all_functions = add_defaults({}, functions, case_sensitive)
+
+    def evaluate(variables):
+        """
+        Evaluate the expression with the given variables
+        """
+        # Get our variables together.
+        all_variables, _ = add_defaults(variables, {}, case_sensitive)
+
+        # ...and check them
+        check_variables(parsed, case_sensitive, all_variables, all_functions)
+
+        evaluate_actions = {
+            'variable': lambda x: all_variables[casify(x[0])],
+            'function': lambda x: all_functions[casify(x[0])](x[1]),
+            'atom': eval_atom,
+            'power': eval_power,
+            'parallel': eval_parallel,
+            'product': eval_product,
+            'sum': eval_sum
+        }
+        return _reduce_compiled(parsed.compiled, evaluate_actions)
+
+    return evaluate
+
+
+def _reduce_compiled(node, handle_actions):
+    """
+    Evaluate a tree compiled by `_compile_tree`, bottom up.
+    """
+    if not isinstance(node, tuple):
+        return node
+    node_name, kids = node
+    return handle_actions[node_name]([_reduce_compiled(kid, handle_actions) for kid in kids])
+
+
+def _compile_tree(node):
+    """
+    Convert a parse tree into nested (node name, children) tuples with numbers
+    already converted to floats, which is much cheaper to walk than ParseResults.
+    """
+    if not isinstance(node, ParseResults):
+        return node
+    node_name = node.getName()
+    if node_name == 'number':
+        return eval_number(node)
+    return (node_name, [_compile_tree(kid) for kid in node])
+
+
+# The parse tree, its compiled form, and the names of the variables and functions used
+ParsedExpression = namedtuple('ParsedExpression', 'tree compiled variables_used functions_used')
+
+_GRAMMAR = None
+_GRAMMAR_LOCK = threading.Lock()
+_PARSE_CACHE = OrderedDict()
+_PARSE_CACHE_LOCK = threading.Lock()
+
+
+def _get_grammar():
+    """
+    Return the pyparsing grammar for an algebraic expression, building it on first use.
+
+    The grammar doesn't depend on case sensitivity (that only affects how names are
+    looked up) and holds no per-parse state; so, a single one serves every parse.
+    """
+    global _GRAMMAR  # pylint: disable=global-statement
+    with _GRAMMAR_LOCK:
+        if _GRAMMAR is None:
+            _GRAMMAR = _build_grammar()
+        return _GRAMMAR
+
+
+def _build_grammar():
+    """
+    Build the pyparsing grammar for an algebraic expression.
+
+    Parse results have proper groupings to reflect parenthesis and order of
+    operations. All operators are left in the tree and strings of numbers are
+    not parsed into their float versions.
+    """
+    # 0.33 or 7 or .34 or 16.
+    number_part = Word(nums)
+    inner_number = (number_part + Optional("." + Optional(number_part))) | ("." + number_part)
+    # pyparsing allows spaces between tokens--`Combine` prevents that.
+    inner_number = Combine(inner_number)
+
+    # SI suffixes and percent.
+    number_suffix = MatchFirst(Literal(k) for k in SUFFIXES.keys())
+
+    # 0.33k or 17
+    plus_minus = Literal('+') | Literal('-')
+    number = Group(
+        Optional(plus_minus) +
+        inner_number +
+        Optional(CaselessLiteral("E") + Optional(plus_minus) + number_part) +
+        Optional(number_suffix)
+    )
+    number = number("number")
+
+    # Predefine recursive variables.
+    expr = Forward()
+
+    # Handle variables passed in. They must start with letters/underscores
+    # and may contain numbers afterward.
+    inner_varname = Word(alphas + "_", alphanums + "_")
+    varname = Group(inner_varname)("variable")
+
+    # Same thing for functions.
+    function = Group(inner_varname + Suppress("(") + expr + Suppress(")"))("function")
+
+    atom = number | function | varname | "(" + expr + ")"
+    atom = Group(atom)("atom")
+
+    # Do the following in the correct order to preserve order of operation.
+    pow_term = atom + ZeroOrMore("^" + atom)
+    pow_term = Group(pow_term)("power")
+
+    par_term = pow_term + ZeroOrMore('||' + pow_term)  # 5k || 4k
+    par_term = Group(par_term)("parallel")
+
+    prod_term = par_term + ZeroOrMore((Literal('*') | Literal('/')) + par_term)  # 7 * 5 / 4
+    prod_term = Group(prod_term)("product")
+
+    sum_term = Optional(plus_minus) + prod_term + ZeroOrMore(plus_minus + prod_term)  # -5 + 4 - 3
+    sum_term = Group(sum_term)("sum")
+
+    # Finish the recursion.
+    expr << sum_term  # pylint: disable=W0104
+    return expr + stringEnd
+
+
+def _names_used(node, variables_used, functions_used):
+    """
+    Collect the names of the variables and functions in the parse tree.
+    """
+    if not isinstance(node, ParseResults):
+        return
+    node_name = node.getName()
+    if node_name == 'variable':
+        variables_used.add(node[0])
+    elif node_name == 'function':
+        functions_used.add(node[0])
+    for kid in node:
+        _names_used(kid, variables_used, functions_used)
+
+
+def parse_expression(math_expr):
+    """
+    Parse an algebraic expression, returning a ParsedExpression.
+
+    Results are kept in an LRU cache keyed by the expression's text, so treat
+    them as read only.
+    """
+    with _PARSE_CACHE_LOCK:
+        parsed = _PARSE_CACHE.pop(math_expr, None)
+        if parsed is not None:
+            # re-insert as the most recently used entry
+            _PARSE_CACHE[math_expr] = parsed
+            return parsed
+
+    tree = _get_grammar().parseString(math_expr)[0]
+    variables_used = set()
+    functions_used = set()
+    _names_used(tree, variables_used, functions_used)
+    parsed = ParsedExpression(tree, _compile_tree(tree), frozenset(variables_used), frozenset(functions_used))
+
+    with _PARSE_CACHE_LOCK:
+        _PARSE_CACHE[math_expr] = parsed
+        while len(_PARSE_CACHE) > PARSE_CACHE_SIZE:
+            _PARSE_CACHE.popitem(last=False)
+    return parsed
+
+
+def check_variables(parsed, case_sensitive, valid_variables, valid_functions):
+    """
+    Confirm that all the variables and functions used in the parsed expression are
+    valid/defined.
+
+    Otherwise, raise an UndefinedVariable containing all bad variables.
+    """
+    if case_sensitive:
+        casify = lambda x: x
+    else:
+        casify = lambda x: x.lower()  # Lowercase for case insens.
+
+    # Test if casify(X) is valid, but return the actual bad input (i.e. X)
+    bad_vars = set(var for var in parsed.variables_used
+                   if casify(var) not in valid_variables)
+    bad_vars.update(func for func in parsed.functions_used
+                    if casify(func) not in valid_functions)
 
-    return math_interpreter.reduce_tree(evaluate_actions)
+    if bad_vars:
+        raise UndefinedVariable(' '.join(sorted(bad_vars)))
 
 
 class ParseAugmenter(object):
@@ -278,23 +510,6 @@ class ParseAugmenter(object):
         self.variables_used = set()
         self.functions_used = set()
 
-        def vpa(tokens):
-            """
-            When a variable is recognized, store it in `variables_used`.
-            """
-            varname = tokens[0][0]
-            self.variables_used.add(varname)
-
-        def fpa(tokens):
-            """
-            When a function is recognized, store it in `functions_used`.
-            """
-            varname = tokens[0][0]
-            self.functions_used.add(varname)
-
-        self.variable_parse_action = vpa
-        self.function_parse_action = fpa
-
     def parse_algebra(self):
         """
         Parse an algebraic expression into a tree.
@@ -303,61 +518,17 @@ class ParseAugmenter(object):
         reflect parenthesis and order of operations. Leave all operators in the
         tree and do not parse any strings of numbers into their float versions.
 
+        The tree may be shared with other parses of the same expression (see
+        `parse_expression`); so, don't modify it.
+
         Adding the groups and result names makes the `repr()` of the result
         really gross. For debugging, use something like
           print OBJ.tree.asXML()
         """
-        # 0.33 or 7 or .34 or 16.
-        number_part = Word(nums)
-        inner_number = (number_part + Optional("." + Optional(number_part))) | ("." + number_part)
-        # pyparsing allows spaces between tokens--`Combine` prevents that.
-        inner_number = Combine(inner_number)
-
-        # SI suffixes and percent.
-        number_suffix = MatchFirst(Literal(k) for k in SUFFIXES.keys())
-
-        # 0.33k or 17
-        plus_minus = Literal('+') | Literal('-')
-        number = Group(
-            Optional(plus_minus) +
-            inner_number +
-            Optional(CaselessLiteral("E") + Optional(plus_minus) + number_part) +
-            Optional(number_suffix)
-        )
-        number = number("number")
-
-        # Predefine recursive variables.
-        expr = Forward()
-
-        # Handle variables passed in. They must start with letters/underscores
-        # and may contain numbers afterward.
-        inner_varname = Word(alphas + "_", alphanums + "_")
-        varname = Group(inner_varname)("variable")
-        varname.setParseAction(self.variable_parse_action)
-
-        # Same thing for functions.
-        function = Group(inner_varname + Suppress("(") + expr + Suppress(")"))("function")
-        function.setParseAction(self.function_parse_action)
-
-        atom = number | function | varname | "(" + expr + ")"
-        atom = Group(atom)("atom")
-
-        # Do the following in the correct order to preserve order of operation.
-        pow_term = atom + ZeroOrMore("^" + atom)
-        pow_term = Group(pow_term)("power")
-
-        par_term = pow_term + ZeroOrMore('||' + pow_term)  # 5k || 4k
-        par_term = Group(par_term)("parallel")
-
-        prod_term = par_term + ZeroOrMore((Literal('*') | Literal('/')) + par_term)  # 7 * 5 / 4
-        prod_term = Group(prod_term)("product")
-
-        sum_term = Optional(plus_minus) + prod_term + ZeroOrMore(plus_minus + prod_term)  # -5 + 4 - 3
-        sum_term = Group(sum_term)("sum")
-
-        # Finish the recursion.
-        expr << sum_term  # pylint: disable=W0104
-        self.tree = (expr + stringEnd).parseString(self.math_expr)[0]
+        parsed = parse_expression(self.math_expr)
+        self.tree = parsed.tree
+        self.variables_used = set(parsed.variables_used)
+        self.functions_used = set(parsed.functions_used)
 
     def reduce_tree(self, handle_actions, terminal_converter=None):
         """
@@ -403,16 +574,4 @@ class ParseAugmenter(object):
 
         Otherwise, raise an UndefinedVariable containing all bad variables.
         """
-        if self.case_sensitive:
-            casify = lambda x: x
-        else:
-            casify = lambda x: x.lower()  # Lowercase for case insens.
-
-        # Test if casify(X) is valid, but return the actual bad input (i.e. X)
-        bad_vars = set(var for var in self.variables_used
-                       if casify(var) not in valid_variables)
-        bad_vars.update(func for func in self.functions_used
-                        if casify(func) not in valid_functions)
-
-        if bad_vars:
-            raise UndefinedVariable(' '.join(sorted(bad_vars)))
+        check_variables(self, self.case_sensitive, valid_variables, valid_functions)
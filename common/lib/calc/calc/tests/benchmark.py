@@ -0,0 +1,90 @@
+"""
+Benchmark of calc's evaluation of FormulaResponse-style workloads: the same
+expressions evaluated at many sample points.
+
+Run with
+  python -m calc.tests.benchmark
+"""
+import random
+import timeit
+
+import numpy
+
+import calc
+
+EXPRESSIONS = [
+    'x^2 + 2*x*y + y^2',
+    '(R1 || R2) * I + V_0 / sqrt(1 + (omega*tau)^2)',
+    'sin(theta)^2 + cos(theta)^2 - exp(-t/tau) * ln(1 + x)',
+]
+VARIABLES = ['x', 'y', 'R1', 'R2', 'I', 'V_0', 'omega', 'tau', 'theta', 't']
+NUM_SAMPLES = 20
+REPEAT = 20
+
+
+def sample_points(num_samples):
+    """
+    Return a list of variable dictionaries like FormulaResponse.randomize_variables
+    """
+    return [
+        {var: random.uniform(1, 10) for var in VARIABLES}
+        for _ in xrange(num_samples)
+    ]
+
+
+def per_sample_uncached(var_dicts):
+    """
+    What grading did before: parse the expressions at every sample point
+    """
+    for expression in EXPRESSIONS:
+        calc._PARSE_CACHE.clear()  # pylint: disable=protected-access
+        for var_dict in var_dicts:
+            calc.evaluator(var_dict, {}, expression)
+            calc._PARSE_CACHE.clear()  # pylint: disable=protected-access
+
+
+def per_sample_cached(var_dicts):
+    """
+    Evaluate at every sample point with the parse cache
+    """
+    for expression in EXPRESSIONS:
+        for var_dict in var_dicts:
+            calc.evaluator(var_dict, {}, expression)
+
+
+def evaluate_many(var_dicts):
+    """
+    Evaluate at all the sample points with one call per expression
+    """
+    for expression in EXPRESSIONS:
+        calc.evaluate_many(var_dicts, {}, expression)
+
+
+def evaluate_many_vectorized(samples):
+    """
+    Evaluate at all the sample points in one vectorized pass per expression
+    """
+    for expression in EXPRESSIONS:
+        calc.evaluate_many(samples, {}, expression)
+
+
+def main():
+    """
+    Time each strategy and print the results
+    """
+    var_dicts = sample_points(NUM_SAMPLES)
+    samples = {var: numpy.array([var_dict[var] for var_dict in var_dicts]) for var in VARIABLES}
+    strategies = [
+        ('reparse every sample', per_sample_uncached, var_dicts),
+        ('evaluator w/ parse cache', per_sample_cached, var_dicts),
+        ('evaluate_many (dicts)', evaluate_many, var_dicts),
+        ('evaluate_many (arrays)', evaluate_many_vectorized, samples),
+    ]
+    print '{} expressions x {} samples, best of {} runs'.format(len(EXPRESSIONS), NUM_SAMPLES, REPEAT)
+    for name, function, argument in strategies:
+        best = min(timeit.repeat(lambda: function(argument), number=1, repeat=REPEAT))
+        print '{:<28} {:8.2f} ms'.format(name, best * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -558,3 +558,69 @@ class EvaluatorTest(unittest.TestCase):
             calc.evaluator({'r1': 5}, {}, "r1+r2")
         with self.assertRaisesRegexp(calc.UndefinedVariable, 'r1 r3'):
             calc.evaluator(variables, {}, "r1*r3", case_sensitive=True)
+
+
+class ParseCacheTest(unittest.TestCase):
+    """
+    Test that expressions are parsed once and reused
+    """
+    def test_reuses_parse(self):
+        first = calc.parse_expression('x^2 + sin(y)')
+        self.assertIs(calc.parse_expression('x^2 + sin(y)'), first)
+        self.assertEqual(first.variables_used, set(['x', 'y']))
+        self.assertEqual(first.functions_used, set(['sin']))
+
+    def test_case_sensitivity_shares_parse(self):
+        """
+        The parse doesn't depend on case sensitivity, only the lookups do
+        """
+        self.assertEqual(calc.evaluator({'X': 2.0}, {}, 'X^2', case_sensitive=True), 4.0)
+        with self.assertRaisesRegexp(calc.UndefinedVariable, 'X'):
+            calc.evaluator({'x': 2.0}, {}, 'X^2', case_sensitive=True)
+        self.assertEqual(calc.evaluator({'x': 2.0}, {}, 'X^2'), 4.0)
+
+    def test_errors_are_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(ParseException):
+                calc.evaluator({}, {}, '1+.')
+
+
+class EvaluateManyTest(unittest.TestCase):
+    """
+    Run tests for calc.evaluate_many
+    """
+    EXPRESSION = 'x^2 + 3*y || 2 + sin(x) + fact(n)'
+
+    def test_matches_evaluator(self):
+        var_dicts = [{'x': x, 'y': y, 'n': 3} for x, y in zip([0.5, 1.0, 2.0], [1.0, 0.0, -4.0])]
+        expected = [calc.evaluator(var_dict, {}, self.EXPRESSION) for var_dict in var_dicts]
+        self.assertEqual(calc.evaluate_many(var_dicts, {}, self.EXPRESSION), expected)
+
+    def test_empty_expression(self):
+        results = calc.evaluate_many([{}, {}], {}, ' ')
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(numpy.isnan(result) for result in results))
+
+    def test_errors_match_evaluator(self):
+        with self.assertRaisesRegexp(calc.UndefinedVariable, 'z'):
+            calc.evaluate_many([{'x': 1}], {}, 'x + z')
+        with self.assertRaisesRegexp(ValueError, 'factorial'):
+            calc.evaluate_many([{'n': 2}, {'n': -1}], {}, 'fact(n)')
+
+    def test_arrays(self):
+        xs = numpy.array([0.5, 1.0, 2.0])
+        ys = numpy.array([1.0, 0.0, -4.0])
+        expression = 'x^2 + 3*y || 2 - cos(x) / e'
+        results = calc.evaluate_many({'x': xs, 'y': ys}, {}, expression)
+        expected = [calc.evaluator({'x': x, 'y': y}, {}, expression) for x, y in zip(xs, ys)]
+        self.assertEqual(results.shape, (3,))
+        for result, answer in zip(results, expected):
+            if numpy.isnan(answer):
+                self.assertTrue(numpy.isnan(result))
+            else:
+                self.assertAlmostEqual(result, answer)
+
+    def test_array_parallel_with_zero(self):
+        results = calc.evaluate_many({'x': numpy.array([0.0, 1.0])}, {}, 'x || 1')
+        self.assertTrue(numpy.isnan(results[0]))
+        self.assertAlmostEqual(results[1], 0.5)
@@ -13,10 +13,13 @@ Main module which shows problems (of "capa" type).
 This is used by capa_module.
 """
 
+from collections import OrderedDict
 from datetime import datetime
+import hashlib
 import logging
 import os.path
 import re
+import threading
 
 from lxml import etree
 from xml.sax.saxutils import unescape
@@ -57,8 +60,74 @@ html_problem_semantics = [
     "openendedrubric",
 ]
 
+# the number of compiled problems kept by each process
+COMPILED_PROBLEM_CACHE_SIZE = 500
+
 log = logging.getLogger(__name__)
 
+
+class CompiledProblem(object):
+    """
+    The seed-independent form of a problem: its XML tree with includes inserted
+    and ids assigned to its responses, inputs and solutions.
+
+    The tree is shared between LoncapaProblems, so it must never be changed;
+    each problem works on its own copy.
+
+    Attributes:
+        problem_text: the problem's XML, after the startouttext/endouttext substitutions
+        tree: the XML tree
+        includes: a list of (filename, digest of contents) of the included files,
+            or None if an include couldn't be read or parsed
+        responses: a list of (response, inputfields) giving the index, in `tree.iter()`
+            order, of each response element and of the input and solution elements in it
+    """
+    def __init__(self, problem_text, tree, includes, responses):
+        self.problem_text = problem_text
+        self.tree = tree
+        self.includes = includes
+        self.responses = responses
+
+
+class CompiledProblemCache(object):
+    """
+    A process-wide cache of CompiledProblems, keeping the `size` most recently used.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._problems = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the CompiledProblem stored under `key`, or None
+        """
+        with self._lock:
+            compiled = self._problems.pop(key, None)
+            if compiled is not None:
+                self._problems[key] = compiled
+            return compiled
+
+    def set(self, key, compiled):
+        """
+        Store `compiled` under `key`, dropping the least recently used problem if the cache is full
+        """
+        with self._lock:
+            self._problems.pop(key, None)
+            self._problems[key] = compiled
+            while len(self._problems) > self.size:
+                self._problems.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove every CompiledProblem
+        """
+        with self._lock:
+            self._problems.clear()
+
+
+compiled_problems = CompiledProblemCache(COMPILED_PROBLEM_CACHE_SIZE)  # pylint: disable=invalid-name
+
 #-----------------------------------------------------------------------------
 # main class for this module
 
@@ -151,25 +220,22 @@ class LoncapaProblem(object):
         self.done = state.get('done', False)
         self.input_state = state.get('input_state', {})
 
-        # Convert startouttext and endouttext to proper <text></text>
-        problem_text = re.sub(r"startouttext\s*/", "text", problem_text)
-        problem_text = re.sub(r"endouttext\s*/", "/text", problem_text)
-        self.problem_text = problem_text
-
-        # parse problem XML file into an element tree
-        self.tree = etree.XML(problem_text)
-
-        # handle any <include file="foo"> tags
-        self._process_includes()
+        # Parse the problem, or reuse the parse of an earlier instance of it;
+        # only the script context and response construction depend on the seed
+        compiled = self._get_compiled_problem(problem_text)
+        self.problem_text = compiled.problem_text
+        self.tree = deepcopy(compiled.tree)
 
         # construct script processor context (eg for customresponse problems)
         self.context = self._extract_context(self.tree)
 
-        # Pre-parse the XML tree: modifies it to add ID's and perform some in-place
-        # transformations.  This also creates the dict (self.responders) of Response
-        # instances for each question in the problem. The dict has keys = xml subtree of
-        # Response, values = Response instance
-        self._preprocess_problem(self.tree)
+        # Create the dict (self.responders) of Response instances for each question
+        # in the problem. The dict has keys = xml subtree of Response, values = Response instance
+        elements = list(self.tree.iter())
+        self._preprocess_problem(self.tree, [
+            (elements[response], [elements[entry] for entry in inputfields])
+            for response, inputfields in compiled.responses
+        ])
 
         if not self.student_answers:  # True when student_answers is an empty dict
             self.set_initial_display()
@@ -526,12 +592,67 @@ class LoncapaProblem(object):
 
     # ======= Private Methods Below ========
 
-    def _process_includes(self):
+    def _get_compiled_problem(self, problem_text):
+        """
+        Return the CompiledProblem for `problem_text`, from the process's cache
+        if neither it nor any file it includes has changed.
+        """
+        encoded_text = problem_text.encode('utf-8') if isinstance(problem_text, unicode) else problem_text
+        key = (self.problem_id, hashlib.sha1(encoded_text).hexdigest())
+        compiled = compiled_problems.get(key)
+        if compiled is None or not self._includes_unchanged(compiled.includes):
+            compiled = self._compile_problem(problem_text)
+            if compiled.includes is not None:
+                compiled_problems.set(key, compiled)
+        return compiled
+
+    def _includes_unchanged(self, includes):
+        """
+        Return whether each of the files in `includes` still has the contents it was compiled with
+        """
+        for filename, digest in includes:
+            try:
+                with self.capa_system.filestore.open(filename) as include_file:
+                    if hashlib.sha1(include_file.read()).hexdigest() != digest:
+                        return False
+            except Exception:  # pylint: disable=broad-except
+                return False
+        return True
+
+    def _compile_problem(self, problem_text):
+        """
+        Parse `problem_text` into a CompiledProblem
+        """
+        # Convert startouttext and endouttext to proper <text></text>
+        problem_text = re.sub(r"startouttext\s*/", "text", problem_text)
+        problem_text = re.sub(r"endouttext\s*/", "/text", problem_text)
+
+        # parse problem XML file into an element tree
+        tree = etree.XML(problem_text)
+
+        # handle any <include file="foo"> tags
+        includes = self._process_includes(tree)
+
+        # Pre-parse the XML tree: modifies it to add ID's
+        responses = self._assign_ids(tree)
+
+        elements = {element: index for index, element in enumerate(tree.iter())}
+        responses = [
+            (elements[response], [elements[entry] for entry in inputfields])
+            for response, inputfields in responses
+        ]
+        return CompiledProblem(problem_text, tree, includes, responses)
+
+    def _process_includes(self, tree):
         """
         Handle any <include file="foo"> tags by reading in the specified file and inserting it
         into our XML tree.  Fail gracefully if debugging.
+
+        Returns a list of (filename, digest of contents) of the included files, or None if
+        any of them was skipped because it couldn't be read or parsed.
         """
-        includes = self.tree.findall('.//include')
+        included = []
+        includes = tree.findall('.//include')
         for inc in includes:
             filename = inc.get('file')
             if filename is not None:
@@ -552,10 +673,12 @@ class LoncapaProblem(object):
                     if not self.capa_system.DEBUG:
                         raise
                     else:
+                        included = None
                         continue
                 try:
                     # read in and convert to XML
-                    incxml = etree.XML(ifp.read())
+                    contents = ifp.read()
+                    incxml = etree.XML(contents)
                 except Exception as err:
                     log.warning(
                         'Error %s in problem xml include: %s',
@@ -568,6 +691,7 @@ class LoncapaProblem(object):
                     if not self.capa_system.DEBUG:
                         raise
                     else:
+                        included = None
                         continue
 
                 # insert new XML into tree in place of include
@@ -575,6 +699,9 @@ class LoncapaProblem(object):
                 parent.insert(parent.index(inc), incxml)
                 parent.remove(inc)
                 log.debug('Included %s into %s' % (filename, self.problem_id))
+                if included is not None:
+                    included.append((filename, hashlib.sha1(contents).hexdigest()))
+        return included
 
     def _extract_system_path(self, script):
         """
@@ -762,19 +889,17 @@ class LoncapaProblem(object):
 
         return tree
 
-    def _preprocess_problem(self, tree):  # private
+    def _assign_ids(self, tree):  # private
         """
         Assign IDs to all the responses
         Assign sub-IDs to all entries (textline, schematic, etc.)
-        Annoted correctness and value
-        In-place transformation
-
-        Also create capa Response instances for each responsetype and save as self.responders
+        In-place transformation, which doesn't depend on the seed
 
-        Obtain all responder answers and save as self.responder_answers dict (key = response)
+        Returns a list of (response, inputfields) of each response element and its
+        input and solution elements
         """
+        responses = []
         response_id = 1
-        self.responders = {}
         for response in tree.xpath('//' + "|//".join(responsetypes.registry.registered_tags())):
             response_id_str = self.problem_id + "_" + str(response_id)
             # create and save ID for this response
@@ -795,6 +920,21 @@ class LoncapaProblem(object):
                 entry.attrib['id'] = "%s_%i_%i" % (self.problem_id, response_id, answer_id)
                 answer_id = answer_id + 1
 
+            responses.append((response, inputfields))
+
+        return responses
+
+    def _preprocess_problem(self, tree, responses):  # private
+        """
+        Create capa Response instances for each of `responses`, the (response, inputfields)
+        found by _assign_ids in `tree`, and save as self.responders
+
+        Obtain all responder answers and save as self.responder_answers dict (key = response)
+
+        Assign IDs to all the solutions
+        """
+        self.responders = {}
+        for response, inputfields in responses:
             # instantiate capa Response
             responsetype_cls = responsetypes.registry.get_class_for_tag(response.tag)
             responder = responsetype_cls(response, inputfields, self.context, self.capa_system)
@@ -0,0 +1,312 @@
+"""
+A pool of warm, sandboxed Python processes for capa.safe_exec.
+
+codejail starts a new sandboxed Python for every execution, which then imports
+numpy, scipy and the rest of the assumed imports. The pool instead keeps
+`size` workers (see pool_worker.py) that have already imported them, and feeds
+each one code and globals over a pipe, one execution at a time. A worker forks
+a fresh child to run each execution, so executions share no state, and can't
+tamper with the worker or its replies.
+
+Each worker is replaced after `max_executions` executions. The same codejail
+configuration is used as for codejail's own executions: the sandboxed Python,
+its user and its CPU, memory and real time limits, which apply to each child.
+Code needing extra files on its python_path is still run by codejail.
+
+Use `configure` to set the pool up; it starts its workers when it's first used.
+"""
+import json
+import logging
+import os
+import os.path
+import resource
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import Queue
+
+from codejail import jail_code
+from codejail.safe_exec import safe_exec as codejail_safe_exec
+from codejail.safe_exec import json_safe, SafeExecException
+from dogapi import dog_stats_api
+
+log = logging.getLogger(__name__)
+
+# CPU seconds allowed for a worker to start up and import its modules, and for
+# each execution it forks (its children's CPU time is limited separately)
+STARTUP_CPU = 10
+EXECUTION_CPU = 1
+
+# Seconds to wait for a worker to start, and between attempts if starting fails
+STARTUP_TIMEOUT = 30
+RETRY_DELAY = 5
+
+# Seconds to wait for a worker's reply beyond the real time limit of its child
+REPLY_GRACE = 5
+
+# We'll copy the worker's code into each worker's directory, so read it now.
+pool_worker_py_file = os.path.join(os.path.dirname(__file__), "pool_worker.py")  # pylint: disable=invalid-name
+with open(pool_worker_py_file) as pool_worker_file:
+    POOL_WORKER_PY = pool_worker_file.read()
+
+POOL_OPTIONS = {
+    # How many workers to keep?  0 means don't use a pool.
+    'size': 0,
+    # How many executions may a worker run before it's replaced?
+    'max_executions': 100,
+    # Send a histogram of the time taken by each execution, and spent waiting for a worker?
+    'timing_metrics': True,
+}
+
+_pool = None  # pylint: disable=invalid-name
+# the process which started _pool's workers
+_pool_pid = None  # pylint: disable=invalid-name
+_pool_lock = threading.Lock()  # pylint: disable=invalid-name
+
+
+def configure(**options):
+    """
+    Set the options of the pool; see POOL_OPTIONS.
+
+    The pool is started on the first execution after this.
+    """
+    global _pool  # pylint: disable=global-statement
+    unknown = set(options) - set(POOL_OPTIONS)
+    if unknown:
+        raise ValueError("Unknown sandbox pool options: {}".format(", ".join(sorted(unknown))))
+    with _pool_lock:
+        POOL_OPTIONS.update(options)
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+def get_pool(modules):
+    """
+    Return this process's SandboxPool, whose workers import `modules` when they
+    start, or None if there is no pool configured.
+
+    A process forked after its parent's pool was started shares the pipes to the
+    parent's workers; so, it starts a pool of its own, leaving those workers to
+    the parent.
+    """
+    global _pool, _pool_pid  # pylint: disable=global-statement
+    if not POOL_OPTIONS['size'] or not jail_code.is_configured("python"):
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = SandboxPool(modules, **POOL_OPTIONS)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _limits():
+    """
+    Return codejail's CPU, VMEM and REALTIME limits, 0 meaning unlimited
+    """
+    return dict((name, jail_code.LIMITS.get(name, 0)) for name in ("CPU", "VMEM", "REALTIME"))
+
+
+class SandboxWorker(object):
+    """
+    One sandboxed Python process running pool_worker.py
+    """
+    def __init__(self, modules):
+        limits = _limits()
+        self.realtime = limits['REALTIME']
+        self.executions = 0
+        self.alive = True
+
+        self.tmpdir = tempfile.mkdtemp(prefix="capa-sandbox-")
+        os.chmod(self.tmpdir, 0755)
+        worker_path = os.path.join(self.tmpdir, "pool_worker.py")
+        with open(worker_path, "w") as worker_file:
+            worker_file.write(POOL_WORKER_PY)
+        os.chmod(worker_path, 0644)
+
+        cmd = []
+        user = jail_code.COMMANDS["python"].get('user')
+        if user:
+            # Run as the specified user
+            cmd.extend(['sudo', '-u', user])
+        cmd.extend(jail_code.COMMANDS["python"]['cmdline_start'])
+        cmd.extend([
+            worker_path,
+            json.dumps({'modules': modules, 'cpu': limits['CPU'], 'realtime': limits['REALTIME']}),
+        ])
+
+        self.process = subprocess.Popen(
+            cmd, cwd=self.tmpdir, env={}, preexec_fn=self._set_process_limits,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        timer = threading.Timer(STARTUP_TIMEOUT, self.kill)
+        timer.start()
+        try:
+            ready = self.process.stdout.readline()
+        finally:
+            timer.cancel()
+        if ready != "ready\n":
+            self.close()
+            raise SafeExecException("Couldn't start sandbox worker: %s" % self.process.stderr.read())
+
+    @staticmethod
+    def _set_process_limits():
+        """
+        Set the limits of the worker process, as codejail does for its own, but
+        allowing it to fork the children which run its executions. Each child
+        forbids itself subprocesses and sets its own CPU limit before running
+        any code.
+        """
+        limits = _limits()
+        # No files.
+        resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+        if limits['CPU']:
+            total = STARTUP_CPU + EXECUTION_CPU * POOL_OPTIONS['max_executions']
+            resource.setrlimit(resource.RLIMIT_CPU, (total, total))
+        if limits['VMEM']:
+            resource.setrlimit(resource.RLIMIT_AS, (limits['VMEM'], limits['VMEM']))
+
+    def execute(self, code, globals_dict):
+        """
+        Run `code` with `globals_dict` in the worker, and return a pair: the
+        exception message, if any, else None; and the resulting globals dict.
+        """
+        request = json.dumps([code, globals_dict]) + "\n"
+        timer = None
+        if self.realtime:
+            # The worker kills a child which runs for too long; this is in case the worker hangs.
+            timer = threading.Timer(self.realtime + REPLY_GRACE, self.kill)
+            timer.start()
+        try:
+            self.process.stdin.write(request)
+            self.process.stdin.flush()
+            reply = self.process.stdout.readline()
+        except IOError:
+            reply = ""
+        finally:
+            if timer is not None:
+                timer.cancel()
+        self.executions += 1
+
+        if not reply:
+            # The worker died, or was killed for taking too long.
+            self.close()
+            return "Couldn't execute jailed code: %s" % self.process.stderr.read(), {}
+
+        error, results = json.loads(reply)
+        if error:
+            error = "Couldn't execute jailed code: %s" % error
+        return error, results
+
+    def kill(self):
+        """
+        Stop the worker immediately
+        """
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+
+    def close(self):
+        """
+        Stop the worker, and remove its directory
+        """
+        self.alive = False
+        try:
+            self.process.stdin.close()
+        except IOError:
+            pass
+        self.kill()
+        self.process.wait()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+class SandboxPool(object):
+    """
+    Keeps `size` SandboxWorkers, and runs each execution in the first one free.
+    """
+    def __init__(self, modules, size, max_executions, timing_metrics):
+        self.modules = modules
+        self.max_executions = max_executions
+        self.timing_metrics = timing_metrics
+        self.closed = False
+        self._idle = Queue.Queue()
+        for _ in xrange(size):
+            self._start_worker()
+
+    def _start_worker(self):
+        """
+        Start a new worker in the background, adding it to the idle workers once it's ready
+        """
+        def start():
+            """
+            Keep trying to start a worker until one starts or the pool is closed
+            """
+            while not self.closed:
+                try:
+                    worker = SandboxWorker(self.modules)
+                except Exception:  # pylint: disable=broad-except
+                    log.exception("Couldn't start a sandbox worker; retrying in %s seconds", RETRY_DELAY)
+                    time.sleep(RETRY_DELAY)
+                else:
+                    if self.closed:
+                        worker.close()
+                    else:
+                        self._idle.put(worker)
+                    return
+
+        thread = threading.Thread(target=start, name="capa-sandbox-starter")
+        thread.daemon = True
+        thread.start()
+
+    def safe_exec(self, code, globals_dict, python_path=None, slug=None):
+        """
+        Run `code` as codejail.safe_exec.safe_exec would, with the same arguments,
+        using a pooled worker if one is free soon enough.
+        """
+        if python_path:
+            # Only codejail copies the files on the path into the sandbox.
+            return codejail_safe_exec(code, globals_dict, python_path=python_path, slug=slug)
+
+        start = time.time()
+        try:
+            worker = self._idle.get(timeout=_limits()['REALTIME'] or STARTUP_TIMEOUT)
+        except Queue.Empty:
+            log.warning("No sandbox worker was free to run %s; running it with codejail", slug)
+            dog_stats_api.increment('capa.safe_exec.pool.fallback')
+            return codejail_safe_exec(code, globals_dict, python_path=python_path, slug=slug)
+        started = time.time()
+
+        try:
+            emsg, results = worker.execute(code, json_safe(globals_dict))
+        finally:
+            if self.closed or not worker.alive or worker.executions >= self.max_executions:
+                if worker.alive:
+                    worker.close()
+                if not self.closed:
+                    self._start_worker()
+            else:
+                self._idle.put(worker)
+
+        if self.timing_metrics:
+            dog_stats_api.histogram('capa.safe_exec.pool.wait_time', started - start)
+            dog_stats_api.histogram('capa.safe_exec.pool.exec_time', time.time() - started)
+
+        if emsg:
+            log.debug("Sandbox worker failed to run %s: %s", slug, emsg)
+            raise SafeExecException(emsg)
+        globals_dict.update(results)
+
+    def close(self):
+        """
+        Stop all the idle workers; busy ones are stopped when they finish
+        """
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Queue.Empty:
+                break
+
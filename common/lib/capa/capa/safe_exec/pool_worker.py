@@ -0,0 +1,150 @@
+"""
+A long-lived sandboxed Python process which runs code for capa.safe_exec.pool.
+
+This file isn't imported: the pool copies it into a temporary directory and
+runs it with codejail's sandboxed Python, so it must only use the standard
+library.
+
+The only argument is a JSON object with
+
+* "modules": the modules to import once at startup, so executions find them warm,
+* "cpu": the CPU seconds allowed for each execution, or 0 for no limit, and
+* "realtime": the seconds each execution may run for, or 0 for no limit.
+
+Once the modules are imported, the worker writes a line "ready". Then each
+request is a line of JSON, ``[code, globals_dict]``. The worker never runs the
+code itself: it forks a child for each request, which runs the code and sends
+its results back over a pipe of its own, and exits. So nothing an execution
+does is seen by the next one, and executed code can't write to the worker's
+replies. The worker then replies with a line of JSON, ``[error, globals_dict]``:
+the traceback if the code raised an exception (or the child failed), or null;
+and the JSON-serializable globals after execution.
+"""
+import json
+import os
+import resource
+import select
+import signal
+import sys
+import time
+import traceback
+from cStringIO import StringIO
+
+# The worker only ever has a few files open, all below this
+MAX_WORKER_FD = 256
+
+
+def jsonable_globals(globals_dict):
+    """
+    Return the entries of `globals_dict` which survive a JSON round-trip
+    """
+    results = {}
+    for key, value in globals_dict.iteritems():
+        if key == "__builtins__":
+            continue
+        try:
+            json.dumps(value)
+        except Exception:  # pylint: disable=broad-except
+            continue
+        results[key] = value
+    return results
+
+
+def run_child(code, globals_dict, cpu, results_fd):
+    """
+    In a newly forked child, run `code` and write `[error, globals_dict]` to results_fd
+    """
+    # Nothing but the results pipe is left open, so that executed code can only
+    # write its own results, and not the worker's replies.
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.closerange(3, results_fd)
+    os.closerange(results_fd + 1, MAX_WORKER_FD)
+    sys.stdin = StringIO()
+    sys.stdout = sys.stderr = StringIO()
+
+    # No subprocesses, and the CPU limit for this execution alone.
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    if cpu:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+
+    try:
+        exec code in globals_dict  # pylint: disable=exec-used
+    except BaseException:  # pylint: disable=broad-except
+        error = traceback.format_exc()
+    else:
+        error = None
+    with os.fdopen(results_fd, "w") as results:
+        results.write(json.dumps([error, jsonable_globals(globals_dict)]))
+
+
+def read_results(pid, results_fd, realtime):
+    """
+    Read what the child `pid` writes to results_fd until it closes it, killing the
+    child if it takes more than `realtime` seconds. Returns `[error, globals_dict]`.
+    """
+    chunks = []
+    deadline = time.time() + realtime if realtime else None
+    with os.fdopen(results_fd, "r") as results:
+        while True:
+            timeout = max(deadline - time.time(), 0) if deadline else None
+            ready = select.select([results], [], [], timeout)[0]
+            if not ready:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                return ["Timed out after {} seconds".format(realtime), {}]
+            chunk = os.read(results_fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    _, status = os.waitpid(pid, 0)
+
+    try:
+        error, globals_dict = json.loads("".join(chunks))
+    except (TypeError, ValueError):
+        return ["Sandboxed code exited with status {}".format(status), {}]
+    if not isinstance(globals_dict, dict):
+        return ["Sandboxed code sent malformed results", {}]
+    return [error, globals_dict]
+
+
+def main():
+    """
+    Import the modules, then serve requests until stdin is closed
+    """
+    options = json.loads(sys.argv[1])
+    for modname in options['modules']:
+        try:
+            __import__(modname)
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    requests = sys.stdin
+    replies = sys.stdout
+    replies.write("ready\n")
+    replies.flush()
+
+    while True:
+        request = requests.readline()
+        if not request:
+            break
+        code, globals_dict = json.loads(request)
+
+        results_fd, child_results_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(results_fd)
+            try:
+                run_child(code, globals_dict, options['cpu'], child_results_fd)
+            finally:
+                os._exit(0)  # pylint: disable=protected-access
+        os.close(child_results_fd)
+
+        reply = read_results(pid, results_fd, options['realtime'])
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
+
+
+if __name__ == "__main__":
+    main()
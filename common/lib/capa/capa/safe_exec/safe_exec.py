@@ -4,6 +4,7 @@ from codejail.safe_exec import safe_exec as codejail_safe_exec
 from codejail.safe_exec import not_safe_exec as codejail_not_safe_exec
 from codejail.safe_exec import json_safe, SafeExecException
 from . import lazymod
+from . import pool
 from dogapi import dog_stats_api
 
 import hashlib
@@ -91,6 +92,8 @@ def safe_exec(code, globals_dict, random_seed=None, python_path=None, cache=None
     caller, that will be used in log messages.
 
     If `unsafely` is true, then the code will actually be executed without sandboxing.
+    Otherwise, if a pool of sandbox workers has been configured (see pool.py), the
+    code runs in one of them.
 
     """
     # Check the cache for a previous result.
@@ -117,7 +120,8 @@ def safe_exec(code, globals_dict, random_seed=None, python_path=None, cache=None
     if unsafely:
         exec_fn = codejail_not_safe_exec
     else:
-        exec_fn = codejail_safe_exec
+        sandbox_pool = pool.get_pool([modname for _name, modname in ASSUMED_IMPORTS])
+        exec_fn = sandbox_pool.safe_exec if sandbox_pool is not None else codejail_safe_exec
 
     # Run the code!  Results are side effects in globals_dict.
     try:
@@ -0,0 +1,143 @@
+"""Test the pool of sandbox workers, using this Python as the sandboxed Python."""
+
+import os.path
+import sys
+import unittest
+
+from codejail import jail_code
+from codejail.safe_exec import SafeExecException
+from mock import patch
+
+from capa.safe_exec import pool, safe_exec
+
+
+@patch.dict(jail_code.COMMANDS, {"python": {'cmdline_start': [sys.executable, '-E', '-B'], 'user': None}})
+@patch.dict(jail_code.LIMITS, {"CPU": 0, "VMEM": 0, "REALTIME": 10})
+class TestSandboxPool(unittest.TestCase):
+    def setUp(self):
+        pool.configure(size=2, max_executions=3)
+        self.addCleanup(pool.configure, size=0, max_executions=100)
+
+    def test_results(self):
+        g = {'a': 1}
+        safe_exec("b = a + 1/2; c = math.floor(b); d = object()", g)
+        self.assertEqual(g['a'], 1)
+        self.assertEqual(g['b'], 1.5)
+        self.assertEqual(g['c'], 1.0)
+        self.assertNotIn('d', g)
+
+    def test_random_seeding(self):
+        first, second = {}, {}
+        code = "import random\nrnums = [random.randint(0, 999) for _ in xrange(100)]\n"
+        safe_exec(code, first, random_seed=17)
+        safe_exec(code, second, random_seed=17)
+        self.assertEqual(first['rnums'], second['rnums'])
+
+    def test_raising_exceptions(self):
+        with self.assertRaises(SafeExecException) as cm:
+            safe_exec("1/0", {})
+        self.assertIn("ZeroDivisionError", cm.exception.message)
+        # the worker survives
+        g = {}
+        safe_exec("a = 17", g)
+        self.assertEqual(g['a'], 17)
+
+    def test_printing_is_ignored(self):
+        g = {}
+        safe_exec("print 'hello'\nimport sys\nsys.stderr.write('there')\na = 17", g)
+        self.assertEqual(g['a'], 17)
+
+    def test_executions_dont_share_modules(self):
+        safe_exec("import sys\nsys.modules['math'] = None", {})
+        g = {}
+        for _ in xrange(3):
+            safe_exec("import math\na = math.floor(1.5)", g)
+        self.assertEqual(g['a'], 1.0)
+
+    def test_executions_dont_share_builtins(self):
+        safe_exec("import __builtin__\n__builtin__.len = lambda x: 0", {})
+        g = {}
+        for _ in xrange(3):
+            safe_exec("a = len('abc')", g)
+        self.assertEqual(g['a'], 3)
+
+    def test_executions_cant_write_replies(self):
+        forged = '[null, {\\"a\\": 1}]\\n'
+        g = {}
+        safe_exec(
+            "import os, sys\nos.write(1, '{0}')\nsys.__stdout__.write('{0}')\nb = 2".format(forged), g
+        )
+        self.assertEqual(g['b'], 2)
+        self.assertNotIn('a', g)
+        g = {}
+        safe_exec("c = 3", g)
+        self.assertEqual(g['c'], 3)
+        self.assertNotIn('a', g)
+
+    def test_exiting_code(self):
+        with self.assertRaises(SafeExecException):
+            safe_exec("import os\nos._exit(1)", {})
+        g = {}
+        safe_exec("a = 17", g)
+        self.assertEqual(g['a'], 17)
+
+    def test_dead_worker_replaced(self):
+        with self.assertRaises(SafeExecException):
+            safe_exec("import os, signal\nos.kill(os.getppid(), signal.SIGKILL)\nwhile True: pass", {})
+        g = {}
+        safe_exec("a = 17", g)
+        self.assertEqual(g['a'], 17)
+
+    def test_each_execution_in_a_new_process(self):
+        pids, worker_pids = set(), set()
+        for _ in xrange(8):
+            g = {}
+            safe_exec("import os\npid = os.getpid()\nworker_pid = os.getppid()", g)
+            pids.add(g['pid'])
+            worker_pids.add(g['worker_pid'])
+        self.assertEqual(len(pids), 8)
+        # 8 executions, at most 3 per worker
+        self.assertGreaterEqual(len(worker_pids), 3)
+
+    def test_new_pool_after_fork(self):
+        parent_pool = pool.get_pool([])
+        self.addCleanup(parent_pool.close)
+        with patch('capa.safe_exec.pool.os.getpid', return_value=os.getpid() + 1):
+            with patch.object(parent_pool, 'close') as mock_close:
+                child_pool = pool.get_pool([])
+                self.assertIsNot(child_pool, parent_pool)
+                self.assertIs(pool.get_pool([]), child_pool)
+                g = {}
+                safe_exec("a = 17", g)
+                self.assertEqual(g['a'], 17)
+
+                # reconfiguring closes only the child's own pool
+                pool.configure(size=2, max_executions=3)
+                self.assertTrue(child_pool.closed)
+                self.assertFalse(mock_close.called)
+
+    @patch.dict(jail_code.LIMITS, {"REALTIME": 1})
+    def test_timeout(self):
+        with self.assertRaises(SafeExecException):
+            safe_exec("while True: pass", {})
+
+    def test_python_path_runs_in_codejail(self):
+        pylib = os.path.dirname(__file__) + "/test_files/pylib"
+        with patch('capa.safe_exec.pool.codejail_safe_exec') as mock_safe_exec:
+            safe_exec("import constant; a = constant.THE_CONST", {}, python_path=[pylib])
+        self.assertTrue(mock_safe_exec.called)
+
+    @patch('capa.safe_exec.pool.dog_stats_api')
+    def test_timing_metrics(self, mock_stats):
+        safe_exec("a = 17", {})
+        metrics = [call[0][0] for call in mock_stats.histogram.call_args_list]
+        self.assertEqual(metrics, ['capa.safe_exec.pool.wait_time', 'capa.safe_exec.pool.exec_time'])
+
+
+class TestPoolConfiguration(unittest.TestCase):
+    def test_no_pool_by_default(self):
+        self.assertIsNone(pool.get_pool([]))
+
+    def test_unknown_option(self):
+        with self.assertRaises(ValueError):
+            pool.configure(workers=2)
@@ -0,0 +1,130 @@
+"""
+Benchmark of rendering and checking typical capa problems, built with the
+factories in response_xml_factory, with and without reusing the compiled
+(parsed and preprocessed) form of each problem.
+
+Each sample creates a new LoncapaProblem, as CapaModule does for every
+student, with a different seed each time.
+
+Run with
+  python -m capa.tests.benchmark_problems
+"""
+import textwrap
+import time
+
+from capa import capa_problem
+from capa.tests import test_capa_system, new_loncapa_problem
+from capa.tests.response_xml_factory import (
+    ChoiceResponseXMLFactory,
+    CustomResponseXMLFactory,
+    FormulaResponseXMLFactory,
+    MultipleChoiceResponseXMLFactory,
+    NumericalResponseXMLFactory,
+    OptionResponseXMLFactory,
+    StringResponseXMLFactory,
+)
+
+NUM_PROBLEMS = 200
+REPEAT = 3
+
+CUSTOM_SCRIPT = textwrap.dedent("""
+    def check_func(expect, answer_given):
+        return {'ok': answer_given == expect, 'msg': 'Message text'}
+""")
+
+# (name, problem XML, answers to check)
+PROBLEMS = [
+    (
+        'option',
+        OptionResponseXMLFactory().build_xml(
+            question_text='The correct answer is Correct',
+            num_inputs=2,
+            options=['Correct', 'Incorrect'],
+            correct_option='Correct',
+        ),
+        {'1_2_1': 'Correct', '1_2_2': 'Incorrect'},
+    ),
+    (
+        'multiple choice',
+        MultipleChoiceResponseXMLFactory().build_xml(choices=[False, True, False, False]),
+        {'1_2_1': 'choice_1'},
+    ),
+    (
+        'checkbox',
+        ChoiceResponseXMLFactory().build_xml(choice_type='checkbox', choices=[True, False, True]),
+        {'1_2_1': ['choice_0', 'choice_2']},
+    ),
+    (
+        'string',
+        StringResponseXMLFactory().build_xml(answer='Michigan', case_sensitive=False),
+        {'1_2_1': 'michigan'},
+    ),
+    (
+        'numerical',
+        NumericalResponseXMLFactory().build_xml(answer=4, tolerance=0.1),
+        {'1_2_1': '4.05'},
+    ),
+    (
+        'formula',
+        FormulaResponseXMLFactory().build_xml(
+            sample_dict={'x': (-10, 10)}, num_samples=10, tolerance=0.01, answer='x^2'
+        ),
+        {'1_2_1': 'x*x'},
+    ),
+    (
+        'custom',
+        CustomResponseXMLFactory().build_xml(script=CUSTOM_SCRIPT, cfn='check_func', expect='42'),
+        {'1_2_1': '42'},
+    ),
+]
+
+
+def render(xml, answers, seed):  # pylint: disable=unused-argument
+    """
+    Create the problem and render it
+    """
+    new_loncapa_problem(xml, capa_system=test_capa_system(), seed=seed).get_html()
+
+
+def check(xml, answers, seed):
+    """
+    Create the problem, grade the answers and render the result
+    """
+    problem = new_loncapa_problem(xml, capa_system=test_capa_system(), seed=seed)
+    problem.grade_answers(answers)
+    problem.get_html()
+
+
+def run(action, xml, answers, reuse):
+    """
+    Return the fewest seconds taken to `action` the problem NUM_PROBLEMS times
+    """
+    times = []
+    for _ in xrange(REPEAT):
+        capa_problem.compiled_problems.clear()
+        start = time.time()
+        for seed in xrange(NUM_PROBLEMS):
+            if not reuse:
+                capa_problem.compiled_problems.clear()
+            action(xml, answers, seed)
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main():
+    """
+    Time each kind of problem and print the results
+    """
+    print '{} problems, best of {} runs, ms per problem'.format(NUM_PROBLEMS, REPEAT)
+    print '{:<16} {:>10} {:>10} {:>10} {:>10}'.format('', 'render', 'reusing', 'check', 'reusing')
+    for name, xml, answers in PROBLEMS:
+        results = [
+            run(action, xml, answers, reuse) * 1000 / NUM_PROBLEMS
+            for action in (render, check)
+            for reuse in (False, True)
+        ]
+        print '{:<16} {:10.2f} {:10.2f} {:10.2f} {:10.2f}'.format(name, *results)
+
+
+if __name__ == '__main__':
+    main()
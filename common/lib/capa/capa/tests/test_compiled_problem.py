@@ -0,0 +1,117 @@
+"""Tests of reusing the seed-independent parse of capa problems."""
+import os
+import textwrap
+import unittest
+
+import mock
+from lxml import etree
+
+from capa import capa_problem
+from capa.capa_problem import CompiledProblemCache, LoncapaProblem
+from . import test_capa_system, new_loncapa_problem
+from .response_xml_factory import OptionResponseXMLFactory
+
+
+class CompiledProblemTest(unittest.TestCase):
+    """Test that LoncapaProblems share the parse of their XML."""
+
+    def setUp(self):
+        super(CompiledProblemTest, self).setUp()
+        self.capa_system = test_capa_system()
+        capa_problem.compiled_problems.clear()
+        self.xml_str = OptionResponseXMLFactory().build_xml(
+            question_text='The correct answer is Correct',
+            num_inputs=2,
+            options=['Correct', 'Incorrect'],
+            correct_option='Correct'
+        )
+
+    def count_compiles(self, *xml_strs):
+        """Create a problem of each of `xml_strs`, and return the number of times the problem was compiled"""
+        with mock.patch.object(
+            LoncapaProblem, '_compile_problem', autospec=True, side_effect=LoncapaProblem._compile_problem
+        ) as mock_compile:
+            for xml_str in xml_strs:
+                new_loncapa_problem(xml_str, capa_system=self.capa_system)
+        return mock_compile.call_count
+
+    def test_parsed_once(self):
+        self.assertEqual(self.count_compiles(self.xml_str, self.xml_str, self.xml_str), 1)
+
+    def test_changed_problem_parsed(self):
+        self.assertEqual(self.count_compiles(self.xml_str, self.xml_str.replace('Correct', 'Right')), 2)
+
+    def test_problems_independent(self):
+        first = new_loncapa_problem(self.xml_str, capa_system=self.capa_system)
+        second = new_loncapa_problem(self.xml_str, capa_system=self.capa_system)
+        self.assertIsNot(first.tree, second.tree)
+        self.assertEqual(etree.tostring(first.tree), etree.tostring(second.tree))
+        self.assertEqual(
+            sorted(responder.answer_ids for responder in first.responders.values()),
+            sorted(responder.answer_ids for responder in second.responders.values()),
+        )
+
+        first.grade_answers({'1_2_1': 'Correct', '1_2_2': 'Incorrect'})
+        self.assertEqual(first.correct_map.get_correctness('1_2_1'), 'correct')
+        self.assertEqual(second.correct_map.get_dict(), {})
+
+    def test_seed_dependent_work_repeated(self):
+        xml_str = textwrap.dedent("""
+            <problem>
+            <multiplechoiceresponse>
+              <choicegroup type="MultipleChoice" shuffle="true">
+                <choice correct="false">Apple</choice>
+                <choice correct="false">Banana</choice>
+                <choice correct="false">Chocolate</choice>
+                <choice correct ="true">Donut</choice>
+              </choicegroup>
+            </multiplechoiceresponse>
+            </problem>
+        """)
+        first = new_loncapa_problem(xml_str, seed=0)
+        # shuffling 4 things with seed of 0 yields: B A C D
+        self.assertEqual(first.responders.values()[0].unmask_order(), ['choice_1', 'choice_0', 'choice_2', 'choice_3'])
+        second = new_loncapa_problem(xml_str, seed=1)
+        third = new_loncapa_problem(xml_str, seed=0)
+        self.assertNotEqual(second.get_html(), first.get_html())
+        self.assertEqual(third.get_html(), first.get_html())
+
+    def test_changed_include_parsed(self):
+        include_path = self.capa_system.filestore.getsyspath('test_compiled_include.xml')
+        self.addCleanup(os.remove, include_path)
+        xml_str = '<problem><include file="test_compiled_include.xml"/></problem>'
+
+        with open(include_path, 'w') as include_file:
+            include_file.write('<test>First</test>')
+        self.assertEqual(self.count_compiles(xml_str, xml_str), 1)
+
+        with open(include_path, 'w') as include_file:
+            include_file.write('<test>Second</test>')
+        self.assertEqual(self.count_compiles(xml_str), 1)
+        problem = new_loncapa_problem(xml_str, capa_system=self.capa_system)
+        self.assertEqual(problem.tree.find('test').text, 'Second')
+
+    def test_missing_include_not_cached(self):
+        # the test system is in DEBUG mode, so the missing include is skipped
+        xml_str = '<problem><include file="no_such_file.xml"/></problem>'
+        self.assertEqual(self.count_compiles(xml_str, xml_str), 2)
+
+
+class CompiledProblemCacheTest(unittest.TestCase):
+    """Test the CompiledProblemCache LRU."""
+
+    def test_least_recently_used_dropped(self):
+        cache = CompiledProblemCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_clear(self):
+        cache = CompiledProblemCache(2)
+        cache.set('a', 1)
+        cache.clear()
+        self.assertIsNone(cache.get('a'))
@@ -2,9 +2,13 @@ from __future__ import absolute_import
 from importlib import import_module
 
 from django.conf import settings
+from django.dispatch import Signal
 
 _CONTENTSTORE = {}
 
+# sent with the content id of an asset whenever it is saved or deleted, so that caches of it can be dropped
+asset_changed = Signal(providing_args=['content_id'])
+
 
 def load_function(path):
     """
@@ -8,6 +8,7 @@ from xmodule.contentstore.content import XASSET_LOCATION_TAG
 import logging
 
 from .content import StaticContent, ContentStore, StaticContentStream
+from .django import asset_changed
 from xmodule.exceptions import NotFoundError
 from fs.osfs import OSFS
 import os
@@ -67,6 +68,8 @@ class MongoContentStore(ContentStore):
         if self.fs.exists({"_id": content_id}):
             self.fs.delete(content_id)
             assert not self.fs.exists({"_id": content_id})
+        # save deletes before writing; so, this covers changes as well
+        asset_changed.send(sender=self.__class__, content_id=content_id)
 
     def find(self, location, throw_on_not_found=True, as_stream=False):
         content_id = self.asset_db_key(location)
@@ -88,7 +91,8 @@ class MongoContentStore(ContentStore):
                     location, fp.displayname, fp.content_type, fp, last_modified_at=fp.uploadDate,
                     thumbnail_location=thumbnail_location,
                     import_path=getattr(fp, 'import_path', None),
-                    length=fp.length, locked=getattr(fp, 'locked', False)
+                    length=fp.length, locked=getattr(fp, 'locked', False),
+                    content_digest=getattr(fp, 'md5', None),
                 )
             else:
                 with self.fs.get(content_id) as fp:
@@ -99,7 +103,8 @@ class MongoContentStore(ContentStore):
                         location, fp.displayname, fp.content_type, fp.read(), last_modified_at=fp.uploadDate,
                         thumbnail_location=thumbnail_location,
                         import_path=getattr(fp, 'import_path', None),
-                        length=fp.length, locked=getattr(fp, 'locked', False)
+                        length=fp.length, locked=getattr(fp, 'locked', False),
+                        content_digest=getattr(fp, 'md5', None),
                     )
         except NoFile:
             if throw_on_not_found:
@@ -258,6 +258,17 @@ class ModuleStoreWrite(ModuleStoreRead):
         """
         pass
 
+    @abstractmethod
+    def delete_orphans(self, course_key, user_id=None, **kwargs):
+        """
+        Delete all of the orphans in the course (see get_orphans) in a bounded number of queries, rather
+        than one or more per orphan. Pass the user's unique id which the persistent store should save
+        with the update if it has that ability.
+
+        Returns the deleted orphans in the form get_orphans returns them.
+        """
+        pass
+
     @abstractmethod
     def create_course(self, org, offering, user_id=None, fields=None, **kwargs):
         """
@@ -420,6 +431,36 @@ class ModuleStoreWriteBase(ModuleStoreReadBase, ModuleStoreWrite):
         """
         raise NotImplementedError
 
+    def delete_orphans(self, course_key, user_id=None, **kwargs):
+        """
+        Delete all of the orphans in the course (see get_orphans) in a bounded number of queries, rather
+        than one or more per orphan. Pass the user's unique id which the persistent store should save
+        with the update if it has that ability.
+
+        Returns the deleted orphans in the form get_orphans returns them.
+        """
+        raise NotImplementedError
+
+
+def find_orphans(blocks, root_id):
+    """
+    Return the set of the ids of the blocks which no block lists as a child, except for the root and
+    blocks of categories which are usually detached. Takes time linear in the size of the course.
+
+    :param blocks: an iterable of (block_id, category, children) for every block in the course. It's
+        only iterated once; so, it can stream the blocks from the database.
+    :param root_id: the id of the course's root block
+    """
+    detached_categories = set(name for name, __ in XBlock.load_tagged_classes("detached"))
+    candidates = set()
+    children_seen = set()
+    for block_id, category, children in blocks:
+        if category not in detached_categories:
+            candidates.add(block_id)
+        children_seen.update(children)
+    candidates.discard(root_id)
+    return candidates - children_seen
+
 
 def only_xmodules(identifier, entry_points):
     """Only use entry_points that are supplied by the xmodule package"""
@@ -62,8 +62,15 @@ def create_modulestore_instance(engine, doc_store_config, options, i18n_service=
     except InvalidCacheBackendError:
         metadata_inheritance_cache = get_cache('default')
 
+    # split mongo structures are only shared through memcache if a cache is configured for them
+    try:
+        structure_cache = get_cache('split_structures')
+    except InvalidCacheBackendError:
+        structure_cache = None
+
     return class_(
         metadata_inheritance_cache_subsystem=metadata_inheritance_cache,
+        structure_cache_subsystem=structure_cache,
         request_cache=request_cache,
         xblock_mixins=getattr(settings, 'XBLOCK_MIXINS', ()),
         xblock_select=getattr(settings, 'XBLOCK_SELECT_FUNCTION', None),
@@ -218,6 +218,14 @@ class MixedModuleStore(ModuleStoreWriteBase):
         store = self._get_modulestore_for_courseid(course_key)
         return store.get_orphans(course_key)
 
+    def delete_orphans(self, course_key, user_id=None, **kwargs):
+        """
+        Delete all of the orphans in the course (see get_orphans) in a bounded number of queries.
+        Returns the deleted orphans in the form get_orphans returns them.
+        """
+        store = self._get_modulestore_for_courseid(course_key)
+        return store.delete_orphans(course_key, user_id, **kwargs)
+
     def get_errored_courses(self):
         """
         Return a dictionary of course_dir -> [(msg, exception_str)], for each
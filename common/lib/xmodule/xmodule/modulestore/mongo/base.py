@@ -15,8 +15,10 @@ structure:
 import pymongo
 import sys
 import logging
-import copy
 import re
+import time
+
+from collections import defaultdict
 
 from bson.son import SON
 from fs.osfs import OSFS
@@ -31,7 +33,7 @@ from xblock.runtime import KvsFieldData
 from xblock.exceptions import InvalidScopeError
 from xblock.fields import Scope, ScopeIds, Reference, ReferenceList, ReferenceValueDict
 
-from xmodule.modulestore import ModuleStoreWriteBase, Location, MONGO_MODULESTORE_TYPE
+from xmodule.modulestore import ModuleStoreWriteBase, Location, MONGO_MODULESTORE_TYPE, find_orphans
 from xmodule.modulestore.exceptions import ItemNotFoundError, InvalidLocationError
 from xmodule.modulestore.inheritance import own_metadata, InheritanceMixin, inherit_metadata, InheritanceKeyValueStore
 from xmodule.tabs import StaticTab, CourseTabList
@@ -108,6 +110,132 @@ class MongoKeyValueStore(InheritanceKeyValueStore):
             return False
 
 
+class InheritanceTree(object):
+    """
+    A course's metadata inheritance tree in a compact form for caching: the inheritable metadata
+    explicitly set on each container plus a pointer from each block to its container. The metadata
+    a block inherits is resolved on demand by walking up the parent pointers, which also serve as
+    the course's index of parents for get_parent_locations.
+    """
+    def __init__(self, root=None):
+        """
+        :param root: the url of the course block
+        """
+        self.root = root
+        # block url -> url of the container which lists it as a child
+        self.parents = {}
+        # block url -> urls of any other containers which list it as a child (rare)
+        self.other_parents = {}
+        # container url -> the inheritable metadata set on it (containers w/o any are omitted)
+        self.overrides = {}
+        # the course's inheritance version (see MongoModuleStore._inheritance_version_key) that
+        # the tree is up to date with
+        self.version = None
+        # resolved inherited metadata per url; not persisted
+        self._resolved = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_resolved']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('other_parents', {})
+        self.__dict__.setdefault('version', None)
+        self._resolved = {}
+
+    def add_parent(self, child, parent):
+        """
+        Record that the container at url parent lists the block at url child as a child
+        """
+        if self.parents.setdefault(child, parent) != parent:
+            self.other_parents.setdefault(child, set()).add(parent)
+
+    def remove_parent(self, child, parent):
+        """
+        Record that the container at url parent no longer lists the block at url child
+        """
+        others = self.other_parents.get(child, set())
+        if self.parents.get(child) == parent:
+            if others:
+                self.parents[child] = others.pop()
+            else:
+                del self.parents[child]
+        else:
+            others.discard(parent)
+        if not others:
+            self.other_parents.pop(child, None)
+
+    def get_parents(self, url):
+        """
+        Return the urls of the containers which list the block at url as a child
+        """
+        if url not in self.parents:
+            return []
+        return [self.parents[url]] + sorted(self.other_parents.get(url, ()))
+
+    def get(self, url, default=None):
+        """
+        Return the metadata which the block at url inherits, or default if the block isn't
+        reachable from the course root.
+        """
+        if url not in self.parents:
+            return default
+        resolved = self._resolve(url)
+        return default if resolved is None else resolved
+
+    def _resolve(self, url):
+        """
+        Return the metadata which the block at url passes down to its children merged w/ that which
+        it inherits, or None if the block isn't reachable from the root.
+        """
+        if url in self._resolved:
+            return self._resolved[url]
+        if url == self.root:
+            resolved = self.overrides.get(url, {})
+        elif url not in self.parents:
+            resolved = None
+        else:
+            inherited = self._resolve(self.parents[url])
+            if inherited is None or url not in self.overrides:
+                resolved = inherited
+            else:
+                resolved = dict(inherited)
+                resolved.update(self.overrides[url])
+        self._resolved[url] = resolved
+        return resolved
+
+    def update_container(self, url, overrides, children):
+        """
+        Record the inheritable metadata and children of the container at url.
+        Returns whether the tree changed.
+        """
+        changed = False
+        if self.overrides.get(url, {}) != overrides:
+            if overrides:
+                self.overrides[url] = overrides
+            else:
+                self.overrides.pop(url, None)
+            changed = True
+
+        children = set(children)
+        previous_children = set(child for child, parent in self.parents.iteritems() if parent == url)
+        previous_children.update(child for child, others in self.other_parents.iteritems() if url in others)
+        if children != previous_children:
+            for child in previous_children - children:
+                self.remove_parent(child, url)
+            for child in children - previous_children:
+                self.add_parent(child, url)
+            changed = True
+
+        if changed:
+            # only the container's subtree can have changed, but resolving is cheap enough
+            # that it's not worth tracking which entries that covers
+            self._resolved = {}
+        return changed
+
+
 class CachingDescriptorSystem(MakoDescriptorSystem):
     """
     A system that has a cache of module json that it will use to load modules
@@ -323,86 +451,86 @@ class MongoModuleStore(ModuleStoreWriteBase):
 
         self.ignore_write_events_on_courses = set()
 
+    @staticmethod
+    def _block_types_with_children():
+        """
+        The categories of the xblock classes which can have children
+        """
+        return set(
+            name for name, class_ in XBlock.load_classes() if getattr(class_, 'has_children', False)
+        )
+
+    @staticmethod
+    def _inheritance_record_filter():
+        """
+        The fields needed to compute the inheritance tree
+        """
+        # we just want the Location, children, and inheritable metadata
+        record_filter = {'_id': 1, 'definition.children': 1}
+
+        # just get the inheritable metadata since that is all we need for the computation
+        # this minimizes both data pushed over the wire
+        for field_name in InheritanceMixin.fields:
+            record_filter['metadata.{0}'.format(field_name)] = 1
+        return record_filter
+
     def _compute_metadata_inheritance_tree(self, course_id):
         '''
         TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
         '''
         # get all collections in the course, this query should not return any leaf nodes
         # note this is a bit ugly as when we add new categories of containers, we have to add it here
-
-        block_types_with_children = set(
-            name for name, class_ in XBlock.load_classes() if getattr(class_, 'has_children', False)
-        )
         query = SON([
             ('_id.tag', 'i4x'),
             ('_id.org', course_id.org),
             ('_id.course', course_id.course),
-            ('_id.category', {'$in': list(block_types_with_children)})
+            ('_id.category', {'$in': list(self._block_types_with_children())})
         ])
-        # we just want the Location, children, and inheritable metadata
-        record_filter = {'_id': 1, 'definition.children': 1}
-
-        # just get the inheritable metadata since that is all we need for the computation
-        # this minimizes both data pushed over the wire
-        for field_name in InheritanceMixin.fields:
-            record_filter['metadata.{0}'.format(field_name)] = 1
-
         # call out to the DB
-        resultset = self.collection.find(query, record_filter)
+        resultset = self.collection.find(query, self._inheritance_record_filter())
 
-        # it's ok to keep these as urls b/c the overall cache is indexed by course_key and this
-        # is a dictionary relative to that course
-        results_by_url = {}
-        root = None
-
-        # now go through the results and order them by the location url
+        tree = InheritanceTree()
+        # the draft and published versions of a container contribute their children to the same url
+        children_by_url = {}
         for result in resultset:
             # manually pick it apart b/c the db has tag and we want revision = None regardless
             location = Location._from_deprecated_son(result['_id'], course_id.run).replace(revision=None)
 
             location_url = location.to_deprecated_string()
-            if location_url in results_by_url:
-                # found either draft or live to complement the other revision
-                existing_children = results_by_url[location_url].get('definition', {}).get('children', [])
-                additional_children = result.get('definition', {}).get('children', [])
-                total_children = existing_children + additional_children
-                results_by_url[location_url].setdefault('definition', {})['children'] = total_children
-            results_by_url[location_url] = result
+            # a container's draft, if it has one, is its most recent version
+            if result['_id'].get('revision') is not None or location_url not in children_by_url:
+                if result.get('metadata'):
+                    tree.overrides[location_url] = result['metadata']
+                else:
+                    tree.overrides.pop(location_url, None)
+            children_by_url.setdefault(location_url, set()).update(
+                result.get('definition', {}).get('children', [])
+            )
             if location.category == 'course':
-                root = location_url
-
-        # now traverse the tree and compute down the inherited metadata
-        metadata_to_inherit = {}
+                tree.root = location_url
 
-        def _compute_inherited_metadata(url):
-            """
-            Helper method for computing inherited metadata for a specific location url
-            """
-            my_metadata = results_by_url[url].get('metadata', {})
-
-            # go through all the children and recurse, but only if we have
-            # in the result set. Remember results will not contain leaf nodes
-            for child in results_by_url[url].get('definition', {}).get('children', []):
-                if child in results_by_url:
-                    new_child_metadata = copy.deepcopy(my_metadata)
-                    new_child_metadata.update(results_by_url[child].get('metadata', {}))
-                    results_by_url[child]['metadata'] = new_child_metadata
-                    metadata_to_inherit[child] = new_child_metadata
-                    _compute_inherited_metadata(child)
-                else:
-                    # this is likely a leaf node, so let's record what metadata we need to inherit
-                    metadata_to_inherit[child] = my_metadata
+        for location_url, children in children_by_url.iteritems():
+            for child in children:
+                tree.add_parent(child, location_url)
 
-        if root is not None:
-            _compute_inherited_metadata(root)
+        return tree
 
-        return metadata_to_inherit
+    @staticmethod
+    def _inheritance_version_key(course_id):
+        """
+        The cache key of the course's inheritance version, which is incremented whenever a
+        container in the course changes. A cached tree is only used if it's up to date with it.
+        """
+        return u'inheritance_version:{}'.format(course_id)
 
     def _get_cached_metadata_inheritance_tree(self, course_id, force_refresh=False):
         '''
         TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
         '''
-        tree = {}
+        tree = None
+        version = None
+        cache = self.metadata_inheritance_cache_subsystem
+        version_key = self._inheritance_version_key(course_id)
 
         if not force_refresh:
             # see if we are first in the request cache (if present)
@@ -410,22 +538,39 @@ class MongoModuleStore(ModuleStoreWriteBase):
                 return self.request_cache.data['metadata_inheritance'][course_id]
 
             # then look in any caching subsystem (e.g. memcached)
-            if self.metadata_inheritance_cache_subsystem is not None:
-                tree = self.metadata_inheritance_cache_subsystem.get(course_id, {})
+            if cache is not None:
+                cached = cache.get_many([course_id, version_key])
+                tree = cached.get(course_id)
+                version = cached.get(version_key)
+                if not isinstance(tree, InheritanceTree) or tree.version != version:
+                    # cached by an older version of this code, or missing a change to the course
+                    tree = None
             else:
                 logging.warning('Running MongoModuleStore without a metadata_inheritance_cache_subsystem. This is OK in localdev and testing environment. Not OK in production.')
+        elif cache is not None:
+            version = cache.get(version_key)
 
-        if not tree:
-            # if not in subsystem, or we are on force refresh, then we have to compute
+        if tree is None:
+            # if not in subsystem, or we are on force refresh, then we have to compute. The
+            # version was read first; so, the tree has at least the changes it counts.
             tree = self._compute_metadata_inheritance_tree(course_id)
+            tree.version = version
 
             # now write out computed tree to caching subsystem (e.g. memcached), if available
-            if self.metadata_inheritance_cache_subsystem is not None:
-                self.metadata_inheritance_cache_subsystem.set(course_id, tree)
+            if cache is not None:
+                cache.set(course_id, tree)
 
         # now populate a request_cache, if available. NOTE, we are outside of the
         # scope of the above if: statement so that after a memcache hit, it'll get
         # put into the request_cache
+        self._set_request_cached_metadata_inheritance_tree(course_id, tree)
+
+        return tree
+
+    def _set_request_cached_metadata_inheritance_tree(self, course_id, tree):
+        """
+        Put the tree into the request cache, if available
+        """
         if self.request_cache is not None:
             # we can't assume the 'metadatat_inheritance' part of the request cache dict has been
             # defined
@@ -433,8 +578,6 @@ class MongoModuleStore(ModuleStoreWriteBase):
                 self.request_cache.data['metadata_inheritance'] = {}
             self.request_cache.data['metadata_inheritance'][course_id] = tree
 
-        return tree
-
     def refresh_cached_metadata_inheritance_tree(self, course_id, runtime=None):
         """
         Refresh the cached metadata inheritance tree for the org/course combination
@@ -448,6 +591,61 @@ class MongoModuleStore(ModuleStoreWriteBase):
             if runtime:
                 runtime.cached_metadata = cached_metadata
 
+    def _update_cached_metadata_inheritance_tree(self, location, runtime=None):
+        """
+        Update the cached metadata inheritance tree after the container at location was saved or
+        deleted. Unlike a refresh, this only re-reads the container's own draft and published
+        revisions.
+
+        Other processes may be changing the course too; so, the change is only made to the cached
+        tree if no other change was counted in the course's inheritance version since the tree
+        was built. Otherwise, the tree is refreshed.
+
+        If given a runtime, it replaces the cached_metadata in that runtime.
+        """
+        course_id = location.course_key
+        if course_id in self.ignore_write_events_on_courses:
+            return
+        cache = self.metadata_inheritance_cache_subsystem
+        if cache is None:
+            # there's no shared tree to keep up to date
+            self.refresh_cached_metadata_inheritance_tree(course_id, runtime)
+            return
+
+        version_key = self._inheritance_version_key(course_id)
+        # a counter which restarts after being evicted starts past any version a tree may still have
+        cache.add(version_key, int(time.time() * 1000000))
+        version = cache.incr(version_key)
+        # never the request cache's tree, which may be missing changes made since it was read
+        tree = cache.get(course_id)
+        if not isinstance(tree, InheritanceTree) or tree.version != version - 1:
+            self.refresh_cached_metadata_inheritance_tree(course_id, runtime)
+            return
+
+        query = SON([
+            ('_id.tag', 'i4x'),
+            ('_id.org', location.org),
+            ('_id.course', location.course),
+            ('_id.category', location.category),
+            ('_id.name', location.name),
+        ])
+        # as in _compute_metadata_inheritance_tree, the draft's metadata wins, and the
+        # draft and published revisions contribute their children to the same url
+        overrides = {}
+        children = set()
+        for result in sorted(
+            self.collection.find(query, self._inheritance_record_filter()),
+            key=lambda result: result['_id'].get('revision') is not None
+        ):
+            overrides = result.get('metadata', {})
+            children.update(result.get('definition', {}).get('children', []))
+        tree.update_container(location.replace(revision=None).to_deprecated_string(), overrides, children)
+        tree.version = version
+        cache.set(course_id, tree)
+        self._set_request_cached_metadata_inheritance_tree(course_id, tree)
+        if runtime:
+            runtime.cached_metadata = tree
+
     def _clean_item_data(self, item):
         """
         Renames the '_id' field in item to 'location'
@@ -689,6 +887,16 @@ class MongoModuleStore(ModuleStoreWriteBase):
                 This modulestore does not allow searching dates by comparison or edited_by, previous_version,
                 update_version info.
         """
+        items = self._find_items(course_id, settings, content, revision, **kwargs)
+        modules = self._load_items(course_id, items)
+        return modules
+
+    def _find_items(self, course_id, settings=None, content=None, revision=None, **kwargs):
+        """
+        Returns the stored data of the items get_items would return, in one query.
+
+        `revision` may also be a query on the revision, such as {'$in': ['draft', None]}.
+        """
         query = self._course_key_to_son(course_id)
         query['_id.revision'] = revision
         for field in ['category', 'name']:
@@ -707,9 +915,28 @@ class MongoModuleStore(ModuleStoreWriteBase):
             query,
             sort=[('_id.revision', pymongo.ASCENDING)],
         )
+        return list(items)
 
-        modules = self._load_items(course_id, list(items))
-        return modules
+    def get_existing_locations(self, usage_keys):
+        """
+        Returns the set of those of `usage_keys` which exist in this ModuleStore,
+        looking them all up in one query.
+        """
+        keys_by_id = dict(
+            ((key.org, key.course, key.category, key.name, key.revision), key)
+            for key in usage_keys
+        )
+        if not keys_by_id:
+            return set()
+        found = self.collection.find(
+            {'_id': {'$in': [key.to_deprecated_son() for key in keys_by_id.itervalues()]}},
+            fields={'_id': True},
+        )
+        return set(
+            keys_by_id[(item['_id']['org'], item['_id']['course'], item['_id']['category'],
+                        item['_id']['name'], item['_id']['revision'])]
+            for item in found
+        )
 
     def create_course(self, org, offering, user_id=None, fields=None, **kwargs):
         """
@@ -770,6 +997,8 @@ class MongoModuleStore(ModuleStoreWriteBase):
         """
         course_query = self._course_key_to_son(course_key)
         self.collection.remove(course_query, multi=True)
+        # don't leave the deleted course's tree (and so its parents) cached for a course recreated with the same id
+        self.refresh_cached_metadata_inheritance_tree(course_key)
 
     def create_xmodule(self, location, definition_data=None, metadata=None, system=None, fields={}):
         """
@@ -915,8 +1144,9 @@ class MongoModuleStore(ModuleStoreWriteBase):
                     static_tab['name'] = xblock.display_name
                     self.update_item(course, user_id)
 
-            # recompute (and update) the metadata inheritance tree which is cached
-            self.refresh_cached_metadata_inheritance_tree(xblock.scope_ids.usage_id.course_key, xblock.runtime)
+            # update the metadata inheritance tree which is cached. Only containers pass anything down.
+            if xblock.has_children:
+                self._update_cached_metadata_inheritance_tree(xblock.scope_ids.usage_id, xblock.runtime)
             # fire signal that we've written to DB
         except ItemNotFoundError:
             if not allow_not_found:
@@ -965,18 +1195,42 @@ class MongoModuleStore(ModuleStoreWriteBase):
         # Must include this to avoid the django debug toolbar (which defines the deprecated "safe=False")
         # from overriding our default value set in the init method.
         self.collection.remove({'_id': location.to_deprecated_son()}, safe=self.collection.safe)
-        # recompute (and update) the metadata inheritance tree which is cached
-        self.refresh_cached_metadata_inheritance_tree(location.course_key)
+        # update the metadata inheritance tree which is cached. Leaves aren't in it except as
+        # children of their container, which deleting them doesn't change.
+        if location.category in self._block_types_with_children():
+            # the container's other revision (draft or published), if any, now defines what it passes down
+            self._update_cached_metadata_inheritance_tree(location)
 
     def get_parent_locations(self, location):
         '''Find all locations that are the parents of this location in this
         course.  Needed for path_to_location().
+
+        The parents are looked up in the cached metadata inheritance tree, which records the
+        children of every container in the course. If the tree has none for a block other than
+        the course, it may be missing a recent change; so, they're queried for.
         '''
-        query = self._course_key_to_son(location.course_key)
+        course_key = location.course_key
+        if course_key in self.ignore_write_events_on_courses:
+            # the cached tree isn't kept up to date while the course is being imported
+            return self._query_parent_locations(location)
+
+        tree = self._get_cached_metadata_inheritance_tree(course_key)
+        parent_urls = tree.get_parents(location.replace(revision=None).to_deprecated_string())
+        if not parent_urls and location.category != 'course':
+            return self._query_parent_locations(location)
+        return [course_key.make_usage_key_from_deprecated_string(parent_url) for parent_url in parent_urls]
+
+    def _query_parent_locations(self, location):
+        """
+        Find the parents of location by querying for the containers which list it as a child,
+        rather than from the cached metadata inheritance tree.
+        """
+        course_key = location.course_key
+        query = self._course_key_to_son(course_key)
         query['definition.children'] = location.to_deprecated_string()
         items = self.collection.find(query, {'_id': True})
         return [
-            location.course_key.make_usage_key(i['_id']['category'], i['_id']['name'])
+            course_key.make_usage_key(i['_id']['category'], i['_id']['name'])
             for i in items
         ]
 
@@ -994,21 +1248,42 @@ class MongoModuleStore(ModuleStoreWriteBase):
         """
         Return an array all of the locations (deprecated string format) for orphans in the course.
         """
-        detached_categories = [name for name, __ in XBlock.load_tagged_classes("detached")]
-        query = self._course_key_to_son(course_key)
-        query['_id.category'] = {'$nin': detached_categories}
-        all_items = self.collection.find(query)
-        all_reachable = set()
-        item_locs = set()
-        for item in all_items:
-            if item['_id']['category'] != 'course':
+        def blocks():
+            """
+            Stream just the id and children of every block in the course
+            """
+            items = self.collection.find(
+                self._course_key_to_son(course_key), {'_id': True, 'definition.children': True}
+            )
+            for item in items:
                 # It would be nice to change this method to return UsageKeys instead of the deprecated string.
-                item_locs.add(
-                    Location._from_deprecated_son(item['_id'], course_key.run).replace(revision=None).to_deprecated_string()
-                )
-            all_reachable = all_reachable.union(item.get('definition', {}).get('children', []))
-        item_locs -= all_reachable
-        return list(item_locs)
+                location = Location._from_deprecated_son(item['_id'], course_key.run).replace(revision=None)
+                yield location.to_deprecated_string(), location.category, item.get('definition', {}).get('children', [])
+
+        root_id = course_key.make_usage_key('course', course_key.run).to_deprecated_string()
+        return list(find_orphans(blocks(), root_id))
+
+    def delete_orphans(self, course_key, user_id=None, **kwargs):
+        """
+        Delete every version (draft and published) of each of the course's orphans, in one query per
+        category of orphan. Returns the deleted orphans as locations in the deprecated string format.
+        """
+        orphans = self.get_orphans(course_key)
+        names_by_category = defaultdict(list)
+        for orphan in orphans:
+            location = course_key.make_usage_key_from_deprecated_string(orphan)
+            names_by_category[location.category].append(location.name)
+
+        for category, names in names_by_category.iteritems():
+            query = self._course_key_to_son(course_key)
+            query['_id.category'] = category
+            query['_id.name'] = {'$in': names}
+            self.collection.remove(query, multi=True)
+
+        # orphaned containers no longer pass anything down to (or parent) their former children
+        if orphans:
+            self.refresh_cached_metadata_inheritance_tree(course_key)
+        return orphans
 
     def get_courses_for_wiki(self, wiki_slug):
         """
@@ -45,6 +45,13 @@ def wrap_draft(item):
     return item
 
 
+def _id_without_revision(item):
+    """
+    Returns a hashable identifier of the stored `item`, the same for its draft and published versions
+    """
+    return tuple(item['_id'][key] for key in ('tag', 'org', 'course', 'category', 'name'))
+
+
 class DraftModuleStore(MongoModuleStore):
     """
     This mixin modifies a modulestore to give it draft semantics.
@@ -75,11 +82,26 @@ class DraftModuleStore(MongoModuleStore):
             in the request. The depth is counted in the number of calls to
             get_children() to cache. None indicates to cache all descendents
         """
+        item = self._find_one_preferring_draft(usage_key)
+        return wrap_draft(self._load_items(usage_key.course_key, [item], depth)[0])
 
-        try:
-            return wrap_draft(super(DraftModuleStore, self).get_item(as_draft(usage_key), depth=depth))
-        except ItemNotFoundError:
-            return wrap_draft(super(DraftModuleStore, self).get_item(usage_key, depth=depth))
+    def _find_one_preferring_draft(self, usage_key):
+        """
+        Returns the stored data of the draft of `usage_key` if there is one, or
+        else of its published version, fetching both in one query.
+
+        If there is neither, raises ItemNotFoundError.
+        """
+        items = list(self.collection.find({'_id': {'$in': [
+            as_draft(usage_key).to_deprecated_son(),
+            as_published(usage_key).to_deprecated_son(),
+        ]}}))
+        if not items:
+            raise ItemNotFoundError(usage_key)
+        for item in items:
+            if item['_id']['revision'] == DRAFT:
+                return item
+        return items[0]
 
     def create_xmodule(self, location, definition_data=None, metadata=None, system=None, fields={}):
         """
@@ -117,21 +139,22 @@ class DraftModuleStore(MongoModuleStore):
                 Substring matching pass a regex object.
                 ``name`` is another commonly provided key (Location based stores)
         """
-        draft_items = [
-            wrap_draft(item) for item in
-            super(DraftModuleStore, self).get_items(course_key, revision='draft', **kwargs)
-        ]
         if revision == 'draft':
             # the user only wants the drafts not everything w/ preference for draft
-            return draft_items
-        draft_items_locations = {item.location for item in draft_items}
+            items = self._find_items(course_key, revision=DRAFT, **kwargs)
+            return [wrap_draft(item) for item in self._load_items(course_key, items)]
+
+        # fetch the drafts and published items together, then drop the published
+        # items which have drafts
+        items = self._find_items(course_key, revision={'$in': [DRAFT, None]}, **kwargs)
+        draft_items = [item for item in items if item['_id']['revision'] == DRAFT]
+        draft_items_ids = set(_id_without_revision(item) for item in draft_items)
         non_draft_items = [
-            item for item in
-            super(DraftModuleStore, self).get_items(course_key, revision=None, **kwargs)
+            item for item in items
             # filter out items that are not already in draft
-            if item.location not in draft_items_locations
+            if item['_id']['revision'] != DRAFT and _id_without_revision(item) not in draft_items_ids
         ]
-        return draft_items + non_draft_items
+        return [wrap_draft(item) for item in self._load_items(course_key, draft_items + non_draft_items)]
 
     def convert_to_draft(self, source_location):
         """
@@ -151,7 +174,7 @@ class DraftModuleStore(MongoModuleStore):
         except pymongo.errors.DuplicateKeyError:
             raise DuplicateItemError(original['_id'])
 
-        self.refresh_cached_metadata_inheritance_tree(draft_location.course_key)
+        # the draft is a copy of the original; so, it doesn't change the metadata inheritance tree
 
         return wrap_draft(self._load_items(source_location.course_key, [original])[0])
 
@@ -206,7 +229,9 @@ class DraftModuleStore(MongoModuleStore):
                 #   2) child moved
                 for child in original_published.children:
                     if child not in draft.children:
-                        rents = self.get_parent_locations(child)
+                        # query rather than use the cached tree, which merges the draft and
+                        # published children of each container
+                        rents = self._query_parent_locations(child)
                         if (len(rents) == 1 and rents[0] == location):  # the 1 is this original_published
                             self.delete_item(child, True)
         super(DraftModuleStore, self).update_item(draft, '**replace_user**')
@@ -220,25 +245,30 @@ class DraftModuleStore(MongoModuleStore):
         super(DraftModuleStore, self).delete_item(location)
 
     def _query_children_for_cache_children(self, course_key, items):
-        # first get non-draft in a round-trip
-        to_process_non_drafts = super(DraftModuleStore, self)._query_children_for_cache_children(course_key, items)
-
-        to_process_dict = {}
-        for non_draft in to_process_non_drafts:
-            to_process_dict[Location._from_deprecated_son(non_draft["_id"], course_key.run)] = non_draft
-
-        # now query all draft content in another round-trip
+        # get the non-drafts and drafts in one round-trip
         query = {
             '_id': {'$in': [
-                as_draft(course_key.make_usage_key_from_deprecated_string(item)).to_deprecated_son() for item in items
+                son
+                for item in items
+                for son in (
+                    course_key.make_usage_key_from_deprecated_string(item).to_deprecated_son(),
+                    as_draft(course_key.make_usage_key_from_deprecated_string(item)).to_deprecated_son(),
+                )
             ]}
         }
-        to_process_drafts = list(self.collection.find(query))
+        to_process = list(self.collection.find(query))
+
+        to_process_dict = {}
+        for non_draft in to_process:
+            if non_draft['_id']['revision'] != DRAFT:
+                to_process_dict[Location._from_deprecated_son(non_draft["_id"], course_key.run)] = non_draft
 
         # now we have to go through all drafts and replace the non-draft
         # with the draft. This is because the semantics of the DraftStore is to
         # always return the draft - if available
-        for draft in to_process_drafts:
+        for draft in to_process:
+            if draft['_id']['revision'] != DRAFT:
+                continue
             draft_loc = Location._from_deprecated_son(draft["_id"], course_key.run)
             draft_as_non_draft_loc = draft_loc.replace(revision=None)
 
@@ -1,4 +1,5 @@
 import sys
+import copy
 import logging
 from xmodule.mako_module import MakoDescriptorSystem
 from xmodule.modulestore.locator import BlockUsageLocator, LocalId, CourseLocator
@@ -7,6 +8,7 @@ from xmodule.errortracker import exc_info_to_str
 from xblock.runtime import KvsFieldData
 from ..exceptions import ItemNotFoundError
 from .split_mongo_kvs import SplitMongoKVS
+from .definition_lazy_loader import DefinitionLazyLoader
 from xblock.fields import ScopeIds
 from xmodule.modulestore.loc_mapper_store import LocMapperStore
 
@@ -52,6 +54,29 @@ class CachingDescriptorSystem(MakoDescriptorSystem):
         )
         self.default_class = default_class
         self.local_modules = {}
+        # definitions fetched for this system's blocks keyed by definition id
+        self.definitions = {}
+
+    def get_definition(self, definition_id):
+        """
+        Return a copy of the definition with the given id.
+
+        The first request for a definition which hasn't been loaded yet fetches the definitions of
+        every block in module_data still waiting on a lazy loader, so that loading a subtree costs one
+        query rather than one per block.
+        """
+        if definition_id not in self.definitions:
+            pending = set(
+                block['definition'].definition_locator.definition_id
+                for block in self.module_data.itervalues()
+                if isinstance(block.get('definition'), DefinitionLazyLoader)
+            )
+            pending.add(definition_id)
+            pending.difference_update(self.definitions)
+            self.definitions.update(self.modulestore.db_connection.get_definitions(list(pending)))
+        definition = self.definitions.get(definition_id)
+        # each kvs updates its fields from the definition; don't let them share mutable values
+        return copy.deepcopy(definition)
 
     def _load_item(self, block_id, course_entry_override=None):
         if isinstance(block_id, BlockUsageLocator):
@@ -5,15 +5,23 @@ import re
 import pymongo
 from bson import son
 
+from xmodule.modulestore.split_mongo.structure_cache import get_structure_cache, get_definition_cache, CourseIndexCache
+
 class MongoConnection(object):
     """
     Segregation of pymongo functions from the data modeling mechanisms for split modulestore.
     """
     def __init__(
-        self, db, collection, host, port=27017, tz_aware=True, user=None, password=None, **kwargs
+        self, db, collection, host, port=27017, tz_aware=True, user=None, password=None,
+        structure_cache=None, definition_cache=None, index_cache_ttl=0, **kwargs
     ):
         """
         Create & open the connection, authenticate, and provide pointers to the collections
+
+        :param structure_cache: the StructureCache to use; defaults to the process-wide one
+        :param definition_cache: the StructureCache to use for definitions; defaults to the process-wide one
+        :param index_cache_ttl: how many seconds course index entries may be cached for reads
+        which accept a slightly out of date head version. 0 disables index caching.
         """
         self.database = pymongo.database.Database(
             pymongo.MongoClient(
@@ -41,11 +49,23 @@ class MongoConnection(object):
         self.structures.write_concern = {'w': 1}
         self.definitions.write_concern = {'w': 1}
 
+        self.tz_aware = tz_aware
+        self.structure_cache = structure_cache if structure_cache is not None else get_structure_cache()
+        self.definition_cache = definition_cache if definition_cache is not None else get_definition_cache()
+        # documents from different dbs & collections must not collide in the process-wide caches
+        self.cache_namespace = u'{}.{}'.format(db, collection)
+        self.index_cache = CourseIndexCache(index_cache_ttl)
+
     def get_structure(self, key):
         """
         Get the structure from the persistence mechanism whose id is the given key
         """
-        return self.structures.find_one({'_id': key})
+        structure = self.structure_cache.get(self.cache_namespace, key, self.tz_aware)
+        if structure is None:
+            structure = self.structures.find_one({'_id': key})
+            if structure is not None:
+                self.structure_cache.set(self.cache_namespace, structure)
+        return structure
 
     def find_matching_structures(self, query):
         """
@@ -59,24 +79,45 @@ class MongoConnection(object):
         Create the structure in the db
         """
         self.structures.insert(structure)
+        # the new version is almost always read back right away
+        self.structure_cache.set(self.cache_namespace, structure)
 
     def update_structure(self, structure):
         """
         Update the db record for structure
         """
         self.structures.update({'_id': structure['_id']}, structure)
+        self.structure_cache.delete(self.cache_namespace, structure['_id'])
 
-    def get_course_index(self, key, ignore_case=False):
+    def get_course_index(self, key, ignore_case=False, allow_cached=False):
         """
         Get the course_index from the persistence mechanism whose id is the given key
+
+        :param allow_cached: if True, an index entry up to index_cache_ttl seconds old may be
+        returned. Only use this for reads: anything which will update the course must see the
+        current head.
         """
+        cache_key = (key.org, key.offering)
+        if allow_cached and not ignore_case:
+            index = self.index_cache.get(cache_key)
+            if index is not None:
+                return index
+
         case_regex = r"(?i)^{}$" if ignore_case else r"{}"
-        return self.course_index.find_one(
+        index = self.course_index.find_one(
             son.SON([
                 (key_attr, re.compile(case_regex.format(getattr(key, key_attr))))
                 for key_attr in ('org', 'offering')
             ])
         )
+        if not ignore_case:
+            # keep the cache up to date with every fresh read so that writes are
+            # immediately visible to subsequent cached reads in this process
+            if index is None:
+                self.index_cache.delete(cache_key)
+            else:
+                self.index_cache.set(cache_key, index)
+        return index
 
     def find_matching_course_indexes(self, query):
         """
@@ -90,6 +131,7 @@ class MongoConnection(object):
         Create the course_index in the db
         """
         self.course_index.insert(course_index)
+        self.index_cache.delete((course_index['org'], course_index['offering']))
 
     def update_course_index(self, course_index):
         """
@@ -99,18 +141,44 @@ class MongoConnection(object):
             son.SON([('org', course_index['org']), ('offering', course_index['offering'])]),
             course_index
         )
+        self.index_cache.delete((course_index['org'], course_index['offering']))
 
     def delete_course_index(self, course_index):
         """
         Delete the course_index from the persistence mechanism whose id is the given course_index
         """
+        self.index_cache.delete((course_index['org'], course_index['offering']))
         return self.course_index.remove(son.SON([('org', course_index['org']), ('offering', course_index['offering'])]))
 
     def get_definition(self, key):
         """
         Get the definition from the persistence mechanism whose id is the given key
         """
-        return self.definitions.find_one({'_id': key})
+        definition = self.definition_cache.get(self.cache_namespace, key, self.tz_aware)
+        if definition is None:
+            definition = self.definitions.find_one({'_id': key})
+            if definition is not None:
+                self.definition_cache.set(self.cache_namespace, definition)
+        return definition
+
+    def get_definitions(self, keys):
+        """
+        Get the definitions whose ids are in keys, fetching any which aren't cached in one query.
+        Returns a dict of definition id to definition; ids which don't exist are omitted.
+        """
+        definitions = {}
+        missing = []
+        for key in keys:
+            definition = self.definition_cache.get(self.cache_namespace, key, self.tz_aware)
+            if definition is None:
+                missing.append(key)
+            else:
+                definitions[key] = definition
+        if missing:
+            for definition in self.definitions.find({'_id': {'$in': missing}}):
+                self.definition_cache.set(self.cache_namespace, definition)
+                definitions[definition['_id']] = definition
+        return definitions
 
     def find_matching_definitions(self, query):
         """
@@ -124,5 +192,7 @@ class MongoConnection(object):
         Create the definition in the db
         """
         self.definitions.insert(definition)
+        # definitions never change once written (an update creates a new one), so they're safe to cache
+        self.definition_cache.set(self.cache_namespace, definition)
 
 
@@ -48,6 +48,7 @@ Representation:
 import threading
 import datetime
 import logging
+from collections import defaultdict, OrderedDict
 from importlib import import_module
 from path import path
 import copy
@@ -60,7 +61,9 @@ from xmodule.modulestore.locator import (
 )
 from xmodule.modulestore.exceptions import InsufficientSpecificationError, VersionConflictError, DuplicateItemError, \
     DuplicateCourseError
-from xmodule.modulestore import inheritance, ModuleStoreWriteBase, Location, SPLIT_MONGO_MODULESTORE_TYPE
+from xmodule.modulestore import (
+    inheritance, ModuleStoreWriteBase, Location, SPLIT_MONGO_MODULESTORE_TYPE, find_orphans
+)
 
 from ..exceptions import ItemNotFoundError
 from .definition_lazy_loader import DefinitionLazyLoader
@@ -68,7 +71,7 @@ from .caching_descriptor_system import CachingDescriptorSystem
 from xblock.fields import Scope
 from bson.objectid import ObjectId
 from xmodule.modulestore.split_mongo.mongo_connection import MongoConnection
-from xblock.core import XBlock
+from xmodule.modulestore.split_mongo.structure_cache import get_structure_cache
 from xmodule.modulestore.loc_mapper_store import LocMapperStore
 
 log = logging.getLogger(__name__)
@@ -101,24 +104,39 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
     SCHEMA_VERSION = 1
     reference_type = Locator
+    # how many CachingDescriptorSystems (one per course version) each thread keeps
+    DESCRIPTOR_SYSTEM_CACHE_SIZE = 20
+
     def __init__(self, doc_store_config, fs_root, render_template,
                  default_class=None,
                  error_tracker=null_error_tracker,
                  loc_mapper=None,
                  i18n_service=None,
+                 structure_cache_size=None,
+                 structure_cache_subsystem=None,
+                 index_cache_ttl=0,
                  **kwargs):
         """
         :param doc_store_config: must have a host, db, and collection entries. Other common entries: port, tz_aware.
+        :param structure_cache_size: the maximum number of bytes of structures to keep in the
+        process-wide structure cache (see structure_cache.py)
+        :param structure_cache_subsystem: an optional shared cache (e.g., memcache) to use as a
+        second tier for structures
+        :param index_cache_ttl: how many seconds reads may use a cached course index to resolve
+        a branch to its head version. 0 (the default) always reads the current head.
         """
 
         super(SplitMongoModuleStore, self).__init__(**kwargs)
         self.loc_mapper = loc_mapper
 
-        self.db_connection = MongoConnection(**doc_store_config)
+        self.db_connection = MongoConnection(
+            structure_cache=get_structure_cache(structure_cache_size, structure_cache_subsystem),
+            index_cache_ttl=index_cache_ttl,
+            **doc_store_config
+        )
         self.db = self.db_connection.database
 
-        # Code review question: How should I expire entries?
-        # _add_cache could use a lru mechanism to control the cache size?
+        # per thread LRUs of CachingDescriptorSystems and of parent indexes keyed by course version guid
         self.thread_cache = threading.local()
 
         if default_class is not None:
@@ -152,15 +170,15 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
         if lazy:
             for block in new_module_data.itervalues():
-                block['definition'] = DefinitionLazyLoader(self, block['category'], block['definition'])
+                if not isinstance(block['definition'], DefinitionLazyLoader):
+                    block['definition'] = DefinitionLazyLoader(
+                        self, block['category'], block['definition'], system
+                    )
         else:
             # Load all descendants by id
-            descendent_definitions = self.db_connection.find_matching_definitions({
-                '_id': {'$in': [block['definition']
-                                for block in new_module_data.itervalues()]}})
-            # turn into a map
-            definitions = {definition['_id']: definition
-                           for definition in descendent_definitions}
+            definitions = self.db_connection.get_definitions(
+                [block['definition'] for block in new_module_data.itervalues()]
+            )
 
             for block in new_module_data.itervalues():
                 if block['definition'] in definitions:
@@ -204,9 +222,12 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param course_version_guid:
         """
         if not hasattr(self.thread_cache, 'course_cache'):
-            self.thread_cache.course_cache = {}
-        system = self.thread_cache.course_cache
-        return system.get(course_version_guid)
+            self.thread_cache.course_cache = OrderedDict()
+        system = self.thread_cache.course_cache.pop(course_version_guid, None)
+        if system is not None:
+            # re-insert as the most recently used entry
+            self.thread_cache.course_cache[course_version_guid] = system
+        return system
 
     def _add_cache(self, course_version_guid, system):
         """
@@ -215,8 +236,10 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param system:
         """
         if not hasattr(self.thread_cache, 'course_cache'):
-            self.thread_cache.course_cache = {}
+            self.thread_cache.course_cache = OrderedDict()
         self.thread_cache.course_cache[course_version_guid] = system
+        while len(self.thread_cache.course_cache) > self.DESCRIPTOR_SYSTEM_CACHE_SIZE:
+            self.thread_cache.course_cache.popitem(last=False)
         return system
 
     def _clear_cache(self, course_version_guid=None):
@@ -226,10 +249,34 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         """
         if course_version_guid:
             del self.thread_cache.course_cache[course_version_guid]
+            getattr(self.thread_cache, 'parent_indexes', {}).pop(course_version_guid, None)
         else:
-            self.thread_cache.course_cache = {}
+            self.thread_cache.course_cache = OrderedDict()
+            self.thread_cache.parent_indexes = OrderedDict()
 
-    def _lookup_course(self, course_locator):
+    def _get_parent_index(self, structure):
+        """
+        Return a dict mapping each block_id in the stored structure to the ids of the blocks which
+        list it as a child. Structures never change once stored; so, the index is built in one pass
+        and cached by version guid alongside the descriptor systems.
+        """
+        if not hasattr(self.thread_cache, 'parent_indexes'):
+            self.thread_cache.parent_indexes = OrderedDict()
+        parent_indexes = self.thread_cache.parent_indexes
+        index = parent_indexes.pop(structure['_id'], None)
+        if index is None:
+            index = defaultdict(list)
+            for parent_id, value in structure['blocks'].iteritems():
+                for child_id in value['fields'].get('children', []):
+                    index[child_id].append(parent_id)
+            index = dict(index)
+        # (re-)insert as the most recently used entry
+        parent_indexes[structure['_id']] = index
+        while len(parent_indexes) > self.DESCRIPTOR_SYSTEM_CACHE_SIZE:
+            parent_indexes.popitem(last=False)
+        return index
+
+    def _lookup_course(self, course_locator, allow_cached=True):
         '''
         Decode the locator into the right series of db access. Does not
         return the CourseDescriptor! It returns the actual db json from
@@ -241,10 +288,12 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         reference)
 
         :param course_locator: any subclass of CourseLocator
+        :param allow_cached: whether the branch may be resolved from a recently cached course
+        index. Anything which derives a new version from the returned structure must pass False.
         '''
         if course_locator.org and course_locator.offering and course_locator.branch:
             # use the course id
-            index = self.db_connection.get_course_index(course_locator)
+            index = self.db_connection.get_course_index(course_locator, allow_cached=allow_cached)
             if index is None:
                 raise ItemNotFoundError(course_locator)
             if course_locator.branch not in index['versions']:
@@ -448,7 +497,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param course_id: ignored. Only included for API compatibility. Specify the course_id within the locator.
         '''
         course = self._lookup_course(locator)
-        items = self._get_parents_from_structure(locator.block_id, course['structure'])
+        items = self._get_parent_index(course['structure']).get(locator.block_id, [])
         return [
             BlockUsageLocator.make_relative(
                 locator,
@@ -462,20 +511,53 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         """
         Return a dict of all of the orphans in the course.
         """
-        detached_categories = [name for name, __ in XBlock.load_tagged_classes("detached")]
         course = self._lookup_course(course_key)
-        items = {LocMapperStore.decode_key_from_mongo(block_id) for block_id in course['structure']['blocks'].keys()}
-        items.remove(course['structure']['root'])
-        blocks = course['structure']['blocks']
-        for block_id, block_data in blocks.iteritems():
-            items.difference_update(block_data.get('fields', {}).get('children', []))
-            if block_data['category'] in detached_categories:
-                items.discard(LocMapperStore.decode_key_from_mongo(block_id))
+        return self._orphan_locators(course_key, course['structure'])
+
+    def _orphan_locators(self, course_key, structure):
+        """
+        Return BlockUsageLocators for the orphans in the structure
+        """
+        blocks = structure['blocks']
+        orphans = find_orphans(
+            (
+                (LocMapperStore.decode_key_from_mongo(block_id), block_data['category'],
+                 block_data.get('fields', {}).get('children', []))
+                for block_id, block_data in blocks.iteritems()
+            ),
+            structure['root'],
+        )
         return [
-            BlockUsageLocator(course_key=course_key, block_type=blocks[block_id]['category'], block_id=block_id)
-            for block_id in items
+            BlockUsageLocator(
+                course_key=course_key,
+                block_type=blocks[LocMapperStore.encode_key_for_mongo(block_id)]['category'],
+                block_id=block_id,
+            )
+            for block_id in orphans
         ]
 
+    def delete_orphans(self, course_key, user_id=None, force=False, **kwargs):
+        """
+        Delete all of the course's orphans in one new version of the course structure.
+        Returns the deleted orphans as BlockUsageLocators.
+
+        Like delete_item, this moves the course head pointer if course_key has an org and offering, and
+        raises a VersionConflictError if it isn't the head version unless force is True.
+        """
+        original_structure = self._lookup_course(course_key, allow_cached=False)['structure']
+        orphans = self._orphan_locators(course_key, original_structure)
+        if not orphans:
+            return orphans
+
+        index_entry = self._get_index_if_valid(course_key, force)
+        new_structure = self._version_structure(original_structure, user_id)
+        for orphan in orphans:
+            del new_structure['blocks'][LocMapperStore.encode_key_for_mongo(orphan.block_id)]
+        self.db_connection.insert_structure(new_structure)
+        if index_entry is not None:
+            self._update_head(index_entry, course_key.branch, new_structure['_id'])
+        return orphans
+
     def get_course_index_info(self, course_locator):
         """
         The index records the initial creation of the indexed course and tracks the current version
@@ -758,7 +840,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         """
         # find course_index entry if applicable and structures entry
         index_entry = self._get_index_if_valid(course_or_parent_locator, force, continue_version)
-        structure = self._lookup_course(course_or_parent_locator)['structure']
+        structure = self._lookup_course(course_or_parent_locator, allow_cached=False)['structure']
 
         partitioned_fields = self.partition_fields_by_scope(category, fields)
         new_def_data = partitioned_fields.get(Scope.content, {})
@@ -927,7 +1009,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         else:
             # just get the draft_version structure
             draft_version = CourseLocator(version_guid=versions_dict[master_branch])
-            draft_structure = self._lookup_course(draft_version)['structure']
+            draft_structure = self._lookup_course(draft_version, allow_cached=False)['structure']
             if definition_fields or block_fields:
                 draft_structure = self._version_structure(draft_structure, user_id)
                 new_id = draft_structure['_id']
@@ -980,7 +1062,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         The implementation tries to detect which, if any changes, actually need to be saved and thus won't version
         the definition, structure, nor course if they didn't change.
         """
-        original_structure = self._lookup_course(descriptor.location)['structure']
+        original_structure = self._lookup_course(descriptor.location, allow_cached=False)['structure']
         index_entry = self._get_index_if_valid(descriptor.location, force)
 
         descriptor.definition_locator, is_updated = self.update_definition_from_data(
@@ -1086,7 +1168,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         """
         # find course_index entry if applicable and structures entry
         index_entry = self._get_index_if_valid(xblock.location, force)
-        structure = self._lookup_course(xblock.location)['structure']
+        structure = self._lookup_course(xblock.location, allow_cached=False)['structure']
         new_structure = self._version_structure(structure, user_id)
         new_id = new_structure['_id']
         is_updated = self._persist_subdag(xblock, user_id, new_structure['blocks'], new_id)
@@ -1212,7 +1294,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         if not there, don't update if there.
         """
         # get the destination's index, and source and destination structures.
-        source_structure = self._lookup_course(source_course)['structure']
+        source_structure = self._lookup_course(source_course, allow_cached=False)['structure']
         index_entry = self.db_connection.get_course_index(destination_course)
         if index_entry is None:
             # brand new course
@@ -1224,7 +1306,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
             # create branch
             destination_structure = self._new_structure(user_id, source_structure['root'])
         else:
-            destination_structure = self._lookup_course(destination_course)['structure']
+            destination_structure = self._lookup_course(destination_course, allow_cached=False)['structure']
             destination_structure = self._version_structure(destination_structure, user_id)
 
         # iterate over subtree list filtering out blacklist.
@@ -1284,7 +1366,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         the course but leaves the head pointer where it is (this change will not be in the course head).
         """
         assert isinstance(usage_locator, BlockUsageLocator)
-        original_structure = self._lookup_course(usage_locator.course_key)['structure']
+        original_structure = self._lookup_course(usage_locator.course_key, allow_cached=False)['structure']
         if original_structure['root'] == usage_locator.block_id:
             raise ValueError("Cannot delete the root of a course")
         index_entry = self._get_index_if_valid(usage_locator, force)
@@ -1433,7 +1515,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
         :param course_locator: the course to clean
         """
-        original_structure = self._lookup_course(course_locator)['structure']
+        original_structure = self._lookup_course(course_locator, allow_cached=False)['structure']
         for block in original_structure['blocks'].itervalues():
             if 'fields' in block and 'children' in block['fields']:
                 block['fields']["children"] = [
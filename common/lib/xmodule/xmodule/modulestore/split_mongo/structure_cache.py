@@ -0,0 +1,241 @@
+"""
+Process-wide caches for the documents that split modulestore reads on every access.
+
+Structures and definitions are immutable once written (a change creates a new
+version with a new id), so they can be shared by every thread and store in the
+process. They are kept as BSON so that the cache's memory use is known exactly,
+and so that every hit decodes a fresh copy which callers are free to mutate (the
+caching descriptor system writes inheritance info and lazy loaders into the
+blocks it is given).
+
+Course indexes, on the other hand, change whenever a branch moves to a new head,
+so they are only cached for a short, configurable time.
+"""
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from bson import BSON, son
+
+log = logging.getLogger(__name__)
+
+# Default upper bounds, in bytes of BSON, for the process-wide caches
+DEFAULT_STRUCTURE_CACHE_SIZE = 64 * 1024 * 1024
+DEFAULT_DEFINITION_CACHE_SIZE = 64 * 1024 * 1024
+
+
+class StructureCache(object):
+    """
+    A thread-safe LRU cache of immutable documents (structures or definitions),
+    bounded by their total encoded size, with an optional second tier in a shared
+    cache such as memcache.
+
+    Keys are (namespace, _id) pairs, where the namespace identifies the database
+    and collection the document came from.
+    """
+    def __init__(self, max_size=DEFAULT_STRUCTURE_CACHE_SIZE, cache_subsystem=None, key_prefix=u'split_structure'):
+        """
+        :param max_size: the maximum number of bytes of BSON to keep in memory
+        :param cache_subsystem: an optional django-style cache (get/set/delete) to use as a second tier
+        :param key_prefix: prefix for the keys of this cache's entries in the second tier
+        """
+        self.max_size = max_size
+        self.cache_subsystem = cache_subsystem
+        self.key_prefix = key_prefix
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.subsystem_hits = 0
+        self.evictions = 0
+
+    @property
+    def size(self):
+        """
+        The number of bytes of BSON currently held in memory
+        """
+        return self._size
+
+    def stats(self):
+        """
+        Return a dict of the cache's counters, for monitoring
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'subsystem_hits': self.subsystem_hits,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'size': self._size,
+        }
+
+    def get(self, namespace, version_guid, tz_aware=True):
+        """
+        Return a freshly decoded copy of the structure, or None if it isn't cached
+        """
+        key = (namespace, version_guid)
+        with self._lock:
+            data = self._entries.pop(key, None)
+            if data is not None:
+                # re-insert as the most recently used entry
+                self._entries[key] = data
+                self.hits += 1
+
+        if data is None and self.cache_subsystem is not None:
+            data = self.cache_subsystem.get(self._subsystem_key(namespace, version_guid))
+            if data is not None:
+                self._store(key, data)
+                with self._lock:
+                    self.subsystem_hits += 1
+
+        if data is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        return BSON(data).decode(as_class=son.SON, tz_aware=tz_aware)
+
+    def set(self, namespace, structure):
+        """
+        Cache the given structure under its _id
+        """
+        data = BSON.encode(structure)
+        self._store((namespace, structure['_id']), data)
+        if self.cache_subsystem is not None:
+            try:
+                self.cache_subsystem.set(self._subsystem_key(namespace, structure['_id']), data)
+            except Exception:  # pylint: disable=broad-except
+                # memcache refuses values over its item size limit; the in-process tier still works
+                log.warning('Unable to store structure %s in the cache subsystem', structure['_id'], exc_info=True)
+
+    def delete(self, namespace, version_guid):
+        """
+        Remove the structure from every tier of the cache
+        """
+        with self._lock:
+            data = self._entries.pop((namespace, version_guid), None)
+            if data is not None:
+                self._size -= len(data)
+        if self.cache_subsystem is not None:
+            self.cache_subsystem.delete(self._subsystem_key(namespace, version_guid))
+
+    def clear(self):
+        """
+        Empty the in-process tier of the cache and reset its counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.misses = self.subsystem_hits = self.evictions = 0
+
+    def _store(self, key, data):
+        """
+        Add the encoded structure to the in-process tier, evicting the least recently used
+        entries until the cache fits in max_size
+        """
+        if len(data) > self.max_size:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def _subsystem_key(self, namespace, version_guid):
+        """
+        The key to use for the document in the second tier cache
+        """
+        return u'{}.{}.{}'.format(self.key_prefix, namespace, version_guid)
+
+
+class CourseIndexCache(object):
+    """
+    A thread-safe cache of course index entries which expire after `ttl` seconds.
+    A ttl of 0 disables the cache.
+    """
+    def __init__(self, ttl=0):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Return a copy of the cached index entry, or None if it isn't cached or has expired
+        """
+        if not self.ttl:
+            return None
+        with self._lock:
+            expires, index = self._entries.get(key, (0, None))
+            if index is None or expires < time.time():
+                self.misses += 1
+                return None
+            self.hits += 1
+        # callers update index entries in place before saving them
+        return copy.deepcopy(index)
+
+    def set(self, key, index):
+        """
+        Cache a copy of the index entry
+        """
+        if not self.ttl:
+            return
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, copy.deepcopy(index))
+
+    def delete(self, key):
+        """
+        Remove the index entry from the cache
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+_STRUCTURE_CACHE = None
+_DEFINITION_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_structure_cache(max_size=None, cache_subsystem=None):
+    """
+    Return the process-wide StructureCache, creating it on first use.
+
+    :param max_size: if not None, the new maximum size of the cache in bytes
+    :param cache_subsystem: if not None, the second tier cache to use
+    """
+    global _STRUCTURE_CACHE  # pylint: disable=global-statement
+    with _CACHE_LOCK:
+        if _STRUCTURE_CACHE is None:
+            _STRUCTURE_CACHE = StructureCache()
+        if max_size is not None:
+            _STRUCTURE_CACHE.max_size = max_size
+        if cache_subsystem is not None:
+            _STRUCTURE_CACHE.cache_subsystem = cache_subsystem
+        return _STRUCTURE_CACHE
+
+
+def get_definition_cache(max_size=None, cache_subsystem=None):
+    """
+    Return the process-wide cache of definitions, creating it on first use.
+
+    :param max_size: if not None, the new maximum size of the cache in bytes
+    :param cache_subsystem: if not None, the second tier cache to use
+    """
+    global _DEFINITION_CACHE  # pylint: disable=global-statement
+    with _CACHE_LOCK:
+        if _DEFINITION_CACHE is None:
+            _DEFINITION_CACHE = StructureCache(DEFAULT_DEFINITION_CACHE_SIZE, key_prefix=u'split_definition')
+        if max_size is not None:
+            _DEFINITION_CACHE.max_size = max_size
+        if cache_subsystem is not None:
+            _DEFINITION_CACHE.cache_subsystem = cache_subsystem
+        return _DEFINITION_CACHE
@@ -0,0 +1,54 @@
+"""
+Benchmark of XMLModuleStore startup over the test courses in common/test/data:
+parsing every course serially, in a process pool, and loading them from snapshots.
+
+Run with
+  python -m xmodule.modulestore.tests.benchmark_xml
+"""
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+from xmodule.modulestore.xml import XMLModuleStore
+from xmodule.tests import DATA_DIR
+
+REPEAT = 3
+
+
+def load(**options):
+    """
+    Return the seconds taken to load every test course into a new XMLModuleStore
+    """
+    start = time.time()
+    XMLModuleStore(DATA_DIR, default_class='xmodule.hidden_module.HiddenDescriptor', **options)
+    return time.time() - start
+
+
+def main():
+    """
+    Time each way of loading the courses and print the results
+    """
+    snapshot_dir = tempfile.mkdtemp()
+    try:
+        processes = multiprocessing.cpu_count()
+        strategies = [
+            ('parse serially', {}),
+            ('parse in {} processes'.format(processes), {'processes': processes}),
+            ('parse and save snapshots', {'snapshot_dir': snapshot_dir}),
+            ('load snapshots', {'snapshot_dir': snapshot_dir}),
+        ]
+        print 'Loading the courses in {}, best of {} runs'.format(DATA_DIR, REPEAT)
+        for name, options in strategies:
+            times = []
+            for _ in xrange(REPEAT):
+                if name == 'parse and save snapshots':
+                    shutil.rmtree(snapshot_dir, ignore_errors=True)
+                times.append(load(**options))
+            print '{:<28} {:8.2f} s'.format(name, min(times))
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
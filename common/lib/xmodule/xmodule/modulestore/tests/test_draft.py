@@ -0,0 +1,117 @@
+"""
+Tests for reading and publishing items in the draft modulestore
+"""
+from mock import patch
+
+from xmodule.modulestore.exceptions import ItemNotFoundError
+from xmodule.modulestore.tests.test_split_w_old_mongo import SplitWMongoCourseBoostrapper
+
+
+class TestDraftReads(SplitWMongoCourseBoostrapper):
+    """
+    Test get_item, get_items and get_existing_locations on a course with published and draft units
+    """
+    def _create_course(self):
+        """
+        Create the course, with a published unit, a unit with a draft, and a private unit
+        """
+        super(TestDraftReads, self)._create_course(split=False)
+
+        self._create_item('chapter', 'Chapter1', {}, {'display_name': 'Chapter 1'}, 'course', 'runid', split=False)
+        for name in ('Published', 'Edited'):
+            self._create_item(
+                'vertical', name, {}, {'display_name': name}, 'chapter', 'Chapter1', draft=False, split=False
+            )
+        self._create_item('vertical', 'Private', {}, {'display_name': 'Private'}, 'chapter', 'Chapter1', split=False)
+
+        edited = self.draft_mongo.get_item(self.old_course_key.make_usage_key('vertical', 'Edited'))
+        edited.display_name = 'Edited draft'
+        self.draft_mongo.update_item(edited, self.userid)
+
+    def count_finds(self, func, *args, **kwargs):
+        """
+        Return the result of calling `func`, and the number of queries it made for
+        items, not counting the query for the course's metadata inheritance tree
+        """
+        collection = self.draft_mongo.collection
+        with patch.object(collection, 'find', wraps=collection.find) as mock_find:
+            result = func(*args, **kwargs)
+        item_queries = [
+            call for call in mock_find.call_args_list
+            if '_id' in call[0][0] or '_id.revision' in call[0][0]
+        ]
+        return result, len(item_queries)
+
+    def test_get_item(self):
+        for name, display_name, is_draft in (
+            ('Published', 'Published', False),
+            ('Edited', 'Edited draft', True),
+            ('Private', 'Private', True),
+        ):
+            location = self.old_course_key.make_usage_key('vertical', name)
+            item, queries = self.count_finds(self.draft_mongo.get_item, location)
+            self.assertEqual(queries, 1)
+            self.assertEqual(item.display_name, display_name)
+            self.assertEqual(item.is_draft, is_draft)
+            self.assertEqual(item.location, location)
+
+    def test_get_missing_item(self):
+        with self.assertRaises(ItemNotFoundError):
+            self.draft_mongo.get_item(self.old_course_key.make_usage_key('vertical', 'Missing'))
+
+    def test_get_items(self):
+        items, queries = self.count_finds(self.draft_mongo.get_items, self.old_course_key, category='vertical')
+        self.assertEqual(queries, 1)
+        self.assertEqual(
+            sorted((item.location.name, item.display_name, item.is_draft) for item in items),
+            [('Edited', 'Edited draft', True), ('Private', 'Private', True), ('Published', 'Published', False)]
+        )
+
+        drafts = self.draft_mongo.get_items(self.old_course_key, revision='draft', category='vertical')
+        self.assertEqual(sorted(item.location.name for item in drafts), ['Edited', 'Private'])
+
+    def test_get_items_ignores_settings_and_content(self):
+        items = self.draft_mongo.get_items(
+            self.old_course_key, settings={'display_name': 'Missing'}, content={'data': 'Missing'}, category='vertical'
+        )
+        self.assertEqual(sorted(item.location.name for item in items), ['Edited', 'Private', 'Published'])
+
+    def test_get_existing_locations(self):
+        locations = [
+            self.old_course_key.make_usage_key('vertical', name)
+            for name in ('Published', 'Edited', 'Private', 'Missing')
+        ]
+        self.assertEqual(self.old_mongo.get_existing_locations(locations), set(locations[:2]))
+        self.assertEqual(self.old_mongo.get_existing_locations([]), set())
+
+
+class TestDraftPublish(SplitWMongoCourseBoostrapper):
+    """
+    Test publishing a draft unit whose children differ from the published unit's
+    """
+    def _create_course(self):
+        """
+        Create the course, with a unit whose draft no longer lists one of the published unit's children
+        """
+        super(TestDraftPublish, self)._create_course(split=False)
+
+        self._create_item('chapter', 'Chapter1', {}, {'display_name': 'Chapter 1'}, 'course', 'runid', split=False)
+        self._create_item(
+            'vertical', 'Unit', {}, {'display_name': 'Unit'}, 'chapter', 'Chapter1', draft=False, split=False
+        )
+        for name in ('Kept', 'Removed'):
+            self._create_item('html', name, '<p>{}</p>'.format(name), {}, 'vertical', 'Unit', draft=False, split=False)
+
+        self.unit_location = self.old_course_key.make_usage_key('vertical', 'Unit')
+        self.removed_location = self.old_course_key.make_usage_key('html', 'Removed')
+        draft = self.draft_mongo.get_item(self.unit_location)
+        draft.children.remove(self.removed_location)
+        self.draft_mongo.update_item(draft, self.userid)
+
+    def test_publish_deletes_removed_child(self):
+        self.draft_mongo.publish(self.unit_location, self.userid)
+
+        unit = self.old_mongo.get_item(self.unit_location)
+        self.assertEqual(unit.children, [self.old_course_key.make_usage_key('html', 'Kept')])
+        with self.assertRaises(ItemNotFoundError):
+            self.draft_mongo.get_item(self.removed_location)
@@ -10,7 +10,9 @@ import shutil
 from tempfile import mkdtemp
 from uuid import uuid4
 import unittest
+import pickle
 import bson.son
+from mock import patch
 from xblock.core import XBlock
 
 from xblock.fields import Scope, Reference, ReferenceList, ReferenceValueDict
@@ -21,6 +23,7 @@ from xblock.plugin import Plugin
 from xmodule.tests import DATA_DIR
 from xmodule.modulestore import Location, MONGO_MODULESTORE_TYPE
 from xmodule.modulestore.mongo import MongoModuleStore, MongoKeyValueStore
+from xmodule.modulestore.mongo.base import InheritanceTree
 from xmodule.modulestore.draft import DraftModuleStore
 from xmodule.modulestore.locations import SlashSeparatedCourseKey, AssetLocation
 from xmodule.modulestore.xml_exporter import export_to_xml
@@ -207,6 +210,34 @@ class TestMongoModuleStore(unittest.TestCase):
         '''Make sure that path_to_location works'''
         check_path_to_location(self.store)
 
+    def test_get_parent_locations(self):
+        """
+        The parents from the cached inheritance tree match those found by querying the children lists
+        """
+        course_key = SlashSeparatedCourseKey('edX', 'toy', '2012_Fall')
+        for item in self.store.get_items(course_key):
+            query = {
+                '_id.org': course_key.org,
+                '_id.course': course_key.course,
+                'definition.children': item.location.to_deprecated_string(),
+            }
+            expected = set(
+                course_key.make_usage_key(parent['_id']['category'], parent['_id']['name'])
+                for parent in self.store.collection.find(query, {'_id': True})
+            )
+            assert_equals(set(self.store.get_parent_locations(item.location)), expected)
+
+    def test_get_parent_locations_missing_from_tree(self):
+        """
+        Parents missing from a stale cached inheritance tree are queried for
+        """
+        course_key = SlashSeparatedCourseKey('edX', 'toy', '2012_Fall')
+        course = self.store.get_course(course_key)
+        chapter = self.store.get_item(course.children[0])
+        with patch.object(self.store, '_get_cached_metadata_inheritance_tree', return_value=InheritanceTree()):
+            assert_equals(self.store.get_parent_locations(chapter.location), [course.location])
+            assert_equals(self.store.get_parent_locations(course.location), [])
+
     def test_xlinter(self):
         '''
         Run through the xlinter, we know the 'toy' course has violations, but the
@@ -513,3 +544,57 @@ class TestMongoKeyValueStore(object):
         for scope in (Scope.preferences, Scope.user_info, Scope.user_state, Scope.parent):
             with assert_raises(InvalidScopeError):
                 self.kvs.delete(KeyValueStore.Key(scope, None, None, 'foo'))
+
+
+class TestInheritanceTree(unittest.TestCase):
+    """
+    Tests for the cached representation of a course's metadata inheritance
+    """
+    COURSE = 'i4x://org/course/course/run'
+    CHAPTER = 'i4x://org/course/chapter/ch'
+    SEQUENTIAL = 'i4x://org/course/sequential/seq'
+    HTML = 'i4x://org/course/html/leaf'
+
+    def setUp(self):
+        self.tree = InheritanceTree(self.COURSE)
+        self.tree.update_container(self.COURSE, {'graded': False, 'due': 'course_due'}, [self.CHAPTER])
+        self.tree.update_container(self.CHAPTER, {}, [self.SEQUENTIAL])
+        self.tree.update_container(self.SEQUENTIAL, {'graded': True}, [self.HTML])
+
+    def test_resolves_overrides_down_the_tree(self):
+        self.assertEqual(self.tree.get(self.COURSE, {}), {})
+        self.assertEqual(self.tree.get(self.CHAPTER), {'graded': False, 'due': 'course_due'})
+        self.assertEqual(self.tree.get(self.SEQUENTIAL), {'graded': True, 'due': 'course_due'})
+        self.assertEqual(self.tree.get(self.HTML), {'graded': True, 'due': 'course_due'})
+
+    def test_unchanged_update(self):
+        self.assertFalse(self.tree.update_container(self.SEQUENTIAL, {'graded': True}, [self.HTML]))
+
+    def test_override_change(self):
+        self.tree.get(self.HTML)
+        self.assertTrue(self.tree.update_container(self.CHAPTER, {'due': 'chapter_due'}, [self.SEQUENTIAL]))
+        self.assertEqual(self.tree.get(self.HTML), {'graded': True, 'due': 'chapter_due'})
+
+    def test_detached_subtree(self):
+        self.assertTrue(self.tree.update_container(self.CHAPTER, {}, []))
+        self.assertIsNone(self.tree.get(self.SEQUENTIAL))
+        self.assertEqual(self.tree.get(self.HTML, {}), {})
+
+    def test_get_parents(self):
+        self.assertEqual(self.tree.get_parents(self.HTML), [self.SEQUENTIAL])
+        self.assertEqual(self.tree.get_parents(self.COURSE), [])
+
+        # a block listed by two containers has both as parents until one drops it
+        other = 'i4x://org/course/sequential/other'
+        self.assertTrue(self.tree.update_container(other, {}, [self.HTML]))
+        self.assertEqual(self.tree.get_parents(self.HTML), [self.SEQUENTIAL, other])
+        self.assertTrue(self.tree.update_container(self.SEQUENTIAL, {'graded': True}, []))
+        self.assertEqual(self.tree.get_parents(self.HTML), [other])
+        # which isn't reachable from the course
+        self.assertIsNone(self.tree.get(self.HTML))
+
+    def test_pickle(self):
+        self.tree.get(self.HTML)
+        tree = pickle.loads(pickle.dumps(self.tree))
+        self.assertEqual(tree.get(self.HTML), {'graded': True, 'due': 'course_due'})
+        self.assertNotIn('_resolved', pickle.dumps(self.tree))
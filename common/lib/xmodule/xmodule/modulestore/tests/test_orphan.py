@@ -50,3 +50,30 @@ class TestOrphan(SplitWMongoCourseBoostrapper):
         self.assertIn(location, orphans)
         location = self.split_course_key.make_usage_key('html', 'OrphanHtml')
         self.assertIn(location, orphans)
+
+    def test_mongo_delete_orphans(self):
+        """
+        Test that old mongo deletes all versions of the orphans and nothing else
+        """
+        orphans = self.old_mongo.get_orphans(self.old_course_key)
+        self.assertItemsEqual(self.draft_mongo.delete_orphans(self.old_course_key, self.userid), orphans)
+        self.assertEqual(self.old_mongo.get_orphans(self.old_course_key), [])
+        for orphan in orphans:
+            usage_key = self.old_course_key.make_usage_key_from_deprecated_string(orphan)
+            self.assertFalse(self.draft_mongo.has_item(usage_key))
+        self.assertTrue(self.draft_mongo.has_item(self.old_course_key.make_usage_key('html', 'Html1')))
+        self.assertTrue(self.old_mongo.has_item(self.old_course_key.make_usage_key('static_tab', 'staticuno')))
+
+    def test_split_delete_orphans(self):
+        """
+        Test that split mongo deletes the orphans in one new version of the course
+        """
+        original_version = self.split_mongo.get_course(self.split_course_key).location.version_guid
+        orphans = self.split_mongo.get_orphans(self.split_course_key)
+        self.assertItemsEqual(self.split_mongo.delete_orphans(self.split_course_key, self.userid), orphans)
+        self.assertEqual(self.split_mongo.get_orphans(self.split_course_key), [])
+        course = self.split_mongo.get_course(self.split_course_key)
+        self.assertNotEqual(course.location.version_guid, original_version)
+        self.assertTrue(self.split_mongo.has_item(self.split_course_key.make_usage_key('html', 'Html1')))
+        for orphan in orphans:
+            self.assertFalse(self.split_mongo.has_item(orphan))
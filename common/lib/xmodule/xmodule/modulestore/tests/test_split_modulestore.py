@@ -8,6 +8,7 @@ from importlib import import_module
 from path import path
 import re
 import random
+from mock import patch
 
 from xblock.fields import Scope
 from xmodule.course_module import CourseDescriptor
@@ -872,6 +873,32 @@ class SplitModuleItemTests(SplitModuleTest):
         parents = modulestore().get_parent_locations(locator)
         self.assertEqual(len(parents), 0)
 
+    def test_lazy_definitions_load_together(self):
+        """
+        The first definition fetched for a course loads all the pending definitions in one query
+        """
+        store = modulestore()
+        store.db_connection.definition_cache.clear()
+        store._clear_cache()  # pylint: disable=protected-access
+        definitions = store.db_connection.definitions
+        with patch.object(definitions, 'find', wraps=definitions.find) as mock_find:
+            with patch.object(definitions, 'find_one', wraps=definitions.find_one) as mock_find_one:
+                course = store.get_course(CourseLocator(org='testx', offering='GreekHero', branch='draft'))
+                # forces loading the course's definition
+                self.assertDictEqual(course.grade_cutoffs, {"Pass": 0.45})
+                self.assertEqual(mock_find.call_count, 1)
+                for child in course.get_children():
+                    child.get_explicitly_set_fields_by_scope(Scope.content)
+                self.assertEqual(mock_find.call_count, 1)
+                self.assertEqual(mock_find_one.call_count, 0)
+
+        # a new request for the same course finds the definitions in the process-wide cache
+        store._clear_cache()  # pylint: disable=protected-access
+        with patch.object(definitions, 'find', wraps=definitions.find) as mock_find:
+            course = store.get_course(CourseLocator(org='testx', offering='GreekHero', branch='draft'))
+            self.assertDictEqual(course.grade_cutoffs, {"Pass": 0.45})
+            self.assertEqual(mock_find.call_count, 0)
+
     def test_get_children(self):
         """
         Test the existing get_children method on xdescriptors
@@ -0,0 +1,164 @@
+"""
+Tests for the split modulestore's process-wide structure, definition, and course index caches.
+"""
+import datetime
+import unittest
+
+from bson import BSON
+from bson.objectid import ObjectId
+from mock import patch
+from pytz import UTC
+
+from xmodule.modulestore.split_mongo.structure_cache import StructureCache, CourseIndexCache
+
+
+class DictCache(object):
+    """
+    A minimal stand-in for a django cache
+    """
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def make_structure(num_blocks=1):
+    """
+    Return a structure-like document with num_blocks blocks
+    """
+    return {
+        '_id': ObjectId(),
+        'root': 'block0',
+        'edited_on': datetime.datetime(2014, 5, 1, tzinfo=UTC),
+        'blocks': {
+            'block{}'.format(index): {'category': 'html', 'fields': {'children': []}}
+            for index in xrange(num_blocks)
+        },
+    }
+
+
+class TestStructureCache(unittest.TestCase):
+    """
+    Tests of StructureCache
+    """
+    NAMESPACE = u'test_db.modulestore'
+
+    def test_miss_then_hit(self):
+        cache = StructureCache()
+        structure = make_structure()
+        self.assertIsNone(cache.get(self.NAMESPACE, structure['_id']))
+        cache.set(self.NAMESPACE, structure)
+        self.assertEqual(cache.get(self.NAMESPACE, structure['_id']), structure)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_hits_are_independent_copies(self):
+        cache = StructureCache()
+        structure = make_structure()
+        cache.set(self.NAMESPACE, structure)
+
+        first = cache.get(self.NAMESPACE, structure['_id'])
+        first['blocks']['block0']['_inherited_settings'] = {'graded': True}
+        second = cache.get(self.NAMESPACE, structure['_id'])
+        self.assertNotIn('_inherited_settings', second['blocks']['block0'])
+
+    def test_namespaces_do_not_collide(self):
+        cache = StructureCache()
+        structure = make_structure()
+        cache.set(self.NAMESPACE, structure)
+        self.assertIsNone(cache.get(u'other_db.modulestore', structure['_id']))
+
+    def test_evicts_least_recently_used_by_size(self):
+        structures = [make_structure(10) for _ in xrange(3)]
+        entry_size = len(BSON.encode(structures[0]))
+        cache = StructureCache(max_size=entry_size * 2)
+
+        cache.set(self.NAMESPACE, structures[0])
+        cache.set(self.NAMESPACE, structures[1])
+        # touch the first so that the second is least recently used
+        cache.get(self.NAMESPACE, structures[0]['_id'])
+        cache.set(self.NAMESPACE, structures[2])
+
+        self.assertIsNotNone(cache.get(self.NAMESPACE, structures[0]['_id']))
+        self.assertIsNone(cache.get(self.NAMESPACE, structures[1]['_id']))
+        self.assertIsNotNone(cache.get(self.NAMESPACE, structures[2]['_id']))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertLessEqual(cache.size, cache.max_size)
+
+    def test_oversized_structure_is_not_cached(self):
+        structure = make_structure(10)
+        cache = StructureCache(max_size=10)
+        cache.set(self.NAMESPACE, structure)
+        self.assertIsNone(cache.get(self.NAMESPACE, structure['_id']))
+        self.assertEqual(cache.size, 0)
+
+    def test_delete(self):
+        cache = StructureCache(cache_subsystem=DictCache())
+        structure = make_structure()
+        cache.set(self.NAMESPACE, structure)
+        cache.delete(self.NAMESPACE, structure['_id'])
+        self.assertIsNone(cache.get(self.NAMESPACE, structure['_id']))
+        self.assertEqual(cache.size, 0)
+
+    def test_subsystem_tier(self):
+        subsystem = DictCache()
+        structure = make_structure()
+        StructureCache(cache_subsystem=subsystem).set(self.NAMESPACE, structure)
+
+        # a different process only shares the second tier
+        cache = StructureCache(cache_subsystem=subsystem)
+        self.assertEqual(cache.get(self.NAMESPACE, structure['_id']), structure)
+        self.assertEqual(cache.stats()['subsystem_hits'], 1)
+        # and now has it in memory
+        self.assertEqual(cache.get(self.NAMESPACE, structure['_id']), structure)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_key_prefixes_do_not_collide(self):
+        subsystem = DictCache()
+        structure = make_structure()
+        StructureCache(cache_subsystem=subsystem).set(self.NAMESPACE, structure)
+
+        definitions = StructureCache(cache_subsystem=subsystem, key_prefix=u'split_definition')
+        self.assertIsNone(definitions.get(self.NAMESPACE, structure['_id']))
+
+
+class TestCourseIndexCache(unittest.TestCase):
+    """
+    Tests of CourseIndexCache
+    """
+    INDEX = {'org': 'testx', 'offering': 'GreekHero', 'versions': {'draft': ObjectId()}}
+
+    def test_disabled_by_default(self):
+        cache = CourseIndexCache()
+        cache.set(('testx', 'GreekHero'), self.INDEX)
+        self.assertIsNone(cache.get(('testx', 'GreekHero')))
+
+    def test_returns_copies(self):
+        cache = CourseIndexCache(ttl=60)
+        cache.set(('testx', 'GreekHero'), self.INDEX)
+        index = cache.get(('testx', 'GreekHero'))
+        self.assertEqual(index, self.INDEX)
+        index['versions']['draft'] = ObjectId()
+        self.assertEqual(cache.get(('testx', 'GreekHero')), self.INDEX)
+
+    def test_expires(self):
+        cache = CourseIndexCache(ttl=5)
+        with patch('xmodule.modulestore.split_mongo.structure_cache.time.time', return_value=1000):
+            cache.set(('testx', 'GreekHero'), self.INDEX)
+        with patch('xmodule.modulestore.split_mongo.structure_cache.time.time', return_value=1004):
+            self.assertIsNotNone(cache.get(('testx', 'GreekHero')))
+        with patch('xmodule.modulestore.split_mongo.structure_cache.time.time', return_value=1006):
+            self.assertIsNone(cache.get(('testx', 'GreekHero')))
+
+    def test_delete(self):
+        cache = CourseIndexCache(ttl=60)
+        cache.set(('testx', 'GreekHero'), self.INDEX)
+        cache.delete(('testx', 'GreekHero'))
+        self.assertIsNone(cache.get(('testx', 'GreekHero')))
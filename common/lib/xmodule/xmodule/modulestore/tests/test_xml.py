@@ -3,6 +3,8 @@ Tests around our XML modulestore, including importing
 well-formed and not-well-formed XML.
 """
 import os.path
+import shutil
+import tempfile
 import unittest
 from glob import glob
 from mock import patch
@@ -106,3 +108,86 @@ class TestXMLModuleStore(unittest.TestCase):
             SlashSeparatedCourseKey('edX', 'toy', '2012_Fall'),
             locator_key_fields=SlashSeparatedCourseKey.KEY_FIELDS
         )
+
+
+class TestXMLModuleStoreSnapshots(unittest.TestCase):
+    """
+    Test loading courses from snapshots and in a process pool
+    """
+    COURSE_DIRS = ['toy', 'simple']
+
+    def setUp(self):
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.snapshot_dir)
+
+    def assert_same_courses(self, expected, actual):
+        """
+        Assert that the two stores loaded the same courses, blocks and parents
+        """
+        self.assertEqual(sorted(expected.courses.keys()), sorted(actual.courses.keys()))
+        for course in expected.get_courses():
+            course_id = course.id
+            self.assertEqual(set(expected.modules[course_id]), set(actual.modules[course_id]))
+            for usage_key, block in expected.modules[course_id].iteritems():
+                restored = actual.get_item(usage_key)
+                self.assertIs(type(block), type(restored))
+                self.assertEqual(block.display_name, restored.display_name)
+                self.assertEqual(getattr(block, 'data_dir', None), getattr(restored, 'data_dir', None))
+                self.assertEqual(
+                    sorted(expected.get_parent_locations(usage_key)),
+                    sorted(actual.get_parent_locations(usage_key))
+                )
+                if block.has_children:
+                    self.assertEqual(
+                        [child.location for child in block.get_children()],
+                        [child.location for child in restored.get_children()]
+                    )
+            self.assertEqual(expected.get_course_errors(course_id), actual.get_course_errors(course_id))
+
+    def test_snapshot_round_trip(self):
+        parsed = XMLModuleStore(DATA_DIR, course_dirs=self.COURSE_DIRS, snapshot_dir=self.snapshot_dir)
+        self.assertEqual(len(os.listdir(self.snapshot_dir)), len(self.COURSE_DIRS))
+
+        with patch.object(XMLModuleStore, 'load_course') as mock_load_course:
+            restored = XMLModuleStore(DATA_DIR, course_dirs=self.COURSE_DIRS, snapshot_dir=self.snapshot_dir)
+        self.assertFalse(mock_load_course.called)
+        self.assert_same_courses(parsed, restored)
+
+    def test_snapshot_respects_course_ids(self):
+        XMLModuleStore(DATA_DIR, course_dirs=self.COURSE_DIRS, snapshot_dir=self.snapshot_dir)
+        store = XMLModuleStore(
+            DATA_DIR, course_dirs=self.COURSE_DIRS, course_ids=['edX/toy/2012_Fall'], snapshot_dir=self.snapshot_dir
+        )
+        self.assertEqual(store.courses.keys(), ['toy'])
+
+    def test_changed_course_is_parsed(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        shutil.copytree(os.path.join(DATA_DIR, 'toy'), os.path.join(data_dir, 'toy'))
+        XMLModuleStore(data_dir, course_dirs=['toy'], snapshot_dir=self.snapshot_dir)
+        old_snapshots = os.listdir(self.snapshot_dir)
+
+        with open(os.path.join(data_dir, 'toy', 'html', 'toyhtml.html'), 'a') as html_file:
+            html_file.write('<p>CHANGED</p>')
+        store = XMLModuleStore(data_dir, course_dirs=['toy'], snapshot_dir=self.snapshot_dir)
+        html = store.get_item(SlashSeparatedCourseKey('edX', 'toy', '2012_Fall').make_usage_key('html', 'toyhtml'))
+        self.assertIn('CHANGED', html.data)
+
+        # the snapshot of the old version is replaced
+        new_snapshots = os.listdir(self.snapshot_dir)
+        self.assertEqual(len(new_snapshots), 1)
+        self.assertNotEqual(old_snapshots, new_snapshots)
+
+    def test_bad_snapshot_is_ignored(self):
+        parsed = XMLModuleStore(DATA_DIR, course_dirs=self.COURSE_DIRS, snapshot_dir=self.snapshot_dir)
+        for file_name in os.listdir(self.snapshot_dir):
+            with open(os.path.join(self.snapshot_dir, file_name), 'wb') as snapshot_file:
+                snapshot_file.write('not a pickle')
+
+        store = XMLModuleStore(DATA_DIR, course_dirs=self.COURSE_DIRS, snapshot_dir=self.snapshot_dir)
+        self.assert_same_courses(parsed, store)
+
+    def test_load_in_processes(self):
+        parsed = XMLModuleStore(DATA_DIR, course_dirs=self.COURSE_DIRS)
+        store = XMLModuleStore(DATA_DIR, course_dirs=self.COURSE_DIRS, processes=2)
+        self.assert_same_courses(parsed, store)
@@ -1,11 +1,14 @@
+import cPickle
 import hashlib
 import itertools
 import json
 import logging
+import multiprocessing
 import os
 import re
 import sys
 import glob
+import tempfile
 
 from collections import defaultdict
 from cStringIO import StringIO
@@ -40,6 +43,10 @@ etree.set_default_parser(edx_xml_parser)
 
 log = logging.getLogger(__name__)
 
+# Bump this whenever a change to the loading code or to what a snapshot records makes
+# existing course snapshots invalid
+SNAPSHOT_VERSION = 1
+
 
 # VS[compat]
 # TODO (cpennington): Remove this once all fall 2012 courses have been imported
@@ -362,13 +369,42 @@ class ParentTracker(object):
         return list(self._parents[child])
 
 
+def _qualified_name(obj):
+    """
+    The dotted name of a class or function (or the repr of anything else), which, unlike its
+    repr, is the same in every process
+    """
+    if hasattr(obj, '__module__') and hasattr(obj, '__name__'):
+        return '{0}.{1}'.format(obj.__module__, obj.__name__)
+    return repr(obj)
+
+
+# The store whose courses a process pool is loading
+_POOL_STORE = None
+
+
+def _snapshot_course_in_process(args):
+    """
+    Load one course, in a worker process, as _POOL_STORE would and return its snapshot (or None)
+    """
+    course_dir, course_ids = args
+    try:
+        options = _POOL_STORE._loader_options  # pylint: disable=protected-access
+        store = XMLModuleStore(_POOL_STORE.data_dir, course_dirs=[], **options)
+        store.try_load_course(course_dir, course_ids)
+        return store.snapshot_course(course_dir)
+    except Exception:  # pylint: disable=broad-except
+        log.exception("Failed to load course %s in a worker process", course_dir)
+        return None
+
+
 class XMLModuleStore(ModuleStoreReadBase):
     """
     An XML backed ModuleStore
     """
     def __init__(
         self, data_dir, default_class=None, course_dirs=None, course_ids=None,
-        load_error_modules=True, i18n_service=None, **kwargs
+        load_error_modules=True, i18n_service=None, snapshot_dir=None, processes=None, **kwargs
     ):
         """
         Initialize an XMLModuleStore from data_dir
@@ -381,10 +417,28 @@ class XMLModuleStore(ModuleStoreReadBase):
 
             course_dirs or course_ids (list of str): If specified, the list of course_dirs or course_ids to load. Otherwise,
                 load all courses. Note, providing both
+
+            snapshot_dir (str): If specified, a directory in which to save a snapshot of each loaded
+                course, keyed by a hash of the course's files, and from which to load unchanged
+                courses rather than parsing them again. Snapshots are pickles; so, this directory
+                must be as trusted as the code. They record the loaded XBlocks' field data, so
+                clear it (or use a new one) when deploying new code.
+
+            processes (int): If more than 1, parse the courses which aren't loaded from snapshots
+                in a pool of this many processes
         """
         super(XMLModuleStore, self).__init__(**kwargs)
 
+        # the options a worker process needs to load courses as this store would
+        self._loader_options = dict(
+            default_class=default_class,
+            load_error_modules=load_error_modules,
+            i18n_service=i18n_service,
+            **kwargs
+        )
+
         self.data_dir = path(data_dir)
+        self.snapshot_dir = path(snapshot_dir) if snapshot_dir else None
         self.modules = defaultdict(dict)  # course_id -> dict(location -> XBlock)
         self.courses = {}  # course_dir -> XBlock for the course
         self.errored_courses = {}  # course_dir -> errorlog, for dirs that failed to load
@@ -417,8 +471,213 @@ class XMLModuleStore(ModuleStoreReadBase):
         if course_dirs is None:
             course_dirs = sorted([d for d in os.listdir(self.data_dir) if
                                   os.path.exists(self.data_dir / d / "course.xml")])
+        self._load_courses(course_dirs, course_ids, processes)
+
+    def _load_courses(self, course_dirs, course_ids, processes):
+        """
+        Load the courses in course_dirs: from their snapshots where possible, otherwise by
+        parsing them, in a pool of `processes` processes if that's more than 1.
+        """
+        digests = {}
+        to_parse = []
         for course_dir in course_dirs:
-            self.try_load_course(course_dir, course_ids)
+            if self.snapshot_dir is not None:
+                digests[course_dir] = self._course_digest(course_dir)
+                snapshot = self._read_snapshot(course_dir, digests[course_dir])
+                if snapshot is not None and self.restore_course(course_dir, snapshot, course_ids):
+                    continue
+            to_parse.append(course_dir)
+
+        snapshots = {}
+        if processes is not None and processes > 1 and len(to_parse) > 1:
+            snapshots = self._snapshot_courses_in_processes(to_parse, course_ids, processes)
+
+        for course_dir in to_parse:
+            snapshot = snapshots.get(course_dir)
+            if snapshot is None or not self.restore_course(course_dir, snapshot, course_ids):
+                self.try_load_course(course_dir, course_ids)
+                snapshot = self.snapshot_course(course_dir) if self.snapshot_dir is not None else None
+            if snapshot is not None and self.snapshot_dir is not None:
+                self._write_snapshot(course_dir, digests[course_dir], snapshot)
+
+    def _course_digest(self, course_dir):
+        """
+        Return a hash of the course directory's files and of the options which affect how it loads.
+        Files under static/ contribute only their names and sizes, since loading doesn't read them
+        and they can be large.
+        """
+        digest = hashlib.sha1()
+        digest.update(repr((
+            SNAPSHOT_VERSION,
+            course_dir,
+            self.load_error_modules,
+            _qualified_name(self.default_class),
+            [_qualified_name(mixin) for mixin in self.xblock_mixins],
+            _qualified_name(self.xblock_select),
+        )))
+        course_path = self.data_dir / course_dir
+        for dir_path, dir_names, file_names in os.walk(course_path, followlinks=True):
+            # walk in the same order every time
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                file_path = os.path.join(dir_path, file_name)
+                relative_path = os.path.relpath(file_path, course_path)
+                if isinstance(relative_path, unicode):
+                    relative_path = relative_path.encode('utf-8')
+                digest.update(relative_path + '\0')
+                if relative_path.split(os.sep)[0] == 'static':
+                    digest.update(str(os.path.getsize(file_path)))
+                else:
+                    with open(file_path, 'rb') as course_file:
+                        for chunk in iter(lambda: course_file.read(65536), ''):
+                            digest.update(chunk)
+                digest.update('\0')
+        return digest.hexdigest()
+
+    def _snapshot_path(self, course_dir, digest):
+        """
+        The path of the snapshot of the given version of the course
+        """
+        return self.snapshot_dir / u'{0}.{1}.snapshot'.format(course_dir, digest)
+
+    def _read_snapshot(self, course_dir, digest):
+        """
+        Return the saved snapshot of this version of the course, or None if there isn't one
+        """
+        try:
+            with open(self._snapshot_path(course_dir, digest), 'rb') as snapshot_file:
+                return snapshot_file.read()
+        except IOError:
+            return None
+
+    def _write_snapshot(self, course_dir, digest, snapshot):
+        """
+        Save the course's snapshot, replacing any of older versions of the course
+        """
+        snapshot_path = self._snapshot_path(course_dir, digest)
+        try:
+            if not os.path.isdir(self.snapshot_dir):
+                os.makedirs(self.snapshot_dir)
+            # write to a temp file and rename it into place so that other processes never read a partial file
+            file_descriptor, temp_path = tempfile.mkstemp(dir=self.snapshot_dir)
+            try:
+                with os.fdopen(file_descriptor, 'wb') as temp_file:
+                    temp_file.write(snapshot)
+                os.rename(temp_path, snapshot_path)
+            except Exception:
+                os.remove(temp_path)
+                raise
+            for file_name in os.listdir(self.snapshot_dir):
+                stale_path = self.snapshot_dir / file_name
+                if (
+                        file_name.startswith(course_dir + u'.') and file_name.endswith(u'.snapshot') and
+                        file_name.count(u'.') == course_dir.count(u'.') + 2 and stale_path != snapshot_path
+                ):
+                    os.remove(stale_path)
+        except (IOError, OSError):
+            log.warning("Unable to save the snapshot of course %s", course_dir, exc_info=True)
+
+    def snapshot_course(self, course_dir):
+        """
+        Return a pickled snapshot of the loaded course from which restore_course can rebuild it,
+        or None if the course isn't loaded or can't be snapshotted.
+        """
+        course = self.courses.get(course_dir)
+        if course is None:
+            return None
+        course_id = course.id
+
+        blocks = []
+        for block in self.modules[course_id].itervalues():
+            if block._field_data is self.field_data:  # pylint: disable=protected-access
+                # pure XBlocks keep their fields in the store-wide field data, which isn't snapshotted
+                log.info("Not snapshotting course %s: %s uses shared field data", course_dir, block.location)
+                return None
+            block_class = type(block)
+            blocks.append((
+                getattr(block_class, 'unmixed_class', block_class),
+                block.scope_ids,
+                block._field_data,  # pylint: disable=protected-access
+                getattr(block, 'data_dir', None),
+            ))
+
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'course_dir': course_dir,
+            'course_id': course_id,
+            'course_usage_id': course.scope_ids.usage_id,
+            'blocks': blocks,
+            'parents': self.parent_trackers[course_id]._parents,  # pylint: disable=protected-access
+            'errors': self._course_errors[course_id].errors,
+        }
+        try:
+            return cPickle.dumps(snapshot, cPickle.HIGHEST_PROTOCOL)
+        except Exception:  # pylint: disable=broad-except
+            log.warning("Unable to snapshot course %s", course_dir, exc_info=True)
+            return None
+
+    def restore_course(self, course_dir, snapshot, course_ids=None):
+        """
+        Load the course from a snapshot made by snapshot_course. Returns False, having loaded
+        nothing, if the snapshot can't be used; otherwise True (including when the course isn't
+        loaded because its id isn't in course_ids).
+        """
+        course_id = None
+        try:
+            snapshot = cPickle.loads(snapshot)
+            if snapshot['version'] != SNAPSHOT_VERSION or snapshot['course_dir'] != course_dir:
+                return False
+
+            course_id = snapshot['course_id']
+            if course_ids is not None and course_id not in course_ids:
+                return True
+
+            errorlog = make_error_tracker()
+            errorlog.errors.extend(snapshot['errors'])
+            self.parent_trackers[course_id]._parents = snapshot['parents']  # pylint: disable=protected-access
+            system = self._make_import_system(course_dir, course_id, errorlog.tracker, lambda usage_id: {})
+            for block_class, scope_ids, field_data, data_dir in snapshot['blocks']:
+                block = system.construct_xblock_from_class(block_class, scope_ids, field_data)
+                if data_dir is not None:
+                    block.data_dir = data_dir
+                self.modules[course_id][scope_ids.usage_id] = block
+            self.courses[course_dir] = self.modules[course_id][snapshot['course_usage_id']]
+        except Exception:  # pylint: disable=broad-except
+            log.warning("Unable to load course %s from its snapshot", course_dir, exc_info=True)
+            if course_id is not None:
+                self.modules.pop(course_id, None)
+                self.parent_trackers.pop(course_id, None)
+            self.courses.pop(course_dir, None)
+            return False
+
+        self._course_errors[course_id] = errorlog
+        return True
+
+    def _snapshot_courses_in_processes(self, course_dirs, course_ids, processes):
+        """
+        Parse the courses in a pool of processes. Returns a dict of course_dir to snapshot
+        for each course that was loaded and could be snapshotted.
+        """
+        global _POOL_STORE  # pylint: disable=global-statement
+        # the workers are forked; so, they get the store without pickling it
+        _POOL_STORE = self
+        try:
+            pool = multiprocessing.Pool(processes)
+            try:
+                snapshots = pool.map(
+                    _snapshot_course_in_process, [(course_dir, course_ids) for course_dir in course_dirs]
+                )
+            finally:
+                pool.close()
+                pool.join()
+        except Exception:  # pylint: disable=broad-except
+            log.warning("Unable to load courses in a process pool; loading them one by one", exc_info=True)
+            return {}
+        finally:
+            _POOL_STORE = None
+        return dict(
+            (course_dir, snapshot) for course_dir, snapshot in zip(course_dirs, snapshots) if snapshot is not None
+        )
 
     def try_load_course(self, course_dir, course_ids=None):
         '''
@@ -549,24 +808,7 @@ class XMLModuleStore(ModuleStoreReadBase):
                 """
                 return policy.get(policy_key(usage_id), {})
 
-            services = {}
-            if self.i18n_service:
-                services['i18n'] = self.i18n_service
-
-            system = ImportSystem(
-                xmlstore=self,
-                course_id=course_id,
-                course_dir=course_dir,
-                error_tracker=tracker,
-                parent_tracker=self.parent_trackers[course_id],
-                load_error_modules=self.load_error_modules,
-                get_policy=get_policy,
-                mixins=self.xblock_mixins,
-                default_class=self.default_class,
-                select=self.xblock_select,
-                field_data=self.field_data,
-                services=services,
-            )
+            system = self._make_import_system(course_dir, course_id, tracker, get_policy)
 
             course_descriptor = system.process_xml(etree.tostring(course_data, encoding='unicode'))
 
@@ -595,6 +837,29 @@ class XMLModuleStore(ModuleStoreReadBase):
             log.debug('========> Done with course import from {0}'.format(course_dir))
             return course_descriptor
 
+    def _make_import_system(self, course_dir, course_id, tracker, get_policy):
+        """
+        Return the ImportSystem for loading the course's blocks
+        """
+        services = {}
+        if self.i18n_service:
+            services['i18n'] = self.i18n_service
+
+        return ImportSystem(
+            xmlstore=self,
+            course_id=course_id,
+            course_dir=course_dir,
+            error_tracker=tracker,
+            parent_tracker=self.parent_trackers[course_id],
+            load_error_modules=self.load_error_modules,
+            get_policy=get_policy,
+            mixins=self.xblock_mixins,
+            default_class=self.default_class,
+            select=self.xblock_select,
+            field_data=self.field_data,
+            services=services,
+        )
+
     def load_extra_content(self, system, course_descriptor, category, base_dir, course_dir, url_name):
         self._load_extra_content(system, course_descriptor, category, base_dir, course_dir)
 
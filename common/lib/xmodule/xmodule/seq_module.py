@@ -47,6 +47,9 @@ class SequenceModule(SequenceFields, XModule):
     css = {'scss': [resource_string(__name__, 'css/sequence/display.scss')]}
     js_module_name = "Sequence"
 
+    # The dispatches which only need the student state of the sequence itself:
+    # render_position loads that of the unit it renders.
+    own_state_dispatches = ('goto_position', 'render_position')
 
     def __init__(self, *args, **kwargs):
         super(SequenceModule, self).__init__(*args, **kwargs)
@@ -70,8 +73,42 @@ class SequenceModule(SequenceFields, XModule):
         if dispatch == 'goto_position':
             self.position = int(data['position'])
             return json.dumps({'success': True})
+        if dispatch == 'render_position':
+            return json.dumps({'content': self._render_position(int(data['position']))})
         raise NotFoundError('Unexpected dispatch type')
 
+    @property
+    def lazy_rendering(self):
+        """
+        Whether only the unit at the current position is rendered with the
+        sequence, the others being fetched with the render_position dispatch
+        """
+        return getattr(self.system, 'lazy_sequence_rendering', False)
+
+    def _render_position(self, position):
+        """
+        Render the unit at `position` (1-indexed) by itself, returning its HTML
+        with the HTML for any resources it needs
+        """
+        # The handler may only have loaded the student state of the sequence itself.
+        # The child modules are bound to whatever state is loaded when they're
+        # created, so load that of the children before creating them, and then that
+        # of the rest of the unit being rendered.
+        cache_descendents = getattr(self.system, 'cache_descendents', None)
+        if cache_descendents is not None:
+            cache_descendents(self.descriptor, depth=1)
+
+        display_items = self.get_display_items()
+        if not 1 <= position <= len(display_items):
+            raise NotFoundError('Position {} is not in this sequence'.format(position))
+        child = display_items[position - 1]
+
+        if cache_descendents is not None:
+            cache_descendents(getattr(child, 'descriptor', child))
+
+        rendered_child = child.render('student_view', {})
+        return rendered_child.head_html() + rendered_child.body_html() + rendered_child.foot_html()
+
     def student_view(self, context):
         # If we're rendering this sequence, but no position is set yet,
         # default the position to the first element
@@ -83,14 +120,19 @@ class SequenceModule(SequenceFields, XModule):
 
         fragment = Fragment()
 
-        for child in self.get_display_items():
+        for index, child in enumerate(self.get_display_items()):
             progress = child.get_progress()
-            rendered_child = child.render('student_view', context)
-            fragment.add_frag_resources(rendered_child)
+            if self.lazy_rendering and index != self.position - 1:
+                # rendered when the student moves to it
+                content = None
+            else:
+                rendered_child = self.system.render_escaped(child, 'student_view', context)
+                fragment.add_frag_resources(rendered_child)
+                content = rendered_child.content
 
             titles = child.get_content_titles()
             childinfo = {
-                'content': rendered_child.content,
+                'content': content,
                 'title': "\n".join(titles),
                 'page_title': titles[0] if titles else '',
                 'progress_status': Progress.to_js_status_str(progress),
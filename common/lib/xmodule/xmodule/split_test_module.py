@@ -154,7 +154,7 @@ class SplitTestModule(SplitTestFields, XModule):
             child_location = self.group_id_to_child[group_id]
             child_descriptor = self.get_child_descriptor_by_location(child_location)
             child = self.system.get_module(child_descriptor)
-            rendered_child = child.render('student_view', context)
+            rendered_child = self.system.render_escaped(child, 'student_view', context)
             fragment.add_frag_resources(rendered_child)
 
             contents.append({
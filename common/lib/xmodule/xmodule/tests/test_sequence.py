@@ -0,0 +1,79 @@
+"""
+Tests for sequence module.
+"""
+import json
+
+from xmodule.exceptions import NotFoundError
+from xmodule.tests import get_test_system
+from xmodule.tests.xml import XModuleXmlImportTest
+from xmodule.tests.xml import factories as xml
+
+
+class SequenceModuleTestCase(XModuleXmlImportTest):
+    test_html_1 = 'Test HTML 1'
+    test_html_2 = 'Test HTML 2'
+
+    def setUp(self):
+        # construct module
+        course = xml.CourseFactory.build()
+        sequence = xml.SequenceFactory.build(parent=course)
+        vertical_1 = xml.VerticalFactory.build(parent=sequence)
+        vertical_2 = xml.VerticalFactory.build(parent=sequence)
+        xml.HtmlFactory(parent=vertical_1, url_name='test-html-1', text=self.test_html_1)
+        xml.HtmlFactory(parent=vertical_2, url_name='test-html-2', text=self.test_html_2)
+
+        self.course = self.process_xml(course)
+        self.module_system = get_test_system()
+        self.cached_descriptors = []
+
+        def get_module(descriptor):
+            """Mocks module_system get_module function"""
+            module_system = get_test_system()
+            module_system.get_module = get_module
+            descriptor.bind_for_student(module_system, descriptor._field_data)  # pylint: disable=protected-access
+            return descriptor
+
+        self.module_system.get_module = get_module
+        self.module_system.descriptor_system = self.course.runtime
+        def cache_descendents(descriptor, depth=None):
+            """Records the descriptors whose descendents' state would be loaded"""
+            self.cached_descriptors.append((descriptor.location, depth))
+
+        self.module_system.set('cache_descendents', cache_descendents)
+
+        self.sequence = self.course.get_children()[0]
+        self.sequence.xmodule_runtime = self.module_system
+
+    def test_render_student_view(self):
+        """
+        Test that every unit is rendered with the sequence by default.
+        """
+        html = self.module_system.render(self.sequence, 'student_view', {}).content
+        self.assertIn(self.test_html_1, html)
+        self.assertIn(self.test_html_2, html)
+
+    def test_lazy_render_student_view(self):
+        """
+        Test that only the current unit is rendered with the sequence when rendering lazily.
+        """
+        self.module_system.set('lazy_sequence_rendering', True)
+        html = self.module_system.render(self.sequence, 'student_view', {}).content
+        self.assertIn(self.test_html_1, html)
+        self.assertNotIn(self.test_html_2, html)
+
+    def test_render_position(self):
+        """
+        Test that the render_position dispatch renders the unit, after loading the state
+        of the sequence's children and then of the unit's descendents.
+        """
+        response = json.loads(self.sequence.handle_ajax('render_position', {'position': '2'}))
+        self.assertIn(self.test_html_2, response['content'])
+        self.assertNotIn(self.test_html_1, response['content'])
+        self.assertEqual(
+            self.cached_descriptors,
+            [(self.sequence.location, 1), (self.sequence.get_children()[1].location, None)],
+        )
+
+    def test_render_position_out_of_range(self):
+        with self.assertRaises(NotFoundError):
+            self.sequence.handle_ajax('render_position', {'position': '3'})
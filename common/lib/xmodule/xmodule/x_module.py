@@ -1248,6 +1248,15 @@ class ModuleSystem(MetricsMixin, ConfigurableFragmentWrapper, Runtime):  # pylin
         self.descriptor_runtime = descriptor_runtime
         self.rebind_noauth_module_to_user = rebind_noauth_module_to_user
 
+    def render_escaped(self, block, view_name, context=None):
+        """
+        Render `block`, a child of the block being rendered, whose content that
+        block will HTML escape. Runtimes which process the content of a whole
+        render at once can override this to process the child's content before
+        it's escaped.
+        """
+        return block.render(view_name, context)
+
     def get(self, attr):
         """	provide uniform access to attributes (like etree)."""
         return self.__dict__.get(attr)
@@ -8,27 +8,44 @@ import csv
 from django.http import HttpResponse
 
 
+class _LineBuffer(object):
+    """
+    A file-like object which just returns what's written to it, so that a
+    csv.writer can produce the lines of a file one at a time
+    """
+    def write(self, value):
+        """ Return the value instead of storing it """
+        return value
+
+
 def create_csv_response(filename, header, datarows):
     """
     Create an HttpResponse with an attached .csv file
 
     header   e.g. ['Name', 'Email']
     datarows e.g. [['Jim', 'jim@edy.org'], ['Jake', 'jake@edy.org'], ...]
+
+    `datarows` may be any iterable, such as a generator; the response's content
+    is produced a row at a time as it's sent, so the file is never built in memory.
     """
-    response = HttpResponse(mimetype='text/csv')
+    response = HttpResponse(_csv_lines(header, datarows), mimetype='text/csv')
     response['Content-Disposition'] = 'attachment; filename={0}'\
         .format(filename)
+    return response
+
+
+def _csv_lines(header, datarows):
+    """ Yield the lines of a csv file with the header and rows """
     csvwriter = csv.writer(
-        response,
+        _LineBuffer(),
         dialect='excel',
         quotechar='"',
         quoting=csv.QUOTE_ALL)
 
-    csvwriter.writerow(header)
+    yield csvwriter.writerow(header)
     for datarow in datarows:
         encoded_row = [unicode(s).encode('utf-8') for s in datarow]
-        csvwriter.writerow(encoded_row)
-    return response
+        yield csvwriter.writerow(encoded_row)
 
 
 def format_dictlist(dictlist, features):
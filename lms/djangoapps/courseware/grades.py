@@ -1,19 +1,23 @@
 # Compute grades using real division, with no integer truncation
 from __future__ import division
 from collections import defaultdict
+from itertools import islice
+import hashlib
 import json
 import random
 import logging
 
 from contextlib import contextmanager
 from django.conf import settings
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.test.client import RequestFactory
+from django.utils import timezone
 
 from dogapi import dog_stats_api
 
 from courseware import courses
-from courseware.model_data import FieldDataCache
+from courseware.access import has_access
+from courseware.model_data import FieldDataCache, chunks
 from student.models import anonymous_id_for_user
 from submissions import api as sub_api
 from xmodule import graders
@@ -21,7 +25,7 @@ from xmodule.graders import Score
 from xmodule.modulestore.django import modulestore
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.util.duedate import get_extended_due_date
-from .models import StudentModule
+from .models import StudentModule, StudentGradeSummary
 from .module_render import get_module_for_descriptor
 from opaque_keys import InvalidKeyError
 
@@ -51,6 +55,151 @@ def yield_dynamic_descriptor_descendents(descriptor, module_creator):
         yield next_descriptor
 
 
+class StudentModuleScores(object):
+    """
+    A snapshot of the StudentModule (grade, max_grade) values for a single
+    student in a single course.
+
+    The snapshot is built once per grading call, with one query over every
+    location that could contribute to the grade, so that `get_score` doesn't
+    have to go back to the database for every problem in the course.
+    """
+    def __init__(self, course_id, user, locations, chunk_size=500, prefetched_scores=None, loaded_at=None):
+        """
+        course_id: the course in the context of which to load StudentModules
+        user: the django user whose scores should be loaded
+        locations: an iterable of usage keys to load scores for. Only these
+            locations are considered covered by the snapshot; lookups for
+            any other location fall back to a direct query in `get_score`.
+        prefetched_scores: if not None, a tuple of dicts of location -> (grade, max_grade)
+            and location -> modified time that were already loaded for this
+            user (see `bulk_load`). No query is made in that case.
+        loaded_at: the time at which the prefetched scores started to be loaded.
+        """
+        self.course_id = course_id
+        self._locations = set(locations)
+        self._scores = {}
+        self._modified = {}
+        # Taken before querying, so that any StudentModule saved while the
+        # snapshot is being built is considered newer than the snapshot
+        self.loaded_at = loaded_at or timezone.now()
+
+        if prefetched_scores is not None:
+            self._scores, self._modified = prefetched_scores
+            return
+
+        if not user.is_authenticated() or not self._locations:
+            return
+
+        for chunk in chunks(self._locations, chunk_size):
+            student_modules = StudentModule.objects.filter(
+                student=user,
+                course_id=course_id,
+                module_state_key__in=chunk,
+            ).only('module_state_key', 'grade', 'max_grade', 'modified')
+            for student_module in student_modules:
+                location = student_module.module_state_key.map_into_course(course_id)
+                self._scores[location] = (student_module.grade, student_module.max_grade)
+                self._modified[location] = student_module.modified
+
+    @staticmethod
+    def graded_locations(course):
+        """
+        Return the set of every scored location in `course.grading_context`.
+        """
+        return set(
+            descriptor.location
+            for sections in course.grading_context['graded_sections'].itervalues()
+            for section in sections
+            for descriptor in section['xmoduledescriptors']
+        )
+
+    @classmethod
+    def from_grading_context(cls, course, user):
+        """
+        Build a snapshot covering every scored location in `course.grading_context`.
+        """
+        return cls(course.id, user, cls.graded_locations(course))
+
+    @classmethod
+    def bulk_load(cls, course, users, chunk_size=500):
+        """
+        Build snapshots for several users at once, covering every scored location
+        in `course.grading_context`.
+
+        The StudentModules for all of `users` are loaded together, so this costs one
+        query per `chunk_size` locations no matter how many users are passed in.
+
+        Returns a dict mapping user id -> StudentModuleScores.
+        """
+        locations = cls.graded_locations(course)
+        users_by_id = dict((user.id, user) for user in users if user.is_authenticated())
+        scores_by_user = dict((user_id, ({}, {})) for user_id in users_by_id)
+        # Taken before the first query, as in __init__
+        loaded_at = timezone.now()
+
+        if users_by_id and locations:
+            for chunk in chunks(locations, chunk_size):
+                student_modules = StudentModule.objects.filter(
+                    student__in=users_by_id.keys(),
+                    course_id=course.id,
+                    module_state_key__in=chunk,
+                ).only('student', 'module_state_key', 'grade', 'max_grade', 'modified')
+                for student_module in student_modules:
+                    location = student_module.module_state_key.map_into_course(course.id)
+                    scores, modified = scores_by_user[student_module.student_id]
+                    scores[location] = (student_module.grade, student_module.max_grade)
+                    modified[location] = student_module.modified
+
+        return dict(
+            (user_id, cls(course.id, users_by_id[user_id], locations, prefetched_scores=scores, loaded_at=loaded_at))
+            for user_id, scores in scores_by_user.iteritems()
+        )
+
+    def covers(self, location):
+        """
+        Return True if the snapshot was built for `location`, whether or not the
+        student has a StudentModule for it.
+        """
+        return location in self._locations
+
+    def get(self, location):
+        """
+        Return the (grade, max_grade) tuple stored for `location`, or None if
+        the student has no StudentModule for it.
+        """
+        return self._scores.get(location)
+
+    def has_any(self, locations):
+        """
+        Return True if the student has a StudentModule for any of `locations`.
+        """
+        return any(location in self._scores for location in locations)
+
+    def modified_since(self, locations, timestamp):
+        """
+        Return True if the student's StudentModule for any of `locations` was
+        modified at or after `timestamp`.
+        """
+        return any(
+            location in self._modified and self._modified[location] >= timestamp
+            for location in locations
+        )
+
+
+def _section_fingerprint(section):
+    """
+    Return a hash of the structure of a graded section from the grading
+    context: which scored blocks it contains, and their weights and graded flags.
+    """
+    hasher = hashlib.sha1(section['section_descriptor'].location.to_deprecated_string())
+    for descriptor in section['xmoduledescriptors']:
+        hasher.update(u'|{}|{}|{}'.format(
+            descriptor.location.to_deprecated_string(), descriptor.weight, descriptor.graded
+        ).encode('utf-8'))
+    return hasher.hexdigest()
+
+
 def answer_distributions(course_key):
     """
     Given a course_key, return answer distributions in the form of a dictionary
@@ -141,16 +290,16 @@ def answer_distributions(course_key):
     return answer_counts
 
 @transaction.commit_manually
-def grade(student, request, course, keep_raw_scores=False):
+def grade(student, request, course, keep_raw_scores=False, student_module_scores=None, max_scores_cache=None):
     """
     Wraps "_grade" with the manual_transaction context manager just in case
     there are unanticipated errors.
     """
     with manual_transaction():
-        return _grade(student, request, course, keep_raw_scores)
+        return _grade(student, request, course, keep_raw_scores, student_module_scores, max_scores_cache)
 
 
-def _grade(student, request, course, keep_raw_scores):
+def _grade(student, request, course, keep_raw_scores, student_module_scores=None, max_scores_cache=None):
     """
     Unwrapped version of "grade"
 
@@ -168,6 +317,14 @@ def _grade(student, request, course, keep_raw_scores):
       make up the final grade. (For display)
     - keep_raw_scores : if True, then value for key 'raw_scores' contains scores
       for every graded module
+    - student_module_scores : an optional, already loaded StudentModuleScores
+      snapshot for this student (see `iterate_grades_for`)
+    - max_scores_cache : an optional dict shared between calls, see `get_score`
+
+    Unless raw scores are requested, section totals are read from and saved to
+    the student's StudentGradeSummary, so that only sections whose scores or
+    structure changed since the last call are recomputed. See the docstring of
+    StudentGradeSummary for exactly when a section is recomputed.
 
     More information on the format is in the docstring for CourseGrader.
     """
@@ -181,6 +338,23 @@ def _grade(student, request, course, keep_raw_scores):
         course.id.to_deprecated_string(), anonymous_id_for_user(student, course.id)
     )
 
+    # All of the StudentModule scores that can contribute to the grade, fetched
+    # up front so that sections and problems don't each need their own query
+    if student_module_scores is None:
+        with manual_transaction():
+            student_module_scores = StudentModuleScores.from_grading_context(course, student)
+
+    grade_summary_record = None
+    cached_section_grades = {}
+    section_grades = {}
+    if not keep_raw_scores and not settings.GENERATE_PROFILE_SCORES and student.is_authenticated():
+        with manual_transaction():
+            try:
+                grade_summary_record = StudentGradeSummary.objects.get(student=student, course_id=course.id)
+                cached_section_grades = json.loads(grade_summary_record.section_grades)
+            except StudentGradeSummary.DoesNotExist:
+                grade_summary_record = StudentGradeSummary(student=student, course_id=course.id)
+
     totaled_scores = {}
     # This next complicated loop is just to collect the totaled_scores, which is
     # passed to the grader
@@ -189,6 +363,7 @@ def _grade(student, request, course, keep_raw_scores):
         for section in sections:
             section_descriptor = section['section_descriptor']
             section_name = section_descriptor.display_name_with_default
+            section_locations = [descriptor.location for descriptor in section['xmoduledescriptors']]
 
             # some problems have state that is updated independently of interaction
             # with the LMS, so they need to always be scored. (E.g. foldit.,
@@ -202,22 +377,35 @@ def _grade(student, request, course, keep_raw_scores):
             # API. If scores exist, we have to calculate grades for this section.
             if not should_grade_section:
                 should_grade_section = any(
-                    descriptor.location.to_deprecated_string() in submissions_scores
-                    for descriptor in section['xmoduledescriptors']
+                    location.to_deprecated_string() in submissions_scores
+                    for location in section_locations
                 )
 
+            # Only sections whose scores all come from StudentModules can be
+            # cached in the StudentGradeSummary
+            cacheable_section = grade_summary_record is not None and not should_grade_section
+            section_key = section_descriptor.location.to_deprecated_string()
+            cached_section_grade = None
+            if cacheable_section:
+                fingerprint = _section_fingerprint(section)
+                cached_section_grade = cached_section_grades.get(section_key)
+                if cached_section_grade is not None and (
+                        cached_section_grade['fingerprint'] != fingerprint or
+                        student_module_scores.modified_since(section_locations, grade_summary_record.computed)
+                ):
+                    cached_section_grade = None
+
             if not should_grade_section:
-                with manual_transaction():
-                    should_grade_section = StudentModule.objects.filter(
-                        student=student,
-                        module_state_key__in=[
-                            descriptor.location for descriptor in section['xmoduledescriptors']
-                        ]
-                    ).exists()
+                should_grade_section = student_module_scores.has_any(section_locations)
 
             # If we haven't seen a single problem in the section, we don't have
             # to grade it at all! We can assume 0%
-            if should_grade_section:
+            if cached_section_grade is not None:
+                graded_total = Score(
+                    cached_section_grade['earned'], cached_section_grade['possible'], True, section_name
+                )
+                section_grades[section_key] = cached_section_grade
+            elif should_grade_section:
                 scores = []
 
                 def create_module(descriptor):
@@ -231,7 +419,8 @@ def _grade(student, request, course, keep_raw_scores):
                 for module_descriptor in yield_dynamic_descriptor_descendents(section_descriptor, create_module):
 
                     (correct, total) = get_score(
-                        course.id, student, module_descriptor, create_module, scores_cache=submissions_scores
+                        course.id, student, module_descriptor, create_module, scores_cache=submissions_scores,
+                        student_module_scores=student_module_scores, max_scores_cache=max_scores_cache
                     )
                     if correct is None and total is None:
                         continue
@@ -252,6 +441,12 @@ def _grade(student, request, course, keep_raw_scores):
                 _, graded_total = graders.aggregate_scores(scores, section_name)
                 if keep_raw_scores:
                     raw_scores += scores
+                if cacheable_section:
+                    section_grades[section_key] = {
+                        'fingerprint': fingerprint,
+                        'earned': graded_total.earned,
+                        'possible': graded_total.possible,
+                    }
             else:
                 graded_total = Score(0.0, 1.0, True, section_name)
 
@@ -264,6 +459,19 @@ def _grade(student, request, course, keep_raw_scores):
 
         totaled_scores[section_format] = format_scores
 
+    if grade_summary_record is not None and (
+            grade_summary_record.pk is None or section_grades != cached_section_grades
+    ):
+        try:
+            with manual_transaction():
+                grade_summary_record.section_grades = json.dumps(section_grades)
+                grade_summary_record.computed = student_module_scores.loaded_at
+                grade_summary_record.save()
+        except IntegrityError:
+            # Another request created this student's summary at the same time.
+            # It will be brought up to date the next time the student is graded.
+            pass
+
     grade_summary = course.grader.grade(totaled_scores, generate_random_scores=settings.GENERATE_PROFILE_SCORES)
 
     # We round the grade here, to make sure that the grade is an whole percentage and
@@ -347,6 +555,12 @@ def _progress_summary(student, request, course):
             return None
 
     submissions_scores = sub_api.get_scores(course.id.to_deprecated_string(), anonymous_id_for_user(student, course.id))
+    # The progress page also shows ungraded problems, so cover every scored
+    # descriptor that the field data cache walked rather than just the graded ones
+    with manual_transaction():
+        student_module_scores = StudentModuleScores(course.id, student, [
+            descriptor.location for descriptor in field_data_cache.descriptors if descriptor.has_score
+        ])
 
     chapters = []
     # Don't include chapters that aren't displayable (e.g. due to error)
@@ -371,7 +585,8 @@ def _progress_summary(student, request, course):
                 for module_descriptor in yield_dynamic_descriptor_descendents(section_module, module_creator):
                     course_id = course.id
                     (correct, total) = get_score(
-                        course_id, student, module_descriptor, module_creator, scores_cache=submissions_scores
+                        course_id, student, module_descriptor, module_creator, scores_cache=submissions_scores,
+                        student_module_scores=student_module_scores
                     )
                     if correct is None and total is None:
                         continue
@@ -403,7 +618,8 @@ def _progress_summary(student, request, course):
     return chapters
 
 
-def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=None):
+def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=None, student_module_scores=None,
+              max_scores_cache=None):
     """
     Return the score for a user on a problem, as a tuple (correct, total).
     e.g. (5,7) if you got 5 out of 7 points.
@@ -417,6 +633,13 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
            Can return None if user doesn't have access, or if something else went wrong.
     scores_cache: A dict of location names to (earned, possible) point tuples.
            If an entry is found in this cache, it takes precedence.
+    student_module_scores: An optional StudentModuleScores snapshot. If it covers
+           this problem, the stored grade is read from it instead of the database.
+    max_scores_cache: An optional dict of locations to the max score of the problem,
+           shared across students when grading in bulk. When the student has no
+           stored max_grade, the problem is only instantiated if it isn't found here.
+           Only problems whose max score doesn't depend on the student's seed are
+           cached, and the student's access to the problem is still checked.
     """
     scores_cache = scores_cache or {}
 
@@ -443,28 +666,42 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
         # These are not problems, and do not have a score
         return (None, None)
 
-    try:
-        student_module = StudentModule.objects.get(
-            student=user,
-            course_id=course_id,
-            module_state_key=problem_descriptor.location
-        )
-    except StudentModule.DoesNotExist:
-        student_module = None
+    if student_module_scores is not None and student_module_scores.covers(problem_descriptor.location):
+        stored_score = student_module_scores.get(problem_descriptor.location)
+    else:
+        try:
+            student_module = StudentModule.objects.get(
+                student=user,
+                course_id=course_id,
+                module_state_key=problem_descriptor.location
+            )
+            stored_score = (student_module.grade, student_module.max_grade)
+        except StudentModule.DoesNotExist:
+            stored_score = None
 
-    if student_module is not None and student_module.max_grade is not None:
-        correct = student_module.grade if student_module.grade is not None else 0
-        total = student_module.max_grade
+    if stored_score is not None and stored_score[1] is not None:
+        stored_grade, total = stored_score
+        correct = stored_grade if stored_grade is not None else 0
     else:
         # If the problem was not in the cache, or hasn't been graded yet,
         # we need to instantiate the problem.
         # Otherwise, the max score (cached in student_module) won't be available
-        problem = module_creator(problem_descriptor)
-        if problem is None:
-            return (None, None)
-
         correct = 0.0
-        total = problem.max_score()
+        cacheable = max_scores_cache is not None and _max_score_is_student_independent(problem_descriptor)
+        if cacheable and problem_descriptor.location in max_scores_cache:
+            # module_creator would have checked that this student can load the
+            # problem, so check it here too before using another student's max.
+            if not has_access(user, 'load', problem_descriptor, course_id):
+                return (None, None)
+            total = max_scores_cache[problem_descriptor.location]
+        else:
+            problem = module_creator(problem_descriptor)
+            if problem is None:
+                return (None, None)
+
+            total = problem.max_score()
+            if cacheable:
+                max_scores_cache[problem_descriptor.location] = total
 
         # Problem may be an error module (if something in the problem builder failed)
         # In which case total might be None
@@ -475,7 +712,7 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
     weight = problem_descriptor.weight
     if weight is not None:
         if total == 0:
-            log.exception("Cannot reweight a problem with zero total points. Problem: " + str(student_module))
+            log.exception("Cannot reweight a problem with zero total points. Problem: " + str(location_url))
             return (correct, total)
         correct = correct * weight / total
         total = weight
@@ -483,6 +720,15 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
     return (correct, total)
 
 
+def _max_score_is_student_independent(problem_descriptor):
+    """
+    Return whether the max score of the problem is the same for every student,
+    and so can be shared between them. A problem that is randomized per student
+    may have a different number of responses for each seed.
+    """
+    return getattr(problem_descriptor, 'rerandomize', 'never') == 'never'
+
+
 @contextmanager
 def manual_transaction():
     """A context manager for managing manual transactions"""
@@ -496,11 +742,18 @@ def manual_transaction():
         transaction.commit()
 
 
-def iterate_grades_for(course_id, students):
+def iterate_grades_for(course_id, students, batch_size=None):
     """Given a course_id and an iterable of students (User), yield a tuple of:
 
     (student, gradeset, err_msg) for every student enrolled in the course.
 
+    If batch_size is given, students are graded in batches of that size: the
+    StudentModule scores for a whole batch are loaded with a single query, and
+    the max score of problems that a student hasn't been graded on yet is
+    computed once for the course rather than once per student, so that modules
+    only need to be instantiated for blocks that always recalculate their
+    grades. The gradesets are the same as when grading one student at a time.
+
     If an error occurred, gradeset will be an empty dict and err_msg will be an
     exception message. If there was no error, err_msg is an empty string.
 
@@ -521,25 +774,54 @@ def iterate_grades_for(course_id, students):
     # grading that student.
     request = RequestFactory().get('/')
 
-    for student in students:
-        with dog_stats_api.timer('lms.grades.iterate_grades_for', tags=['action:{}'.format(course_id)]):
-            try:
-                request.user = student
-                # Grading calls problem rendering, which calls masquerading,
-                # which checks session vars -- thus the empty session dict below.
-                # It's not pretty, but untangling that is currently beyond the
-                # scope of this feature.
-                request.session = {}
-                gradeset = grade(student, request, course)
-                yield student, gradeset, ""
-            except Exception as exc:  # pylint: disable=broad-except
-                # Keep marching on even if this student couldn't be graded for
-                # some reason, but log it for future reference.
-                log.exception(
-                    'Cannot grade student %s (%s) in course %s because of exception: %s',
-                    student.username,
-                    student.id,
-                    course_id,
-                    exc.message
-                )
-                yield student, {}, exc.message
+    if batch_size:
+        batches = _batched(students, batch_size)
+        max_scores_cache = {}
+    else:
+        batches = ([student] for student in students)
+        max_scores_cache = None
+
+    for batch in batches:
+        if batch_size:
+            scores_by_user = StudentModuleScores.bulk_load(course, batch)
+        else:
+            scores_by_user = {}
+
+        for student in batch:
+            with dog_stats_api.timer('lms.grades.iterate_grades_for', tags=['action:{}'.format(course_id)]):
+                try:
+                    request.user = student
+                    # Grading calls problem rendering, which calls masquerading,
+                    # which checks session vars -- thus the empty session dict below.
+                    # It's not pretty, but untangling that is currently beyond the
+                    # scope of this feature.
+                    request.session = {}
+                    gradeset = grade(
+                        student, request, course,
+                        student_module_scores=scores_by_user.get(student.id),
+                        max_scores_cache=max_scores_cache
+                    )
+                    yield student, gradeset, ""
+                except Exception as exc:  # pylint: disable=broad-except
+                    # Keep marching on even if this student couldn't be graded for
+                    # some reason, but log it for future reference.
+                    log.exception(
+                        'Cannot grade student %s (%s) in course %s because of exception: %s',
+                        student.username,
+                        student.id,
+                        course_id,
+                        exc.message
+                    )
+                    yield student, {}, exc.message
+
+
+def _batched(items, batch_size):
+    """
+    Yields lists of up to batch_size values from items, without reading more
+    than one batch of items into memory at a time.
+    """
+    items = iter(items)
+    batch = list(islice(items, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(items, batch_size))
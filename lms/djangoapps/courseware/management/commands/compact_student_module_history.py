@@ -0,0 +1,166 @@
+"""A command to prune and compact the StudentModuleHistory table.
+
+For each StudentModule with history, this
+
+* deletes the entries created more than --keep-days days ago (though the
+  newest entry of each module is always kept),
+* deletes entries which are identical to the one before them, and
+* rewrites the oldest remaining entry with the whole state, and, with
+  --deltas, each of the others as the changes from the entry before it
+  (or, without --deltas, with the whole state). As when history is saved,
+  no more than StudentModuleHistory.MAX_DELTA_CHAIN entries in a row are
+  stored as deltas.
+
+The history shown by the submission_history view is unchanged, other than
+the removed entries.
+
+"""
+
+import datetime
+import logging
+import optparse
+import time
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from pytz import UTC
+
+from courseware.models import StudentModule, StudentModuleHistory
+
+log = logging.getLogger(__name__)
+
+
+class Command(NoArgsCommand):
+    """The actual compact_student_module_history command."""
+
+    help = "Prunes old and duplicate rows from the StudentModuleHistory table and optionally stores deltas."
+
+    option_list = NoArgsCommand.option_list + (
+        optparse.make_option(
+            '--keep-days',
+            type='int',
+            default=None,
+            help="Delete history entries older than this many days. By default, none are deleted for age.",
+        ),
+        optparse.make_option(
+            '--deltas',
+            action='store_true',
+            default=False,
+            help="Store entries as the changes from the previous entry where that's smaller.",
+        ),
+        optparse.make_option(
+            '--batch',
+            type='int',
+            default=100,
+            help="Batch size, number of student modules to compact in a transaction.",
+        ),
+        optparse.make_option(
+            '--dry-run',
+            action='store_true',
+            default=False,
+            help="Don't change the database, just show what would be done.",
+        ),
+        optparse.make_option(
+            '--sleep',
+            type='float',
+            default=0,
+            help="Seconds to sleep between batches.",
+        ),
+    )
+
+    def handle_noargs(self, **options):
+        # We don't want to see the SQL output from the db layer.
+        logging.getLogger("django.db.backends").setLevel(logging.INFO)
+
+        cutoff = None
+        if options['keep_days'] is not None:
+            cutoff = datetime.datetime.now(UTC) - datetime.timedelta(days=options['keep_days'])
+
+        compactor = StudentModuleHistoryCompactor(
+            cutoff=cutoff,
+            deltas=options['deltas'],
+            dry_run=options['dry_run'],
+        )
+        compactor.main(batch_size=options['batch'], sleep=options['sleep'])
+        self.stdout.write(
+            "Deleted {deleted} and rewrote {rewritten} history entries of {modules} student modules\n".format(
+                **compactor.stats
+            )
+        )
+
+
+class StudentModuleHistoryCompactor(object):
+    """Logic to compact the history of each StudentModule."""
+
+    def __init__(self, cutoff=None, deltas=False, dry_run=False):
+        """
+        `cutoff`: entries created before this datetime are deleted, unless they are a module's newest
+        `deltas`: whether to store entries as deltas
+        `dry_run`: if True, only count what would be changed
+        """
+        self.cutoff = cutoff
+        self.deltas = deltas
+        self.dry_run = dry_run
+        self.stats = {'modules': 0, 'deleted': 0, 'rewritten': 0}
+
+    def main(self, batch_size=100, sleep=0):
+        """Compact the history of every StudentModule which has any, in batches."""
+        student_module_ids = (
+            StudentModuleHistory.objects.order_by('student_module').values_list('student_module', flat=True).distinct()
+        )
+        last_id = -1
+        while True:
+            batch = list(student_module_ids.filter(student_module__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.commit_on_success():
+                for student_module_id in batch:
+                    self.compact_one_student_module(student_module_id)
+            last_id = batch[-1]
+            log.info("Compacted history up to student_module_id %d: %r", last_id, self.stats)
+            if sleep:
+                time.sleep(sleep)
+
+    def compact_one_student_module(self, student_module_id):
+        """Compact one StudentModule's-worth of history."""
+        # lock the module, as saving it does, so that no entry is written while its history is rewritten
+        list(StudentModule.objects.select_for_update().filter(id=student_module_id).values_list('id'))
+        entries = list(StudentModuleHistory.objects.filter(student_module_id=student_module_id).order_by('id'))
+        stored_states = [entry.state for entry in entries]
+        StudentModuleHistory.decode_states(entries)
+
+        kept = []
+        ids_to_delete = []
+        for index, entry in enumerate(entries):
+            newest = index == len(entries) - 1
+            if self.cutoff is not None and entry.created < self.cutoff and not newest:
+                ids_to_delete.append(entry.id)
+            elif kept and (entry.state, entry.grade, entry.max_grade) == (
+                    kept[-1][0].state, kept[-1][0].grade, kept[-1][0].max_grade):
+                ids_to_delete.append(entry.id)
+            else:
+                kept.append((entry, stored_states[index]))
+
+        to_rewrite = []
+        previous_state = None
+        chain_length = 0
+        for entry, stored_state in kept:
+            if self.deltas and chain_length < StudentModuleHistory.MAX_DELTA_CHAIN:
+                new_state = StudentModuleHistory.encode_state(previous_state, entry.state)
+            else:
+                new_state = entry.state
+            chain_length = chain_length + 1 if StudentModuleHistory.is_delta(new_state) else 0
+            previous_state = entry.state
+            if new_state != stored_state:
+                to_rewrite.append((entry.id, new_state))
+
+        self.stats['modules'] += 1
+        self.stats['deleted'] += len(ids_to_delete)
+        self.stats['rewritten'] += len(to_rewrite)
+        if self.dry_run:
+            return
+
+        if ids_to_delete:
+            StudentModuleHistory.objects.filter(id__in=ids_to_delete).delete()
+        for entry_id, new_state in to_rewrite:
+            StudentModuleHistory.objects.filter(id=entry_id).update(state=new_state)
@@ -0,0 +1,92 @@
+"""Test the compact_student_module_history management command."""
+import datetime
+import json
+
+from django.test import TestCase
+from pytz import UTC
+
+from courseware.management.commands.compact_student_module_history import StudentModuleHistoryCompactor
+from courseware.models import StudentModuleHistory
+from courseware.tests.factories import StudentModuleFactory
+
+
+class StudentModuleHistoryCompactorTest(TestCase):
+    """Tests of StudentModuleHistoryCompactor."""
+
+    def setUp(self):
+        self.student_module = StudentModuleFactory.create(state=json.dumps({'attempts': 0}))
+        StudentModuleHistory.objects.all().delete()
+        self.now = datetime.datetime.now(UTC)
+
+    def write_history(self, rows):
+        """Write history rows of (days ago, state dict, grade)."""
+        for days_ago, state, grade in rows:
+            StudentModuleHistory.objects.create(
+                student_module=self.student_module,
+                created=self.now - datetime.timedelta(days=days_ago),
+                state=json.dumps(state),
+                grade=grade,
+            )
+
+    def history(self):
+        """Return the (state dict, grade) of each history entry, oldest first."""
+        return [
+            (json.loads(entry.state), entry.grade)
+            for entry in reversed(StudentModuleHistory.get_history(self.student_module))
+        ]
+
+    def test_prunes_old_and_duplicate_entries(self):
+        self.write_history([
+            (30, {'attempts': 1}, 0),
+            (20, {'attempts': 2}, 1),
+            (5, {'attempts': 3}, 1),
+            (4, {'attempts': 3}, 1),
+            (3, {'attempts': 3}, 2),
+        ])
+        compactor = StudentModuleHistoryCompactor(cutoff=self.now - datetime.timedelta(days=10))
+        compactor.compact_one_student_module(self.student_module.id)
+
+        self.assertEqual(self.history(), [({'attempts': 3}, 1), ({'attempts': 3}, 2)])
+        self.assertEqual(compactor.stats, {'modules': 1, 'deleted': 3, 'rewritten': 0})
+
+    def test_keeps_newest_entry(self):
+        self.write_history([
+            (30, {'attempts': 1}, 0),
+            (20, {'attempts': 2}, 1),
+        ])
+        StudentModuleHistoryCompactor(cutoff=self.now).compact_one_student_module(self.student_module.id)
+        self.assertEqual(self.history(), [({'attempts': 2}, 1)])
+
+    def test_deltas(self):
+        answer = 'x' * 200
+        rows = [
+            (3, {'attempts': 1, 'answer': answer}, 0),
+            (2, {'attempts': 2, 'answer': answer}, 1),
+            (1, {'attempts': 3, 'answer': answer}, 1),
+        ]
+        self.write_history(rows)
+        StudentModuleHistoryCompactor(deltas=True).compact_one_student_module(self.student_module.id)
+
+        stored = [json.loads(entry.state) for entry in StudentModuleHistory.objects.order_by('id')]
+        self.assertNotIn(StudentModuleHistory.DELTA_KEY, stored[0])
+        self.assertIn(StudentModuleHistory.DELTA_KEY, stored[1])
+        self.assertIn(StudentModuleHistory.DELTA_KEY, stored[2])
+        self.assertEqual(self.history(), [(state, grade) for _, state, grade in rows])
+
+        # pruning the first entry leaves a whole state to build on
+        StudentModuleHistoryCompactor(
+            cutoff=self.now - datetime.timedelta(days=2, hours=12)
+        ).compact_one_student_module(self.student_module.id)
+        first = StudentModuleHistory.objects.order_by('id')[0]
+        self.assertNotIn(StudentModuleHistory.DELTA_KEY, json.loads(first.state))
+        self.assertEqual(self.history(), [(state, grade) for _, state, grade in rows[1:]])
+
+    def test_dry_run(self):
+        self.write_history([
+            (30, {'attempts': 1}, 0),
+            (20, {'attempts': 2}, 1),
+        ])
+        compactor = StudentModuleHistoryCompactor(cutoff=self.now, dry_run=True)
+        compactor.main()
+        self.assertEqual(compactor.stats['deleted'], 1)
+        self.assertEqual(len(self.history()), 2)
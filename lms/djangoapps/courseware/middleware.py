@@ -0,0 +1,26 @@
+"""
+Middleware for the courseware app
+"""
+from courseware.models import StudentModuleHistory
+
+
+class StudentModuleHistoryMiddleware(object):
+    """
+    Writes the history entries of the StudentModules saved during a request with
+    one INSERT when the request finishes.
+
+    It must come after TransactionMiddleware so that the entries are written in
+    the request's transaction.
+    """
+    def process_request(self, request):  # pylint: disable=unused-argument
+        StudentModuleHistory.buffer_history()
+
+    def process_exception(self, request, exception):  # pylint: disable=unused-argument
+        # the request's transaction is rolled back, and with it the saves the entries record. Saves
+        # made in nested transaction blocks, which may have committed, were written without buffering.
+        StudentModuleHistory.discard_history()
+
+    def process_response(self, request, response):  # pylint: disable=unused-argument
+        StudentModuleHistory.flush_history()
+        StudentModuleHistory.discard_history()
+        return response
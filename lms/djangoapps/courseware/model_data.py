@@ -2,6 +2,7 @@
 Classes to provide the LMS runtime data storage to XBlocks
 """
 
+import copy
 import json
 from collections import defaultdict
 from itertools import chain
@@ -39,6 +40,30 @@ def chunks(items, chunk_size):
     return (items[i:i + chunk_size] for i in xrange(0, len(items), chunk_size))
 
 
+def _get_child_descriptors(descriptor, depth, descriptor_filter):
+    """
+    Return a list of all child descriptors down to the specified depth
+    that match the descriptor filter. Includes `descriptor`
+
+    descriptor: The parent to search inside
+    depth: The number of levels to descend, or None for infinite depth
+    descriptor_filter(descriptor): A function that returns True
+        if descriptor should be included in the results
+    """
+    if descriptor_filter(descriptor):
+        descriptors = [descriptor]
+    else:
+        descriptors = []
+
+    if depth is None or depth > 0:
+        new_depth = depth - 1 if depth is not None else depth
+
+        for child in descriptor.get_children() + descriptor.get_required_module_descriptors():
+            descriptors.extend(_get_child_descriptors(child, new_depth, descriptor_filter))
+
+    return descriptors
+
+
 class FieldDataCache(object):
     """
     A cache of django model objects needed to supply the data
@@ -58,6 +83,9 @@ class FieldDataCache(object):
         select_for_update: True if rows should be locked until end of transaction
         '''
         self.cache = {}
+        # maps the cache keys of StudentModules whose state has been read to
+        # (the serialized state it was decoded from, the decoded state)
+        self._decoded_states = {}
         self.descriptors = descriptors
         self.select_for_update = select_for_update
 
@@ -65,10 +93,16 @@ class FieldDataCache(object):
         self.course_id = course_id
         self.user = user
 
-        if user.is_authenticated():
-            for scope, fields in self._fields_to_cache().items():
-                for field_object in self._retrieve_fields(scope, fields):
-                    self.cache[self._cache_key_from_field_object(scope, field_object)] = field_object
+        self._cache_descriptors(descriptors)
+
+    def _cache_descriptors(self, descriptors):
+        """
+        Add the objects needed by `descriptors` to the cache, keeping any already cached.
+        """
+        if self.user.is_authenticated():
+            for scope, fields in self._fields_to_cache(descriptors).items():
+                for field_object in self._retrieve_fields(scope, fields, descriptors):
+                    self.cache.setdefault(self._cache_key_from_field_object(scope, field_object), field_object)
 
     @classmethod
     def cache_for_descriptor_descendents(cls, course_id, user, descriptor, depth=None,
@@ -85,32 +119,28 @@ class FieldDataCache(object):
         select_for_update: Flag indicating whether the rows should be locked until end of transaction
         """
 
-        def get_child_descriptors(descriptor, depth, descriptor_filter):
-            """
-            Return a list of all child descriptors down to the specified depth
-            that match the descriptor filter. Includes `descriptor`
-
-            descriptor: The parent to search inside
-            depth: The number of levels to descend, or None for infinite depth
-            descriptor_filter(descriptor): A function that returns True
-                if descriptor should be included in the results
-            """
-            if descriptor_filter(descriptor):
-                descriptors = [descriptor]
-            else:
-                descriptors = []
-
-            if depth is None or depth > 0:
-                new_depth = depth - 1 if depth is not None else depth
+        descriptors = _get_child_descriptors(descriptor, depth, descriptor_filter)
 
-                for child in descriptor.get_children() + descriptor.get_required_module_descriptors():
-                    descriptors.extend(get_child_descriptors(child, new_depth, descriptor_filter))
-
-            return descriptors
+        return FieldDataCache(descriptors, course_id, user, select_for_update)
 
-        descriptors = get_child_descriptors(descriptor, depth, descriptor_filter)
+    def add_descriptor_descendents(self, descriptor, depth=None, descriptor_filter=lambda descriptor: True):
+        """
+        Add the objects needed by `descriptor` and its descendents to the cache, as
+        cache_for_descriptor_descendents would load them. Descriptors which are
+        already cached are skipped.
 
-        return FieldDataCache(descriptors, course_id, user, select_for_update)
+        This lets a cache start out with just the modules that are always used, and
+        then be extended with the subtrees that a request turns out to need.
+        """
+        cached_ids = set(cached.scope_ids.usage_id for cached in self.descriptors)
+        descriptors = [
+            new_descriptor
+            for new_descriptor in _get_child_descriptors(descriptor, depth, descriptor_filter)
+            if new_descriptor.scope_ids.usage_id not in cached_ids
+        ]
+        if descriptors:
+            self.descriptors = self.descriptors + descriptors
+            self._cache_descriptors(descriptors)
 
     def _query(self, model_class, **kwargs):
         """
@@ -137,15 +167,15 @@ class FieldDataCache(object):
         )
         return res
 
-    def _retrieve_fields(self, scope, fields):
+    def _retrieve_fields(self, scope, fields, descriptors):
         """
-        Queries the database for all of the fields in the specified scope
+        Queries the database for all of the fields in the specified scope, for `descriptors`
         """
         if scope == Scope.user_state:
             return self._chunked_query(
                 StudentModule,
                 'module_state_key__in',
-                (descriptor.scope_ids.usage_id for descriptor in self.descriptors),
+                (descriptor.scope_ids.usage_id for descriptor in descriptors),
                 course_id=self.course_id,
                 student=self.user.pk,
             )
@@ -153,14 +183,14 @@ class FieldDataCache(object):
             return self._chunked_query(
                 XModuleUserStateSummaryField,
                 'usage_id__in',
-                (descriptor.scope_ids.usage_id for descriptor in self.descriptors),
+                (descriptor.scope_ids.usage_id for descriptor in descriptors),
                 field_name__in=set(field.name for field in fields),
             )
         elif scope == Scope.preferences:
             return self._chunked_query(
                 XModuleStudentPrefsField,
                 'module_type__in',
-                set(descriptor.scope_ids.block_type for descriptor in self.descriptors),
+                set(descriptor.scope_ids.block_type for descriptor in descriptors),
                 student=self.user.pk,
                 field_name__in=set(field.name for field in fields),
             )
@@ -173,12 +203,12 @@ class FieldDataCache(object):
         else:
             return []
 
-    def _fields_to_cache(self):
+    def _fields_to_cache(self, descriptors):
         """
-        Returns a map of scopes to fields in that scope that should be cached
+        Returns a map of scopes to fields in that scope that should be cached for `descriptors`
         """
         scope_map = defaultdict(set)
-        for descriptor in self.descriptors:
+        for descriptor in descriptors:
             for field in descriptor.fields.values():
                 scope_map[field.scope].add(field)
         return scope_map
@@ -269,6 +299,59 @@ class FieldDataCache(object):
         self.cache[cache_key] = field_object
         return field_object
 
+    def _decoded_state(self, cache_key, field_object):
+        """
+        Return the decoded state of the StudentModule, decoding it only if it hasn't
+        been decoded since its `state` was last replaced
+        """
+        serialized, state = self._decoded_states.get(cache_key, (None, None))
+        if serialized is not field_object.state:
+            serialized = field_object.state
+            state = json.loads(serialized)
+            self._decoded_states[cache_key] = (serialized, state)
+        return state
+
+    def find_state(self, key):
+        """
+        Return the decoded state dict of the StudentModule for the Scope.user_state `key`,
+        or None if there isn't one. Changes to the dict are written by `save_state`.
+        """
+        field_object = self.find(key)
+        if field_object is None:
+            return None
+        return self._decoded_state(self._cache_key_from_kvs_key(key), field_object)
+
+    def find_or_create_state(self, key):
+        """
+        Return the decoded state dict of the StudentModule for the Scope.user_state `key`,
+        creating the StudentModule if it doesn't exist
+        """
+        field_object = self.find_or_create(key)
+        return self._decoded_state(self._cache_key_from_kvs_key(key), field_object)
+
+    def save_state(self, key):
+        """
+        Serialize the decoded state of the StudentModule for the Scope.user_state `key` and
+        save it, unless it's unchanged. Returns whether the StudentModule was saved.
+        """
+        cache_key = self._cache_key_from_kvs_key(key)
+        field_object = self.cache[cache_key]
+        serialized, state = self._decoded_states[cache_key]
+        new_serialized = json.dumps(state)
+        if new_serialized == serialized:
+            return False
+
+        field_object.state = new_serialized
+        try:
+            field_object.save()
+        except DatabaseError:
+            # forget the unsaved changes so that the next read sees what's stored
+            field_object.state = serialized
+            del self._decoded_states[cache_key]
+            raise
+        self._decoded_states[cache_key] = (new_serialized, state)
+        return True
+
 
 class DjangoKeyValueStore(KeyValueStore):
     """
@@ -307,7 +390,8 @@ class DjangoKeyValueStore(KeyValueStore):
             raise KeyError(key.field_name)
 
         if key.scope == Scope.user_state:
-            return json.loads(field_object.state)[key.field_name]
+            # a copy, so that changing the value doesn't change the cached state
+            return copy.deepcopy(self._field_data_cache.find_state(key)[key.field_name])
         else:
             return json.loads(field_object.value)
 
@@ -335,25 +419,29 @@ class DjangoKeyValueStore(KeyValueStore):
 
             # If the field is valid and isn't already in the dictionary, add it.
             field_object = self._field_data_cache.find_or_create(field)
-            if field_object not in field_objects.keys():
+            if field_object not in field_objects:
                 field_objects[field_object] = []
             # Update the list of associated fields
             field_objects[field_object].append(field)
 
-            # Special case when scope is for the user state, because this scope saves fields in a single row
+            # Special case when scope is for the user state, because this scope saves fields in a single row,
+            # which is serialized once all its fields are set
             if field.scope == Scope.user_state:
-                state = json.loads(field_object.state)
-                state[field.field_name] = kv_dict[field]
-                field_object.state = json.dumps(state)
-            else:
-            # The remaining scopes save fields on different rows, so
-            # we don't have to worry about conflicts
-                field_object.value = json.dumps(kv_dict[field])
-
-        for field_object in field_objects:
+                state = self._field_data_cache.find_or_create_state(field)
+                state[field.field_name] = copy.deepcopy(kv_dict[field])
+
+        for field_object, fields in field_objects.iteritems():
             try:
-                # Save the field object that we made above
-                field_object.save()
+                # Save the field object, skipping the UPDATE if nothing changed
+                if fields[0].scope == Scope.user_state:
+                    self._field_data_cache.save_state(fields[0])
+                else:
+                    # The remaining scopes save fields on different rows, so
+                    # we don't have to worry about conflicts
+                    value = json.dumps(kv_dict[fields[0]])
+                    if value != field_object.value:
+                        field_object.value = value
+                        field_object.save()
                 # If save is successful on this scope, add the saved fields to
                 # the list of successful saves
                 saved_fields.extend([field.field_name for field in field_objects[field_object]])
@@ -370,10 +458,9 @@ class DjangoKeyValueStore(KeyValueStore):
             raise KeyError(key.field_name)
 
         if key.scope == Scope.user_state:
-            state = json.loads(field_object.state)
+            state = self._field_data_cache.find_state(key)
             del state[key.field_name]
-            field_object.state = json.dumps(state)
-            field_object.save()
+            self._field_data_cache.save_state(key)
         else:
             field_object.delete()
 
@@ -386,6 +473,6 @@ class DjangoKeyValueStore(KeyValueStore):
             return False
 
         if key.scope == Scope.user_state:
-            return key.field_name in json.loads(field_object.state)
+            return key.field_name in self._field_data_cache.find_state(key)
         else:
             return True
@@ -12,10 +12,14 @@ file and check it in at the same time as your model changes. To do that,
 ASSUMPTIONS: modules have unique IDs, even across different module_types
 
 """
+from contextlib import contextmanager
+import json
+import threading
+
 from django.contrib.auth.models import User
 from django.conf import settings
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import connection, models
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 from xmodule_django.models import CourseKeyField, LocationKeyField
@@ -96,10 +100,25 @@ class StudentModule(models.Model):
 class StudentModuleHistory(models.Model):
     """Keeps a complete history of state changes for a given XModule for a given
     Student. Right now, we restrict this to problems so that the table doesn't
-    explode in size."""
+    explode in size.
+
+    During a request (see courseware.middleware.StudentModuleHistoryMiddleware),
+    entries are buffered and written with one INSERT when the request finishes.
+
+    If FEATURES['STORE_STUDENT_HISTORY_DELTAS'] is set, an entry's state may hold
+    only the changes from the previous entry's state (see `encode_state`); use
+    `get_history` rather than reading `state` directly."""
 
     HISTORY_SAVING_TYPES = {'problem'}
 
+    # The key of the JSON object in `state` of an entry which holds the changes from
+    # the previous entry rather than the whole state
+    DELTA_KEY = '__delta__'
+
+    # The most entries in a row which are stored as deltas, so that the latest state
+    # can always be rebuilt from the last few entries
+    MAX_DELTA_CHAIN = 10
+
     class Meta:
         get_latest_by = "created"
 
@@ -121,7 +140,280 @@ class StudentModuleHistory(models.Model):
                                                  state=instance.state,
                                                  grade=instance.grade,
                                                  max_grade=instance.max_grade)
-            history_entry.save()
+            pending = getattr(_HISTORY_BUFFER, 'entries', None)
+            # A save made in a nested transaction block (such as commit_on_success) may be
+            # committed before the buffer is flushed, so its entry is written with it
+            if pending is not None and _HISTORY_BUFFER.depth == _transaction_depth():
+                pending.append(history_entry)
+            else:
+                StudentModuleHistory.write_history([history_entry])
+
+    @classmethod
+    def buffer_history(cls):
+        """
+        Hold the history entries of StudentModules saved by this thread, in the current
+        transaction, until `flush_history` or `discard_history` is called.
+
+        If this thread is already buffering, this joins that buffer: the matching
+        `flush_history` and `discard_history` leave its entries to the outermost caller.
+        """
+        if getattr(_HISTORY_BUFFER, 'entries', None) is not None:
+            _HISTORY_BUFFER.nesting += 1
+            return
+        _HISTORY_BUFFER.entries = []
+        _HISTORY_BUFFER.nesting = 1
+        _HISTORY_BUFFER.depth = _transaction_depth()
+
+    @classmethod
+    def flush_history(cls):
+        """
+        Write this thread's buffered history entries (if any) with one INSERT, if called
+        by the outermost caller of `buffer_history`. Entries saved afterwards are still
+        buffered.
+        """
+        if getattr(_HISTORY_BUFFER, 'nesting', 0) == 1:
+            cls._write_buffered_history()
+
+    @classmethod
+    def discard_history(cls):
+        """
+        Drop this thread's buffered history entries and stop buffering, if called by the
+        outermost caller of `buffer_history`
+        """
+        if getattr(_HISTORY_BUFFER, 'nesting', 0) > 1:
+            _HISTORY_BUFFER.nesting -= 1
+        else:
+            _HISTORY_BUFFER.entries = None
+            _HISTORY_BUFFER.nesting = 0
+
+    @classmethod
+    @contextmanager
+    def buffered_history(cls):
+        """
+        A context manager which buffers the history entries of the StudentModules saved
+        within it, and writes them when it exits without an exception
+        """
+        cls.buffer_history()
+        try:
+            yield
+            cls.flush_history()
+        finally:
+            cls.discard_history()
+
+    @classmethod
+    def _write_buffered_history(cls):
+        """
+        Write this thread's buffered history entries (if any), whoever is buffering them
+        """
+        pending = getattr(_HISTORY_BUFFER, 'entries', None)
+        if pending:
+            _HISTORY_BUFFER.entries = []
+            cls.write_history(pending)
+
+    @classmethod
+    def write_history(cls, entries):
+        """
+        Write `entries`, which hold whole states, oldest first. If deltas are enabled,
+        each is first encoded against the latest entry of its StudentModule.
+        """
+        if settings.FEATURES.get('STORE_STUDENT_HISTORY_DELTAS'):
+            cls._encode_deltas(entries)
+        if len(entries) == 1:
+            entries[0].save()
+        else:
+            cls.objects.bulk_create(entries)
+
+    @classmethod
+    def _encode_deltas(cls, entries):
+        """
+        Replace the state of each of `entries` with its delta from the entry before it,
+        which is either the latest stored entry of its StudentModule or an earlier one
+        of `entries`.
+
+        The StudentModules are locked until the end of the transaction, so that no other
+        entry can be written for them between reading their latest entry and writing these.
+        """
+        latest = {}
+        for entry in entries:
+            student_module_id = entry.student_module_id
+            if student_module_id not in latest:
+                list(StudentModule.objects.select_for_update().filter(id=student_module_id).values_list('id'))
+                latest[student_module_id] = cls.latest_state(student_module_id)
+
+            previous_state, chain_length = latest[student_module_id]
+            state = entry.state
+            if chain_length < cls.MAX_DELTA_CHAIN:
+                entry.state = cls.encode_state(previous_state, state)
+            latest[student_module_id] = (state, chain_length + 1 if cls.is_delta(entry.state) else 0)
+
+    @classmethod
+    def latest_state(cls, student_module_id):
+        """
+        Return the whole state of the latest stored entry of the StudentModule, and the
+        number of deltas which follow the last entry holding a whole state, or (None, 0)
+        if the state can't be rebuilt from its last MAX_DELTA_CHAIN + 1 entries.
+        """
+        entries = list(
+            cls.objects.filter(student_module_id=student_module_id).order_by('-id')[:cls.MAX_DELTA_CHAIN + 1]
+        )
+        for chain_length, entry in enumerate(entries):
+            if not cls.is_delta(entry.state):
+                newer = list(reversed(entries[:chain_length + 1]))
+                cls.decode_states(newer)
+                return newer[-1].state, chain_length
+        return None, 0
+
+    @classmethod
+    def is_delta(cls, state):
+        """
+        Whether `state`, as stored in an entry, holds a delta rather than a whole state
+        """
+        if state is None or cls.DELTA_KEY not in state:
+            return False
+        decoded = json.loads(state)
+        return isinstance(decoded, dict) and decoded.keys() == [cls.DELTA_KEY]
+
+    @classmethod
+    def encode_state(cls, previous_state, state):
+        """
+        Return what to store as the state of a history entry following one with
+        `previous_state`: an encoded delta if it is smaller than `state`, and
+        otherwise `state` itself.
+
+        A delta is a JSON object whose only key is DELTA_KEY, mapping to an object of
+        the fields which were set (`set`) and the names of those removed (`unset`).
+        """
+        if previous_state is None or state is None or previous_state == state:
+            # an unchanged state (such as when staff start a history) gets a full copy,
+            # so that every history has a full copy to build on
+            return state
+        previous, current = json.loads(previous_state), json.loads(state)
+        if not isinstance(previous, dict) or not isinstance(current, dict):
+            return state
+
+        delta = {
+            'set': {
+                key: value for key, value in current.iteritems()
+                if not _same_json(previous.get(key, _MISSING), value)
+            },
+            'unset': [key for key in previous if key not in current],
+        }
+        encoded = json.dumps({cls.DELTA_KEY: delta})
+        return encoded if len(encoded) < len(state) else state
+
+    @classmethod
+    def decode_states(cls, entries):
+        """
+        Replace the state of each of `entries` (the history of one StudentModule, oldest
+        first) which holds a delta with the whole state it encodes
+        """
+        previous = None
+        for entry in entries:
+            if cls.is_delta(entry.state):
+                delta = json.loads(entry.state)[cls.DELTA_KEY]
+                state = json.loads(previous) if previous is not None else {}
+                for key in delta['unset']:
+                    state.pop(key, None)
+                state.update(delta['set'])
+                entry.state = json.dumps(state)
+            previous = entry.state
+        return entries
+
+    @classmethod
+    def get_history(cls, student_module):
+        """
+        Return a list of the history entries of `student_module`, newest first, with
+        their whole states. Includes entries buffered by this thread.
+        """
+        cls._write_buffered_history()
+        entries = list(cls.objects.filter(student_module=student_module).order_by('id'))
+        cls.decode_states(entries)
+        entries.reverse()
+        return entries
+
+
+_HISTORY_BUFFER = threading.local()
+_MISSING = object()
+
+
+def _transaction_depth():
+    """
+    How many transaction management blocks (such as the request's, or commit_on_success)
+    this thread is inside of on the default database
+    """
+    return len(connection.transaction_state)
+
+
+def _same_json(first, second):
+    """
+    Whether two decoded JSON values are the same (unlike ==, True and 1 are different)
+    """
+    return type(first) is type(second) and first == second
+
+
+class StudentGradeSummary(models.Model):
+    """
+    Per-section grade totals for a student in a course, persisted so that
+    `courseware.grades.grade` only has to recompute the sections whose scores
+    may have changed since the summary was last computed.
+
+    `section_grades` is a JSON dict mapping the location of each graded section
+    to its `fingerprint`, `earned` and `possible` points. The course grader
+    itself is always re-run over these totals, so changes to the grading policy
+    (assignment types, weights, drop counts and grade cutoffs) take effect
+    immediately.
+
+    A cached section total is recomputed when:
+
+    - a StudentModule for one of the section's problems has been modified
+      since `computed` (this is how a new score written by `handle_grade_event`
+      invalidates its section),
+    - the structure of the section changed, i.e. a scored block was added,
+      removed, or had its weight or graded flag changed (the fingerprint no
+      longer matches), or
+    - any of the student's StudentModules in the course was deleted (the whole
+      summary is dropped).
+
+    Sections that contain blocks that always recalculate their grades, or that
+    have scores in the submissions API, are never cached.
+
+    Stale-on-publish: republishing a problem without changing the structure of
+    its section (e.g. editing the problem's XML so that it is worth more points)
+    does not invalidate the cached total. This is the same behavior as the
+    `max_grade` stored on StudentModule, which also keeps the old value until
+    the student is graded on the problem again or the problem is rescored.
+    """
+    student = models.ForeignKey(User, db_index=True)
+    course_id = CourseKeyField(max_length=255, db_index=True)
+
+    # JSON dict of section location -> {'fingerprint', 'earned', 'possible'}
+    section_grades = models.TextField(default='{}')
+
+    # The time as of which every section in section_grades was up to date
+    computed = models.DateTimeField(db_index=True)
+
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        unique_together = (('student', 'course_id'),)
+
+    @receiver(post_delete, sender=StudentModule)
+    def invalidate_for_deleted_module(sender, instance, **kwargs):  # pylint: disable=no-self-argument
+        StudentGradeSummary.objects.filter(
+            student_id=instance.student_id,
+            course_id=instance.course_id
+        ).delete()
+
+    def __repr__(self):
+        return 'StudentGradeSummary<%r>' % ({
+            'course_id': self.course_id,
+            'student': self.student.username,
+            'computed': self.computed,
+        },)
+
+    def __unicode__(self):
+        return unicode(repr(self))
 
 
 class XModuleUserStateSummaryField(models.Model):
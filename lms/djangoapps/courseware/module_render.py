@@ -38,8 +38,9 @@ from xmodule.modulestore.locations import SlashSeparatedCourseKey
 from xmodule.modulestore.django import modulestore, ModuleI18nService
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.util.duedate import get_extended_due_date
-from xmodule_modifiers import replace_course_urls, replace_jump_to_id_urls, replace_static_urls, add_staff_markup, wrap_xblock
+from xmodule_modifiers import rewrite_urls, add_staff_markup, wrap_xblock
 from xmodule.lti_module import LTIModule
+from xmodule.seq_module import SequenceModule
 from xmodule.x_module import XModuleDescriptor
 
 from util.json_request import JsonResponse
@@ -408,28 +409,23 @@ def get_module_system_for_user(user, field_data_cache,
     # prefix is going to have to be specific to the module, not the directory
     # that the xml was loaded from
 
-    # Rewrite urls beginning in /static to point to course-specific content
-    block_wrappers.append(partial(
-        replace_static_urls,
-        getattr(descriptor, 'data_dir', None),
-        course_id=course_id,
-        static_asset_path=static_asset_path or descriptor.static_asset_path
-    ))
-
-    # Allow URLs of the form '/course/' refer to the root of multicourse directory
-    #   hierarchy of this course
-    block_wrappers.append(partial(replace_course_urls, course_id))
-
-    # this will rewrite intra-courseware links (/jump_to_id/<id>). This format
-    # is an improvement over the /course/... format for studio authored courses,
-    # because it is agnostic to course-hierarchy.
     # NOTE: module_id is empty string here. The 'module_id' will get assigned in the replacement
     # function, we just need to specify something to get the reverse() to work.
-    block_wrappers.append(partial(
-        replace_jump_to_id_urls,
+    jump_to_id_base_url = reverse('jump_to_id', kwargs={'course_id': course_id.to_deprecated_string(), 'module_id': ''})
+
+    # Rewrite urls beginning in /static to point to course-specific content,
+    # allow URLs of the form '/course/' refer to the root of multicourse directory
+    # hierarchy of this course, and rewrite intra-courseware links (/jump_to_id/<id>).
+    # This is done once, on the fragment of the outermost block being rendered,
+    # which holds those of all of the blocks inside it, and on each child whose
+    # content a container HTML escapes, such as a sequence's units, before it's escaped.
+    url_rewriter = static_replace.UrlRewriter(
         course_id,
-        reverse('jump_to_id', kwargs={'course_id': course_id.to_deprecated_string(), 'module_id': ''}),
-    ))
+        getattr(descriptor, 'data_dir', None),
+        static_asset_path=static_asset_path or descriptor.static_asset_path,
+        jump_to_id_base_url=jump_to_id_base_url,
+    )
+    outer_block_wrappers = [partial(rewrite_urls, url_rewriter)]
 
     if settings.FEATURES.get('DISPLAY_DEBUG_INFO_TO_STAFF'):
         if has_access(user, 'staff', descriptor, course_id):
@@ -476,7 +472,7 @@ def get_module_system_for_user(user, field_data_cache,
         replace_jump_to_id_urls=partial(
             static_replace.replace_jump_to_id_urls,
             course_id=course_id,
-            jump_to_id_base_url=reverse('jump_to_id', kwargs={'course_id': course_id.to_deprecated_string(), 'module_id': ''})
+            jump_to_id_base_url=jump_to_id_base_url
         ),
         node_path=settings.NODE_PATH,
         publish=publish,
@@ -489,6 +485,7 @@ def get_module_system_for_user(user, field_data_cache,
         # TODO: When we merge the descriptor and module systems, we can stop reaching into the mixologist (cpennington)
         mixins=descriptor.runtime.mixologist._mixins,  # pylint: disable=protected-access
         wrappers=block_wrappers,
+        outer_wrappers=outer_block_wrappers,
         get_real_user=user_by_anonymous_id,
         services={
             'i18n': ModuleI18nService(),
@@ -500,6 +497,10 @@ def get_module_system_for_user(user, field_data_cache,
 
     # pass position specified in URL to module through ModuleSystem
     system.set('position', position)
+    # let sequences render just the unit being viewed, and fetch the others as they're needed
+    system.set('lazy_sequence_rendering', settings.FEATURES.get('ENABLE_LAZY_SEQUENCE_RENDERING', False))
+    # let modules whose handlers only need part of their subtree load the student state of that part
+    system.set('cache_descendents', field_data_cache.add_descriptor_descendents)
     if settings.FEATURES.get('ENABLE_PSYCHOMETRICS'):
         system.set(
             'psychometrics_handler',  # set callback for updating PsychometricsData
@@ -653,6 +654,25 @@ def xblock_resource(request, block_type, uri):  # pylint: disable=unused-argumen
     return HttpResponse(content, mimetype=mimetype)
 
 
+def _handler_cache_depth(descriptor, handler, suffix):
+    """
+    Return how many levels of the descendents of `descriptor` to load the student
+    state of before invoking the handler, or None for all of them.
+
+    When sequences are rendered lazily, a sequence's own dispatches only need its own
+    state. Blocks which extend SequenceDescriptor use another module_class, and aren't
+    affected.
+    """
+    if (
+        settings.FEATURES.get('ENABLE_LAZY_SEQUENCE_RENDERING', False) and
+        getattr(descriptor, 'module_class', None) is SequenceModule and
+        handler == 'xmodule_handler' and
+        suffix in SequenceModule.own_state_dispatches
+    ):
+        return 0
+    return None
+
+
 def _invoke_xblock_handler(request, course_id, usage_id, handler, suffix, user):
     """
     Invoke an XBlock handler, either authenticated or not.
@@ -699,7 +719,8 @@ def _invoke_xblock_handler(request, course_id, usage_id, handler, suffix, user):
     field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
         course_id,
         user,
-        descriptor
+        descriptor,
+        depth=_handler_cache_depth(descriptor, handler, suffix),
     )
     instance = get_module(user, request, usage_key, field_data_cache, grade_bucket_type='ajax')
     if instance is None:
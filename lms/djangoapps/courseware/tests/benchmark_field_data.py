@@ -0,0 +1,105 @@
+"""
+Microbenchmark of the student state reads and writes done while rendering a
+vertical full of problems which the student has already answered.
+
+It isn't collected with the other tests; run it with
+
+  rake fasttest_lms[lms/djangoapps/courseware/tests/benchmark_field_data.py]
+"""
+import json
+import time
+
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from mock import patch
+
+from capa.tests.response_xml_factory import OptionResponseXMLFactory
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
+
+from courseware import module_render as render
+from courseware.model_data import FieldDataCache
+from courseware.tests.factories import StudentModuleFactory, UserFactory
+from courseware.tests.modulestore_config import TEST_DATA_MIXED_MODULESTORE
+
+NUM_PROBLEMS = 20
+NUM_RENDERS = 5
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class ProblemVerticalBenchmark(ModuleStoreTestCase):
+    """
+    Renders a vertical of answered problems and reports the time taken and how
+    much JSON was decoded and encoded
+    """
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+        self.request.session = {}
+        self.course = CourseFactory.create()
+        self.vertical = ItemFactory.create(parent_location=self.course.location, category='vertical')
+
+        problem_xml = OptionResponseXMLFactory().build_xml(
+            question_text='The correct answer is Correct',
+            num_inputs=2,
+            options=['Correct', 'Incorrect'],
+            correct_option='Correct'
+        )
+        for index in xrange(NUM_PROBLEMS):
+            problem = ItemFactory.create(
+                parent_location=self.vertical.location,
+                category='problem',
+                data=problem_xml,
+                display_name='Problem {}'.format(index),
+            )
+            answer_ids = ['{}_2_{}'.format(problem.location.html_id(), num) for num in (1, 2)]
+            StudentModuleFactory.create(
+                student=self.user,
+                course_id=self.course.id,
+                module_state_key=problem.location,
+                state=json.dumps({
+                    'attempts': 1,
+                    'seed': 1,
+                    'done': True,
+                    'last_submission_time': '2014-06-01T12:00:00Z',
+                    'student_answers': {answer_id: 'Correct' for answer_id in answer_ids},
+                    'correct_map': {
+                        answer_id: {'correctness': 'correct', 'npoints': None, 'msg': '', 'hint': '',
+                                    'hintmode': None, 'queuestate': None}
+                        for answer_id in answer_ids
+                    },
+                    'input_state': {answer_id: {} for answer_id in answer_ids},
+                }),
+            )
+
+    def render_vertical(self):
+        """
+        Render the vertical as the courseware view does
+        """
+        field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
+            self.course.id, self.user, self.vertical, depth=2
+        )
+        module = render.get_module(
+            self.user, self.request, self.vertical.location, field_data_cache, self.course.id
+        )
+        return module.render('student_view')
+
+    def test_render_problem_vertical(self):
+        self.render_vertical()
+
+        with patch('courseware.model_data.json.loads', wraps=json.loads) as mock_loads:
+            with patch('courseware.model_data.json.dumps', wraps=json.dumps) as mock_dumps:
+                start = time.time()
+                for _ in xrange(NUM_RENDERS):
+                    self.render_vertical()
+                elapsed = time.time() - start
+
+        # counts every JSON decode and encode done while rendering, not just those of student state
+        print '\n{} problems, average of {} renders: {:.1f} ms; {} JSON decodes and {} encodes per render'.format(
+            NUM_PROBLEMS,
+            NUM_RENDERS,
+            elapsed * 1000 / NUM_RENDERS,
+            mock_loads.call_count / NUM_RENDERS,
+            mock_dumps.call_count / NUM_RENDERS,
+        )
@@ -0,0 +1,121 @@
+"""
+Microbenchmark of rewriting the /static/, /course/ and /jump_to_id/ urls of a
+sequence holding a large unit of HTML components.
+
+It compares rewriting the unit once, before the sequence escapes it, with one pass of a
+UrlRewriter, against making each of the three replacements again for every
+level of blocks that the HTML is inside, as was done when the replacements
+were made by block wrappers.
+
+It isn't collected with the other tests; run it with
+
+  rake fasttest_lms[lms/djangoapps/courseware/tests/benchmark_url_rewriting.py]
+"""
+import time
+
+from django.core.urlresolvers import reverse
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from mock import patch
+
+import static_replace
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
+
+from courseware import module_render as render
+from courseware.model_data import FieldDataCache
+from courseware.tests.factories import UserFactory
+from courseware.tests.modulestore_config import TEST_DATA_MIXED_MODULESTORE
+
+NUM_HTML_COMPONENTS = 50
+NUM_LINKS = 20
+NUM_RENDERS = 5
+
+# sequence, vertical, html
+NESTING_DEPTH = 3
+
+HTML_LINKS = (
+    '<p>Paragraph {index} <img src="/static/images/figure_{index}.png"/>'
+    '<a href="/course/info">course info</a> <a href="/jump_to_id/vertical_{index}">next</a></p>'
+)
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class UrlRewritingBenchmark(ModuleStoreTestCase):
+    """
+    Renders a sequence with a unit of many HTML components, each with many links
+    """
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+        self.request.session = {}
+        self.course = CourseFactory.create()
+        self.sequence = ItemFactory.create(parent_location=self.course.location, category='sequential')
+        vertical = ItemFactory.create(parent_location=self.sequence.location, category='vertical')
+
+        html = ''.join(HTML_LINKS.format(index=index) for index in xrange(NUM_LINKS))
+        for index in xrange(NUM_HTML_COMPONENTS):
+            ItemFactory.create(
+                parent_location=vertical.location,
+                category='html',
+                data=html,
+                display_name='HTML {}'.format(index),
+            )
+
+    def render_sequence(self):
+        """
+        Render the sequence as the courseware view does
+        """
+        field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
+            self.course.id, self.user, self.sequence, depth=2
+        )
+        module = render.get_module(
+            self.user, self.request, self.sequence.location, field_data_cache, self.course.id
+        )
+        return module.render('student_view')
+
+    def test_rewrite_sequence_urls(self):
+        self.render_sequence()
+
+        storage = static_replace.staticfiles_storage
+        with patch.object(storage, 'exists', wraps=storage.exists) as mock_exists:
+            start = time.time()
+            for _ in xrange(NUM_RENDERS):
+                content = self.render_sequence().content
+            elapsed = time.time() - start
+
+        print '\n{} html components of {} links, average of {} renders: {:.1f} ms; {} static file lookups'.format(
+            NUM_HTML_COMPONENTS, NUM_LINKS, NUM_RENDERS, elapsed * 1000 / NUM_RENDERS, mock_exists.call_count
+        )
+
+        # The rendered HTML of the unit, without the sequence's escaping, stands in
+        # for the content that each level of wrappers used to rewrite.
+        unit_html = ''.join(HTML_LINKS.format(index=index) for index in xrange(NUM_LINKS)) * NUM_HTML_COMPONENTS
+        jump_to_id_base_url = reverse(
+            'jump_to_id', kwargs={'course_id': self.course.id.to_deprecated_string(), 'module_id': ''}
+        )
+
+        start = time.time()
+        for _ in xrange(NUM_RENDERS):
+            text = unit_html
+            for _ in xrange(NESTING_DEPTH):
+                text = static_replace.replace_static_urls(text, None, course_id=self.course.id)
+                text = static_replace.replace_course_urls(text, self.course.id)
+                text = static_replace.replace_jump_to_id_urls(text, self.course.id, jump_to_id_base_url)
+        separate_elapsed = time.time() - start
+
+        start = time.time()
+        for _ in xrange(NUM_RENDERS):
+            rewriter = static_replace.UrlRewriter(
+                self.course.id, None, jump_to_id_base_url=jump_to_id_base_url
+            )
+            rewriter.rewrite(unit_html)
+        single_elapsed = time.time() - start
+
+        print '{} KB of HTML: {:.1f} ms for {} levels of separate replacements, {:.1f} ms for one pass'.format(
+            len(content) / 1024,
+            separate_elapsed * 1000 / NUM_RENDERS,
+            NESTING_DEPTH,
+            single_elapsed * 1000 / NUM_RENDERS,
+        )
@@ -1,20 +1,30 @@
 """
 Test grade calculation.
 """
+from datetime import datetime, timedelta
+
+from django.db import connection, reset_queries
 from django.http import Http404
+from django.test.client import RequestFactory
 from django.test.utils import override_settings
 from mock import patch
+from pytz import UTC
 
+from capa.tests.response_xml_factory import MultipleChoiceResponseXMLFactory
+from courseware.tests.factories import StudentModuleFactory
 from courseware.tests.modulestore_config import TEST_DATA_MIXED_MODULESTORE
 from student.tests.factories import UserFactory
-from xmodule.modulestore.tests.factories import CourseFactory
+from xmodule.modulestore.django import modulestore, editable_modulestore
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 from xmodule.modulestore.locations import SlashSeparatedCourseKey
 
-from courseware.grades import grade, iterate_grades_for
+from courseware import grades
+from courseware.grades import grade, iterate_grades_for, progress_summary, StudentModuleScores
+from courseware.models import StudentGradeSummary, StudentModule
 
 
-def _grade_with_errors(student, request, course, keep_raw_scores=False):
+def _grade_with_errors(student, request, course, keep_raw_scores=False, **kwargs):
     """This fake grade method will throw exceptions for student3 and
     student4, but allow any other students to go through normal grading.
 
@@ -25,7 +35,7 @@ def _grade_with_errors(student, request, course, keep_raw_scores=False):
     if student.username in ['student3', 'student4']:
         raise Exception("I don't like {}".format(student.username))
 
-    return grade(student, request, course, keep_raw_scores=keep_raw_scores)
+    return grade(student, request, course, keep_raw_scores=keep_raw_scores, **kwargs)
 
 
 @override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
@@ -106,8 +116,22 @@ class TestGradeIteration(ModuleStoreTestCase):
         self.assertTrue(all_gradesets[student2])
         self.assertTrue(all_gradesets[student5])
 
+    @patch('courseware.grades.grade', _grade_with_errors)
+    def test_grading_exception_batched(self):
+        """Errors for individual students are reported the same way when grading in batches."""
+        all_gradesets, all_errors = self._gradesets_and_errors_for(self.course.id, self.students, batch_size=2)
+        student3, student4 = self.students[2], self.students[3]
+        self.assertEqual(
+            all_errors,
+            {
+                student3: "I don't like student3",
+                student4: "I don't like student4"
+            }
+        )
+        self.assertEqual(len(all_gradesets), 5)
+
     ################################# Helpers #################################
-    def _gradesets_and_errors_for(self, course_id, students):
+    def _gradesets_and_errors_for(self, course_id, students, batch_size=None):
         """Simple helper method to iterate through student grades and give us
         two dictionaries -- one that has all students and their respective
         gradesets, and one that has only students that could not be graded and
@@ -115,9 +139,353 @@ class TestGradeIteration(ModuleStoreTestCase):
         students_to_gradesets = {}
         students_to_errors = {}
 
-        for student, gradeset, err_msg in iterate_grades_for(course_id, students):
+        for student, gradeset, err_msg in iterate_grades_for(course_id, students, batch_size=batch_size):
             students_to_gradesets[student] = gradeset
             if err_msg:
                 students_to_errors[student] = err_msg
 
         return students_to_gradesets, students_to_errors
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class TestGradeQueryCount(ModuleStoreTestCase):
+    """
+    Benchmark the number of SQL queries issued while grading a student.
+
+    Before scores were prefetched with `StudentModuleScores`, grading issued
+    one `exists()` query per section plus one `get()` query per problem, so the
+    count grew linearly with the size of the course. It should now be constant.
+    """
+    def setUp(self):
+        self.student = UserFactory.create()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.student
+        self.request.session = {}
+
+    def _create_course(self, num_problems):
+        """
+        Create a course with a single graded homework containing `num_problems`
+        problems, all of which the student has already answered.
+        """
+        course = CourseFactory.create(number='query_count_{}'.format(num_problems))
+        chapter = ItemFactory.create(parent_location=course.location, category='chapter')
+        section = ItemFactory.create(
+            parent_location=chapter.location,
+            category='sequential',
+            metadata={'graded': True, 'format': 'Homework'}
+        )
+        vertical = ItemFactory.create(parent_location=section.location, category='vertical')
+        problem_xml = MultipleChoiceResponseXMLFactory().build_xml(
+            question_text='The correct answer is Choice 2',
+            choices=[False, False, True, False],
+            choice_names=['choice_0', 'choice_1', 'choice_2', 'choice_3']
+        )
+        for index in xrange(num_problems):
+            problem = ItemFactory.create(
+                parent_location=vertical.location,
+                category='problem',
+                data=problem_xml,
+                display_name='problem_{}'.format(index)
+            )
+            StudentModuleFactory.create(
+                student=self.student,
+                course_id=course.id,
+                module_state_key=problem.location,
+                grade=1,
+                max_grade=1,
+            )
+        return modulestore().get_course(course.id)
+
+    def _count_queries(self, func, *args):
+        """
+        Return the result of `func(*args)` and the number of SQL queries it issued.
+        """
+        with self.settings(DEBUG=True):
+            reset_queries()
+            result = func(*args)
+            return result, len(connection.queries)
+
+    def test_grade_query_count_is_constant(self):
+        small_course = self._create_course(2)
+        large_course = self._create_course(12)
+
+        small_grade, small_queries = self._count_queries(grade, self.student, self.request, small_course)
+        large_grade, large_queries = self._count_queries(grade, self.student, self.request, large_course)
+
+        self.assertEqual(small_grade['percent'], 1.0)
+        self.assertEqual(large_grade['percent'], 1.0)
+        self.assertEqual(small_queries, large_queries)
+
+    def test_progress_summary_does_not_query_per_problem(self):
+        course = self._create_course(12)
+        with patch('courseware.grades.StudentModule.objects.get') as mock_get:
+            summary = progress_summary(self.student, self.request, course)
+        self.assertFalse(mock_get.called)
+        scores = summary[0]['sections'][0]['scores']
+        self.assertEqual(len(scores), 12)
+        self.assertTrue(all(score.earned == 1 for score in scores))
+
+    def test_snapshot_covers_graded_locations(self):
+        course = self._create_course(3)
+        snapshot = StudentModuleScores.from_grading_context(course, self.student)
+        for section in course.grading_context['graded_sections']['Homework']:
+            for descriptor in section['xmoduledescriptors']:
+                self.assertTrue(snapshot.covers(descriptor.location))
+                self.assertEqual(snapshot.get(descriptor.location), (1, 1))
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class TestBatchGradeParity(ModuleStoreTestCase):
+    """
+    Grading students in batches must give exactly the same gradesets as
+    grading them one at a time.
+    """
+    def setUp(self):
+        self.course = CourseFactory.create(number='batch_parity')
+        chapter = ItemFactory.create(parent_location=self.course.location, category='chapter')
+        problem_xml = MultipleChoiceResponseXMLFactory().build_xml(
+            question_text='The correct answer is Choice 2',
+            choices=[False, False, True, False],
+            choice_names=['choice_0', 'choice_1', 'choice_2', 'choice_3']
+        )
+        self.problems = []
+        for section_format in ('Homework', 'Homework', 'Exam'):
+            section = ItemFactory.create(
+                parent_location=chapter.location,
+                category='sequential',
+                metadata={'graded': True, 'format': section_format}
+            )
+            vertical = ItemFactory.create(parent_location=section.location, category='vertical')
+            for _ in xrange(3):
+                self.problems.append(ItemFactory.create(
+                    parent_location=vertical.location,
+                    category='problem',
+                    data=problem_xml,
+                ))
+        self.course = modulestore().get_course(self.course.id)
+
+        self.students = [UserFactory.create() for _ in xrange(7)]
+        for index, student in enumerate(self.students):
+            # Give each student a different mix of graded, ungraded and
+            # missing StudentModules
+            for problem_index, problem in enumerate(self.problems):
+                kind = (index + problem_index) % 4
+                if kind == 0:
+                    continue
+                StudentModuleFactory.create(
+                    student=student,
+                    course_id=self.course.id,
+                    module_state_key=problem.location,
+                    grade=(problem_index % 2) if kind != 3 else None,
+                    max_grade=1 if kind != 3 else None,
+                )
+
+    def _gradesets(self, **kwargs):
+        """Return a dict of student -> (gradeset, err_msg) from iterate_grades_for."""
+        return dict(
+            (student, (gradeset, err_msg))
+            for student, gradeset, err_msg in iterate_grades_for(self.course.id, self.students, **kwargs)
+        )
+
+    def test_batch_parity(self):
+        expected = self._gradesets()
+        for batch_size in (1, 3, 100):
+            self.assertEqual(self._gradesets(batch_size=batch_size), expected)
+
+    @patch.dict('django.conf.settings.FEATURES', {'DISABLE_START_DATES': False})
+    def test_batch_parity_with_staff_only_problem(self):
+        # A problem that hasn't started yet can only be loaded by staff. Grade a
+        # staff member first, so that its max score is known before grading the
+        # students who can't load it.
+        section = ItemFactory.create(
+            parent_location=self.course.get_children()[0].location,
+            category='sequential',
+            metadata={'graded': True, 'format': 'Homework'}
+        )
+        ItemFactory.create(
+            parent_location=section.location,
+            category='problem',
+            data=MultipleChoiceResponseXMLFactory().build_xml(
+                question_text='The correct answer is Choice 0',
+                choices=[True, False],
+            ),
+            start=datetime.now(UTC) + timedelta(days=1),
+        )
+        self.course = modulestore().get_course(self.course.id)
+        self.students.insert(0, UserFactory.create(is_staff=True))
+
+        expected = self._gradesets()
+        self.assertEqual(self._gradesets(batch_size=100), expected)
+
+    def test_bulk_load_timestamp_precedes_queries(self):
+        # A StudentModule saved while the scores are being loaded must be
+        # newer than the snapshots
+        saved = []
+        filter_student_modules = StudentModule.objects.filter
+
+        def save_then_filter(*args, **kwargs):
+            """Save a StudentModule before the query"""
+            if not saved:
+                saved.append(StudentModuleFactory.create(
+                    course_id=self.course.id, module_state_key=self.problems[0].location
+                ))
+            return filter_student_modules(*args, **kwargs)
+
+        with patch('courseware.grades.StudentModule.objects.filter', side_effect=save_then_filter):
+            snapshots = StudentModuleScores.bulk_load(self.course, self.students)
+
+        for snapshot in snapshots.itervalues():
+            self.assertLess(snapshot.loaded_at, saved[0].modified)
+
+    def test_bulk_load_matches_single_student_snapshot(self):
+        snapshots = StudentModuleScores.bulk_load(self.course, self.students)
+        for student in self.students:
+            single = StudentModuleScores.from_grading_context(self.course, student)
+            for problem in self.problems:
+                self.assertEqual(snapshots[student.id].get(problem.location), single.get(problem.location))
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class TestStudentGradeSummary(ModuleStoreTestCase):
+    """
+    Test that section totals are persisted in StudentGradeSummary and only
+    recomputed when they may have changed.
+    """
+    def setUp(self):
+        self.course = CourseFactory.create(number='grade_summary')
+        self._set_grading_policy(0.6)
+        self.chapter = ItemFactory.create(parent_location=self.course.location, category='chapter')
+        self.problem_xml = MultipleChoiceResponseXMLFactory().build_xml(
+            question_text='The correct answer is Choice 2',
+            choices=[False, False, True, False],
+            choice_names=['choice_0', 'choice_1', 'choice_2', 'choice_3']
+        )
+        self.student = UserFactory.create()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.student
+        self.request.session = {}
+
+        self.verticals = []
+        self.problems = []
+        for _ in xrange(2):
+            section = ItemFactory.create(
+                parent_location=self.chapter.location,
+                category='sequential',
+                metadata={'graded': True, 'format': 'Homework'}
+            )
+            vertical = ItemFactory.create(parent_location=section.location, category='vertical')
+            self.verticals.append(vertical)
+            self.problems.append([self._add_problem(vertical) for _ in xrange(2)])
+
+        self.modules = {}
+        for section_problems in self.problems:
+            for problem in section_problems:
+                self.modules[problem.location] = StudentModuleFactory.create(
+                    student=self.student,
+                    course_id=self.course.id,
+                    module_state_key=problem.location,
+                    grade=0,
+                    max_grade=1,
+                )
+
+    def _set_grading_policy(self, pass_cutoff):
+        """Grade the course on two equally weighted homeworks, with the given cutoff for a pass."""
+        course = modulestore().get_course(self.course.id)
+        course.grading_policy = {
+            "GRADER": [{"type": "Homework", "min_count": 2, "drop_count": 0, "short_label": "HW", "weight": 1.0}],
+            "GRADE_CUTOFFS": {"Pass": pass_cutoff},
+        }
+        editable_modulestore().update_item(course, '**replace_user**')
+
+    def _add_problem(self, vertical):
+        """Add a problem to `vertical` and return it."""
+        return ItemFactory.create(parent_location=vertical.location, category='problem', data=self.problem_xml)
+
+    def _grade(self):
+        """
+        Grade the student, returning the grade summary and the locations that
+        get_score had to compute scores for.
+        """
+        course = modulestore().get_course(self.course.id)
+        with patch('courseware.grades.get_score', wraps=grades.get_score) as mock_get_score:
+            grade_summary = grade(self.student, self.request, course)
+        scored_locations = set(call[0][2].location for call in mock_get_score.call_args_list)
+        return grade_summary, scored_locations
+
+    def _all_problem_locations(self, section_index=None):
+        """Return the set of problem locations, optionally for a single section."""
+        sections = self.problems if section_index is None else [self.problems[section_index]]
+        return set(problem.location for section_problems in sections for problem in section_problems)
+
+    def _set_grade(self, problem, value):
+        """Simulate handle_grade_event writing a new score for `problem`."""
+        student_module = StudentModule.objects.get(pk=self.modules[problem.location].pk)
+        student_module.grade = value
+        student_module.save()
+
+    def test_summary_is_reused(self):
+        first_summary, first_scored = self._grade()
+        self.assertTrue(self._all_problem_locations().issubset(first_scored))
+        self.assertTrue(StudentGradeSummary.objects.filter(student=self.student, course_id=self.course.id).exists())
+
+        second_summary, second_scored = self._grade()
+        self.assertEqual(second_scored, set())
+        self.assertEqual(first_summary, second_summary)
+
+    def test_new_score_recomputes_only_its_section(self):
+        self._grade()
+        self._set_grade(self.problems[1][0], 1)
+
+        grade_summary, scored = self._grade()
+        self.assertTrue(self._all_problem_locations(1).issubset(scored))
+        self.assertFalse(self._all_problem_locations(0) & scored)
+        self.assertEqual(grade_summary['percent'], 0.25)
+
+    def test_structure_change_recomputes_section(self):
+        self._grade()
+        new_problem = self._add_problem(self.verticals[0])
+
+        _, scored = self._grade()
+        self.assertIn(new_problem.location, scored)
+        self.assertFalse(self._all_problem_locations(1) & scored)
+
+    def test_grading_policy_change_applies_without_recompute(self):
+        self._grade()
+        for problem in self.problems[0]:
+            self._set_grade(problem, 1)
+        grade_summary, _ = self._grade()
+        self.assertIsNone(grade_summary['grade'])
+
+        self._set_grading_policy(0.4)
+
+        grade_summary, scored = self._grade()
+        self.assertEqual(scored, set())
+        self.assertEqual(grade_summary['grade'], 'Pass')
+
+    def test_deleted_module_drops_summary(self):
+        self._grade()
+        StudentModule.objects.get(pk=self.modules[self.problems[0][0].location].pk).delete()
+        self.assertFalse(StudentGradeSummary.objects.filter(student=self.student).exists())
+
+    def test_stale_on_publish(self):
+        """
+        Republishing a problem without changing the structure of its section
+        does not invalidate the cached section total.
+        """
+        self._grade()
+        problem = modulestore().get_item(self.problems[0][0].location)
+        problem.data = MultipleChoiceResponseXMLFactory().build_xml(
+            question_text='The correct answer is now Choice 1',
+            choices=[False, True, False, False],
+            choice_names=['choice_0', 'choice_1', 'choice_2', 'choice_3']
+        )
+        editable_modulestore().update_item(problem, '**replace_user**')
+
+        _, scored = self._grade()
+        self.assertEqual(scored, set())
+
+    def test_raw_scores_bypass_summary(self):
+        self._grade()
+        course = modulestore().get_course(self.course.id)
+        grade_summary = grade(self.student, self.request, course, keep_raw_scores=True)
+        self.assertEqual(len(grade_summary['raw_scores']), 4)
@@ -0,0 +1,192 @@
+"""
+Tests of the StudentModuleHistory buffering and delta storage
+"""
+import json
+
+from django.db import transaction
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.http import HttpResponse
+from mock import patch
+
+from courseware.middleware import StudentModuleHistoryMiddleware
+from courseware.models import StudentModule, StudentModuleHistory
+from courseware.tests.factories import StudentModuleFactory
+
+
+class StudentModuleHistoryTest(TestCase):
+    """
+    Tests of how StudentModuleHistory entries are written and read
+    """
+    def setUp(self):
+        self.student_module = StudentModuleFactory.create(state=json.dumps({'attempts': 1, 'seed': 1}))
+        self.addCleanup(StudentModuleHistory.discard_history)
+
+    def save_state(self, **state):
+        """
+        Save the student module with the given state
+        """
+        self.student_module.state = json.dumps(state)
+        self.student_module.save()
+
+    def test_writes_without_buffering(self):
+        self.save_state(attempts=2, seed=1)
+        self.assertEqual(StudentModuleHistory.objects.filter(student_module=self.student_module).count(), 2)
+
+    def test_buffered_entries_written_together(self):
+        StudentModuleHistory.buffer_history()
+        self.save_state(attempts=2, seed=1)
+        self.save_state(attempts=3, seed=1)
+        self.assertEqual(StudentModuleHistory.objects.filter(student_module=self.student_module).count(), 1)
+
+        with self.assertNumQueries(1):
+            StudentModuleHistory.flush_history()
+        self.assertEqual(StudentModuleHistory.objects.filter(student_module=self.student_module).count(), 3)
+
+    def test_nested_buffers_flush_once(self):
+        StudentModuleHistory.buffer_history()
+        with StudentModuleHistory.buffered_history():
+            self.save_state(attempts=2, seed=1)
+        # the inner buffer leaves its entries, and the buffering, to the outer one
+        self.save_state(attempts=3, seed=1)
+        self.assertEqual(StudentModuleHistory.objects.filter(student_module=self.student_module).count(), 1)
+
+        with self.assertNumQueries(1):
+            StudentModuleHistory.flush_history()
+        self.assertEqual(StudentModuleHistory.objects.filter(student_module=self.student_module).count(), 3)
+
+    def test_get_history_includes_buffered_entries(self):
+        StudentModuleHistory.buffer_history()
+        self.save_state(attempts=2, seed=1)
+        history = StudentModuleHistory.get_history(self.student_module)
+        self.assertEqual(
+            [json.loads(entry.state)['attempts'] for entry in history],
+            [2, 1]
+        )
+
+    def test_middleware(self):
+        middleware = StudentModuleHistoryMiddleware()
+        request = RequestFactory().get('/')
+
+        middleware.process_request(request)
+        self.save_state(attempts=2, seed=1)
+        self.assertEqual(StudentModuleHistory.objects.filter(student_module=self.student_module).count(), 1)
+        middleware.process_response(request, HttpResponse())
+        self.assertEqual(StudentModuleHistory.objects.filter(student_module=self.student_module).count(), 2)
+
+        # and nothing is buffered outside of requests
+        self.save_state(attempts=3, seed=1)
+        self.assertEqual(StudentModuleHistory.objects.filter(student_module=self.student_module).count(), 3)
+
+    def test_middleware_discards_on_exception(self):
+        middleware = StudentModuleHistoryMiddleware()
+        request = RequestFactory().get('/')
+
+        middleware.process_request(request)
+        self.save_state(attempts=2, seed=1)
+        middleware.process_exception(request, Exception())
+        middleware.process_response(request, HttpResponse())
+        self.assertEqual(StudentModuleHistory.objects.filter(student_module=self.student_module).count(), 1)
+
+    def test_middleware_writes_entries_of_nested_transactions(self):
+        middleware = StudentModuleHistoryMiddleware()
+        request = RequestFactory().get('/')
+
+        middleware.process_request(request)
+        with transaction.commit_on_success():
+            self.save_state(attempts=2, seed=1)
+        self.assertEqual(StudentModuleHistory.objects.filter(student_module=self.student_module).count(), 2)
+        self.save_state(attempts=3, seed=1)
+        middleware.process_exception(request, Exception())
+        middleware.process_response(request, HttpResponse())
+        self.assertEqual(StudentModuleHistory.objects.filter(student_module=self.student_module).count(), 2)
+
+    @patch.dict('django.conf.settings.FEATURES', {'STORE_STUDENT_HISTORY_DELTAS': True})
+    def test_deltas(self):
+        big_answer = 'x' * 500
+        states = [
+            {'attempts': 2, 'seed': 1, 'student_answers': {'1_2_1': big_answer}},
+            {'attempts': 3, 'seed': 1, 'student_answers': {'1_2_1': big_answer}},
+            {'attempts': 3, 'seed': 1},
+        ]
+        for state in states:
+            self.save_state(**state)
+
+        stored = StudentModuleHistory.objects.filter(student_module=self.student_module).order_by('id')
+        self.assertEqual(
+            [StudentModuleHistory.DELTA_KEY in json.loads(entry.state) for entry in stored],
+            [False, False, True, True]
+        )
+        self.assertEqual(
+            [json.loads(entry.state) for entry in StudentModuleHistory.get_history(self.student_module)],
+            list(reversed([{'attempts': 1, 'seed': 1}] + states))
+        )
+
+    @patch.dict('django.conf.settings.FEATURES', {'STORE_STUDENT_HISTORY_DELTAS': True})
+    def test_deltas_of_concurrent_saves(self):
+        # Two requests load the module before either saves it
+        big_answer = 'x' * 500
+        self.save_state(attempts=1, seed=1, answer=big_answer)
+        first = StudentModule.objects.get(id=self.student_module.id)
+        second = StudentModule.objects.get(id=self.student_module.id)
+
+        first.state = json.dumps({'attempts': 2, 'seed': 1, 'answer': big_answer})
+        first.save()
+        second.state = json.dumps({'attempts': 1, 'seed': 2, 'answer': big_answer})
+        second.save()
+
+        self.assertEqual(
+            [json.loads(entry.state) for entry in StudentModuleHistory.get_history(self.student_module)[:2]],
+            [json.loads(second.state), json.loads(first.state)]
+        )
+
+    @patch.dict('django.conf.settings.FEATURES', {'STORE_STUDENT_HISTORY_DELTAS': True})
+    def test_buffered_deltas(self):
+        big_answer = 'x' * 500
+        states = [{'attempts': attempts, 'seed': 1, 'answer': big_answer} for attempts in xrange(2, 5)]
+        StudentModuleHistory.buffer_history()
+        for state in states:
+            self.save_state(**state)
+        StudentModuleHistory.flush_history()
+
+        stored = StudentModuleHistory.objects.filter(student_module=self.student_module).order_by('id')
+        self.assertEqual(
+            [StudentModuleHistory.is_delta(entry.state) for entry in stored],
+            [False, False, True, True]
+        )
+        self.assertEqual(
+            [json.loads(entry.state) for entry in StudentModuleHistory.get_history(self.student_module)],
+            list(reversed([{'attempts': 1, 'seed': 1}] + states))
+        )
+
+    @patch.dict('django.conf.settings.FEATURES', {'STORE_STUDENT_HISTORY_DELTAS': True})
+    def test_delta_chain_is_bounded(self):
+        big_answer = 'x' * 500
+        states = [
+            {'attempts': attempts, 'seed': 1, 'answer': big_answer}
+            for attempts in xrange(2, StudentModuleHistory.MAX_DELTA_CHAIN + 5)
+        ]
+        for state in states:
+            self.save_state(**state)
+
+        stored = StudentModuleHistory.objects.filter(student_module=self.student_module).order_by('id')
+        whole = [index for index, entry in enumerate(stored) if not StudentModuleHistory.is_delta(entry.state)]
+        self.assertEqual(whole, [0, 1, StudentModuleHistory.MAX_DELTA_CHAIN + 2])
+        latest_state, chain_length = StudentModuleHistory.latest_state(self.student_module.id)
+        self.assertEqual(json.loads(latest_state), states[-1])
+        self.assertEqual(chain_length, len(states) - StudentModuleHistory.MAX_DELTA_CHAIN - 2)
+        self.assertEqual(
+            [json.loads(entry.state) for entry in StudentModuleHistory.get_history(self.student_module)],
+            list(reversed([{'attempts': 1, 'seed': 1}] + states))
+        )
+
+    def test_encode_state(self):
+        previous = json.dumps({'done': 1, 'seed': 1, 'answer': 'y' * 100})
+        state = json.dumps({'done': True, 'seed': 1, 'answer': 'y' * 100})
+        encoded = StudentModuleHistory.encode_state(previous, state)
+        self.assertEqual(json.loads(encoded), {StudentModuleHistory.DELTA_KEY: {'set': {'done': True}, 'unset': []}})
+
+        # not worth it
+        self.assertEqual(StudentModuleHistory.encode_state('{"a": 1}', '{"a": 2}'), '{"a": 2}')
+        # unchanged
+        self.assertEqual(StudentModuleHistory.encode_state(previous, previous), previous)
@@ -176,6 +176,43 @@ class TestStudentModuleStorage(OtherUserFailureTestMixin, TestCase):
         self.assertEquals(len(exception_context.exception.saved_field_names), 0)
 
 
+    def test_state_decoded_once(self):
+        "Test that reading many fields decodes the StudentModule's state once"
+        with patch('courseware.model_data.json.loads', wraps=json.loads) as mock_loads:
+            self.assertEquals('a_value', self.kvs.get(user_state_key('a_field')))
+            self.assertEquals('b_value', self.kvs.get(user_state_key('b_field')))
+            self.assertTrue(self.kvs.has(user_state_key('a_field')))
+            self.assertFalse(self.kvs.has(user_state_key('not_a_field')))
+        self.assertEquals(1, mock_loads.call_count)
+
+    def test_state_replaced_elsewhere(self):
+        "Test that replacing a StudentModule's state outside the kvs is noticed"
+        self.kvs.get(user_state_key('a_field'))
+        student_module = self.field_data_cache.find(user_state_key('a_field'))
+        student_module.state = json.dumps({'a_field': 'other_value'})
+        self.assertEquals('other_value', self.kvs.get(user_state_key('a_field')))
+
+    def test_get_returns_copy(self):
+        "Test that changing a value that was read doesn't change the stored state"
+        self.kvs.set(user_state_key('a_field'), ['a_value'])
+        self.kvs.get(user_state_key('a_field')).append('b_value')
+        self.assertEquals(['a_value'], self.kvs.get(user_state_key('a_field')))
+
+    def test_set_many_serializes_once(self):
+        "Test that setting many user_state fields serializes and saves the StudentModule once"
+        with patch('courseware.model_data.json.dumps', wraps=json.dumps) as mock_dumps:
+            with patch('courseware.models.StudentModule.save') as mock_save:
+                self.kvs.set_many(self.construct_kv_dict())
+        self.assertEquals(1, mock_dumps.call_count)
+        self.assertEquals(1, mock_save.call_count)
+
+    def test_set_unchanged_skips_save(self):
+        "Test that setting fields to the values they already have doesn't save the StudentModule"
+        with patch('courseware.models.StudentModule.save') as mock_save:
+            self.kvs.set_many({user_state_key('a_field'): 'a_value', user_state_key('b_field'): 'b_value'})
+        self.assertFalse(mock_save.called)
+
+
 class TestMissingStudentModule(TestCase):
     def setUp(self):
         self.user = UserFactory.create(username='user')
@@ -212,6 +249,34 @@ class TestMissingStudentModule(TestCase):
         self.assertFalse(self.kvs.has(user_state_key('a_field')))
 
 
+class TestAddDescriptorDescendents(TestCase):
+    """Tests for extending a FieldDataCache with more descriptors"""
+    def setUp(self):
+        student_module = StudentModuleFactory(state=json.dumps({'a_field': 'a_value'}))
+        self.user = student_module.student
+        self.assertEqual(self.user.id, 1)   # check our assumption hard-coded in the key functions above.
+        self.descriptor = mock_descriptor([mock_field(Scope.user_state, 'a_field')])
+        self.descriptor.get_children.return_value = []
+        self.descriptor.get_required_module_descriptors.return_value = []
+        self.field_data_cache = FieldDataCache([], course_id, self.user)
+        self.kvs = DjangoKeyValueStore(self.field_data_cache)
+
+    def test_added_descriptor_cached(self):
+        "Test that the state of an added descriptor is loaded"
+        self.assertRaises(KeyError, self.kvs.get, user_state_key('a_field'))
+        self.field_data_cache.add_descriptor_descendents(self.descriptor)
+        with self.assertNumQueries(0):
+            self.assertEquals('a_value', self.kvs.get(user_state_key('a_field')))
+
+    def test_cached_descriptor_skipped(self):
+        "Test that adding a descriptor that's already cached doesn't query again, or replace its state"
+        self.field_data_cache.add_descriptor_descendents(self.descriptor)
+        self.kvs.set(user_state_key('a_field'), 'new_value')
+        with self.assertNumQueries(0):
+            self.field_data_cache.add_descriptor_descendents(self.descriptor)
+        self.assertEquals('new_value', self.kvs.get(user_state_key('a_field')))
+
+
 class StorageTestBase(object):
     """
     A base class for that gets subclassed when testing each of the scopes.
@@ -313,6 +378,13 @@ class StorageTestBase(object):
         self.assertEquals(exception.saved_field_names[0], 'existing_field')
 
 
+    def test_set_unchanged_skips_save(self):
+        """Test that setting a field to the value it already has doesn't save it"""
+        with patch('django.db.models.Model.save') as mock_save:
+            self.kvs.set(self.key_factory('existing_field'), 'old_value')
+        self.assertFalse(mock_save.called)
+
+
 class TestUserStateSummaryStorage(StorageTestBase, TestCase):
     """Tests for UserStateSummaryStorage"""
     factory = UserStateSummaryFactory
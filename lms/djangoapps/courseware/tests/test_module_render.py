@@ -25,6 +25,7 @@ from xmodule.modulestore.tests.factories import ItemFactory, CourseFactory
 from xmodule.x_module import XModuleDescriptor
 from xmodule.modulestore.locations import SlashSeparatedCourseKey
 
+import static_replace
 from courseware import module_render as render
 from courseware.courses import get_course_with_access, course_image_url, get_course_info_section
 from courseware.model_data import FieldDataCache
@@ -518,6 +519,122 @@ class TestHtmlModifiers(ModuleStoreTestCase):
             result_fragment.content
         )
 
+    def render_links_in_sequence(self, sequence, unit_parent):
+        """
+        Render `sequence`, with a unit of html with links added to `unit_parent`,
+        returning the fragment and the number of times content was rewritten
+        """
+        vertical = ItemFactory.create(parent_location=unit_parent.location, category='vertical')
+        ItemFactory.create(
+            parent_location=vertical.location,
+            category='html',
+            data=self.content_string + self.rewrite_link + self.course_link
+        )
+        field_data_cache = FieldDataCache.cache_for_descriptor_descendents(self.course.id, self.user, sequence)
+        module = render.get_module(
+            self.user,
+            self.request,
+            sequence.location,
+            field_data_cache,
+            self.course.id,
+        )
+        with patch.object(
+            static_replace.UrlRewriter, 'rewrite', autospec=True, side_effect=static_replace.UrlRewriter.rewrite
+        ) as mock_rewrite:
+            result_fragment = module.render('student_view')
+        return result_fragment, mock_rewrite.call_count
+
+    def assert_links_rewritten_once(self, content):
+        """
+        Assert that the links of the html in `content` were each rewritten, once
+        """
+        static_url = '/c4x/{org}/{course}/asset/foo_content'.format(
+            org=self.course.location.org,
+            course=self.course.location.course,
+        )
+        course_url = '/courses/{course_id}/bar/content'.format(course_id=self.course.id.to_deprecated_string())
+        self.assertEqual(content.count(static_url), 1)
+        self.assertEqual(content.count(course_url), 1)
+        self.assertNotIn('/static/foo/content', content)
+
+    def test_links_rewritten_once_in_sequence(self):
+        sequence = ItemFactory.create(parent_location=self.course.location, category='sequential')
+        result_fragment, rewrites = self.render_links_in_sequence(sequence, sequence)
+
+        # the unit is rewritten before the sequence escapes it, then the sequence's own markup
+        self.assertEqual(rewrites, 2)
+        self.assert_links_rewritten_once(result_fragment.content)
+
+    def test_links_rewritten_once_in_nested_sequence(self):
+        sequence = ItemFactory.create(parent_location=self.course.location, category='sequential')
+        inner_sequence = ItemFactory.create(parent_location=sequence.location, category='sequential')
+        result_fragment, rewrites = self.render_links_in_sequence(sequence, inner_sequence)
+
+        # the unit's html is escaped twice, but is still rewritten before the inner sequence escapes it
+        self.assertEqual(rewrites, 3)
+        self.assert_links_rewritten_once(result_fragment.content)
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+@patch.dict('django.conf.settings.FEATURES', {'ENABLE_LAZY_SEQUENCE_RENDERING': True})
+class TestLazySequenceHandlers(ModuleStoreTestCase):
+    """
+    Test the student state loaded for the handlers of lazily rendered sequences
+    """
+    def setUp(self):
+        self.course = CourseFactory.create()
+        self.sequence = ItemFactory.create(parent_location=self.course.location, category='sequential')
+        self.vertical = ItemFactory.create(parent_location=self.sequence.location, category='vertical')
+
+    def test_render_position_with_problem_state(self):
+        # A problem directly in the sequence must be created with its saved state
+        problem = ItemFactory.create(
+            parent_location=self.sequence.location,
+            category='problem',
+            data=OptionResponseXMLFactory().build_xml(
+                question_text='The correct answer is Correct',
+                options=['Incorrect', 'Correct'],
+                correct_option='Correct',
+            ),
+        )
+        user = UserFactory.create()
+        answer_id = '{}_2_1'.format(problem.location.html_id())
+        StudentModuleFactory.create(
+            student=user,
+            course_id=self.course.id,
+            module_state_key=problem.location,
+            state=json.dumps({
+                'seed': 1,
+                'attempts': 1,
+                'done': True,
+                'student_answers': {answer_id: 'Correct'},
+                'correct_map': {answer_id: {'correctness': 'correct', 'npoints': None, 'msg': '', 'hint': '',
+                                            'hintmode': None, 'queuestate': None}},
+            }),
+        )
+
+        request = RequestFactory().post('dummy_url', data={'position': 2})
+        request.user = user
+        request.session = {}
+        response = render.handle_xblock_callback(
+            request,
+            self.course.id.to_deprecated_string(),
+            quote_slashes(self.sequence.location.to_deprecated_string()),
+            'xmodule_handler',
+            'render_position',
+        )
+        content = json.loads(response.content)['content']
+        self.assertIn('data-progress_status="done"', content)
+
+    def test_handler_cache_depth(self):
+        self.assertEqual(render._handler_cache_depth(self.sequence, 'xmodule_handler', 'render_position'), 0)
+        self.assertEqual(render._handler_cache_depth(self.sequence, 'xmodule_handler', 'goto_position'), 0)
+        # blocks extending SequenceDescriptor, and other handlers, load the whole subtree
+        self.assertIsNone(render._handler_cache_depth(self.vertical, 'xmodule_handler', 'goto_position'))
+        self.assertIsNone(render._handler_cache_depth(self.sequence, 'xmodule_handler', 'problem_get'))
+        with patch.dict('django.conf.settings.FEATURES', {'ENABLE_LAZY_SEQUENCE_RENDERING': False}):
+            self.assertIsNone(render._handler_cache_depth(self.sequence, 'xmodule_handler', 'render_position'))
+
 
 class ViewInStudioTest(ModuleStoreTestCase):
     """Tests for the 'View in Studio' link visiblity."""
@@ -766,16 +766,12 @@ def submission_history(request, course_id, student_username, location):
             username=student_username,
             location=location
         )))
-    history_entries = StudentModuleHistory.objects.filter(
-        student_module=student_module
-    ).order_by('-id')
+    history_entries = StudentModuleHistory.get_history(student_module)
 
     # If no history records exist, let's force a save to get history started.
     if not history_entries:
         student_module.save()
-        history_entries = StudentModuleHistory.objects.filter(
-            student_module=student_module
-        ).order_by('-id')
+        history_entries = StudentModuleHistory.get_history(student_module)
 
     context = {
         'history_entries': history_entries,
@@ -117,9 +117,11 @@ def inline_discussion(request, course_id, discussion_id):
 
     course = get_course_with_access(request.user, 'load_forum', course_id)
 
-    threads, query_params = get_threads(request, course_id, discussion_id, per_page=INLINE_THREADS_PER_PAGE)
     cc_user = cc.User.from_django_user(request.user)
-    user_info = cc_user.to_dict()
+    (threads, query_params), user_info = cc.utils.perform_concurrently(
+        lambda: get_threads(request, course_id, discussion_id, per_page=INLINE_THREADS_PER_PAGE),
+        cc_user.to_dict,
+    )
 
     with newrelic.agent.FunctionTrace(nr_transaction, "get_metadata_for_threads"):
         annotated_content_info = utils.get_metadata_for_threads(course_id, threads, request.user, user_info)
@@ -176,16 +178,17 @@ def forum_form_discussion(request, course_id):
     with newrelic.agent.FunctionTrace(nr_transaction, "get_discussion_category_map"):
         category_map = utils.get_discussion_category_map(course)
 
+    user = cc.User.from_django_user(request.user)
     try:
-        unsafethreads, query_params = get_threads(request, course_id)   # This might process a search query
+        (unsafethreads, query_params), user_info = cc.utils.perform_concurrently(
+            lambda: get_threads(request, course_id),   # This might process a search query
+            user.to_dict,
+        )
         threads = [utils.safe_content(thread) for thread in unsafethreads]
     except cc.utils.CommentClientMaintenanceError:
         log.warning("Forum is in maintenance mode")
         return render_to_response('discussion/maintenance.html', {})
 
-    user = cc.User.from_django_user(request.user)
-    user_info = user.to_dict()
-
     with newrelic.agent.FunctionTrace(nr_transaction, "get_metadata_for_threads"):
         annotated_content_info = utils.get_metadata_for_threads(course_id, threads, request.user, user_info)
 
@@ -237,22 +240,27 @@ def single_thread(request, course_id, discussion_id, thread_id):
 
     course = get_course_with_access(request.user, 'load_forum', course_id)
     cc_user = cc.User.from_django_user(request.user)
-    user_info = cc_user.to_dict()
 
     # Currently, the front end always loads responses via AJAX, even for this
     # page; it would be a nice optimization to avoid that extra round trip to
     # the comments service.
-    try:
-        thread = cc.Thread.find(thread_id).retrieve(
-            recursive=request.is_ajax(),
-            user_id=request.user.id,
-            response_skip=request.GET.get("resp_skip"),
-            response_limit=request.GET.get("resp_limit")
-        )
-    except cc.utils.CommentClientRequestError as e:
-        if e.status_code == 404:
-            raise Http404
-        raise
+    def retrieve_thread():
+        """
+        Retrieve the thread, raising Http404 if the comments service doesn't have it
+        """
+        try:
+            return cc.Thread.find(thread_id).retrieve(
+                recursive=request.is_ajax(),
+                user_id=request.user.id,
+                response_skip=request.GET.get("resp_skip"),
+                response_limit=request.GET.get("resp_limit")
+            )
+        except cc.utils.CommentClientRequestError as e:
+            if e.status_code == 404:
+                raise Http404
+            raise
+
+    user_info, thread = cc.utils.perform_concurrently(cc_user.to_dict, retrieve_thread)
 
     if request.is_ajax():
         with newrelic.agent.FunctionTrace(nr_transaction, "get_annotated_content_infos"):
@@ -5,6 +5,9 @@ Module for checking permissions with the comment_client backend
 import logging
 from types import NoneType
 from django.core import cache
+from django_comment_common.models import Role, FORUM_ROLE_STUDENT
+from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.modulestore.keys import CourseKey
 
 CACHE = cache.get_cache('default')
@@ -13,17 +16,52 @@ CACHE_LIFESPAN = 60
 
 def cached_has_permission(user, permission, course_id=None):
     """
-    Call has_permission if it's not cached. A change in a user's role or
-    a role's permissions will only become effective after CACHE_LIFESPAN seconds.
+    Whether the user has the permission, according to get_permissions. A change in a
+    user's role or a role's permissions will only become effective after CACHE_LIFESPAN seconds.
+    """
+    return permission in get_permissions(user, course_id)
+
+
+def get_permissions(user, course_id=None):
+    """
+    Return the frozenset of names of the permissions the user's roles give them in the course.
+
+    The set is cached for CACHE_LIFESPAN seconds, and on the user object, so that it's only
+    looked up once per request however many permissions are checked.
     """
     assert isinstance(course_id, (NoneType, CourseKey))
-    key = u"permission_{user_id:d}_{course_id}_{permission}".format(
-        user_id=user.id, course_id=course_id, permission=permission)
-    val = CACHE.get(key, None)
-    if val not in [True, False]:
-        val = has_permission(user, permission, course_id=course_id)
-        CACHE.set(key, val, CACHE_LIFESPAN)
-    return val
+    if not hasattr(user, '_forum_permissions'):
+        user._forum_permissions = {}  # pylint: disable=protected-access
+    if course_id not in user._forum_permissions:  # pylint: disable=protected-access
+        key = u"permissions_{user_id:d}_{course_id}".format(user_id=user.id, course_id=course_id)
+        permissions = CACHE.get(key, None)
+        if not isinstance(permissions, frozenset):
+            permissions = _get_permissions(user, course_id)
+            CACHE.set(key, permissions, CACHE_LIFESPAN)
+        user._forum_permissions[course_id] = permissions  # pylint: disable=protected-access
+    return user._forum_permissions[course_id]  # pylint: disable=protected-access
+
+
+def _get_permissions(user, course_id):
+    """
+    Look up the user's permissions in the course, as has_permission would for each one
+    """
+    roles = list(Role.objects.filter(users=user, course_id=course_id).prefetch_related('permissions'))
+    if not roles:
+        return frozenset()
+
+    course = modulestore().get_course(course_id)
+    if course is None:
+        raise ItemNotFoundError(course_id)
+    permissions = set()
+    for role in roles:
+        for permission in role.permissions.all():
+            # the same rule as Role.has_permission: students may not post when the course disallows it
+            if role.name == FORUM_ROLE_STUDENT and not course.forum_posts_allowed and \
+               permission.name.startswith(('edit', 'update', 'create')):
+                continue
+            permissions.add(permission.name)
+    return frozenset(permissions)
 
 
 def has_permission(user, permission, course_id=None):
@@ -58,19 +96,23 @@ def _check_condition(user, condition, course_id, data):
     return handlers[condition](user, condition, course_id, data)
 
 
-def _check_conditions_permissions(user, permissions, course_id, **kwargs):
+def _check_conditions_permissions(user, permissions, course_id, user_permissions=None, **kwargs):
     """
     Accepts a list of permissions and proceed if any of the permission is valid.
     Note that ["can_view", "can_edit"] will proceed if the user has either
     "can_view" or "can_edit" permission. To use AND operator in between, wrap them in
     a list.
+
+    `user_permissions` is the set returned by get_permissions, if the caller already has it.
     """
+    if user_permissions is None:
+        user_permissions = get_permissions(user, course_id)
 
     def test(user, per, operator="or"):
         if isinstance(per, basestring):
             if per in CONDITIONS:
                 return _check_condition(user, per, course_id, kwargs)
-            return cached_has_permission(user, per, course_id=course_id)
+            return per in user_permissions
         elif isinstance(per, list) and operator in ["and", "or"]:
             results = [test(user, x, operator="and") for x in per]
             if operator == "or":
@@ -109,10 +151,10 @@ VIEW_PERMISSIONS = {
 }
 
 
-def check_permissions_by_view(user, course_id, content, name):
+def check_permissions_by_view(user, course_id, content, name, user_permissions=None):
     assert isinstance(course_id, CourseKey)
     try:
         p = VIEW_PERMISSIONS[name]
     except KeyError:
         logging.warning("Permission for view named %s does not exist in permissions.py" % name)
-    return _check_conditions_permissions(user, p, course_id, content=content)
+    return _check_conditions_permissions(user, p, course_id, user_permissions=user_permissions, content=content)
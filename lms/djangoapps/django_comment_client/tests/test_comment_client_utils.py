@@ -0,0 +1,78 @@
+"""
+Tests of the connection pooling and concurrency helpers of the comments service client
+"""
+import threading
+
+from django.test import TestCase
+from django.utils import translation
+from django.utils.translation import get_language
+
+from lms.lib.comment_client import utils as cc_utils
+
+
+class GetSessionTestCase(TestCase):
+    def test_session_is_reused(self):
+        self.assertIs(cc_utils.get_session(), cc_utils.get_session())
+
+    def test_session_keeps_no_cookies(self):
+        session = cc_utils.get_session()
+        # no domain is allowed to set or receive cookies
+        self.assertEqual(session.cookies.get_policy().allowed_domains(), [])
+
+    def test_pool_mounted(self):
+        session = cc_utils.get_session()
+        adapter = session.get_adapter('http://localhost:4567/api/v1/threads')
+        self.assertIsInstance(adapter, cc_utils.HTTPAdapter)
+        self.assertIs(adapter, session.get_adapter('https://localhost/api/v1/threads'))
+
+
+class PerformConcurrentlyTestCase(TestCase):
+    def test_results_in_order(self):
+        self.assertEqual(
+            cc_utils.perform_concurrently(lambda: 1, lambda: 2, lambda: 3),
+            [1, 2, 3]
+        )
+
+    def test_no_calls(self):
+        self.assertEqual(cc_utils.perform_concurrently(), [])
+
+    def test_calls_overlap(self):
+        # each call waits for the other; so, this only finishes if they run at the same time
+        barrier = [threading.Event(), threading.Event()]
+
+        def call(index):
+            barrier[index].set()
+            return barrier[1 - index].wait(5)
+
+        self.assertEqual(
+            cc_utils.perform_concurrently(lambda: call(0), lambda: call(1)),
+            [True, True]
+        )
+
+    def test_first_call_in_calling_thread(self):
+        caller = threading.current_thread()
+        first, second = cc_utils.perform_concurrently(threading.current_thread, threading.current_thread)
+        self.assertIs(first, caller)
+        self.assertIsNot(second, caller)
+
+    def test_earliest_exception_raised(self):
+        def fail(message):
+            raise ValueError(message)
+
+        finished = []
+        with self.assertRaisesRegexp(ValueError, 'first'):
+            cc_utils.perform_concurrently(
+                lambda: finished.append(0),
+                lambda: fail('first'),
+                lambda: fail('second'),
+                lambda: finished.append(3),
+            )
+        # the other calls still finish
+        self.assertEqual(sorted(finished), [0, 3])
+
+    def test_workers_use_callers_language(self):
+        translation.activate('eo')
+        try:
+            self.assertEqual(cc_utils.perform_concurrently(get_language, get_language), ['eo', 'eo'])
+        finally:
+            translation.deactivate()
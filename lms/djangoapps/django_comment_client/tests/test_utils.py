@@ -8,7 +8,10 @@ from django.core.urlresolvers import reverse
 from django.test import TestCase
 from django.test.utils import override_settings
 from student.tests.factories import UserFactory, CourseEnrollmentFactory
+from django_comment_client.permissions import CACHE, cached_has_permission, check_permissions_by_view, get_permissions
 from django_comment_client.tests.factories import RoleFactory
+from django_comment_common.models import Role
+from django_comment_common.utils import seed_permissions_roles
 from django_comment_client.tests.unicode import UnicodeTestMixin
 import django_comment_client.utils as utils
 from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
@@ -78,6 +81,91 @@ class AccessUtilsTestCase(TestCase):
         self.assertFalse(ret)
 
 
+@override_settings(MODULESTORE=TEST_DATA_MONGO_MODULESTORE)
+class AnnotationTestCase(ModuleStoreTestCase):
+    """
+    Test the permission sets and thread metadata used to annotate threads
+    """
+    def setUp(self):
+        # other tests' users and courses may have had the same ids
+        CACHE.clear()
+        self.course = CourseFactory.create()
+        seed_permissions_roles(self.course.id)
+        self.student = UserFactory.create()
+        self.student.roles.add(Role.objects.get(name='Student', course_id=self.course.id))
+        self.moderator = UserFactory.create()
+        self.moderator.roles.add(Role.objects.get(name='Moderator', course_id=self.course.id))
+
+    def make_content(self, content_type, content_id, user, children=()):
+        """
+        Return the dict of an open thread or comment by the user
+        """
+        return {
+            'type': content_type,
+            'id': content_id,
+            'user_id': str(user.id),
+            'closed': False,
+            'children': list(children),
+        }
+
+    def test_get_permissions(self):
+        permissions = get_permissions(self.student, self.course.id)
+        self.assertIsInstance(permissions, frozenset)
+        self.assertIn('create_thread', permissions)
+        self.assertNotIn('openclose_thread', permissions)
+        self.assertIn('openclose_thread', get_permissions(self.moderator, self.course.id))
+        self.assertEqual(get_permissions(UserFactory.create(), self.course.id), frozenset())
+
+    @mock.patch(
+        'xmodule.course_module.CourseDescriptor.forum_posts_allowed',
+        new_callable=mock.PropertyMock,
+        return_value=False
+    )
+    def test_get_permissions_posts_not_allowed(self, _mock_posts_allowed):
+        self.assertNotIn('create_thread', get_permissions(self.student, self.course.id))
+        self.assertIn('vote', get_permissions(self.student, self.course.id))
+        self.assertIn('create_thread', get_permissions(self.moderator, self.course.id))
+
+    def test_get_permissions_looked_up_once(self):
+        get_permissions(self.student, self.course.id)
+        with self.assertNumQueries(0):
+            for permission in ['vote', 'create_thread', 'openclose_thread']:
+                cached_has_permission(self.student, permission, self.course.id)
+
+    def test_metadata_matches_checks_by_view(self):
+        comment = self.make_content('comment', 'comment_id', self.moderator)
+        thread = self.make_content('thread', 'thread_id', self.student, children=[comment])
+        user_info = {'upvoted_ids': ['comment_id'], 'downvoted_ids': [], 'subscribed_thread_ids': ['thread_id']}
+
+        metadata = utils.get_metadata_for_threads(self.course.id, [thread], self.student, user_info)
+
+        self.assertEqual(set(metadata), {'thread_id', 'comment_id'})
+        self.assertEqual(metadata['comment_id']['voted'], 'up')
+        self.assertTrue(metadata['thread_id']['subscribed'])
+        self.assertEqual(metadata['thread_id']['ability'], {
+            'editable': True,
+            'can_reply': True,
+            'can_endorse': False,
+            'can_delete': True,
+            'can_openclose': False,
+            'can_vote': True,
+        })
+        # the student may not edit or delete the moderator's comment
+        self.assertFalse(metadata['comment_id']['ability']['editable'])
+        self.assertFalse(metadata['comment_id']['ability']['can_delete'])
+        self.assertEqual(
+            metadata['comment_id']['ability'],
+            {
+                'editable': check_permissions_by_view(self.student, self.course.id, comment, 'update_comment'),
+                'can_reply': check_permissions_by_view(self.student, self.course.id, comment, 'create_sub_comment'),
+                'can_endorse': check_permissions_by_view(self.student, self.course.id, comment, 'endorse_comment'),
+                'can_delete': check_permissions_by_view(self.student, self.course.id, comment, 'delete_comment'),
+                'can_openclose': False,
+                'can_vote': check_permissions_by_view(self.student, self.course.id, comment, 'vote_for_comment'),
+            }
+        )
+
+
 @override_settings(MODULESTORE=TEST_DATA_MONGO_MODULESTORE)
 class CoursewareContextTestCase(ModuleStoreTestCase):
     def setUp(self):
@@ -9,7 +9,7 @@ from django.db import connection
 from django.http import HttpResponse
 from django.utils import simplejson
 from django_comment_common.models import Role, FORUM_ROLE_STUDENT
-from django_comment_client.permissions import check_permissions_by_view
+from django_comment_client.permissions import check_permissions_by_view, get_permissions
 
 from edxmako import lookup_template
 import pystache_custom as pystache
@@ -248,20 +248,31 @@ class QueryCountDebugMiddleware(object):
         return response
 
 
-def get_ability(course_id, content, user):
+def get_ability(course_id, content, user, user_permissions=None):
+    """
+    Return what the user may do to the content (thread or comment). Pass the set returned
+    by get_permissions as `user_permissions` to check many contents against it.
+    """
+    if user_permissions is None:
+        user_permissions = get_permissions(user, course_id)
+
+    def check(name):
+        return check_permissions_by_view(user, course_id, content, name, user_permissions=user_permissions)
+
+    is_thread = content['type'] == 'thread'
     return {
-        'editable': check_permissions_by_view(user, course_id, content, "update_thread" if content['type'] == 'thread' else "update_comment"),
-        'can_reply': check_permissions_by_view(user, course_id, content, "create_comment" if content['type'] == 'thread' else "create_sub_comment"),
-        'can_endorse': check_permissions_by_view(user, course_id, content, "endorse_comment") if content['type'] == 'comment' else False,
-        'can_delete': check_permissions_by_view(user, course_id, content, "delete_thread" if content['type'] == 'thread' else "delete_comment"),
-        'can_openclose': check_permissions_by_view(user, course_id, content, "openclose_thread") if content['type'] == 'thread' else False,
-        'can_vote': check_permissions_by_view(user, course_id, content, "vote_for_thread" if content['type'] == 'thread' else "vote_for_comment"),
+        'editable': check("update_thread" if is_thread else "update_comment"),
+        'can_reply': check("create_comment" if is_thread else "create_sub_comment"),
+        'can_endorse': check("endorse_comment") if content['type'] == 'comment' else False,
+        'can_delete': check("delete_thread" if is_thread else "delete_comment"),
+        'can_openclose': check("openclose_thread") if is_thread else False,
+        'can_vote': check("vote_for_thread" if is_thread else "vote_for_comment"),
     }
 
 # TODO: RENAME
 
 
-def get_annotated_content_info(course_id, content, user, user_info):
+def get_annotated_content_info(course_id, content, user, user_info, user_permissions=None):
     """
     Get metadata for an individual content (thread or comment)
     """
@@ -273,7 +284,7 @@ def get_annotated_content_info(course_id, content, user, user_info):
     return {
         'voted': voted,
         'subscribed': content['id'] in user_info['subscribed_thread_ids'],
-        'ability': get_ability(course_id, content, user),
+        'ability': get_ability(course_id, content, user, user_permissions=user_permissions),
     }
 
 # TODO: RENAME
@@ -283,22 +294,30 @@ def get_annotated_content_infos(course_id, thread, user, user_info):
     """
     Get metadata for a thread and its children
     """
-    infos = {}
-
-    def annotate(content):
-        infos[str(content['id'])] = get_annotated_content_info(course_id, content, user, user_info)
-        for child in content.get('children', []):
-            annotate(child)
-    annotate(thread)
-    return infos
+    return get_metadata_for_threads(course_id, [thread], user, user_info)
 
 
 def get_metadata_for_threads(course_id, threads, user, user_info):
-    def infogetter(thread):
-        return get_annotated_content_infos(course_id, thread, user, user_info)
-
-    metadata = reduce(merge_dict, map(infogetter, threads), {})
-    return metadata
+    """
+    Get metadata for the threads and all their children, in one pass, keyed by content id
+    """
+    user_permissions = get_permissions(user, course_id)
+    # sets, to look up each content's id quickly
+    user_info = dict(
+        user_info,
+        upvoted_ids=set(user_info['upvoted_ids']),
+        downvoted_ids=set(user_info['downvoted_ids']),
+        subscribed_thread_ids=set(user_info['subscribed_thread_ids']),
+    )
+    infos = {}
+    to_annotate = list(reversed(threads))
+    while to_annotate:
+        content = to_annotate.pop()
+        infos[str(content['id'])] = get_annotated_content_info(
+            course_id, content, user, user_info, user_permissions=user_permissions
+        )
+        to_annotate.extend(reversed(content.get('children', [])))
+    return infos
 
 # put this method in utils.py to avoid circular import dependency between helpers and mustache_helpers
 
@@ -12,13 +12,14 @@ file and check it in at the same time as your model changes. To do that,
 ASSUMPTIONS: modules have unique IDs, even across different module_types
 
 """
-from cStringIO import StringIO
 from gzip import GzipFile
 from uuid import uuid4
 import csv
 import json
 import hashlib
 import os.path
+import shutil
+import tempfile
 import urllib
 
 from boto.s3.connection import S3Connection
@@ -190,12 +191,120 @@ class InstructorTask(models.Model):
         return json.dumps({'message': 'Task revoked before running'})
 
 
+class ReportWriter(object):
+    """
+    Writes the rows of a CSV report to a local working file as they're produced,
+    so that the whole report never has to be held in memory. Nothing is visible
+    in the `ReportStore` until `close()` publishes the file; so, any report that
+    is listed is a complete one.
+
+    `checkpoint(state)` saves the rows written so far along with `state`, any
+    JSON-serializable value describing how far the report has got. If the
+    process dies, a writer later opened with `resume=True` for the same report
+    truncates the working file to the last checkpoint and makes that state
+    available as `resumed_state`, which is None if the report is starting
+    afresh.
+
+    Used as a context manager, the report is published if the block finishes,
+    and the working file is kept for resuming if it raises.
+    """
+    def __init__(self, path, publish, resume=False):
+        """
+        `path` is the working file, and `publish` a function which is passed
+        that path to store the finished report.
+        """
+        self.path = path
+        self.checkpoint_path = path + '.checkpoint'
+        self.publish = publish
+        self.resumed_state = None
+
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        offset = 0
+        if resume and os.path.exists(self.checkpoint_path) and os.path.exists(path):
+            with open(self.checkpoint_path, 'rb') as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+            offset = checkpoint['offset']
+            self.resumed_state = checkpoint['state']
+        elif os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        if offset:
+            self._file = open(path, 'r+b')
+            self._file.truncate(offset)
+            self._file.seek(offset)
+        else:
+            self._file = open(path, 'wb')
+        self._writer = csv.writer(self._file)
+
+    def writerow(self, row):
+        """
+        Write a row, which is an iterable of strings (unicode is utf-8 encoded) and numbers
+        """
+        self._writer.writerow([
+            value.encode('utf-8') if isinstance(value, unicode) else value
+            for value in row
+        ])
+
+    def writerows(self, rows):
+        """
+        Write each of the rows
+        """
+        for row in rows:
+            self.writerow(row)
+
+    def checkpoint(self, state):
+        """
+        Save the rows written so far, so that writing the report can be resumed
+        from here with `state`
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'wb') as checkpoint_file:
+            json.dump({'offset': self._file.tell(), 'state': state}, checkpoint_file)
+        os.rename(temp_path, self.checkpoint_path)
+
+    def close(self):
+        """
+        Finish the report and publish it to the `ReportStore`
+        """
+        self._file.close()
+        self.publish(self.path)
+        self._remove_working_files()
+
+    def abort(self):
+        """
+        Discard the report, including any checkpoint
+        """
+        self._file.close()
+        self._remove_working_files()
+
+    def _remove_working_files(self):
+        """
+        Remove the working file and checkpoint, if they're still there
+        """
+        for path in (self.path, self.checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
 class ReportStore(object):
     """
     Simple abstraction layer that can fetch and store CSV files for reports
-    download. Should probably refactor later to create a ReportFile object that
-    can simply be appended to for the sake of memory efficiency, rather than
-    passing in the whole dataset. Doing that for now just because it's simpler.
+    download. Reports can be stored whole, with `store_rows`, or written a
+    row at a time with the `ReportWriter` returned by `open_report`.
     """
     @classmethod
     def from_config(cls):
@@ -209,6 +318,22 @@ class ReportStore(object):
         elif storage_type.lower() == "localfs":
             return LocalFSReportStore.from_config()
 
+    def open_report(self, course_id, filename, resume=False):
+        """
+        Return a `ReportWriter` for the report named `filename` for `course_id`.
+        If `resume` is set, the report carries on from the last checkpoint of an
+        earlier writer of the same report which didn't finish.
+        """
+        raise NotImplementedError
+
+    def store_rows(self, course_id, filename, rows):
+        """
+        Given a `course_id`, `filename`, and `rows` (each row is an iterable of
+        strings), write this data out.
+        """
+        with self.open_report(course_id, filename) as report:
+            report.writerows(rows)
+
 
 class S3ReportStore(ReportStore):
     """
@@ -295,21 +420,40 @@ class S3ReportStore(ReportStore):
             }
         )
 
-    def store_rows(self, course_id, filename, rows):
+    def open_report(self, course_id, filename, resume=False):
         """
-        Given a `course_id`, `filename`, and `rows` (each row is an iterable of
-        strings), create a buffer that is a gzip'd csv file, and then `store()`
-        that buffer.
+        Return a `ReportWriter` which writes a csv file to a local temporary
+        file, and uploads it gzip'd to S3 once it's finished.
 
         Even though we store it in gzip format, browsers will transparently
         download and decompress it. Filenames should end in `.csv`, not `.gz`.
         """
-        output_buffer = StringIO()
-        gzip_file = GzipFile(fileobj=output_buffer, mode="wb")
-        csv.writer(gzip_file).writerows(rows)
-        gzip_file.close()
-
-        self.store(course_id, filename, output_buffer)
+        key = self.key_for(course_id, filename)
+        working_path = os.path.join(tempfile.gettempdir(), 'report-partials', self.bucket.name, key.key)
+
+        def publish(path):
+            """
+            Gzip the finished file in one pass, so that it's a single gzip member,
+            which every gzip decoder reads all of, and upload that, streamed from disk
+            """
+            compressed_path = path + '.gz'
+            try:
+                with open(path, 'rb') as report_file, GzipFile(compressed_path, 'wb') as compressed_file:
+                    shutil.copyfileobj(report_file, compressed_file)
+                key.content_encoding = "gzip"
+                key.content_type = "text/csv"
+                key.set_contents_from_filename(
+                    compressed_path,
+                    headers={
+                        "Content-Encoding": "gzip",
+                        "Content-Type": "text/csv",
+                    }
+                )
+            finally:
+                if os.path.exists(compressed_path):
+                    os.remove(compressed_path)
+
+        return ReportWriter(working_path, publish, resume=resume)
 
     def links_for(self, course_id):
         """
@@ -378,14 +522,26 @@ class LocalFSReportStore(ReportStore):
         with open(full_path, "wb") as f:
             f.write(buff.getvalue())
 
-    def store_rows(self, course_id, filename, rows):
+    def open_report(self, course_id, filename, resume=False):
         """
-        Given a course_id, filename, and rows (each row is an iterable of strings),
-        write this data out.
+        Return a `ReportWriter` which writes to a file in a `.partial` directory
+        under `root_path`, and moves it into place once it's finished.
         """
-        output_buffer = StringIO()
-        csv.writer(output_buffer).writerows(rows)
-        self.store(course_id, filename, output_buffer)
+        working_path = os.path.join(
+            self.root_path, '.partial', urllib.quote(course_id.to_deprecated_string(), safe=''), filename
+        )
+
+        def publish(path):
+            """
+            Move the finished file to where `links_for` will find it
+            """
+            full_path = self.path_to(course_id, filename)
+            directory = os.path.dirname(full_path)
+            if not os.path.exists(directory):
+                os.mkdir(directory)
+            os.rename(path, full_path)
+
+        return ReportWriter(working_path, publish, resume=resume)
 
     def links_for(self, course_id):
         """
@@ -18,6 +18,11 @@ object contains a 'task_input' row which is a JSON-encoded dict containing
 a problem URL and optionally a student.  These are used to set up the initial value
 of the query for traversing StudentModule objects.
 
+Rescoring, resetting and deleting split the StudentModules into chunks, each updated
+by an `update_problem_module_state` subtask, when there are more than
+settings.INSTRUCTOR_TASK_MODULES_PER_TASK of them.  Resetting and deleting update each
+chunk in bulk, while rescoring visits the modules one at a time.
+
 """
 from django.conf import settings
 from django.utils.translation import ugettext_noop
@@ -26,10 +31,8 @@ from functools import partial
 from instructor_task.tasks_helper import (
     run_main_task,
     BaseInstructorTask,
-    perform_module_state_update,
-    rescore_problem_module_state,
-    reset_attempts_module_state,
-    delete_problem_module_state,
+    delegate_module_state_update,
+    perform_module_state_subtask,
     push_grades_to_s3,
 )
 from bulk_email.tasks import perform_delegate_email_batches
@@ -56,13 +59,14 @@ def rescore_problem(entry_id, xmodule_instance_args):
     """
     # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
     action_name = ugettext_noop('rescored')
-    update_fcn = partial(rescore_problem_module_state, xmodule_instance_args)
 
     def filter_fcn(modules_to_update):
         """Filter that matches problems which are marked as being done"""
         return modules_to_update.filter(state__contains='"done": true')
 
-    visit_fcn = partial(perform_module_state_update, update_fcn, filter_fcn)
+    visit_fcn = partial(
+        delegate_module_state_update, update_problem_module_state, 'rescore', filter_fcn, xmodule_instance_args
+    )
     return run_main_task(entry_id, visit_fcn, action_name)
 
 
@@ -83,8 +87,9 @@ def reset_problem_attempts(entry_id, xmodule_instance_args):
     """
     # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
     action_name = ugettext_noop('reset')
-    update_fcn = partial(reset_attempts_module_state, xmodule_instance_args)
-    visit_fcn = partial(perform_module_state_update, update_fcn, None)
+    visit_fcn = partial(
+        delegate_module_state_update, update_problem_module_state, 'reset', None, xmodule_instance_args
+    )
     return run_main_task(entry_id, visit_fcn, action_name)
 
 
@@ -105,11 +110,24 @@ def delete_problem_state(entry_id, xmodule_instance_args):
     """
     # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
     action_name = ugettext_noop('deleted')
-    update_fcn = partial(delete_problem_module_state, xmodule_instance_args)
-    visit_fcn = partial(perform_module_state_update, update_fcn, None)
+    visit_fcn = partial(
+        delegate_module_state_update, update_problem_module_state, 'delete', None, xmodule_instance_args
+    )
     return run_main_task(entry_id, visit_fcn, action_name)
 
 
+@task  # pylint: disable=E1102
+def update_problem_module_state(entry_id, update_type, module_ids, xmodule_instance_args, subtask_status_dict):
+    """Rescores, resets attempts on or deletes a chunk of the StudentModules of a problem.
+
+    `entry_id` is the id value of the InstructorTask entry whose subtask this is.
+    `update_type` is 'rescore', 'reset' or 'delete', and `module_ids` the ids of the
+    StudentModules to update.  `subtask_status_dict` is the subtask's initial status
+    (see SubtaskStatus); the outcome is recorded in the InstructorTask.
+    """
+    return perform_module_state_subtask(entry_id, update_type, module_ids, xmodule_instance_args, subtask_status_dict)
+
+
 @task(base=BaseInstructorTask)  # pylint: disable=E1102
 def send_bulk_course_email(entry_id, _xmodule_instance_args):
     """Sends emails to recipients enrolled in a course.
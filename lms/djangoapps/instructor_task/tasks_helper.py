@@ -5,12 +5,14 @@ running state of a course.
 """
 import json
 import urllib
+from functools import partial
 from datetime import datetime
 from time import time
 
 from celery import Task, current_task
 from celery.utils.log import get_task_logger
 from celery.states import SUCCESS, FAILURE
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import transaction, reset_queries
 from dogapi import dog_stats_api
@@ -20,10 +22,16 @@ from xmodule.modulestore.django import modulestore
 from track.views import task_track
 
 from courseware.grades import iterate_grades_for
-from courseware.models import StudentModule
+from courseware.models import StudentModule, StudentModuleHistory
 from courseware.model_data import FieldDataCache
 from courseware.module_render import get_module_for_descriptor_internal
 from instructor_task.models import ReportStore, InstructorTask, PROGRESS
+from instructor_task.subtasks import (
+    SubtaskStatus,
+    queue_subtasks_for_query,
+    check_subtask_is_valid,
+    update_subtask_status,
+)
 from student.models import CourseEnrollment
 
 # define different loggers for use within tasks and on client side
@@ -37,6 +45,9 @@ UPDATE_STATUS_SUCCEEDED = 'succeeded'
 UPDATE_STATUS_FAILED = 'failed'
 UPDATE_STATUS_SKIPPED = 'skipped'
 
+# The least time, in seconds, between the progress updates of a task working through StudentModules
+PROGRESS_UPDATE_INTERVAL = 1.0
+
 
 class BaseInstructorTask(Task):
     """
@@ -207,16 +218,75 @@ def run_main_task(entry_id, task_fcn, action_name):
     return task_progress
 
 
-def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, task_input, action_name):
+def _get_modules_to_update(course_id, task_input, filter_fcn):
     """
-    Performs generic update by visiting StudentModule instances with the update_fcn provided.
+    Return the descriptor of the problem named by `task_input`, and a query for the StudentModules to update.
 
     StudentModule instances are those that match the specified `course_id` and `module_state_key`.
     If `student_identifier` is not None, it is used as an additional filter to limit the modules to those belonging
-    to that student. If `student_identifier` is None, performs update on modules for all students on the specified problem.
+    to that student. If `student_identifier` is None, returns modules for all students on the specified problem.
 
     If a `filter_fcn` is not None, it is applied to the query that has been constructed.  It takes one
     argument, which is the query being filtered, and returns the filtered version of the query.
+    """
+    usage_key = course_id.make_usage_key_from_deprecated_string(task_input.get('problem_url'))
+    student_identifier = task_input.get('student')
+
+    # find the problem descriptor:
+    module_descriptor = modulestore().get_item(usage_key)
+
+    # find the module in question
+    modules_to_update = StudentModule.objects.filter(course_id=course_id, module_state_key=usage_key)
+
+    # give the option of updating an individual student. If not specified,
+    # then updates all students who have responded to a problem so far
+    student = None
+    if student_identifier is not None:
+        # if an identifier is supplied, then look for the student,
+        # and let it throw an exception if none is found.
+        if "@" in student_identifier:
+            student = User.objects.get(email=student_identifier)
+        elif student_identifier is not None:
+            student = User.objects.get(username=student_identifier)
+
+    if student is not None:
+        modules_to_update = modules_to_update.filter(student_id=student.id)
+
+    if filter_fcn is not None:
+        modules_to_update = filter_fcn(modules_to_update)
+
+    return module_descriptor, modules_to_update
+
+
+def update_modules_one_at_a_time(update_fcn, module_descriptor, modules_to_update, action_name, progress_fcn=None):
+    """
+    Calls `update_fcn` on each StudentModule in `modules_to_update`, as described for
+    perform_module_state_update, and returns a dict of the number of modules for which
+    it returned each of UPDATE_STATUS_SUCCEEDED, UPDATE_STATUS_FAILED and UPDATE_STATUS_SKIPPED.
+
+    If given, `progress_fcn` is called with that dict after each module.
+    """
+    counts = {UPDATE_STATUS_SUCCEEDED: 0, UPDATE_STATUS_FAILED: 0, UPDATE_STATUS_SKIPPED: 0}
+    for module_to_update in modules_to_update:
+        # There is no try here:  if there's an error, we let it throw, and the task will
+        # be marked as FAILED, with a stack trace.
+        with dog_stats_api.timer('instructor_tasks.module.time.step', tags=[u'action:{name}'.format(name=action_name)]):
+            update_status = update_fcn(module_descriptor, module_to_update)
+        if update_status not in counts:
+            raise UpdateProblemModuleStateError("Unexpected update_status returned: {}".format(update_status))
+        # Logging of failures is left to the update_fcn itself.
+        counts[update_status] += 1
+        if progress_fcn is not None:
+            progress_fcn(counts)
+    return counts
+
+
+def perform_module_state_update(update_fcn, filter_fcn, entry_id, course_id, task_input, action_name):
+    """
+    Performs generic update by visiting StudentModule instances with the update_fcn provided.
+
+    The StudentModules are those found by `_get_modules_to_update` from `course_id`, `task_input` and
+    `filter_fcn`.
 
     The `update_fcn` is called on each StudentModule that passes the resulting filtering.
     It is passed three arguments:  the module_descriptor for the module pointed to by the
@@ -225,6 +295,22 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
     the update is successful; False indicates the update on the particular student module failed.
     A raised exception indicates a fatal condition -- that no other student modules should be considered.
 
+    The return value is a dict containing the task's results, as described for perform_batch_update.
+    """
+    batch_update_fcn = partial(update_modules_one_at_a_time, update_fcn)
+    return perform_batch_update(batch_update_fcn, filter_fcn, entry_id, course_id, task_input, action_name)
+
+
+def perform_batch_update(batch_update_fcn, filter_fcn, _entry_id, course_id, task_input, action_name):
+    """
+    Performs an update of all the StudentModule instances to update within this task.
+
+    `batch_update_fcn` is called with the problem's descriptor, the query for the StudentModules
+    to update (see `_get_modules_to_update`), `action_name`, and a function to call with the counts
+    so far as it makes progress, and returns the final counts of modules for which the update
+    succeeded, failed and was skipped (see `update_modules_one_at_a_time`). Progress is reported
+    to celery at most every PROGRESS_UPDATE_INTERVAL seconds.
+
     The return value is a dict containing the task's results, with the following keys:
 
           'attempted': number of attempts made
@@ -239,81 +325,164 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
     Because this is run internal to a task, it does not catch exceptions.  These are allowed to pass up to the
     next level, so that it can set the failure modes and capture the error trace in the InstructorTask and the
     result object.
-
     """
     # get start time for task:
     start_time = time()
 
-    usage_key = course_id.make_usage_key_from_deprecated_string(task_input.get('problem_url'))
-    student_identifier = task_input.get('student')
-
-    # find the problem descriptor:
-    module_descriptor = modulestore().get_item(usage_key)
-
-    # find the module in question
-    modules_to_update = StudentModule.objects.filter(course_id=course_id, module_state_key=usage_key)
-
-    # give the option of updating an individual student. If not specified,
-    # then updates all students who have responded to a problem so far
-    student = None
-    if student_identifier is not None:
-        # if an identifier is supplied, then look for the student,
-        # and let it throw an exception if none is found.
-        if "@" in student_identifier:
-            student = User.objects.get(email=student_identifier)
-        elif student_identifier is not None:
-            student = User.objects.get(username=student_identifier)
+    module_descriptor, modules_to_update = _get_modules_to_update(course_id, task_input, filter_fcn)
+    return _perform_batch_update(batch_update_fcn, module_descriptor, modules_to_update, action_name, start_time)
 
-    if student is not None:
-        modules_to_update = modules_to_update.filter(student_id=student.id)
 
-    if filter_fcn is not None:
-        modules_to_update = filter_fcn(modules_to_update)
-
-    # perform the main loop
-    num_attempted = 0
-    num_succeeded = 0
-    num_skipped = 0
-    num_failed = 0
+def _perform_batch_update(batch_update_fcn, module_descriptor, modules_to_update, action_name, start_time):
+    """
+    Does the work of `perform_batch_update` once the StudentModules to update have been found
+    """
     num_total = modules_to_update.count()
+    counts = {UPDATE_STATUS_SUCCEEDED: 0, UPDATE_STATUS_FAILED: 0, UPDATE_STATUS_SKIPPED: 0}
 
     def get_task_progress():
         """Return a dict containing info about current task"""
         current_time = time()
         progress = {'action_name': action_name,
-                    'attempted': num_attempted,
-                    'succeeded': num_succeeded,
-                    'skipped': num_skipped,
-                    'failed': num_failed,
+                    'attempted': sum(counts.values()),
+                    'succeeded': counts[UPDATE_STATUS_SUCCEEDED],
+                    'skipped': counts[UPDATE_STATUS_SKIPPED],
+                    'failed': counts[UPDATE_STATUS_FAILED],
                     'total': num_total,
                     'duration_ms': int((current_time - start_time) * 1000),
                     }
         return progress
 
-    task_progress = get_task_progress()
-    _get_current_task().update_state(state=PROGRESS, meta=task_progress)
-    for module_to_update in modules_to_update:
-        num_attempted += 1
-        # There is no try here:  if there's an error, we let it throw, and the task will
-        # be marked as FAILED, with a stack trace.
-        with dog_stats_api.timer('instructor_tasks.module.time.step', tags=[u'action:{name}'.format(name=action_name)]):
-            update_status = update_fcn(module_descriptor, module_to_update)
-            if update_status == UPDATE_STATUS_SUCCEEDED:
-                # If the update_fcn returns true, then it performed some kind of work.
-                # Logging of failures is left to the update_fcn itself.
-                num_succeeded += 1
-            elif update_status == UPDATE_STATUS_FAILED:
-                num_failed += 1
-            elif update_status == UPDATE_STATUS_SKIPPED:
-                num_skipped += 1
-            else:
-                raise UpdateProblemModuleStateError("Unexpected update_status returned: {}".format(update_status))
+    last_update_time = [time()]
 
-        # update task status:
-        task_progress = get_task_progress()
-        _get_current_task().update_state(state=PROGRESS, meta=task_progress)
+    def report_progress(new_counts):
+        """Record the counts so far, and update task status if it hasn't been updated lately"""
+        counts.update(new_counts)
+        if time() - last_update_time[0] >= PROGRESS_UPDATE_INTERVAL:
+            _get_current_task().update_state(state=PROGRESS, meta=get_task_progress())
+            last_update_time[0] = time()
+
+    _get_current_task().update_state(state=PROGRESS, meta=get_task_progress())
+    counts.update(batch_update_fcn(module_descriptor, modules_to_update, action_name, report_progress))
+    return get_task_progress()
+
+
+def get_batch_update_fcn(update_type, xmodule_instance_args):
+    """
+    Return the batch update function (see `perform_batch_update`) for `update_type`, which is
+    'rescore', 'reset' or 'delete'.
+
+    Rescoring needs each student's XModule; so, it visits the modules one at a time. Resetting and
+    deleting only change the StudentModule rows; so, they're done in bulk.
+    """
+    if update_type == 'rescore':
+        return partial(update_modules_one_at_a_time, partial(rescore_problem_module_state, xmodule_instance_args))
+    elif update_type == 'reset':
+        return partial(reset_attempts_in_bulk, xmodule_instance_args)
+    elif update_type == 'delete':
+        return partial(delete_problem_state_in_bulk, xmodule_instance_args)
+    raise ValueError(u"Unknown update type {}".format(update_type))
 
-    return task_progress
+
+def delegate_module_state_update(subtask_class, update_type, filter_fcn, xmodule_instance_args,
+                                 entry_id, course_id, task_input, action_name):
+    """
+    Updates the StudentModules of a problem, as `perform_batch_update` does with the batch
+    update function for `update_type` (see `get_batch_update_fcn`), fanning the work out to
+    subtasks if there's more of it than one task should do.
+
+    The StudentModules to update are broken up into chunks of no more than
+    settings.INSTRUCTOR_TASK_MODULES_PER_TASK, each of which is updated by a `subtask_class`
+    task (see `perform_module_state_subtask`) which records its progress in the InstructorTask.
+    If there's only one chunk's worth, the work is done in this task.
+
+    Returns the task progress, as for `perform_batch_update`, or as stored in the InstructorTask
+    when subtasks are queued.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+    # If the task is rerun (e.g. requeued when celery lost its connection to the broker)
+    # after queuing its subtasks, leave the subtasks to finish the work.
+    if len(entry.subtasks) > 0 and len(entry.task_output) > 0:
+        TASK_LOG.warning(u"Task %s has already queued its subtasks!  InstructorTask = %s", entry.task_id, entry)
+        return json.loads(entry.task_output)
+
+    start_time = time()
+    batch_update_fcn = get_batch_update_fcn(update_type, xmodule_instance_args)
+    module_descriptor, modules_to_update = _get_modules_to_update(course_id, task_input, filter_fcn)
+    if modules_to_update.count() <= settings.INSTRUCTOR_TASK_MODULES_PER_TASK:
+        return _perform_batch_update(batch_update_fcn, module_descriptor, modules_to_update, action_name, start_time)
+
+    def create_subtask(item_list, initial_subtask_status):
+        """Creates a subtask to update the given StudentModules"""
+        return subtask_class.subtask(
+            (
+                entry_id,
+                update_type,
+                [item['pk'] for item in item_list],
+                xmodule_instance_args,
+                initial_subtask_status.to_dict(),
+            ),
+            task_id=initial_subtask_status.task_id,
+        )
+
+    TASK_LOG.info(u"Task %s: Preparing to queue subtasks to update modules for %s", entry.task_id, task_input)
+    return queue_subtasks_for_query(
+        entry,
+        action_name,
+        create_subtask,
+        modules_to_update,
+        [],
+        settings.INSTRUCTOR_TASK_MODULES_PER_QUERY,
+        settings.INSTRUCTOR_TASK_MODULES_PER_TASK,
+    )
+
+
+def perform_module_state_subtask(entry_id, update_type, module_ids, xmodule_instance_args, subtask_status_dict):
+    """
+    Updates the StudentModules with ids `module_ids` with the batch update function for
+    `update_type`, as a subtask queued by `delegate_module_state_update`, and records the
+    result in the InstructorTask `entry_id`.
+
+    Returns the subtask's status, as a dict (see SubtaskStatus).
+    """
+    subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
+    current_task_id = subtask_status.task_id
+    TASK_LOG.info(u"Preparing to %s %d modules as subtask %s for instructor task %d",
+                  update_type, len(module_ids), current_task_id, entry_id)
+
+    # Raises an exception if this subtask isn't known to the InstructorTask or has already been done
+    check_subtask_is_valid(entry_id, current_task_id, subtask_status)
+
+    counts = {UPDATE_STATUS_SUCCEEDED: 0, UPDATE_STATUS_FAILED: 0, UPDATE_STATUS_SKIPPED: 0}
+    try:
+        entry = InstructorTask.objects.get(pk=entry_id)
+        task_input = json.loads(entry.task_input)
+        usage_key = entry.course_id.make_usage_key_from_deprecated_string(task_input.get('problem_url'))
+        module_descriptor = modulestore().get_item(usage_key)
+        modules_to_update = StudentModule.objects.filter(id__in=module_ids).order_by('id')
+        batch_update_fcn = get_batch_update_fcn(update_type, xmodule_instance_args)
+        with dog_stats_api.timer('instructor_tasks.subtask.time', tags=[u'action:{}'.format(update_type)]):
+            counts.update(batch_update_fcn(module_descriptor, modules_to_update, update_type, counts.update))
+    except Exception:
+        # Count the modules that weren't done as having failed, to keep the counts consistent.
+        TASK_LOG.exception(u"Subtask %s of instructor task %d failed unexpectedly!", current_task_id, entry_id)
+        subtask_status.increment(
+            succeeded=counts[UPDATE_STATUS_SUCCEEDED],
+            skipped=counts[UPDATE_STATUS_SKIPPED],
+            failed=len(module_ids) - counts[UPDATE_STATUS_SUCCEEDED] - counts[UPDATE_STATUS_SKIPPED],
+            state=FAILURE,
+        )
+        update_subtask_status(entry_id, current_task_id, subtask_status)
+        raise
+
+    subtask_status.increment(
+        succeeded=counts[UPDATE_STATUS_SUCCEEDED],
+        failed=counts[UPDATE_STATUS_FAILED],
+        skipped=counts[UPDATE_STATUS_SKIPPED],
+        state=SUCCESS,
+    )
+    update_subtask_status(entry_id, current_task_id, subtask_status)
+    return subtask_status.to_dict()
 
 
 def _get_task_id_from_xmodule_args(xmodule_instance_args):
@@ -435,6 +604,13 @@ def reset_attempts_module_state(xmodule_instance_args, _module_descriptor, stude
     Returns a status of UPDATE_STATUS_SUCCEEDED if a problem has non-zero attempts
     that are being reset, and UPDATE_STATUS_SKIPPED otherwise.
     """
+    return _reset_attempts(xmodule_instance_args, student_module)
+
+
+def _reset_attempts(xmodule_instance_args, student_module):
+    """
+    Resets problem attempts to zero for `student_module`, returning its update status
+    """
     update_status = UPDATE_STATUS_SKIPPED
     problem_state = json.loads(student_module.state) if student_module.state else {}
     if 'attempts' in problem_state:
@@ -454,6 +630,26 @@ def reset_attempts_module_state(xmodule_instance_args, _module_descriptor, stude
     return update_status
 
 
+@transaction.commit_on_success
+def reset_attempts_in_bulk(xmodule_instance_args, _module_descriptor, modules_to_update, _action_name,
+                           progress_fcn=None):
+    """
+    Resets problem attempts to zero for each of `modules_to_update`, a query for StudentModules,
+    in one transaction, without instantiating any XModules. The students are fetched with the
+    modules, and the history entries of the modules are written together.
+
+    Returns the counts of modules reset and skipped, and calls `progress_fcn` with them, as
+    described for `update_modules_one_at_a_time`.
+    """
+    counts = {UPDATE_STATUS_SUCCEEDED: 0, UPDATE_STATUS_FAILED: 0, UPDATE_STATUS_SKIPPED: 0}
+    with StudentModuleHistory.buffered_history():
+        for student_module in modules_to_update.select_related('student'):
+            counts[_reset_attempts(xmodule_instance_args, student_module)] += 1
+    if progress_fcn is not None:
+        progress_fcn(counts)
+    return counts
+
+
 @transaction.autocommit
 def delete_problem_module_state(xmodule_instance_args, _module_descriptor, student_module):
     """
@@ -469,37 +665,83 @@ def delete_problem_module_state(xmodule_instance_args, _module_descriptor, stude
     return UPDATE_STATUS_SUCCEEDED
 
 
-def push_grades_to_s3(_xmodule_instance_args, _entry_id, course_id, _task_input, action_name):
+@transaction.commit_on_success
+def delete_problem_state_in_bulk(xmodule_instance_args, _module_descriptor, modules_to_update, _action_name,
+                                 progress_fcn=None):
+    """
+    Deletes each of `modules_to_update`, a query for StudentModules, with one DELETE in one
+    transaction, without instantiating any XModules.
+
+    Returns the count of modules deleted, and calls `progress_fcn` with it, as described for
+    `update_modules_one_at_a_time`.
+    """
+    student_modules = list(modules_to_update.select_related('student'))
+    StudentModule.objects.filter(id__in=[student_module.id for student_module in student_modules]).delete()
+    for student_module in student_modules:
+        track_function = _get_track_function_for_task(student_module.student, xmodule_instance_args)
+        track_function('problem_delete_state', {})
+
+    counts = {UPDATE_STATUS_SUCCEEDED: len(student_modules), UPDATE_STATUS_FAILED: 0, UPDATE_STATUS_SKIPPED: 0}
+    if progress_fcn is not None:
+        progress_fcn(counts)
+    return counts
+
+
+def push_grades_to_s3(_xmodule_instance_args, entry_id, course_id, _task_input, action_name):
     """
     For a given `course_id`, generate a grades CSV file for all students that
     are enrolled, and store using a `ReportStore`. Once created, the files can
     be accessed by instantiating another `ReportStore` (via
-    `ReportStore.from_config()`) and calling `link_for()` on it. Writes are
-    buffered, so we'll never write part of a CSV file to S3 -- i.e. any files
-    that are visible in ReportStore will be complete ones.
-
-    As we start to add more CSV downloads, it will probably be worthwhile to
-    make a more general CSVDoc class instead of building out the rows like we
-    do here.
+    `ReportStore.from_config()`) and calling `link_for()` on it. Rows are
+    written to a working file as students are graded, which is only stored
+    once it's complete, so we'll never write part of a CSV file to S3 -- i.e.
+    any files that are visible in ReportStore will be complete ones.
+
+    Progress is checkpointed every `GRADES_DOWNLOAD_BATCH_SIZE` students; if the
+    task is run again for the same InstructorTask entry after dying, it carries
+    on from the last checkpoint instead of regrading everyone.
     """
     start_time = datetime.now(UTC)
     status_interval = 100
+    checkpoint_interval = settings.GRADES_DOWNLOAD_BATCH_SIZE
 
-    enrolled_students = CourseEnrollment.users_enrolled_in(course_id)
+    enrolled_students = CourseEnrollment.users_enrolled_in(course_id).order_by('id')
     num_total = enrolled_students.count()
-    num_attempted = 0
-    num_succeeded = 0
-    num_failed = 0
     curr_step = "Calculating Grades"
 
+    # Name the files after when the task was submitted, so a rerun writes the same ones
+    created = InstructorTask.objects.get(pk=entry_id).created or start_time
+    timestamp_str = created.strftime("%Y-%m-%d-%H%M")
+    course_id_prefix = urllib.quote(course_id.to_deprecated_string().replace("/", "_"))
+
+    report_store = ReportStore.from_config()
+    report = report_store.open_report(
+        course_id,
+        u"{}_grade_report_{}.csv".format(course_id_prefix, timestamp_str),
+        resume=True
+    )
+    state = report.resumed_state or {
+        'last_student_id': None,
+        'attempted': 0,
+        'succeeded': 0,
+        'failed': 0,
+        'header': None,
+        'err_rows': [["id", "username", "error_msg"]],
+    }
+    if state['last_student_id'] is not None:
+        TASK_LOG.info(
+            u"Resuming grade report for %s after %d students", course_id.to_deprecated_string(), state['attempted']
+        )
+        enrolled_students = enrolled_students.filter(id__gt=state['last_student_id'])
+
     def update_task_progress():
         """Return a dict containing info about current task"""
         current_time = datetime.now(UTC)
         progress = {
             'action_name': action_name,
-            'attempted': num_attempted,
-            'succeeded': num_succeeded,
-            'failed': num_failed,
+            'attempted': state['attempted'],
+            'succeeded': state['succeeded'],
+            'failed': state['failed'],
             'total': num_total,
             'duration_ms': int((current_time - start_time).total_seconds() * 1000),
             'step': curr_step,
@@ -508,65 +750,56 @@ def push_grades_to_s3(_xmodule_instance_args, _entry_id, course_id, _task_input,
 
         return progress
 
-    # Loop over all our students and build our CSV lists in memory
-    header = None
-    rows = []
-    err_rows = [["id", "username", "error_msg"]]
-    for student, gradeset, err_msg in iterate_grades_for(course_id, enrolled_students):
-        # Periodically update task status (this is a cache write)
-        if num_attempted % status_interval == 0:
-            update_task_progress()
-        num_attempted += 1
-
-        if gradeset:
-            # We were able to successfully grade this student for this course.
-            num_succeeded += 1
-            if not header:
-                # Encode the header row in utf-8 encoding in case there are unicode characters
-                header = [section['label'].encode('utf-8') for section in gradeset[u'section_breakdown']]
-                rows.append(["id", "email", "username", "grade"] + header)
-
-            percents = {
-                section['label']: section.get('percent', 0.0)
-                for section in gradeset[u'section_breakdown']
-                if 'label' in section
-            }
-
-            # Not everybody has the same gradable items. If the item is not
-            # found in the user's gradeset, just assume it's a 0. The aggregated
-            # grades for their sections and overall course will be calculated
-            # without regard for the item they didn't have access to, so it's
-            # possible for a student to have a 0.0 show up in their row but
-            # still have 100% for the course.
-            row_percents = [percents.get(label, 0.0) for label in header]
-            rows.append([student.id, student.email, student.username, gradeset['percent']] + row_percents)
-        else:
-            # An empty gradeset means we failed to grade a student.
-            num_failed += 1
-            err_rows.append([student.id, student.username, err_msg])
-
-    # By this point, we've got the rows we're going to stuff into our CSV files.
-    curr_step = "Uploading CSVs"
-    update_task_progress()
+    # Loop over all our students, writing their rows as we go. Error rows are
+    # expected to be few; so, they're kept in the checkpoint state.
+    with report:
+        grades_iter = iterate_grades_for(course_id, enrolled_students, batch_size=settings.GRADES_DOWNLOAD_BATCH_SIZE)
+        for student, gradeset, err_msg in grades_iter:
+            # Periodically update task status (this is a cache write)
+            if state['attempted'] % status_interval == 0:
+                update_task_progress()
+            state['attempted'] += 1
+
+            if gradeset:
+                # We were able to successfully grade this student for this course.
+                state['succeeded'] += 1
+                if not state['header']:
+                    state['header'] = [section['label'] for section in gradeset[u'section_breakdown']]
+                    report.writerow(["id", "email", "username", "grade"] + state['header'])
+
+                percents = {
+                    section['label']: section.get('percent', 0.0)
+                    for section in gradeset[u'section_breakdown']
+                    if 'label' in section
+                }
+
+                # Not everybody has the same gradable items. If the item is not
+                # found in the user's gradeset, just assume it's a 0. The aggregated
+                # grades for their sections and overall course will be calculated
+                # without regard for the item they didn't have access to, so it's
+                # possible for a student to have a 0.0 show up in their row but
+                # still have 100% for the course.
+                row_percents = [percents.get(label, 0.0) for label in state['header']]
+                report.writerow([student.id, student.email, student.username, gradeset['percent']] + row_percents)
+            else:
+                # An empty gradeset means we failed to grade a student.
+                state['failed'] += 1
+                state['err_rows'].append([student.id, student.username, err_msg])
 
-    # Generate parts of the file name
-    timestamp_str = start_time.strftime("%Y-%m-%d-%H%M")
-    course_id_prefix = urllib.quote(course_id.to_deprecated_string().replace("/", "_"))
+            state['last_student_id'] = student.id
+            if state['attempted'] % checkpoint_interval == 0:
+                report.checkpoint(state)
 
-    # Perform the actual upload
-    report_store = ReportStore.from_config()
-    report_store.store_rows(
-        course_id,
-        u"{}_grade_report_{}.csv".format(course_id_prefix, timestamp_str),
-        rows
-    )
+        # By this point, every row is written; leaving the block stores the CSV.
+        curr_step = "Uploading CSVs"
+        update_task_progress()
 
     # If there are any error rows (don't count the header), write them out as well
-    if len(err_rows) > 1:
+    if len(state['err_rows']) > 1:
         report_store.store_rows(
             course_id,
             u"{}_grade_report_{}_err.csv".format(course_id_prefix, timestamp_str),
-            err_rows
+            state['err_rows']
         )
 
     # One last update before we close out...
@@ -0,0 +1,138 @@
+"""
+Tests for the ReportStore and ReportWriter in instructor_task.models
+"""
+import os
+import shutil
+import tempfile
+import zlib
+from uuid import uuid4
+
+from django.test import TestCase
+from mock import patch
+
+from xmodule.modulestore.locations import SlashSeparatedCourseKey
+
+from instructor_task.models import LocalFSReportStore, S3ReportStore
+
+
+class TestLocalFSReportStore(TestCase):
+    """
+    Test writing reports with a LocalFSReportStore
+    """
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root_path)
+        self.store = LocalFSReportStore(self.root_path)
+        self.course_id = SlashSeparatedCourseKey('edX', 'toy', '2012_Fall')
+
+    def read_report(self, filename):
+        """
+        Return the contents of the report
+        """
+        with open(self.store.path_to(self.course_id, filename), 'rb') as report_file:
+            return report_file.read()
+
+    def test_store_rows(self):
+        self.store.store_rows(self.course_id, 'report.csv', [['id', 'name'], [1, u'caf\xe9']])
+        self.assertEqual(self.read_report('report.csv'), 'id,name\r\n1,caf\xc3\xa9\r\n')
+        self.assertEqual([filename for filename, _url in self.store.links_for(self.course_id)], ['report.csv'])
+
+    def test_report_hidden_until_closed(self):
+        report = self.store.open_report(self.course_id, 'report.csv')
+        report.writerow(['id'])
+        report.checkpoint(None)
+        self.assertEqual(self.store.links_for(self.course_id), [])
+        report.close()
+        self.assertEqual(self.read_report('report.csv'), 'id\r\n')
+
+    def test_report_kept_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.store.open_report(self.course_id, 'report.csv') as report:
+                report.writerow(['id'])
+                report.checkpoint({'rows': 1})
+                raise ValueError()
+        self.assertEqual(self.store.links_for(self.course_id), [])
+
+        report = self.store.open_report(self.course_id, 'report.csv', resume=True)
+        self.assertEqual(report.resumed_state, {'rows': 1})
+        report.close()
+        self.assertEqual(self.read_report('report.csv'), 'id\r\n')
+
+    def test_resume(self):
+        report = self.store.open_report(self.course_id, 'report.csv')
+        report.writerow(['id'])
+        report.writerow([1])
+        report.checkpoint({'last_id': 1})
+        # not checkpointed; so, lost when the writer dies without closing
+        report.writerow([2])
+        report._file.close()  # pylint: disable=protected-access
+
+        report = self.store.open_report(self.course_id, 'report.csv', resume=True)
+        self.assertEqual(report.resumed_state, {'last_id': 1})
+        report.writerow([2])
+        report.writerow([3])
+        report.close()
+        self.assertEqual(self.read_report('report.csv'), 'id\r\n1\r\n2\r\n3\r\n')
+
+    def test_restart_without_resume(self):
+        report = self.store.open_report(self.course_id, 'report.csv')
+        report.writerow(['old'])
+        report.checkpoint({'last_id': 1})
+        report._file.close()  # pylint: disable=protected-access
+
+        report = self.store.open_report(self.course_id, 'report.csv')
+        self.assertIsNone(report.resumed_state)
+        report.writerow(['new'])
+        report.close()
+        self.assertEqual(self.read_report('report.csv'), 'new\r\n')
+
+
+@patch('instructor_task.models.Key')
+@patch('instructor_task.models.S3Connection')
+class TestS3ReportStore(TestCase):
+    """
+    Test the gzip'd reports which an S3ReportStore uploads
+    """
+    def setUp(self):
+        self.course_id = SlashSeparatedCourseKey('edX', 'toy', '2012_Fall')
+        self.uploaded = []
+        # a root of its own, so that the working files are this test's
+        self.root_path = 'reports-{}'.format(uuid4().hex)
+        self.addCleanup(
+            shutil.rmtree, os.path.join(tempfile.gettempdir(), 'report-partials', 'bucket', self.root_path), True
+        )
+
+    def upload(self, path, headers):
+        """
+        Save the contents of the uploaded file
+        """
+        with open(path, 'rb') as uploaded_file:
+            self.uploaded.append((uploaded_file.read(), headers))
+
+    def test_checkpointed_report_is_one_gzip_member(self, mock_connection, mock_key):
+        mock_connection.return_value.get_bucket.return_value.name = 'bucket'
+        mock_key.return_value.set_contents_from_filename.side_effect = self.upload
+        store = S3ReportStore('bucket', self.root_path)
+
+        report = store.open_report(self.course_id, 'report.csv')
+        report.writerow(['id'])
+        report.checkpoint({'last_id': None})
+        report.writerow([1])
+        report._file.close()  # pylint: disable=protected-access
+
+        report = store.open_report(self.course_id, 'report.csv', resume=True)
+        self.assertEqual(report.resumed_state, {'last_id': None})
+        report.writerow([1])
+        report.checkpoint({'last_id': 1})
+        report.writerow([2])
+        working_path = report.path
+        report.close()
+
+        data, headers = self.uploaded[0]
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        # a decoder which stops after the first gzip member still finds every row
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.assertEqual(decompressor.decompress(data), 'id\r\n1\r\n2\r\n')
+        self.assertEqual(decompressor.unused_data, '')
+        self.assertEqual(os.listdir(os.path.dirname(working_path)), [])
+
@@ -11,6 +11,7 @@ from uuid import uuid4
 from mock import Mock, MagicMock, patch
 
 from celery.states import SUCCESS, FAILURE
+from django.test.utils import override_settings
 
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.modulestore.locations import i4xEncoder
@@ -113,6 +114,26 @@ class TestInstructorTasks(InstructorTaskModuleTestCase):
         self.assertEquals(json.loads(entry.task_output), status)
         self.assertEquals(entry.task_state, SUCCESS)
 
+    def _test_run_in_subtasks(self, task_class, expected_num_succeeded, expected_num_skipped=0):
+        """
+        Run a task with few enough modules per subtask that it queues subtasks (which run
+        at once, as celery is eager in tests), and check the number of StudentModules processed.
+        """
+        task_entry = self._create_input_entry()
+        with override_settings(INSTRUCTOR_TASK_MODULES_PER_TASK=3, INSTRUCTOR_TASK_MODULES_PER_QUERY=5):
+            self._run_task_with_mock_celery(task_class, task_entry.id, task_entry.task_id)
+        entry = InstructorTask.objects.get(id=task_entry.id)
+        self.assertEquals(entry.task_state, SUCCESS)
+        output = json.loads(entry.task_output)
+        self.assertEquals(output.get('attempted'), expected_num_succeeded + expected_num_skipped)
+        self.assertEquals(output.get('succeeded'), expected_num_succeeded)
+        self.assertEquals(output.get('skipped'), expected_num_skipped)
+        self.assertEquals(output.get('total'), expected_num_succeeded + expected_num_skipped)
+        subtasks = json.loads(entry.subtasks)
+        # two queries, of five modules in two subtasks each
+        self.assertEquals(subtasks['total'], 4)
+        self.assertEquals(subtasks['succeeded'], 4)
+
     def _test_run_with_no_state(self, task_class, action_name):
         """Run with no StudentModules defined for the current problem."""
         self.define_option_problem(PROBLEM_URL_NAME)
@@ -258,6 +279,16 @@ class TestRescoreInstructorTask(TestInstructorTasks):
         self.assertEquals(output.get('action_name'), 'rescored')
         self.assertGreater(output.get('duration_ms'), 0)
 
+    def test_rescoring_in_subtasks(self):
+        input_state = json.dumps({'done': True})
+        self._create_students_with_state(10, input_state)
+        mock_instance = Mock()
+        mock_instance.rescore_problem = Mock(return_value={'success': 'correct'})
+        with patch('instructor_task.tasks_helper.get_module_for_descriptor_internal') as mock_get_module:
+            mock_get_module.return_value = mock_instance
+            self._test_run_in_subtasks(rescore_problem, 10)
+        self.assertEquals(mock_instance.rescore_problem.call_count, 10)
+
     def test_rescoring_bad_result(self):
         # Confirm that rescoring does not succeed if "success" key is not an expected value.
         input_state = json.dumps({'done': True})
@@ -347,6 +378,11 @@ class TestResetAttemptsInstructorTask(TestInstructorTasks):
         # check that entries were reset
         self._assert_num_attempts(students, 0)
 
+    def test_reset_in_subtasks(self):
+        students = self._create_students_with_state(10, json.dumps({'attempts': 3}))
+        self._test_run_in_subtasks(reset_problem_attempts, 10)
+        self._assert_num_attempts(students, 0)
+
     def _test_reset_with_student(self, use_email):
         """Run a reset task for one student, with several StudentModules for the problem defined."""
         num_students = 10
@@ -438,3 +474,9 @@ class TestDeleteStateInstructorTask(TestInstructorTasks):
                 StudentModule.objects.get(course_id=self.course.id,
                                           student=student,
                                           module_state_key=self.location)
+
+    def test_delete_in_subtasks(self):
+        self._create_students_with_state(10)
+        self._test_run_in_subtasks(delete_problem_state, 10)
+        modules = StudentModule.objects.filter(course_id=self.course.id, module_state_key=self.location)
+        self.assertFalse(modules.exists())
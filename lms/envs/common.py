@@ -144,6 +144,11 @@ FEATURES = {
     # Staff Debug tool.
     'ENABLE_STUDENT_HISTORY_VIEW': True,
 
+    # Store each StudentModuleHistory entry's state as the changes from the previous
+    # entry's, where that's smaller. Use the compact_student_module_history command
+    # (not clean_history) to prune history once this is on.
+    'STORE_STUDENT_HISTORY_DELTAS': False,
+
     # segment.io for LMS--need to explicitly turn it on for production.
     'SEGMENT_IO_LMS': False,
 
@@ -255,6 +260,10 @@ FEATURES = {
     # Show a "Download your certificate" on the Progress page if the lowest
     # nonzero grade cutoff is met
     'SHOW_PROGRESS_SUCCESS_BUTTON': False,
+
+    # Render only the unit being viewed in a sequence, fetching the other units
+    # from the server when the student moves to them
+    'ENABLE_LAZY_SEQUENCE_RENDERING': False,
 }
 
 # Used for A/B testing
@@ -417,6 +426,11 @@ TRACKING_BACKENDS = {
 # names/passwords.  Heartbeat events are likely not interesting.
 TRACKING_IGNORE_URL_PATTERNS = [r'^/event', r'^/login', r'^/heartbeat']
 
+# If set, a dict of BATCH_SIZE, FLUSH_INTERVAL (seconds), and MAX_QUEUE_SIZE with
+# which to send events to the TRACKING_BACKENDS in batches from a background thread
+# rather than during the request. See track.dispatcher.
+TRACKING_BUFFER = None
+
 EVENT_TRACKING_ENABLED = True
 EVENT_TRACKING_BACKENDS = {
     'logger': {
@@ -500,6 +514,17 @@ CODE_JAIL = {
         # How many CPU seconds can jailed code use?
         'CPU': 1,
     },
+
+    # Keep warm sandboxed Python processes to run code in, rather than starting
+    # one for each execution.  See common/lib/capa/capa/safe_exec/README.rst.
+    'pool': {
+        # How many processes to keep?  0 means don't use a pool.
+        'size': 0,
+        # How many executions may a process run before it's replaced?
+        'max_executions': 100,
+        # Send histograms of the time taken by each execution?
+        'timing_metrics': True,
+    },
 }
 
 # Some courses are allowed to run unsafe code. This is a list of regexes, one
@@ -544,6 +569,18 @@ STATIC_URL = '/static/'
 ADMIN_MEDIA_PREFIX = '/static/admin/'
 STATIC_ROOT = ENV_ROOT / "staticfiles"
 
+# How many seconds browsers and proxies may cache unlocked course assets (the /c4x/ urls)
+STATIC_CONTENT_CACHE_MAX_AGE = 60 * 60 * 24
+
+# Local disk cache for course assets too big for memcache. None disables it; otherwise e.g.,
+# {
+#     'ROOT': '/var/tmp/asset_cache',
+#     'MAX_SIZE': 10 * 1024 ** 3,  # bytes of disk to use
+#     'MAX_FILE_SIZE': 512 * 1024 ** 2,  # optional: larger assets aren't cached
+#     'ACCEL_REDIRECT_PREFIX': '/asset_cache/',  # optional: an nginx internal location serving ROOT
+# }
+STATIC_CONTENT_DISK_CACHE = None
+
 STATICFILES_DIRS = [
     COMMON_ROOT / "static",
     PROJECT_ROOT / "static",
@@ -785,6 +822,8 @@ MIDDLEWARE_CLASSES = (
     'django.middleware.locale.LocaleMiddleware',
 
     'django.middleware.transaction.TransactionMiddleware',
+    # Writes the StudentModuleHistory saved during the request; must come after TransactionMiddleware
+    'courseware.middleware.StudentModuleHistoryMiddleware',
     # 'debug_toolbar.middleware.DebugToolbarMiddleware',
 
     'django_comment_client.utils.ViewNameMiddleware',
@@ -1328,6 +1367,18 @@ GRADES_DOWNLOAD = {
     'ROOT_PATH': '/tmp/edx-s3/grades',
 }
 
+# Number of students whose StudentModule scores are loaded together when
+# generating a grade report
+GRADES_DOWNLOAD_BATCH_SIZE = 100
+
+################### Problem rescoring, resetting and deleting ###################
+
+# Parameters for breaking down the StudentModules of a problem into subtasks.
+# A task with no more than INSTRUCTOR_TASK_MODULES_PER_TASK modules to update
+# does the work itself.
+INSTRUCTOR_TASK_MODULES_PER_TASK = 100
+INSTRUCTOR_TASK_MODULES_PER_QUERY = 1000
+
 ######################## PROGRESS SUCCESS BUTTON ##############################
 # The following fields are available in the URL: {course_id} {student_id}
 PROGRESS_SUCCESS_BUTTON_URL = 'http://<domain>/<path>/{course_id}'
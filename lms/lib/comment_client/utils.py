@@ -1,14 +1,27 @@
 from contextlib import contextmanager
 from dogapi import dog_stats_api
+import cookielib
 import logging
+import os
 import requests
+import sys
+import threading
 from django.conf import settings
+from django.utils import translation
 from time import time
 from uuid import uuid4
 from django.utils.translation import get_language
+from requests.adapters import HTTPAdapter
 
 log = logging.getLogger(__name__)
 
+DEFAULT_TIMEOUT = 5
+DEFAULT_POOL_SIZE = 10
+
+_SESSION = None
+_SESSION_PID = None
+_SESSION_LOCK = threading.Lock()
+
 
 def strip_none(dic):
     return dict([(k, v) for k, v in dic.iteritems() if v is not None])
@@ -50,6 +63,77 @@ def request_timer(request_id, method, url, tags=None):
     )
 
 
+def get_session():
+    """
+    Return this process's session for talking to the comments service, which keeps up to
+    COMMENTS_SERVICE_POOL_SIZE connections alive for reuse. Connections don't survive a fork;
+    so, a forked worker makes its own session.
+    """
+    global _SESSION, _SESSION_PID  # pylint: disable=global-statement
+    if _SESSION_PID != os.getpid():
+        with _SESSION_LOCK:
+            if _SESSION_PID != os.getpid():
+                session = requests.Session()
+                # the session is shared by every user's requests; so, it mustn't keep any cookies
+                session.cookies.set_policy(cookielib.DefaultCookiePolicy(allowed_domains=[]))
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=getattr(settings, "COMMENTS_SERVICE_POOL_SIZE", DEFAULT_POOL_SIZE),
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _SESSION = session
+                _SESSION_PID = os.getpid()
+    return _SESSION
+
+
+def perform_concurrently(*calls):
+    """
+    Make the calls (functions taking no arguments) at the same time and return their results in a list.
+
+    The first call is made in the calling thread, so it may do anything; the others are made in
+    worker threads, so they should only make comment service requests (e.g., they mustn't use the
+    database). Each uses the caller's language. If any call raises an exception, the exception
+    raised by the earliest such call in the list is re-raised once all have finished.
+    """
+    language = get_language()
+    results = [None] * len(calls)
+    errors = [None] * len(calls)
+
+    def make_call(index):
+        """
+        Make calls[index], recording its result or exception
+        """
+        try:
+            results[index] = calls[index]()
+        except Exception:  # pylint: disable=broad-except
+            errors[index] = sys.exc_info()
+
+    def make_worker_call(index):
+        """
+        Make calls[index] in a worker thread, in the caller's language
+        """
+        translation.activate(language)
+        try:
+            make_call(index)
+        finally:
+            translation.deactivate()
+
+    with dog_stats_api.timer('comment_client.concurrent.time', tags=[u'calls:{}'.format(len(calls))]):
+        workers = [threading.Thread(target=make_worker_call, args=(index,)) for index in xrange(1, len(calls))]
+        for worker in workers:
+            worker.start()
+        if calls:
+            make_call(0)
+        for worker in workers:
+            worker.join()
+
+    for error in errors:
+        if error is not None:
+            raise error[0], error[1], error[2]
+    return results
+
+
 def perform_request(method, url, data_or_params=None, raw=False,
                     metric_action=None, metric_tags=None, paged_results=False):
 
@@ -76,13 +160,13 @@ def perform_request(method, url, data_or_params=None, raw=False,
         data = None
         params = merge_dict(data_or_params, request_id_dict)
     with request_timer(request_id, method, url, metric_tags):
-        response = requests.request(
+        response = get_session().request(
             method,
             url,
             data=data,
             params=params,
             headers=headers,
-            timeout=5
+            timeout=getattr(settings, "COMMENTS_SERVICE_TIMEOUT", DEFAULT_TIMEOUT)
         )
 
     metric_tags.append(u'status_code:{}'.format(response.status_code))
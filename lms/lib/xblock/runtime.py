@@ -3,6 +3,7 @@ Module implementing `xblock.runtime.Runtime` functionality for the LMS
 """
 
 import re
+import threading
 
 from django.core.urlresolvers import reverse
 from django.conf import settings
@@ -181,11 +182,22 @@ class UserTagsService(object):
                                            self.runtime.course_id, key, value)
 
 
+# How many renders are in progress in this thread, one inside another
+_render_state = threading.local()  # pylint: disable=invalid-name
+
+
 class LmsModuleSystem(LmsHandlerUrls, ModuleSystem):  # pylint: disable=abstract-method
     """
     ModuleSystem specialized to the LMS
     """
-    def __init__(self, **kwargs):
+    def __init__(self, outer_wrappers=None, **kwargs):
+        """
+        :param outer_wrappers: A list of wrappers, like `wrappers`, but only applied to
+            the fragment of the outermost render, which holds the fragments of all of
+            the blocks rendered inside it, or of a child rendered with `render_escaped`.
+            They're applied before `wrappers`, so they don't see the markup `wrappers` add.
+        """
+        self.outer_wrappers = outer_wrappers or []
         services = kwargs.setdefault('services', {})
         services['user_tags'] = UserTagsService(self)
         services['partitions'] = LmsPartitionService(
@@ -194,3 +206,35 @@ class LmsModuleSystem(LmsHandlerUrls, ModuleSystem):  # pylint: disable=abstract
             track_function=kwargs.get('track_function', None),
         )
         super(LmsModuleSystem, self).__init__(**kwargs)
+
+    def render(self, block, view_name, context=None):
+        """
+        Render as ModuleSystem does, keeping count of the renders in progress
+        """
+        depth = getattr(_render_state, 'depth', 0)
+        _render_state.depth = depth + 1
+        try:
+            return super(LmsModuleSystem, self).render(block, view_name, context)
+        finally:
+            _render_state.depth = depth
+
+    def render_escaped(self, block, view_name, context=None):
+        """
+        Render `block` as though it were the outermost block, so that its content
+        has `outer_wrappers` applied before the block rendering it escapes it
+        """
+        depth = getattr(_render_state, 'depth', 0)
+        _render_state.depth = 0
+        try:
+            return super(LmsModuleSystem, self).render_escaped(block, view_name, context)
+        finally:
+            _render_state.depth = depth
+
+    def wrap_child(self, block, view, frag, context):
+        """
+        Apply `outer_wrappers` if this is the outermost render, then `wrappers`
+        """
+        if getattr(_render_state, 'depth', 0) == 1:
+            for wrapper in self.outer_wrappers:
+                frag = wrapper(block, view, frag, context)
+        return super(LmsModuleSystem, self).wrap_child(block, view, frag, context)
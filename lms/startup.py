@@ -29,6 +29,9 @@ def run():
     if settings.FEATURES.get('ENABLE_THIRD_PARTY_AUTH', False):
         enable_third_party_auth()
 
+    if settings.CODE_JAIL.get('pool', {}).get('size'):
+        enable_code_jail_pool()
+
 
 def enable_theme():
     """
@@ -61,6 +64,14 @@ def enable_theme():
     )
 
 
+def enable_code_jail_pool():
+    """
+    Run sandboxed Python code in a pool of warm sandboxed processes
+    """
+    from capa.safe_exec import configure_pool
+    configure_pool(**settings.CODE_JAIL['pool'])
+
+
 def enable_microsites():
     """
     Enable the use of microsites, which are websites that allow